@@ -18,11 +18,14 @@ from app.core.config import settings
 from app.core.database import Base
 from app.models import (  # noqa
     MessageRecord,
+    MessageContent,
     MessageTemplate,
     MessageTemplateHistory,
     EmailAccount,
     EmailAttachment,
     APIKey,
+    Campaign,
+    CampaignRecipient,
 )
 
 # this is the Alembic Config object, which provides
@@ -0,0 +1,133 @@
+"""消息正文改为内容寻址存储（message_contents）
+
+Revision ID: 3f2a9c1d0026
+Revises:
+Create Date: 2026-10-19 17:15:00
+
+按SHA-256对已有message_records.content去重写入message_contents（ref_count为引用行数），
+回填content_hash后再删除content列。基线库由init_db(create_all)创建，已是新结构时跳过。
+需要PostgreSQL 11+（sha256函数）。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2a9c1d0026'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _columns(table: str) -> set:
+    return {column["name"] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table("message_contents"):
+        op.create_table(
+            "message_contents",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False, comment="主键ID"),
+            sa.Column("content_hash", sa.String(length=64), nullable=False, comment="内容哈希（SHA-256，基于原文计算）"),
+            sa.Column("body", sa.LargeBinary(), nullable=False, comment="内容（可能已压缩）"),
+            sa.Column("compression", sa.String(length=20), nullable=False, comment="压缩算法: none/zstd"),
+            sa.Column("size", sa.Integer(), nullable=False, comment="原文大小（字节）"),
+            sa.Column("ref_count", sa.Integer(), nullable=False, comment="引用计数"),
+            sa.Column("created_at", sa.DateTime(), nullable=False, comment="创建时间"),
+            sa.Column("updated_at", sa.DateTime(), nullable=False, comment="更新时间"),
+            sa.PrimaryKeyConstraint("id"),
+            comment="消息内容表",
+        )
+        op.create_index(op.f("ix_message_contents_id"), "message_contents", ["id"], unique=False)
+        op.create_index(op.f("ix_message_contents_content_hash"), "message_contents", ["content_hash"], unique=True)
+
+    columns = _columns("message_records")
+    if "content" not in columns:
+        return
+
+    # 1. 新增可空的content_hash列
+    if "content_hash" not in columns:
+        op.add_column(
+            "message_records",
+            sa.Column("content_hash", sa.String(length=64), nullable=True, comment="消息内容哈希（SHA-256）")
+        )
+
+    # 2. 按原文去重写入内容表，ref_count为引用该内容的消息数（与ContentStore.compute_hash一致：UTF-8编码后SHA-256）
+    op.execute(
+        """
+        INSERT INTO message_contents (content_hash, body, compression, size, ref_count, created_at, updated_at)
+        SELECT encode(sha256(convert_to(content, 'UTF8')), 'hex'),
+               convert_to(content, 'UTF8'),
+               'none',
+               octet_length(convert_to(content, 'UTF8')),
+               count(*),
+               now(),
+               now()
+        FROM message_records
+        GROUP BY content
+        ON CONFLICT (content_hash) DO UPDATE
+            SET ref_count = message_contents.ref_count + excluded.ref_count
+        """
+    )
+
+    # 3. 回填content_hash
+    op.execute(
+        """
+        UPDATE message_records
+        SET content_hash = encode(sha256(convert_to(content, 'UTF8')), 'hex')
+        WHERE content_hash IS NULL
+        """
+    )
+
+    # 4. 加约束后删除旧列
+    op.alter_column("message_records", "content_hash", nullable=False)
+    op.create_index(op.f("ix_message_records_content_hash"), "message_records", ["content_hash"], unique=False)
+    op.create_foreign_key(
+        "message_records_content_hash_fkey",
+        "message_records",
+        "message_contents",
+        ["content_hash"],
+        ["content_hash"],
+        ondelete="RESTRICT",
+    )
+    op.drop_column("message_records", "content")
+
+
+def downgrade() -> None:
+    op.add_column(
+        "message_records",
+        sa.Column("content", sa.Text(), nullable=True, comment="消息内容")
+    )
+    op.execute(
+        """
+        UPDATE message_records AS m
+        SET content = convert_from(c.body, 'UTF8')
+        FROM message_contents AS c
+        WHERE c.content_hash = m.content_hash AND c.compression = 'none'
+        """
+    )
+
+    # zstd压缩的内容无法在SQL中解压，逐条在Python中处理
+    bind = op.get_bind()
+    compressed = bind.execute(
+        sa.text("SELECT content_hash, body FROM message_contents WHERE compression = 'zstd'")
+    ).fetchall()
+    if compressed:
+        import zstandard
+
+        decompressor = zstandard.ZstdDecompressor()
+        for content_hash, body in compressed:
+            bind.execute(
+                sa.text("UPDATE message_records SET content = :content WHERE content_hash = :content_hash"),
+                {"content": decompressor.decompress(body).decode("utf-8"), "content_hash": content_hash},
+            )
+
+    op.alter_column("message_records", "content", nullable=False)
+    op.drop_constraint("message_records_content_hash_fkey", "message_records", type_="foreignkey")
+    op.drop_index(op.f("ix_message_records_content_hash"), table_name="message_records")
+    op.drop_column("message_records", "content_hash")
+    op.drop_index(op.f("ix_message_contents_content_hash"), table_name="message_contents")
+    op.drop_index(op.f("ix_message_contents_id"), table_name="message_contents")
+    op.drop_table("message_contents")
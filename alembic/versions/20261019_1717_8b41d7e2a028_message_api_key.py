@@ -0,0 +1,43 @@
+"""消息记录增加api_key_id
+
+Revision ID: 8b41d7e2a028
+Revises: 3f2a9c1d0026
+Create Date: 2026-10-19 17:17:00
+
+历史消息无法确定调用方，保持为空（仅管理员可见）。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b41d7e2a028'
+down_revision = '3f2a9c1d0026'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("message_records")}
+    if "api_key_id" in columns:
+        return
+
+    op.add_column(
+        "message_records",
+        sa.Column("api_key_id", sa.Integer(), nullable=True, comment="创建消息的API Key ID")
+    )
+    op.create_index(op.f("ix_message_records_api_key_id"), "message_records", ["api_key_id"], unique=False)
+    op.create_foreign_key(
+        "message_records_api_key_id_fkey",
+        "message_records",
+        "api_keys",
+        ["api_key_id"],
+        ["id"],
+        ondelete="SET NULL",
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint("message_records_api_key_id_fkey", "message_records", type_="foreignkey")
+    op.drop_index(op.f("ix_message_records_api_key_id"), table_name="message_records")
+    op.drop_column("message_records", "api_key_id")
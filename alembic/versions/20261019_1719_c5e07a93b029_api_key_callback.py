@@ -0,0 +1,32 @@
+"""API Key增加状态回调地址和签名密钥
+
+Revision ID: c5e07a93b029
+Revises: 8b41d7e2a028
+Create Date: 2026-10-19 17:19:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e07a93b029'
+down_revision = '8b41d7e2a028'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("api_keys")}
+    if "callback_url" not in columns:
+        op.add_column("api_keys", sa.Column("callback_url", sa.String(length=500), nullable=True, comment="状态回调地址"))
+    if "callback_secret" not in columns:
+        op.add_column(
+            "api_keys",
+            sa.Column("callback_secret", sa.String(length=500), nullable=True, comment="回调签名密钥（加密存储）")
+        )
+
+
+def downgrade() -> None:
+    op.drop_column("api_keys", "callback_secret")
+    op.drop_column("api_keys", "callback_url")
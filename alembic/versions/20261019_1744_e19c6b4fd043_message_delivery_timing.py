@@ -0,0 +1,66 @@
+"""sent_at改为DateTime并增加投递耗时字段
+
+Revision ID: e19c6b4fd043
+Revises: c5e07a93b029
+Create Date: 2026-10-19 17:44:00
+
+旧版本以 datetime.utcnow().isoformat() 字符串写入sent_at，直接转换为timestamp；
+历史值保持UTC，不换算为本地时间。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e19c6b4fd043'
+down_revision = 'c5e07a93b029'
+branch_labels = None
+depends_on = None
+
+
+TIMING_COLUMNS = [
+    ("queued_at", sa.DateTime(), "进入发送队列时间"),
+    ("started_at", sa.DateTime(), "Worker开始处理时间"),
+    ("render_ms", sa.Integer(), "模板渲染耗时(毫秒)"),
+    ("queue_wait_ms", sa.Integer(), "排队耗时(毫秒)：queued_at到started_at"),
+    ("smtp_connect_ms", sa.Integer(), "SMTP连接及登录耗时(毫秒)"),
+    ("smtp_transmit_ms", sa.Integer(), "SMTP投递耗时(毫秒)"),
+    ("delivery_ms", sa.Integer(), "端到端投递耗时(毫秒)：queued_at到sent_at"),
+]
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    columns = {column["name"]: column for column in inspector.get_columns("message_records")}
+
+    if not isinstance(columns["sent_at"]["type"], sa.DateTime):
+        op.alter_column(
+            "message_records",
+            "sent_at",
+            type_=sa.DateTime(),
+            existing_type=sa.String(length=50),
+            existing_nullable=True,
+            postgresql_using="NULLIF(sent_at, '')::timestamp",
+        )
+
+    indexes = {index["name"] for index in inspector.get_indexes("message_records")}
+    if op.f("ix_message_records_sent_at") not in indexes:
+        op.create_index(op.f("ix_message_records_sent_at"), "message_records", ["sent_at"], unique=False)
+
+    for name, type_, comment in TIMING_COLUMNS:
+        if name not in columns:
+            op.add_column("message_records", sa.Column(name, type_, nullable=True, comment=comment))
+
+
+def downgrade() -> None:
+    for name, _, _ in reversed(TIMING_COLUMNS):
+        op.drop_column("message_records", name)
+    op.drop_index(op.f("ix_message_records_sent_at"), table_name="message_records")
+    op.alter_column(
+        "message_records",
+        "sent_at",
+        type_=sa.String(length=50),
+        existing_type=sa.DateTime(),
+        existing_nullable=True,
+        postgresql_using="to_char(sent_at, 'YYYY-MM-DD\"T\"HH24:MI:SS.US')",
+    )
@@ -0,0 +1,33 @@
+"""消息记录增加计划发送时间send_at
+
+Revision ID: 5d8e2b6c1047
+Revises: e19c6b4fd043
+Create Date: 2026-10-19 17:50:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d8e2b6c1047'
+down_revision = 'e19c6b4fd043'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("message_records")}
+    if "send_at" in columns:
+        return
+
+    op.add_column(
+        "message_records",
+        sa.Column("send_at", sa.DateTime(), nullable=True, comment="计划发送时间（为空表示立即发送）")
+    )
+    op.create_index(op.f("ix_message_records_send_at"), "message_records", ["send_at"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_message_records_send_at"), table_name="message_records")
+    op.drop_column("message_records", "send_at")
@@ -0,0 +1,104 @@
+"""批量发送任务表、收件人暂存表及消息记录campaign_id
+
+Revision ID: a7f3d0e95050
+Revises: 5d8e2b6c1047
+Create Date: 2026-10-19 18:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7f3d0e95050'
+down_revision = '5d8e2b6c1047'
+branch_labels = None
+depends_on = None
+
+
+CAMPAIGN_STATUS = sa.Enum("DRAFT", "RUNNING", "PAUSED", "COMPLETED", "CANCELLED", name="campaignstatus")
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table("campaigns"):
+        op.create_table(
+            "campaigns",
+            sa.Column("id", sa.Integer(), autoincrement=True, nullable=False, comment="主键ID"),
+            sa.Column("name", sa.String(length=200), nullable=False, comment="任务名称"),
+            sa.Column("status", CAMPAIGN_STATUS, nullable=False, comment="状态"),
+            sa.Column("template_id", sa.Integer(), nullable=True, comment="模板ID"),
+            sa.Column("template_code", sa.String(length=100), nullable=False, comment="模板编码"),
+            sa.Column("template_version", sa.Integer(), nullable=True, comment="模板版本号"),
+            sa.Column("variables", sa.JSON(), nullable=True, comment="所有收件人共用的模板变量（收件人变量优先）"),
+            sa.Column("rate_limit", sa.Float(), nullable=False, comment="拆分速率上限(封/秒)"),
+            sa.Column("run_token", sa.Integer(), nullable=False, comment="拆分任务令牌，每次启动/恢复递增，旧的任务链据此退出"),
+            sa.Column("recipient_seq", sa.BigInteger(), nullable=False, comment="已写入的收件人序号"),
+            sa.Column("total_count", sa.Integer(), nullable=False, comment="收件人总数"),
+            sa.Column("created_count", sa.Integer(), nullable=False, comment="已生成的消息数"),
+            sa.Column("invalid_count", sa.Integer(), nullable=False, comment="渲染失败未生成消息的收件人数"),
+            sa.Column("success_count", sa.Integer(), nullable=False, comment="发送成功数"),
+            sa.Column("failed_count", sa.Integer(), nullable=False, comment="发送失败数"),
+            sa.Column("cancelled_count", sa.Integer(), nullable=False, comment="取消时尚未发送的消息数"),
+            sa.Column("started_at", sa.DateTime(), nullable=True, comment="开始拆分时间"),
+            sa.Column("last_chunk_at", sa.DateTime(), nullable=True, comment="最近一批拆分时间（用于发现中断的拆分任务链）"),
+            sa.Column("fanout_finished_at", sa.DateTime(), nullable=True, comment="全部收件人拆分完成时间"),
+            sa.Column("finished_at", sa.DateTime(), nullable=True, comment="完成或取消时间"),
+            sa.Column("api_key_id", sa.Integer(), nullable=True, comment="创建任务的API Key ID"),
+            sa.Column("error_message", sa.Text(), nullable=True, comment="错误信息"),
+            sa.Column("created_at", sa.DateTime(), nullable=False, comment="创建时间"),
+            sa.Column("updated_at", sa.DateTime(), nullable=False, comment="更新时间"),
+            sa.ForeignKeyConstraint(["template_id"], ["message_templates.id"], ondelete="SET NULL"),
+            sa.ForeignKeyConstraint(["api_key_id"], ["api_keys.id"], ondelete="SET NULL"),
+            sa.PrimaryKeyConstraint("id"),
+            comment="批量发送任务表",
+        )
+        op.create_index(op.f("ix_campaigns_id"), "campaigns", ["id"], unique=False)
+        op.create_index(op.f("ix_campaigns_status"), "campaigns", ["status"], unique=False)
+        op.create_index(op.f("ix_campaigns_api_key_id"), "campaigns", ["api_key_id"], unique=False)
+
+    if not inspector.has_table("campaign_recipients"):
+        op.create_table(
+            "campaign_recipients",
+            sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False, comment="主键ID"),
+            sa.Column("campaign_id", sa.Integer(), nullable=False, comment="批量任务ID"),
+            sa.Column("seq", sa.BigInteger(), nullable=False, comment="收件人序号（拆分顺序）"),
+            sa.Column("email", sa.String(length=255), nullable=False, comment="收件人邮箱"),
+            sa.Column("variables", sa.JSON(), nullable=True, comment="收件人模板变量"),
+            sa.ForeignKeyConstraint(["campaign_id"], ["campaigns.id"], ondelete="CASCADE"),
+            sa.PrimaryKeyConstraint("id"),
+            comment="批量任务收件人暂存表",
+        )
+        op.create_index(
+            "ix_campaign_recipients_campaign_seq", "campaign_recipients", ["campaign_id", "seq"], unique=True
+        )
+
+    columns = {column["name"] for column in inspector.get_columns("message_records")}
+    if "campaign_id" not in columns:
+        op.add_column(
+            "message_records",
+            sa.Column("campaign_id", sa.Integer(), nullable=True, comment="所属批量任务ID")
+        )
+        op.create_index(op.f("ix_message_records_campaign_id"), "message_records", ["campaign_id"], unique=False)
+        op.create_foreign_key(
+            "message_records_campaign_id_fkey",
+            "message_records",
+            "campaigns",
+            ["campaign_id"],
+            ["id"],
+            ondelete="SET NULL",
+        )
+
+
+def downgrade() -> None:
+    op.drop_constraint("message_records_campaign_id_fkey", "message_records", type_="foreignkey")
+    op.drop_index(op.f("ix_message_records_campaign_id"), table_name="message_records")
+    op.drop_column("message_records", "campaign_id")
+    op.drop_index("ix_campaign_recipients_campaign_seq", table_name="campaign_recipients")
+    op.drop_table("campaign_recipients")
+    op.drop_index(op.f("ix_campaigns_api_key_id"), table_name="campaigns")
+    op.drop_index(op.f("ix_campaigns_status"), table_name="campaigns")
+    op.drop_index(op.f("ix_campaigns_id"), table_name="campaigns")
+    op.drop_table("campaigns")
+    CAMPAIGN_STATUS.drop(op.get_bind(), checkfirst=True)
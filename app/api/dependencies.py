@@ -1,16 +1,19 @@
 """
 API依赖项
 """
-from typing import Optional, Union
+from typing import Optional
 from fastapi import Depends, HTTPException, status, Header
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
+from app.core.context import get_request_id as current_request_id
 from app.core.security import decode_token
+from app.core.auth_cache import Principal, PRINCIPAL_API_KEY, PRINCIPAL_ADMIN, auth_cache, usage_recorder
 from app.models.api_key import APIKey
 from app.models.admin_user import AdminUser
 from app.core.logger import logger
+from app.core.query_profiler import expose_query_headers
 
 
 # HTTP Bearer Token安全方案
@@ -19,89 +22,128 @@ security = HTTPBearer()
 optional_security = HTTPBearer(auto_error=False)
 
 
-async def get_current_api_key(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> APIKey:
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def _authenticate(token: str, db: Session) -> Principal:
     """
-    获取当前API Key（通过JWT Token）
+    验证Token并返回调用方快照
+    
+    命中认证缓存时直接返回，未命中时解码JWT并查询数据库后写入缓存
     
     Args:
-        credentials: 认证凭证
+        token: JWT Token
         db: 数据库会话
         
     Returns:
-        APIKey: API Key对象
+        Principal: 调用方快照
         
     Raises:
         HTTPException: 认证失败
     """
-    token = credentials.credentials
+    cached = auth_cache.get(token)
+    if cached:
+        _, principal = cached
+        if principal.is_expired:
+            raise _unauthorized("API Key expired")
+        return principal
     
     # 解码Token
     payload = decode_token(token)
     if not payload:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _unauthorized("Invalid or expired token")
     
-    # 检查Token类型
-    if payload.get("type") != "access":
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token type",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+    token_type = payload.get("type")
     
-    # 获取API Key
-    api_key_str = payload.get("api_key")
-    if not api_key_str:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token payload",
-            headers={"WWW-Authenticate": "Bearer"},
+    # 根据token类型查询不同的调用方
+    if token_type == "admin":
+        user_id = payload.get("sub")
+        if not user_id:
+            raise _unauthorized("Invalid token payload")
+        
+        admin_user = (
+            db.query(AdminUser)
+            .filter(
+                AdminUser.id == int(user_id),
+                AdminUser.is_active == True
+            )
+            .first()
         )
+        
+        if not admin_user:
+            raise _unauthorized("Admin user not found or inactive")
+        
+        principal = Principal.from_admin_user(admin_user)
     
-    # 查询API Key
-    api_key = (
-        db.query(APIKey)
-        .filter(
-            APIKey.api_key == api_key_str,
-            APIKey.is_active == True,
-            APIKey.deleted_at == None
+    elif token_type == "access":
+        api_key_str = payload.get("api_key")
+        if not api_key_str:
+            raise _unauthorized("Invalid token payload")
+        
+        api_key = (
+            db.query(APIKey)
+            .filter(
+                APIKey.api_key == api_key_str,
+                APIKey.is_active == True,
+                APIKey.deleted_at == None
+            )
+            .first()
         )
-        .first()
-    )
+        
+        if not api_key:
+            raise _unauthorized("API Key not found or inactive")
+        
+        if api_key.is_expired:
+            raise _unauthorized("API Key expired")
+        
+        principal = Principal.from_api_key(api_key)
     
-    if not api_key:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="API Key not found or inactive",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+    else:
+        raise _unauthorized("Invalid token type")
     
-    # 检查是否过期
-    if api_key.is_expired:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="API Key expired",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+    auth_cache.set(token, payload, principal)
+    return principal
+
+
+async def get_current_api_key(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+) -> Principal:
+    """
+    获取当前API Key（通过JWT Token）
+    
+    Args:
+        credentials: 认证凭证
+        db: 数据库会话
+        
+    Returns:
+        Principal: API Key调用方快照
+        
+    Raises:
+        HTTPException: 认证失败
+    """
+    principal = _authenticate(credentials.credentials, db)
+    
+    # 检查Token类型
+    if principal.type != PRINCIPAL_API_KEY:
+        raise _unauthorized("Invalid token type")
     
-    # 更新使用统计
-    api_key.increment_usage()
-    db.commit()
+    # 更新使用统计（缓冲后批量写入）
+    usage_recorder.record(principal.id, db)
     
-    logger.debug(f"API Key authenticated: {api_key.name}")
-    return api_key
+    logger.debug(f"API Key authenticated: {principal.name}")
+    return principal
 
 
 async def get_current_admin_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
-) -> AdminUser:
+) -> Principal:
     """
     获取当前管理员用户（通过JWT Token）
     
@@ -110,64 +152,26 @@ async def get_current_admin_user(
         db: 数据库会话
         
     Returns:
-        AdminUser: 管理员用户对象
+        Principal: 管理员调用方快照
         
     Raises:
         HTTPException: 认证失败
     """
-    token = credentials.credentials
-    
-    # 解码Token
-    payload = decode_token(token)
-    if not payload:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+    principal = _authenticate(credentials.credentials, db)
     
     # 检查Token类型
-    if payload.get("type") != "admin":
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Admin token required",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    # 获取用户ID
-    user_id = payload.get("sub")
-    if not user_id:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token payload",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+    if principal.type != PRINCIPAL_ADMIN:
+        raise _unauthorized("Admin token required")
     
-    # 查询管理员用户
-    admin_user = (
-        db.query(AdminUser)
-        .filter(
-            AdminUser.id == int(user_id),
-            AdminUser.is_active == True
-        )
-        .first()
-    )
-    
-    if not admin_user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Admin user not found or inactive",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    logger.debug(f"Admin user authenticated: {admin_user.username}")
-    return admin_user
+    expose_query_headers()
+    logger.debug(f"Admin user authenticated: {principal.username}")
+    return principal
 
 
 async def get_current_user(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
     db: Session = Depends(get_db)
-) -> Union[AdminUser, APIKey]:
+) -> Principal:
     """
     获取当前用户（管理员或API Key）
     
@@ -178,104 +182,23 @@ async def get_current_user(
         db: 数据库会话
         
     Returns:
-        Union[AdminUser, APIKey]: 管理员用户或API Key对象
+        Principal: 调用方快照（通过is_admin区分管理员和API Key）
         
     Raises:
         HTTPException: 认证失败
     """
     if not credentials:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Authentication required",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    token = credentials.credentials
-    
-    # 解码Token
-    payload = decode_token(token)
-    if not payload:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    token_type = payload.get("type")
-    
-    # 根据token类型返回不同的用户对象
-    if token_type == "admin":
-        user_id = payload.get("sub")
-        if not user_id:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid token payload",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
-        admin_user = (
-            db.query(AdminUser)
-            .filter(
-                AdminUser.id == int(user_id),
-                AdminUser.is_active == True
-            )
-            .first()
-        )
-        
-        if not admin_user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Admin user not found or inactive",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
-        return admin_user
+        raise _unauthorized("Authentication required")
     
-    elif token_type == "access":
-        api_key_str = payload.get("api_key")
-        if not api_key_str:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid token payload",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
-        api_key = (
-            db.query(APIKey)
-            .filter(
-                APIKey.api_key == api_key_str,
-                APIKey.is_active == True,
-                APIKey.deleted_at == None
-            )
-            .first()
-        )
-        
-        if not api_key:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="API Key not found or inactive",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
-        if api_key.is_expired:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="API Key expired",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
-        # 更新使用统计
-        api_key.increment_usage()
-        db.commit()
-        
-        return api_key
+    principal = _authenticate(credentials.credentials, db)
     
+    if principal.type == PRINCIPAL_API_KEY:
+        # 更新使用统计（缓冲后批量写入）
+        usage_recorder.record(principal.id, db)
     else:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token type",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        expose_query_headers()
+    
+    return principal
 
 
 async def get_request_id(
@@ -284,13 +207,15 @@ async def get_request_id(
     """
     获取请求ID
     
+    优先使用中间件写入上下文的请求ID（与响应头X-Request-ID一致）
+    
     Args:
         x_request_id: 请求ID头
         
     Returns:
         Optional[str]: 请求ID
     """
-    return x_request_id
+    return current_request_id() or x_request_id
 
 
 __all__ = [
@@ -298,6 +223,7 @@ __all__ = [
     "get_current_admin_user", 
     "get_current_user",
     "get_request_id",
+    "Principal",
     "security",
     "optional_security"
 ]
@@ -1,7 +1,7 @@
 """API v1版本路由"""
 from fastapi import APIRouter
 
-from app.api.v1 import health, auth, messages, templates, monitoring
+from app.api.v1 import health, auth, messages, templates, monitoring, campaigns
 from app.api.v1.admin import admin_router
 
 
@@ -14,6 +14,7 @@ api_router.include_router(auth.router)
 api_router.include_router(messages.router)
 api_router.include_router(templates.router)
 api_router.include_router(monitoring.router)
+api_router.include_router(campaigns.router)
 api_router.include_router(admin_router)
 
 
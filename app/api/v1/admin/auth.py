@@ -6,7 +6,7 @@ from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
-from app.core.security import verify_password, create_access_token
+from app.core.security import verify_password_async, create_access_token
 from app.models.admin_user import AdminUser
 from app.schemas.admin_user import AdminLoginRequest, AdminLoginResponse, AdminUserInfo
 from app.schemas.common import ResponseModel
@@ -37,7 +37,7 @@ async def admin_login(
         raise HTTPException(status_code=401, detail="用户名或密码错误")
     
     # 验证密码
-    if not verify_password(login_data.password, admin_user.password_hash):
+    if not await verify_password_async(login_data.password, admin_user.password_hash):
         raise HTTPException(status_code=401, detail="用户名或密码错误")
     
     # 检查是否激活
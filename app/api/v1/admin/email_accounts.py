@@ -2,16 +2,13 @@
 邮箱账户管理API
 """
 import time
-from typing import List, Union
+from typing import Any, Dict, List
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-import aiosmtplib
 from email.mime.text import MIMEText
 
 from app.core.database import get_db
-from app.api.dependencies import get_current_api_key, get_current_user
-from app.models.api_key import APIKey
-from app.models.admin_user import AdminUser
+from app.api.dependencies import get_current_api_key, get_current_user, Principal
 from app.models.email import EmailAccount
 from app.schemas.common import ResponseModel
 from app.schemas.email_account import (
@@ -21,18 +18,48 @@ from app.schemas.email_account import (
     EmailAccountTestRequest,
     EmailAccountTestResponse,
 )
+from app.core.config import settings
 from app.core.logger import logger
 from app.core.security import encrypt_password, decrypt_password
+from app.services.account_health import AccountHealthTracker
+from app.services.account_quota import AccountQuota
+from app.services.circuit_breaker import AccountCircuitBreaker
+from app.services.credential_cache import smtp_credential_cache
+from app.tasks.dispatch import trigger_deferred_release
+from app.utils.redis_client import redis_client
 
 
 router = APIRouter(prefix="/email-accounts", tags=["Email Accounts"])
 
+circuit_breaker = AccountCircuitBreaker(redis_client)
+
+
+def _release_deferred() -> None:
+    """账户额度增加后释放暂存消息（投递失败不影响管理操作，定时任务会兜底）"""
+    if not settings.DEFERRED_QUEUE_ENABLED:
+        return
+    try:
+        trigger_deferred_release()
+    except Exception as e:
+        logger.error(f"Failed to trigger deferred message release: {e}")
+
+
+def _with_circuit(accounts: List[EmailAccount]) -> List[EmailAccountResponse]:
+    """构建账户响应并附带熔断状态（一次pipeline读取）"""
+    states = circuit_breaker.states([account.id for account in accounts]) if circuit_breaker.enabled else {}
+    responses = []
+    for account in accounts:
+        response = EmailAccountResponse.model_validate(account)
+        response.circuit = states.get(account.id)
+        responses.append(response)
+    return responses
+
 
 @router.get("", response_model=ResponseModel[List[EmailAccountResponse]])
 async def list_email_accounts(
     is_active: bool = None,
     db: Session = Depends(get_db),
-    current_user: Union[AdminUser, APIKey] = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     获取邮箱账户列表
@@ -49,7 +76,44 @@ async def list_email_accounts(
     return ResponseModel(
         code=0,
         message="Success",
-        data=[EmailAccountResponse.model_validate(acc) for acc in accounts]
+        data=_with_circuit(accounts)
+    )
+
+
+@router.get("/routing", response_model=ResponseModel[Dict[str, Any]])
+async def get_account_routing(
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """
+    账户路由权重
+    
+    返回启用账户的EWMA延迟、错误率、评分、熔断状态、滚动配额使用情况
+    及在所属优先级档内的流量占比（weighted策略下的选中概率）
+    """
+    accounts = (
+        db.query(EmailAccount)
+        .filter(EmailAccount.is_active == True)
+        .order_by(EmailAccount.priority.desc(), EmailAccount.id)
+        .all()
+    )
+    states = circuit_breaker.states([account.id for account in accounts]) if circuit_breaker.enabled else {}
+    quota = AccountQuota(redis_client)
+    usage = quota.usage(accounts) if quota.enabled else {}
+    
+    return ResponseModel(
+        code=0,
+        message="Success",
+        data={
+            "policy": settings.ACCOUNT_ROUTING_POLICY,
+            "ewma_alpha": settings.ACCOUNT_HEALTH_EWMA_ALPHA,
+            "error_penalty": settings.ACCOUNT_HEALTH_ERROR_PENALTY,
+            "quota_window_seconds": settings.QUOTA_WINDOW_SECONDS if quota.enabled else None,
+            "accounts": [
+                {**weights, "circuit": states.get(weights["account_id"]), "quota": usage.get(weights["account_id"])}
+                for weights in AccountHealthTracker(redis_client).weights(accounts)
+            ]
+        }
     )
 
 
@@ -57,7 +121,7 @@ async def list_email_accounts(
 async def get_email_account(
     account_id: int,
     db: Session = Depends(get_db),
-    current_user: Union[AdminUser, APIKey] = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """获取邮箱账户详情"""
     account = db.query(EmailAccount).filter(
@@ -73,7 +137,7 @@ async def get_email_account(
     return ResponseModel(
         code=0,
         message="Success",
-        data=EmailAccountResponse.model_validate(account)
+        data=_with_circuit([account])[0]
     )
 
 
@@ -81,7 +145,7 @@ async def get_email_account(
 async def create_email_account(
     request: EmailAccountCreate,
     db: Session = Depends(get_db),
-    current_user: Union[AdminUser, APIKey] = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     创建邮箱账户
@@ -121,7 +185,9 @@ async def create_email_account(
     db.commit()
     db.refresh(account)
     
-    logger.info(f"Email account created: {account.email} by {api_key.name}")
+    logger.info(f"Email account created: {account.email} by {current_user.name}")
+    if account.is_active:
+        _release_deferred()
     
     return ResponseModel(
         code=0,
@@ -135,7 +201,7 @@ async def update_email_account(
     account_id: int,
     request: EmailAccountUpdate,
     db: Session = Depends(get_db),
-    current_user: Union[AdminUser, APIKey] = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     更新邮箱账户
@@ -164,8 +230,11 @@ async def update_email_account(
     
     db.commit()
     db.refresh(account)
+    smtp_credential_cache.invalidate(account.id)
     
-    logger.info(f"Email account updated: {account.email} by {api_key.name}")
+    logger.info(f"Email account updated: {account.email} by {current_user.name}")
+    if account.is_active:
+        _release_deferred()
     
     return ResponseModel(
         code=0,
@@ -178,7 +247,7 @@ async def update_email_account(
 async def delete_email_account(
     account_id: int,
     db: Session = Depends(get_db),
-    current_user: Union[AdminUser, APIKey] = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     删除邮箱账户
@@ -197,8 +266,9 @@ async def delete_email_account(
     
     db.delete(account)
     db.commit()
+    smtp_credential_cache.invalidate(account_id)
     
-    logger.info(f"Email account deleted: {account.email} by {api_key.name}")
+    logger.info(f"Email account deleted: {account.email} by {current_user.name}")
     
     return ResponseModel(
         code=0,
@@ -207,18 +277,57 @@ async def delete_email_account(
     )
 
 
+@router.post("/{account_id}/circuit/reset", response_model=ResponseModel[EmailAccountResponse])
+async def reset_account_circuit(
+    account_id: int,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """
+    手动恢复熔断
+    
+    熔断状态恢复为closed，清空失败率窗口和连续失败计数
+    """
+    account = db.query(EmailAccount).filter(
+        EmailAccount.id == account_id
+    ).first()
+    
+    if not account:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Email account not found"
+        )
+    
+    circuit_breaker.reset(account.id)
+    if account.failure_count > 0:
+        account.reset_failure_count()
+        db.commit()
+    
+    logger.info(f"Email account circuit reset: {account.email} by {current_user.name}")
+    _release_deferred()
+    
+    return ResponseModel(
+        code=0,
+        message="Circuit reset successfully",
+        data=_with_circuit([account])[0]
+    )
+
+
 @router.post("/{account_id}/test", response_model=ResponseModel[EmailAccountTestResponse])
 async def test_email_account(
     account_id: int,
     request: EmailAccountTestRequest,
     db: Session = Depends(get_db),
-    current_user: Union[AdminUser, APIKey] = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     测试邮箱连接
     
     测试SMTP连接是否正常，并可选发送测试邮件
     """
+    # SMTP客户端只在测试连接时使用，不在API启动时加载
+    import aiosmtplib
+    
     account = db.query(EmailAccount).filter(
         EmailAccount.id == account_id
     ).first()
@@ -285,10 +394,12 @@ async def test_email_account(
         
         duration_ms = (time.time() - start_time) * 1000
         
-        # 重置失败计数
+        # 重置失败计数和熔断状态
         if account.failure_count > 0:
             account.reset_failure_count()
             db.commit()
+        if circuit_breaker.enabled:
+            circuit_breaker.reset(account.id)
         
         logger.info(f"Email account test successful: {account.email}")
         
@@ -5,7 +5,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
-from app.core.security import verify_password, create_access_token
+from app.core.security import verify_password_async, create_access_token
 from app.core.config import settings
 from app.models.api_key import APIKey
 from app.schemas import TokenRequest, TokenResponse, ResponseModel
@@ -52,7 +52,7 @@ async def get_token(
         )
     
     # 验证API Secret
-    if not verify_password(request.api_secret, api_key.api_secret_hash):
+    if not await verify_password_async(request.api_secret, api_key.api_secret_hash):
         logger.warning(f"Invalid API Secret for key: {request.api_key}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
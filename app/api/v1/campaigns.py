@@ -0,0 +1,371 @@
+"""
+批量发送任务API
+"""
+from typing import AsyncIterator, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy.orm import Session
+
+from app.core.database import get_db
+from app.api.dependencies import get_current_api_key, get_current_user, Principal
+from app.models.campaign import Campaign
+from app.schemas import (
+    CampaignCreate,
+    CampaignRecipientUploadResponse,
+    CampaignResponse,
+    ResponseModel,
+    PagedResponse,
+)
+from app.services.campaign_service import CampaignService, CampaignError, RecipientParser
+from app.tasks.dispatch import start_campaign_fanout
+from app.core.config import settings
+from app.core.logger import logger
+from app.utils.redis_client import redis_client
+
+
+router = APIRouter(prefix="/campaigns", tags=["Campaigns"])
+
+# 上传响应中最多返回的跳过原因条数
+MAX_REPORTED_ERRORS = 20
+# multipart上传时每次读取的字节数
+UPLOAD_READ_SIZE = 65536
+
+
+def _get_owned_campaign(service: CampaignService, campaign_id: int, current_user: Principal) -> Campaign:
+    """获取任务并检查权限（API Key只能操作自己创建的任务）"""
+    campaign = service.get_campaign(campaign_id)
+    if not campaign:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Campaign not found"
+        )
+    if not current_user.is_admin and campaign.api_key_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You don't have permission to access this campaign"
+        )
+    return campaign
+
+
+def _conflict(error: CampaignError) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(error))
+
+
+def _recipient_format(content_type: str, filename: Optional[str] = None) -> Optional[str]:
+    """根据Content-Type或文件扩展名判断收件人格式"""
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    filename = (filename or "").lower()
+    if content_type in ("application/x-ndjson", "application/jsonl") or filename.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    if content_type in ("text/csv", "application/csv") or filename.endswith(".csv"):
+        return "csv"
+    return None
+
+
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """把字节流切分为文本行（不把整个上传读入内存）"""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8", errors="replace")
+    if buffer:
+        yield buffer.decode("utf-8", errors="replace")
+
+
+async def _read_upload(upload) -> AsyncIterator[bytes]:
+    """分块读取multipart上传的文件"""
+    while True:
+        chunk = await upload.read(UPLOAD_READ_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+
+def _start(service: CampaignService, campaign_id: int) -> Campaign:
+    """开始任务并启动拆分任务链"""
+    try:
+        campaign = service.start(campaign_id)
+    except CampaignError as e:
+        raise _conflict(e)
+    start_campaign_fanout(campaign.id, campaign.run_token)
+    return campaign
+
+
+@router.post("", response_model=ResponseModel[CampaignResponse], status_code=status.HTTP_201_CREATED)
+async def create_campaign(
+    request: CampaignCreate,
+    db: Session = Depends(get_db),
+    api_key: Principal = Depends(get_current_api_key)
+):
+    """
+    创建批量任务
+
+    任务创建后为草稿状态，通过 /campaigns/{id}/recipients 上传收件人后调用 /start 开始；
+    少量收件人可直接放在recipients中并设置start=true
+    """
+    service = CampaignService(db, redis_client)
+    try:
+        campaign = service.create_campaign(
+            name=request.name,
+            template_code=request.template_code,
+            variables=request.variables,
+            rate_limit=request.rate_limit,
+            api_key_id=api_key.id
+        )
+        if request.recipients:
+            campaign = service.add_recipients(
+                campaign.id,
+                [(item.email, item.variables) for item in request.recipients]
+            )
+    except CampaignError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    if request.start:
+        campaign = _start(service, campaign.id)
+
+    logger.info(f"Campaign {campaign.id} created by API key {api_key.name}")
+
+    return ResponseModel(
+        code=0,
+        message="Campaign created",
+        data=CampaignResponse(**service.summary(campaign))
+    )
+
+
+@router.post("/{campaign_id}/recipients", response_model=ResponseModel[CampaignRecipientUploadResponse])
+async def upload_recipients(
+    campaign_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """
+    上传收件人（仅草稿状态，可多次调用追加）
+
+    支持三种方式，均按行流式解析、每CAMPAIGN_CHUNK_SIZE行批量写入一次：
+    1. Content-Type: text/csv，请求体为CSV（首行表头须含email列，其余列作为模板变量）
+    2. Content-Type: application/x-ndjson，每行一个 {"email": ..., "variables": {...}}
+    3. multipart/form-data 上传文件（字段名file），按扩展名 .csv/.ndjson/.jsonl 判断格式
+    """
+    service = CampaignService(db, redis_client)
+    campaign = _get_owned_campaign(service, campaign_id, current_user)
+
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or not hasattr(upload, "read"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Missing file field"
+            )
+        fmt = _recipient_format(upload.content_type, upload.filename)
+        chunks = _read_upload(upload)
+    else:
+        fmt = _recipient_format(content_type)
+        chunks = request.stream()
+
+    if fmt is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Recipients must be uploaded as text/csv or application/x-ndjson"
+        )
+
+    parser = RecipientParser(fmt)
+    batch = []
+    accepted = rejected = 0
+    errors: List[str] = []
+    line_no = 0
+
+    try:
+        async for line in _iter_lines(chunks):
+            line_no += 1
+            try:
+                recipient = parser.parse(line)
+            except CampaignError:
+                raise
+            except ValueError as e:
+                rejected += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append(f"line {line_no}: {e}")
+                continue
+            if recipient is None:
+                continue
+
+            batch.append(recipient)
+            if len(batch) >= settings.CAMPAIGN_CHUNK_SIZE:
+                campaign = service.add_recipients(campaign.id, batch)
+                accepted += len(batch)
+                batch = []
+
+        if batch:
+            campaign = service.add_recipients(campaign.id, batch)
+            accepted += len(batch)
+    except CampaignError as e:
+        # 已写入的批次保留，返回已接受的数量便于调用方续传
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"{e} (accepted {accepted} recipients before the error)"
+        )
+
+    logger.info(f"Campaign {campaign.id} received {accepted} recipients ({rejected} rejected)")
+
+    return ResponseModel(
+        code=0,
+        message="Recipients uploaded",
+        data=CampaignRecipientUploadResponse(
+            accepted=accepted,
+            rejected=rejected,
+            total=campaign.total_count,
+            errors=errors
+        )
+    )
+
+
+@router.post("/{campaign_id}/start", response_model=ResponseModel[CampaignResponse])
+async def start_campaign(
+    campaign_id: int,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """开始任务：按速率上限分批生成消息并投递"""
+    service = CampaignService(db, redis_client)
+    _get_owned_campaign(service, campaign_id, current_user)
+    campaign = _start(service, campaign_id)
+
+    logger.info(f"Campaign {campaign_id} started by {current_user.name}")
+
+    return ResponseModel(
+        code=0,
+        message="Campaign started",
+        data=CampaignResponse(**service.summary(campaign))
+    )
+
+
+@router.post("/{campaign_id}/pause", response_model=ResponseModel[CampaignResponse])
+async def pause_campaign(
+    campaign_id: int,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """暂停任务：停止生成新消息，已投递的消息继续发送"""
+    service = CampaignService(db, redis_client)
+    _get_owned_campaign(service, campaign_id, current_user)
+    try:
+        campaign = service.pause(campaign_id)
+    except CampaignError as e:
+        raise _conflict(e)
+
+    logger.info(f"Campaign {campaign_id} paused by {current_user.name}")
+
+    return ResponseModel(
+        code=0,
+        message="Campaign paused",
+        data=CampaignResponse(**service.summary(campaign))
+    )
+
+
+@router.post("/{campaign_id}/resume", response_model=ResponseModel[CampaignResponse])
+async def resume_campaign(
+    campaign_id: int,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """恢复已暂停的任务"""
+    service = CampaignService(db, redis_client)
+    _get_owned_campaign(service, campaign_id, current_user)
+    try:
+        campaign = service.resume(campaign_id)
+    except CampaignError as e:
+        raise _conflict(e)
+    start_campaign_fanout(campaign.id, campaign.run_token)
+
+    logger.info(f"Campaign {campaign_id} resumed by {current_user.name}")
+
+    return ResponseModel(
+        code=0,
+        message="Campaign resumed",
+        data=CampaignResponse(**service.summary(campaign))
+    )
+
+
+@router.post("/{campaign_id}/cancel", response_model=ResponseModel[CampaignResponse])
+async def cancel_campaign(
+    campaign_id: int,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """取消任务：停止生成新消息，发送队列中尚未发送的消息标记为已取消"""
+    service = CampaignService(db, redis_client)
+    _get_owned_campaign(service, campaign_id, current_user)
+    try:
+        campaign = service.cancel(campaign_id)
+    except CampaignError as e:
+        raise _conflict(e)
+
+    logger.info(f"Campaign {campaign_id} cancelled by {current_user.name}")
+
+    return ResponseModel(
+        code=0,
+        message="Campaign cancelled",
+        data=CampaignResponse(**service.summary(campaign))
+    )
+
+
+@router.get("/{campaign_id}", response_model=ResponseModel[CampaignResponse])
+async def get_campaign(
+    campaign_id: int,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """
+    获取任务状态和汇总结果
+
+    计数来自任务表和Redis实时计数，不扫描子消息
+    """
+    service = CampaignService(db, redis_client)
+    campaign = _get_owned_campaign(service, campaign_id, current_user)
+
+    return ResponseModel(
+        code=0,
+        message="Success",
+        data=CampaignResponse(**service.summary(campaign))
+    )
+
+
+@router.get("", response_model=ResponseModel[PagedResponse[CampaignResponse]])
+async def list_campaigns(
+    page: int = Query(1, ge=1, description="页码"),
+    page_size: int = Query(20, ge=1, le=100, description="每页数量"),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """查询任务列表（API Key只返回自己创建的任务）"""
+    service = CampaignService(db, redis_client)
+
+    query = db.query(Campaign)
+    if not current_user.is_admin:
+        query = query.filter(Campaign.api_key_id == current_user.id)
+    total = query.count()
+    campaigns = query.order_by(Campaign.id.desc()).offset((page - 1) * page_size).limit(page_size).all()
+
+    # 一次pipeline读取本页所有任务的实时计数
+    counts = service.counts(campaigns)
+
+    return ResponseModel(
+        code=0,
+        message="Success",
+        data={
+            "items": [CampaignResponse(**service.summary(campaign, counts[campaign.id])) for campaign in campaigns],
+            "pagination": {
+                "page": page,
+                "page_size": page_size,
+                "total": total,
+                "total_pages": (total + page_size - 1) // page_size
+            }
+        }
+    )
+
+
+__all__ = ["router"]
@@ -1,14 +1,17 @@
 """
 消息API
 """
-from typing import Union
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+import json
+import time
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
-from app.api.dependencies import get_current_api_key, get_current_user, get_request_id
-from app.models.api_key import APIKey
-from app.models.admin_user import AdminUser
+from app.api.dependencies import get_current_api_key, get_current_user, get_request_id, Principal
 from app.models.message import MessageChannel, MessageStatus
 from app.schemas import (
     EmailSendRequest,
@@ -16,14 +19,20 @@ from app.schemas import (
     MessageQuery,
     MessageResponse,
     BatchQueryRequest,
+    MessageStatusQueryRequest,
+    MessageStatusResponse,
     ResponseModel,
     PagedResponse,
-    PaginationModel,
 )
 from app.services.message_service import MessageService
+from app.services.deferred_queue import DeferredMessageQueue, DEFERRED_ERROR_CODE
+from app.services.scheduler import ScheduledMessageQueue
 from app.services.template_service import TemplateService
-from app.tasks.email_tasks import send_email_task
+from app.services.status_events import status_event_hub
+from app.tasks.dispatch import enqueue_email
 from app.core.logger import logger
+from app.core.config import settings
+from app.core.tracing import tracer
 from app.utils.redis_client import redis_client
 
 
@@ -34,7 +43,7 @@ router = APIRouter(prefix="/messages", tags=["Messages"])
 async def send_email(
     request: EmailSendRequest,
     db: Session = Depends(get_db),
-    api_key: APIKey = Depends(get_current_api_key),
+    api_key: Principal = Depends(get_current_api_key),
     request_id: str = Depends(get_request_id)
 ):
     """
@@ -43,6 +52,8 @@ async def send_email(
     支持两种模式：
     1. 直接指定内容：提供 subject + content
     2. 使用模板：提供 template_code + template_variables
+    
+    指定send_at（未来时间）时消息进入定时发送队列，到期后由调度任务投递
     """
     message_service = MessageService(db, redis_client)
     
@@ -50,10 +61,13 @@ async def send_email(
     if request.template_code:
         # 模板模式
         template_service = TemplateService(db)
-        success, subject, content, error, version = template_service.render_message_template(
-            request.template_code,
-            request.template_variables or {}
-        )
+        render_start = time.perf_counter()
+        with tracer.span("template.render", attributes={"template_code": request.template_code}):
+            success, subject, content, error, version = template_service.render_message_template(
+                request.template_code,
+                request.template_variables or {}
+            )
+        render_ms = round((time.perf_counter() - render_start) * 1000)
         
         if not success:
             raise HTTPException(
@@ -74,15 +88,17 @@ async def send_email(
         content = request.content
         template_id = None
         template_version = None
+        render_ms = None
     
     # 去重检查
     if request.idempotency_key or content:
-        duplicate = message_service.check_duplicate(
-            idempotency_key=request.idempotency_key,
-            channel=MessageChannel.EMAIL,
-            to=",".join(request.to),
-            content=content
-        )
+        with tracer.span("message.dedup"):
+            duplicate = message_service.check_duplicate(
+                idempotency_key=request.idempotency_key,
+                channel=MessageChannel.EMAIL,
+                to=",".join(request.to),
+                content=content
+            )
         
         if duplicate:
             logger.warning(f"Duplicate message detected: {duplicate.id}")
@@ -97,31 +113,44 @@ async def send_email(
                 request_id=request_id
             )
     
+    # 计划时间已过去或未指定时立即发送
+    send_at = request.send_at if request.send_at and request.send_at > datetime.now() else None
+    
     # 创建消息记录
-    message = message_service.create_message(
-        channel=MessageChannel.EMAIL,
-        to=",".join(request.to),
-        cc=",".join(request.cc) if request.cc else None,
-        bcc=",".join(request.bcc) if request.bcc else None,
-        subject=subject,
-        content=content,
-        content_type="html",
-        template_id=template_id,
-        template_version=template_version,
-        template_variables=request.template_variables,
-        idempotency_key=request.idempotency_key,
-        request_id=request_id,
-        extra_data=request.extra_data
-    )
+    with tracer.span("message.insert") as span:
+        message = message_service.create_message(
+            channel=MessageChannel.EMAIL,
+            to=",".join(request.to),
+            cc=",".join(request.cc) if request.cc else None,
+            bcc=",".join(request.bcc) if request.bcc else None,
+            subject=subject,
+            content=content,
+            content_type="html",
+            template_id=template_id,
+            template_version=template_version,
+            template_variables=request.template_variables,
+            idempotency_key=request.idempotency_key,
+            request_id=request_id,
+            extra_data=request.extra_data,
+            api_key_id=api_key.id,
+            render_ms=render_ms,
+            send_at=send_at
+        )
+        if span is not None:
+            span.set_attribute("message_id", message.id)
     
-    # 异步发送（通过Celery）
-    send_email_task.delay(message.id)
+    if send_at:
+        # 定时发送：写入Redis有序集合，不占用Celery队列和Worker内存
+        ScheduledMessageQueue(redis_client).add(message.id, send_at)
+    else:
+        # 异步发送（通过Celery）
+        enqueue_email(message.id)
     
-    logger.info(f"Email message created: {message.id}")
+    logger.debug(f"Email message created: {message.id}")
     
     return ResponseModel(
         code=0,
-        message="Message queued for sending",
+        message="Message scheduled" if send_at else "Message queued for sending",
         data=EmailSendResponse(
             message_id=message.id,
             status=message.status.value,
@@ -142,7 +171,7 @@ async def list_messages(
     page: int = 1,
     page_size: int = 20,
     db: Session = Depends(get_db),
-    current_user: Union[AdminUser, APIKey] = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """查询消息列表（支持管理员和API Key）"""
     message_service = MessageService(db)
@@ -152,7 +181,7 @@ async def list_messages(
     status_enum = MessageStatus(status) if status else None
     
     # 如果是API Key用户，只返回该API Key的消息；管理员可以看所有消息
-    api_key_id = None if isinstance(current_user, AdminUser) else current_user.id
+    api_key_id = None if current_user.is_admin else current_user.id
     
     # 限制导出数量
     if page_size > 10000:
@@ -173,18 +202,93 @@ async def list_messages(
     
     total_pages = (total + page_size - 1) // page_size
     
-    return ResponseModel(
-        code=0,
-        message="Success",
-        data=PagedResponse(
-            items=[MessageResponse.model_validate(msg) for msg in messages],
-            pagination=PaginationModel(
-                page=page,
-                page_size=page_size,
-                total=total,
-                total_pages=total_pages
-            )
-        )
+    # 行已是与MessageResponse一致的字典，直接用orjson输出，跳过逐行模型校验
+    return ORJSONResponse({
+        "code": 0,
+        "message": "Success",
+        "data": {
+            "items": messages,
+            "pagination": {
+                "page": page,
+                "page_size": page_size,
+                "total": total,
+                "total_pages": total_pages
+            }
+        },
+        "request_id": None
+    })
+
+
+def _format_sse(event_id: str, data: dict) -> str:
+    """格式化SSE事件"""
+    return f"id: {event_id}\nevent: status\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _stream_id_key(event_id: str) -> tuple[int, int]:
+    """Redis Stream ID排序键"""
+    ms, _, seq = event_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+@router.get("/events")
+async def stream_message_events(
+    request: Request,
+    db: Session = Depends(get_db),
+    api_key: Principal = Depends(get_current_api_key),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """
+    消息状态事件流（Server-Sent Events）
+    
+    推送当前API Key所属消息的状态变化，断线重连时通过Last-Event-ID补发遗漏事件
+    """
+    api_key_id = api_key.id
+    # 鉴权完成后立即释放数据库会话，长连接不占用连接池
+    db.close()
+    
+    async def event_stream():
+        queue = status_event_hub.subscribe(api_key_id)
+        try:
+            # 先订阅再补发，补发期间到达的事件在队列中按ID去重
+            last_sent = None
+            if last_event_id:
+                for event_id, data in await status_event_hub.replay(api_key_id, last_event_id):
+                    last_sent = event_id
+                    yield _format_sse(event_id, data)
+            
+            yield f"retry: {settings.MESSAGE_EVENTS_RETRY_MS}\n\n"
+            
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        queue.get(),
+                        timeout=settings.MESSAGE_EVENTS_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                
+                if event is None:
+                    # 订阅者过慢导致队列溢出，断开后由客户端携带Last-Event-ID续传
+                    break
+                
+                event_id, data = event
+                if last_sent and _stream_id_key(event_id) <= _stream_id_key(last_sent):
+                    continue
+                last_sent = event_id
+                yield _format_sse(event_id, data)
+        finally:
+            status_event_hub.unsubscribe(api_key_id, queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        }
     )
 
 
@@ -192,7 +296,7 @@ async def list_messages(
 async def get_message(
     message_id: int,
     db: Session = Depends(get_db),
-    current_user: Union[AdminUser, APIKey] = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """获取消息详情（支持管理员和API Key）"""
     message_service = MessageService(db)
@@ -205,7 +309,7 @@ async def get_message(
         )
     
     # 如果是API Key用户，检查权限
-    if isinstance(current_user, APIKey) and message.api_key_id != current_user.id:
+    if not current_user.is_admin and message.api_key_id != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You don't have permission to access this message"
@@ -222,16 +326,14 @@ async def get_message(
 async def batch_query_messages(
     request: BatchQueryRequest,
     db: Session = Depends(get_db),
-    api_key: APIKey = Depends(get_current_api_key)
+    api_key: Principal = Depends(get_current_api_key)
 ):
-    """批量查询消息状态"""
+    """批量查询消息详情（只返回当前API Key的消息）"""
     message_service = MessageService(db)
     
-    messages = []
-    for message_id in request.message_ids:
-        message = message_service.get_message(message_id)
-        if message:
-            messages.append(MessageResponse.model_validate(message))
+    records = message_service.get_messages(request.message_ids, api_key_id=api_key.id)
+    message_service.prefetch_contents(records)
+    messages = [MessageResponse.model_validate(msg) for msg in records]
     
     return ResponseModel(
         code=0,
@@ -240,21 +342,42 @@ async def batch_query_messages(
     )
 
 
+@router.post("/status/batch", response_model=ResponseModel[list[MessageStatusResponse]])
+async def batch_query_status(
+    request: MessageStatusQueryRequest,
+    db: Session = Depends(get_db),
+    api_key: Principal = Depends(get_current_api_key)
+):
+    """
+    批量查询消息状态（只返回当前API Key的消息）
+    
+    优先从Redis状态缓存读取（一次MGET），未命中的部分通过一次IN查询补齐
+    """
+    message_service = MessageService(db, redis_client)
+    statuses = message_service.get_status_many(request.message_ids, api_key_id=api_key.id)
+    
+    return ResponseModel(
+        code=0,
+        message="Success",
+        data=[MessageStatusResponse(**record) for record in statuses]
+    )
+
+
 @router.post("/{message_id}/retry", response_model=ResponseModel[None])
 async def retry_message(
     message_id: int,
     db: Session = Depends(get_db),
-    current_user: Union[AdminUser, APIKey] = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """重试失败的消息（仅管理员）"""
     # 只有管理员可以重试
-    if not isinstance(current_user, AdminUser):
+    if not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="仅管理员可以重试消息"
         )
     
-    message_service = MessageService(db)
+    message_service = MessageService(db, redis_client)
     message = message_service.get_message(message_id)
     
     if not message:
@@ -270,19 +393,11 @@ async def retry_message(
             detail=f"只能重试失败的消息，当前状态：{message.status.value}"
         )
     
-    # 检查重试次数（如果已达上限，重置计数器）
-    if message.retry_count >= message.max_retry:
-        logger.warning(f"消息 {message_id} 已达最大重试次数，重置计数器")
-        message.retry_count = 0  # 重置重试次数
-    
     # 重置消息状态为待发送
-    message.status = MessageStatus.PENDING
-    message.error_code = None
-    message.error_message = None
-    db.commit()
+    message_service.reset_for_retry(message)
     
     # 重新加入发送队列
-    send_email_task.delay(message.id)
+    enqueue_email(message.id)
     
     logger.info(f"消息 {message_id} 由管理员 {current_user.username} 请求重试")
     
@@ -297,11 +412,11 @@ async def retry_message(
 async def delete_message(
     message_id: int,
     db: Session = Depends(get_db),
-    current_user: Union[AdminUser, APIKey] = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """删除消息（仅管理员）"""
     # 只有管理员可以删除
-    if not isinstance(current_user, AdminUser):
+    if not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="仅管理员可以删除消息"
@@ -316,9 +431,12 @@ async def delete_message(
             detail="消息不存在"
         )
     
-    # 删除消息（硬删除）
-    db.delete(message)
-    db.commit()
+    # 删除消息（硬删除，同时释放内容引用）
+    if message.send_at and message.queued_at is None:
+        ScheduledMessageQueue(redis_client).remove(message_id)
+    elif message.error_code == DEFERRED_ERROR_CODE:
+        DeferredMessageQueue(redis_client).remove(message_id)
+    message_service.delete_message(message)
     
     logger.info(f"消息 {message_id} 由管理员 {current_user.username} 删除")
     
@@ -4,13 +4,19 @@
 from datetime import datetime, timedelta
 from typing import Dict, Any
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from sqlalchemy import select, func, and_, Integer
+from sqlalchemy.dialects.postgresql import array
 
+from app.core.config import settings
 from app.core.database import get_db
+from app.core.query_profiler import query_registry
+from app.api.dependencies import get_current_admin_user, Principal
 from app.models.message import MessageRecord, MessageStatus, MessageChannel
 from app.models.email import EmailAccount
+from app.services.deferred_queue import DeferredMessageQueue
+from app.services.scheduler import ScheduledMessageQueue
 from app.utils.redis_client import redis_client
 from app.schemas.common import ResponseModel
 
@@ -115,6 +121,7 @@ async def get_system_metrics(
         queue_length = 0  # 默认值，实际需要通过Celery API获取
     except Exception:
         queue_length = 0
+    deferred = DeferredMessageQueue(redis_client).size()
     
     # 4. 失败原因统计（top 5）
     error_result = db.execute(
@@ -189,7 +196,9 @@ async def get_system_metrics(
                     "usage_rate": round((email_stats.daily_sent / email_stats.daily_limit * 100) if email_stats.daily_limit else 0, 2)
                 },
                 "queue": {
-                    "pending_tasks": queue_length
+                    "pending_tasks": queue_length,
+                    "deferred": deferred["deferred"],
+                    "deferred_oldest_seconds": deferred["oldest_seconds"]
                 },
                 "top_errors": error_stats
             }
@@ -264,6 +273,24 @@ async def detailed_health_check(db: Session = Depends(get_db)) -> Dict[str, Any]
             "message": f"Check failed: {str(e)}"
         }
     
+    # 4. 定时发送队列检查（到期未认领的积压说明调度任务未运行或处理不过来）
+    queue_size = ScheduledMessageQueue(redis_client).size()
+    due = queue_size["due"] or 0
+    health_status["components"]["scheduler"] = {
+        "status": "warning" if due > settings.SCHEDULE_DISPATCH_MAX_PER_RUN else "healthy",
+        "message": f"{queue_size['scheduled']} scheduled, {due} due, {queue_size['inflight']} in flight",
+        **queue_size
+    }
+    
+    # 5. 延迟发送队列检查（有暂存消息说明所有发件账户额度已用尽）
+    deferred = DeferredMessageQueue(redis_client).size()
+    backlog = deferred["deferred"] or 0
+    health_status["components"]["deferred"] = {
+        "status": "warning" if backlog else "healthy",
+        "message": f"{backlog} message(s) waiting for sending account capacity",
+        **deferred
+    }
+    
     return health_status
 
 
@@ -318,3 +345,122 @@ async def get_hourly_stats(
     }
 
 
+# 延迟分位数统计的耗时列（毫秒）
+LATENCY_METRICS = {
+    "delivery": MessageRecord.delivery_ms,
+    "queue_wait": MessageRecord.queue_wait_ms,
+    "render": MessageRecord.render_ms,
+    "smtp_connect": MessageRecord.smtp_connect_ms,
+    "smtp_transmit": MessageRecord.smtp_transmit_ms,
+}
+LATENCY_PERCENTILES = (0.5, 0.95, 0.99)
+LATENCY_BUCKETS = ("minute", "hour", "day")
+
+
+@router.get("/latency", response_model=ResponseModel[Dict[str, Any]], summary="投递延迟分位数")
+async def get_latency_percentiles(
+    hours: int = 24,
+    group_by: str = "account",
+    bucket: str = "hour",
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_admin_user)
+):
+    """
+    按账户/模板/时间段统计成功消息的投递延迟分位数（仅管理员）
+    
+    只扫描sent_at时间范围内的成功消息（走sent_at索引），每组一次percentile_cont聚合
+    
+    Args:
+        hours: 统计时间范围（小时，按发送时间）
+        group_by: 分组维度（account/template/bucket）
+        bucket: 时间段粒度（minute/hour/day，group_by=bucket时生效）
+        limit: 最多返回的分组数（按消息数降序）
+        
+    Returns:
+        每组的消息数及各阶段耗时的p50/p95/p99（毫秒）
+    """
+    if group_by == "account":
+        group_key = MessageRecord.sender
+    elif group_by == "template":
+        group_key = MessageRecord.template_id
+    elif group_by == "bucket" and bucket in LATENCY_BUCKETS:
+        group_key = func.date_trunc(bucket, MessageRecord.sent_at)
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"group_by must be account/template/bucket, bucket must be one of {'/'.join(LATENCY_BUCKETS)}"
+        )
+    
+    since = datetime.now() - timedelta(hours=hours)
+    percentiles = array(LATENCY_PERCENTILES)
+    columns = [group_key.label("group"), func.count(MessageRecord.id).label("count")]
+    columns += [
+        func.percentile_cont(percentiles).within_group(column).label(name)
+        for name, column in LATENCY_METRICS.items()
+    ]
+    
+    query = (
+        select(*columns)
+        .where(
+            MessageRecord.sent_at >= since,
+            MessageRecord.status == MessageStatus.SUCCESS
+        )
+        .group_by(group_key)
+    )
+    if group_by == "bucket":
+        query = query.order_by(group_key)
+    else:
+        query = query.order_by(func.count(MessageRecord.id).desc()).limit(limit)
+    
+    groups = []
+    for row in db.execute(query):
+        item = {
+            group_by: row.group.isoformat() if group_by == "bucket" else row.group,
+            "count": row.count,
+        }
+        for name in LATENCY_METRICS:
+            values = getattr(row, name) or [None] * len(LATENCY_PERCENTILES)
+            item[name] = {
+                f"p{int(p * 100)}": round(value, 1) if value is not None else None
+                for p, value in zip(LATENCY_PERCENTILES, values)
+            }
+        groups.append(item)
+    
+    return ResponseModel(
+        code=0,
+        message="success",
+        data={
+            "time_range_hours": hours,
+            "group_by": group_by,
+            "bucket": bucket if group_by == "bucket" else None,
+            "unit": "ms",
+            "groups": groups
+        }
+    )
+
+
+@router.get("/db/queries", response_model=ResponseModel[Dict[str, Any]], summary="SQL指纹统计")
+async def get_query_stats(
+    limit: int = 50,
+    order_by: str = "total_ms",
+    current_user: Principal = Depends(get_current_admin_user)
+):
+    """
+    按SQL指纹聚合的执行统计（仅管理员，当前进程）
+    
+    Args:
+        limit: 返回条数
+        order_by: 排序字段（total_ms/count/mean_ms/p95_ms/p99_ms/max_ms）
+        
+    Returns:
+        指纹统计，fingerprint与Prometheus指标db_query_duration_seconds的标签一致
+    """
+    return ResponseModel(
+        code=0,
+        message="success",
+        data={
+            "max_fingerprints": query_registry.max_fingerprints,
+            "queries": query_registry.snapshot(limit=limit, order_by=order_by)
+        }
+    )
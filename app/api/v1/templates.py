@@ -1,14 +1,13 @@
 """
 模板API
 """
-from typing import List, Union
+from typing import List
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
-from app.api.dependencies import get_current_api_key, get_current_user
-from app.models.api_key import APIKey
-from app.models.admin_user import AdminUser
+from app.api.dependencies import get_current_api_key, get_current_user, Principal
 from app.models.template import MessageTemplate, MessageTemplateHistory
 from app.schemas import (
     TemplateCreate,
@@ -24,6 +23,23 @@ from app.services.template_service import TemplateService
 from app.core.logger import logger
 
 
+# 列表接口查询的列（与TemplateResponse字段一致）
+TEMPLATE_LIST_COLUMNS = (
+    MessageTemplate.id,
+    MessageTemplate.code,
+    MessageTemplate.name,
+    MessageTemplate.type,
+    MessageTemplate.description,
+    MessageTemplate.subject_template,
+    MessageTemplate.content_template,
+    MessageTemplate.variables,
+    MessageTemplate.version,
+    MessageTemplate.is_active,
+    MessageTemplate.created_at,
+    MessageTemplate.updated_at,
+)
+
+
 router = APIRouter(prefix="/templates", tags=["Templates"])
 
 
@@ -31,7 +47,7 @@ router = APIRouter(prefix="/templates", tags=["Templates"])
 async def create_template(
     request: TemplateCreate,
     db: Session = Depends(get_db),
-    current_user: Union[AdminUser, APIKey] = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """创建模板"""
     # 检查编码是否已存在
@@ -51,7 +67,7 @@ async def create_template(
         subject_template=request.subject_template,
         content_template=request.content_template,
         variables=request.variables,
-        created_by=api_key.name
+        created_by=current_user.name
     )
     
     db.add(template)
@@ -63,7 +79,7 @@ async def create_template(
     template_service.create_version_history(
         template,
         change_reason="Initial creation",
-        changed_by=api_key.name
+        changed_by=current_user.name
     )
     
     logger.info(f"Template created: {template.code}")
@@ -80,30 +96,32 @@ async def list_templates(
     type: str = None,
     is_active: bool = None,
     db: Session = Depends(get_db),
-    current_user: Union[AdminUser, APIKey] = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """查询模板列表"""
-    query = db.query(MessageTemplate).filter(MessageTemplate.deleted_at == None)
+    # 只查询响应需要的列，由Core元组直接构建字典
+    query = db.query(*TEMPLATE_LIST_COLUMNS).filter(MessageTemplate.deleted_at == None)
     
     if type:
         query = query.filter(MessageTemplate.type == type)
     if is_active is not None:
         query = query.filter(MessageTemplate.is_active == is_active)
     
-    templates = query.all()
+    templates = [dict(row._mapping) for row in query.all()]
     
-    return ResponseModel(
-        code=0,
-        message="Success",
-        data=[TemplateResponse.model_validate(t) for t in templates]
-    )
+    return ORJSONResponse({
+        "code": 0,
+        "message": "Success",
+        "data": templates,
+        "request_id": None
+    })
 
 
 @router.get("/{template_id}", response_model=ResponseModel[TemplateResponse])
 async def get_template(
     template_id: int,
     db: Session = Depends(get_db),
-    current_user: Union[AdminUser, APIKey] = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """获取模板详情"""
     template = db.query(MessageTemplate).filter(
@@ -129,7 +147,7 @@ async def update_template(
     template_id: int,
     request: TemplateUpdate,
     db: Session = Depends(get_db),
-    current_user: Union[AdminUser, APIKey] = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """更新模板"""
     template = db.query(MessageTemplate).filter(
@@ -152,7 +170,7 @@ async def update_template(
         content_template=request.content_template,
         variables=request.variables,
         change_reason=request.change_reason,
-        changed_by=api_key.name
+        changed_by=current_user.name
     )
     
     # 更新其他字段
@@ -179,7 +197,7 @@ async def update_template(
 async def delete_template(
     template_id: int,
     db: Session = Depends(get_db),
-    current_user: Union[AdminUser, APIKey] = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """删除模板（软删除）"""
     template = db.query(MessageTemplate).filter(
@@ -209,7 +227,7 @@ async def delete_template(
 async def preview_template(
     request: TemplatePreviewRequest,
     db: Session = Depends(get_db),
-    current_user: Union[AdminUser, APIKey] = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """预览模板"""
     template_service = TemplateService(db)
@@ -240,7 +258,7 @@ async def preview_template(
 async def get_template_history(
     template_id: int,
     db: Session = Depends(get_db),
-    current_user: Union[AdminUser, APIKey] = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """获取模板历史版本"""
     template = db.query(MessageTemplate).filter(
@@ -270,7 +288,7 @@ async def rollback_template(
     template_id: int,
     request: TemplateRollbackRequest,
     db: Session = Depends(get_db),
-    current_user: Union[AdminUser, APIKey] = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """回滚模板到指定版本"""
     template = db.query(MessageTemplate).filter(
@@ -289,7 +307,7 @@ async def rollback_template(
     updated_template = template_service.rollback_template(
         template=template,
         target_version=request.target_version,
-        changed_by=api_key.name
+        changed_by=current_user.name
     )
     
     if not updated_template:
@@ -0,0 +1,278 @@
+"""
+认证缓存
+缓存已验证的JWT声明和调用方快照，稳态下的认证请求既不解码JWT也不查询数据库
+"""
+import hashlib
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, Dict, Any, Tuple
+
+from sqlalchemy import event, inspect, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.models.api_key import APIKey
+from app.models.admin_user import AdminUser
+from app.utils.cache import LRUCache
+from app.utils.redis_client import ChannelListener
+
+
+PRINCIPAL_API_KEY = "api_key"
+PRINCIPAL_ADMIN = "admin"
+
+INVALIDATION_CHANNEL = "auth:invalidate"
+
+
+@dataclass(frozen=True)
+class Principal:
+    """调用方快照"""
+    type: str
+    id: int
+    name: str
+    is_active: bool = True
+    is_superuser: bool = False
+    expires_at: Optional[datetime] = None
+
+    @property
+    def is_admin(self) -> bool:
+        """是否为管理员"""
+        return self.type == PRINCIPAL_ADMIN
+
+    @property
+    def username(self) -> str:
+        """管理员用户名（与AdminUser保持一致）"""
+        return self.name
+
+    @property
+    def is_expired(self) -> bool:
+        """是否已过期"""
+        return self.expires_at is not None and datetime.utcnow() > self.expires_at
+
+    @classmethod
+    def from_api_key(cls, api_key: APIKey) -> "Principal":
+        return cls(
+            type=PRINCIPAL_API_KEY,
+            id=api_key.id,
+            name=api_key.name,
+            is_active=api_key.is_active,
+            expires_at=api_key.expires_at,
+        )
+
+    @classmethod
+    def from_admin_user(cls, admin_user: AdminUser) -> "Principal":
+        return cls(
+            type=PRINCIPAL_ADMIN,
+            id=admin_user.id,
+            name=admin_user.username,
+            is_active=admin_user.is_active,
+            is_superuser=admin_user.is_superuser,
+        )
+
+
+class AuthCache:
+    """
+    Token -> (声明, 调用方) 缓存
+
+    按调用方失效使用代数计数：每个条目记录写入时调用方的代数，失效时只把代数加一，
+    读取时代数不一致即视为未命中。条目只由LRU淘汰和TTL过期清理，不维护Token索引；
+    代数表只记录被失效过的调用方，规模不超过调用方总数
+    """
+
+    def __init__(self, maxsize: int, ttl: int):
+        self.ttl = ttl
+        self._cache = LRUCache(maxsize=maxsize)
+        # 调用方 -> 失效代数（未失效过的调用方为0，不占用条目）
+        self._generations: Dict[Tuple[str, int], int] = {}
+        self._lock = threading.Lock()
+        # 订阅建立或断线重连后清空缓存：期间可能错过失效通知
+        self._listener = ChannelListener(INVALIDATION_CHANNEL, self._on_invalidation, on_reset=self._cache.clear)
+
+    @staticmethod
+    def _token_key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def _generation(self, principal_type: str, principal_id: int) -> int:
+        return self._generations.get((principal_type, principal_id), 0)
+
+    def get(self, token: str) -> Optional[Tuple[Dict[str, Any], Principal]]:
+        """
+        获取缓存的认证结果
+
+        Args:
+            token: JWT Token
+
+        Returns:
+            Optional[Tuple]: (声明, 调用方)，未命中返回None
+        """
+        if not settings.AUTH_CACHE_ENABLED:
+            return None
+
+        token_key = self._token_key(token)
+        entry = self._cache.get(token_key)
+        if entry is None:
+            return None
+
+        claims, principal, generation = entry
+        if generation != self._generation(principal.type, principal.id):
+            self._cache.delete(token_key)
+            return None
+        return claims, principal
+
+    def set(self, token: str, claims: Dict[str, Any], principal: Principal) -> None:
+        """
+        缓存认证结果，有效期不超过Token的exp
+
+        Args:
+            token: JWT Token
+            claims: 已验证的声明
+            principal: 调用方快照
+        """
+        if not settings.AUTH_CACHE_ENABLED:
+            return
+
+        ttl = self.ttl
+        exp = claims.get("exp")
+        if exp is not None:
+            ttl = min(ttl, float(exp) - time.time())
+        if ttl <= 0:
+            return
+
+        self._listener.start()
+        generation = self._generation(principal.type, principal.id)
+        self._cache.set(self._token_key(token), (claims, principal, generation), ttl=ttl)
+
+    def invalidate_local(self, principal_type: str, principal_id: int) -> None:
+        """失效本进程中某个调用方的全部缓存"""
+        key = (principal_type, principal_id)
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+    def invalidate(self, principal_type: str, principal_id: int) -> None:
+        """
+        失效某个调用方的缓存，并通知其他进程
+
+        Args:
+            principal_type: 调用方类型
+            principal_id: 调用方ID
+        """
+        self.invalidate_local(principal_type, principal_id)
+        self._listener.publish({"type": principal_type, "id": principal_id})
+
+        logger.info(f"Auth cache invalidated for {principal_type} {principal_id}")
+
+    def clear(self) -> None:
+        """清空缓存"""
+        self._cache.clear()
+        with self._lock:
+            self._generations.clear()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def _on_invalidation(self, data: Dict[str, Any]) -> None:
+        self.invalidate_local(data["type"], int(data["id"]))
+
+
+class UsageRecorder:
+    """API Key使用统计缓冲，定期合并写入数据库，避免每个请求一次UPDATE"""
+
+    def __init__(self, flush_interval: int):
+        self.flush_interval = flush_interval
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def record(self, api_key_id: int, db: Session) -> None:
+        """
+        记录一次使用，达到刷新间隔时批量写入
+
+        Args:
+            api_key_id: API Key ID
+            db: 数据库会话
+        """
+        with self._lock:
+            self._counts[api_key_id] += 1
+            if time.monotonic() - self._last_flush < self.flush_interval:
+                return
+            counts, self._counts = self._counts, Counter()
+            self._last_flush = time.monotonic()
+
+        self._flush(counts, db)
+
+    @staticmethod
+    def _flush(counts: Counter, db: Session) -> None:
+        now = datetime.utcnow()
+        try:
+            for api_key_id, count in counts.items():
+                db.execute(
+                    update(APIKey)
+                    .where(APIKey.id == api_key_id)
+                    .values(usage_count=APIKey.usage_count + count, last_used_at=now)
+                )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to flush API key usage: {e}")
+
+
+auth_cache = AuthCache(maxsize=settings.AUTH_CACHE_MAX_SIZE, ttl=settings.AUTH_CACHE_TTL)
+usage_recorder = UsageRecorder(flush_interval=settings.AUTH_USAGE_FLUSH_SECONDS)
+
+
+# ==================== 失效钩子 ====================
+
+def _auth_state_changed(target, *fields: str) -> bool:
+    state = inspect(target)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+@event.listens_for(APIKey, "after_update")
+def _api_key_updated(mapper, connection, target):
+    """API Key停用、删除或过期时间变化时，提交后失效缓存"""
+    if _auth_state_changed(target, "is_active", "deleted_at", "expires_at", "name"):
+        Session.object_session(target).info.setdefault("auth_invalidations", set()).add(
+            (PRINCIPAL_API_KEY, target.id)
+        )
+
+
+@event.listens_for(APIKey, "after_delete")
+@event.listens_for(AdminUser, "after_delete")
+def _principal_deleted(mapper, connection, target):
+    principal_type = PRINCIPAL_ADMIN if isinstance(target, AdminUser) else PRINCIPAL_API_KEY
+    Session.object_session(target).info.setdefault("auth_invalidations", set()).add(
+        (principal_type, target.id)
+    )
+
+
+@event.listens_for(AdminUser, "after_update")
+def _admin_user_updated(mapper, connection, target):
+    """管理员停用或权限变化时，提交后失效缓存"""
+    if _auth_state_changed(target, "is_active", "is_superuser", "username"):
+        Session.object_session(target).info.setdefault("auth_invalidations", set()).add(
+            (PRINCIPAL_ADMIN, target.id)
+        )
+
+
+@event.listens_for(Session, "after_commit")
+def _flush_invalidations(session):
+    for principal_type, principal_id in session.info.pop("auth_invalidations", ()):
+        auth_cache.invalidate(principal_type, principal_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidations(session):
+    session.info.pop("auth_invalidations", None)
+
+
+__all__ = [
+    "Principal",
+    "PRINCIPAL_API_KEY",
+    "PRINCIPAL_ADMIN",
+    "AuthCache",
+    "auth_cache",
+    "usage_recorder",
+]
@@ -2,7 +2,7 @@
 应用配置管理
 使用Pydantic Settings进行配置管理和验证
 """
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import Field, validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -36,6 +36,11 @@ class Settings(BaseSettings):
     DB_POOL_TIMEOUT: int = Field(default=30, description="连接超时(秒)")
     DB_POOL_RECYCLE: int = Field(default=3600, description="连接回收时间(秒)")
     DB_ECHO: bool = Field(default=False, description="是否打印SQL")
+    DB_SLOW_QUERY_SECONDS: float = Field(default=1.0, description="慢查询日志阈值(秒)")
+    DB_PROFILER_ENABLED: bool = Field(default=True, description="是否启用SQL指纹统计")
+    DB_PROFILER_MAX_FINGERPRINTS: int = Field(default=200, description="单进程统计的SQL指纹上限，超出的归入other")
+    DB_PROFILER_N_PLUS_ONE_THRESHOLD: int = Field(default=10, description="同一请求/任务内相同指纹执行次数达到该值时判定为N+1")
+    DB_PROFILER_HEADERS: bool = Field(default=False, description="是否向管理员返回X-DB-Queries/X-DB-Time响应头")
     
     # ==================== Redis配置 ====================
     REDIS_URL: str = Field(default="redis://localhost:6379/0", description="Redis连接URL")
@@ -55,6 +60,17 @@ class Settings(BaseSettings):
     JWT_EXPIRE_MINUTES: int = Field(default=60, description="Token有效期(分钟)")
     JWT_REFRESH_EXPIRE_DAYS: int = Field(default=7, description="刷新Token有效期(天)")
     
+    # ==================== 认证缓存配置 ====================
+    AUTH_CACHE_ENABLED: bool = Field(default=True, description="是否启用认证缓存")
+    AUTH_CACHE_MAX_SIZE: int = Field(default=10000, description="认证缓存最大条目数")
+    AUTH_CACHE_TTL: int = Field(default=300, description="认证缓存有效期上限(秒)，同时受Token过期时间限制")
+    AUTH_USAGE_FLUSH_SECONDS: int = Field(default=30, description="API Key使用统计写库间隔(秒)")
+    
+    # ==================== 密码验证配置 ====================
+    PASSWORD_HASH_WORKERS: int = Field(default=4, description="bcrypt验证线程池大小")
+    PASSWORD_VERIFY_CACHE_SIZE: int = Field(default=10000, description="密码验证结果缓存条目数")
+    PASSWORD_VERIFY_CACHE_TTL: int = Field(default=300, description="密码验证结果缓存时间(秒)")
+    
     # ==================== 加密配置 ====================
     ENCRYPTION_KEY: str = Field(..., description="数据加密密钥(Fernet)")
     
@@ -62,6 +78,85 @@ class Settings(BaseSettings):
     EMAIL_TIMEOUT: int = Field(default=30, description="SMTP超时(秒)")
     EMAIL_MAX_SIZE: int = Field(default=20971520, description="邮件最大大小(字节,20MB)")
     EMAIL_USE_TLS: bool = Field(default=True, description="是否使用TLS")
+    SMTP_CREDENTIAL_CACHE_SIZE: int = Field(default=1000, description="Worker内解密凭证缓存最大条目数")
+    SMTP_CREDENTIAL_CACHE_TTL: int = Field(default=3600, description="Worker内解密凭证缓存有效期(秒)")
+    EMAIL_FAILOVER_MAX_ACCOUNTS: int = Field(default=3, description="单次任务内遇到账户侧错误时最多尝试的账户数")
+    
+    # ==================== 账户路由配置 ====================
+    ACCOUNT_ROUTING_POLICY: str = Field(default="p2c", description="同优先级账户的选择策略: p2c/weighted/priority")
+    ACCOUNT_HEALTH_EWMA_ALPHA: float = Field(default=0.2, description="账户延迟/错误率EWMA平滑系数")
+    ACCOUNT_HEALTH_DEFAULT_LATENCY_MS: float = Field(default=1000.0, description="无样本账户的假定发送延迟(毫秒)")
+    ACCOUNT_HEALTH_ERROR_PENALTY: float = Field(default=10.0, description="错误率惩罚系数: 评分=延迟×(1+系数×错误率)")
+    ACCOUNT_HEALTH_TTL: int = Field(default=86400, description="账户健康数据在Redis中的保留时间(秒)")
+    
+    # ==================== 账户熔断配置 ====================
+    CIRCUIT_BREAKER_ENABLED: bool = Field(default=True, description="是否启用账户熔断（关闭时沿用连续失败5次停用）")
+    CIRCUIT_BREAKER_WINDOW_SECONDS: int = Field(default=60, description="失败率统计窗口(秒)")
+    CIRCUIT_BREAKER_MIN_REQUESTS: int = Field(default=10, description="窗口内触发熔断的最少发送次数")
+    CIRCUIT_BREAKER_FAILURE_RATE: float = Field(default=0.5, description="触发熔断的失败率")
+    CIRCUIT_BREAKER_OPEN_SECONDS: int = Field(default=60, description="熔断冷却时间(秒)，之后进入半开状态")
+    CIRCUIT_BREAKER_HALF_OPEN_PROBES: int = Field(default=3, description="半开状态放行的探测发送次数，全部成功后恢复")
+    
+    # ==================== 账户配额配置 ====================
+    QUOTA_ROLLING_ENABLED: bool = Field(default=True, description="是否按滚动窗口统计账户配额（关闭时使用每天0点清零的daily_sent_count）")
+    QUOTA_WINDOW_SECONDS: int = Field(default=86400, description="滚动配额窗口(秒)，daily_limit为该窗口内的上限")
+    QUOTA_BUCKET_SECONDS: int = Field(default=600, description="配额计数时间桶(秒)")
+    QUOTA_PACING_ENABLED: bool = Field(default=False, description="是否匀速发送（限制短窗口内的发送量）")
+    QUOTA_PACING_WINDOW_SECONDS: int = Field(default=3600, description="匀速发送窗口(秒)")
+    QUOTA_PACING_BURST: float = Field(default=2.0, description="匀速窗口内允许超过平均速率的倍数")
+    
+    # ==================== 定时发送配置 ====================
+    SCHEDULE_MAX_DAYS: int = Field(default=30, description="send_at最远可设置的天数")
+    SCHEDULE_DISPATCH_INTERVAL: float = Field(default=5.0, description="到期消息调度间隔(秒)")
+    SCHEDULE_DISPATCH_BATCH_SIZE: int = Field(default=500, description="每批认领的到期消息数")
+    SCHEDULE_DISPATCH_MAX_PER_RUN: int = Field(default=20000, description="单次调度最多投递的消息数")
+    SCHEDULE_CLAIM_LEASE_SECONDS: int = Field(default=300, description="认领租约(秒)，到期未确认的消息重新认领")
+    
+    # ==================== 延迟发送配置 ====================
+    DEFERRED_QUEUE_ENABLED: bool = Field(default=True, description="没有可用发件账户时是否暂存消息（不消耗重试次数），关闭时按普通失败重试")
+    DEFERRED_RELEASE_INTERVAL: float = Field(default=30.0, description="暂存消息释放检查间隔(秒)")
+    DEFERRED_RELEASE_BATCH_SIZE: int = Field(default=500, description="每批释放的暂存消息数")
+    DEFERRED_RELEASE_MAX_PER_RUN: int = Field(default=5000, description="单次最多释放的暂存消息数（另受账户剩余额度限制）")
+    
+    # ==================== 批量发送配置 ====================
+    CAMPAIGN_CHUNK_SIZE: int = Field(default=500, description="每批拆分的收件人数（一次批量写入消息记录）")
+    CAMPAIGN_DEFAULT_RATE: float = Field(default=50.0, description="默认拆分速率上限(封/秒)")
+    CAMPAIGN_MAX_RATE: float = Field(default=500.0, description="允许设置的最大拆分速率(封/秒)")
+    CAMPAIGN_MAX_RECIPIENTS: int = Field(default=1000000, description="单个任务最多收件人数")
+    CAMPAIGN_PROGRESS_TTL: int = Field(default=2592000, description="Redis进度计数有效期(秒)")
+    CAMPAIGN_SYNC_INTERVAL: float = Field(default=30.0, description="进度同步到数据库及完成检测的间隔(秒)")
+    
+    # ==================== 消息内容存储配置 ====================
+    MESSAGE_CONTENT_COMPRESSION: str = Field(default="none", description="消息内容压缩算法: none/zstd")
+    MESSAGE_CONTENT_COMPRESS_MIN_SIZE: int = Field(default=1024, description="启用压缩的最小内容大小(字节)")
+    MESSAGE_CONTENT_ZSTD_LEVEL: int = Field(default=3, description="zstd压缩级别")
+    MESSAGE_CONTENT_CACHE_SIZE: int = Field(default=2048, description="进程内消息内容缓存条目数")
+    MESSAGE_STATUS_CACHE_TTL: int = Field(default=259200, description="Redis消息状态缓存有效期(秒)")
+    MESSAGE_STATUS_BATCH_MAX: int = Field(default=5000, description="批量状态查询单次最大ID数")
+    
+    # ==================== 状态事件推送配置 ====================
+    MESSAGE_EVENTS_STREAM_MAXLEN: int = Field(default=100000, description="状态事件Stream保留条数(近似)")
+    MESSAGE_EVENTS_QUEUE_SIZE: int = Field(default=1000, description="单个SSE订阅者的事件队列长度")
+    MESSAGE_EVENTS_BLOCK_MS: int = Field(default=5000, description="读取事件流的阻塞时间(毫秒)")
+    MESSAGE_EVENTS_HEARTBEAT_SECONDS: int = Field(default=15, description="SSE心跳间隔(秒)")
+    MESSAGE_EVENTS_RETRY_MS: int = Field(default=3000, description="SSE客户端重连间隔(毫秒)")
+    
+    # ==================== Webhook回调配置 ====================
+    WEBHOOK_BATCH_SIZE: int = Field(default=50, description="单次回调最多携带的事件数")
+    WEBHOOK_BATCH_WAIT_MS: int = Field(default=500, description="攒批最长等待时间(毫秒)")
+    WEBHOOK_MAX_CONCURRENCY_PER_ENDPOINT: int = Field(default=4, description="单个回调地址的最大并发请求数")
+    WEBHOOK_MAX_INFLIGHT_BATCHES: int = Field(default=200, description="全局最大在途批次数")
+    WEBHOOK_MAX_RETRIES: int = Field(default=5, description="回调最大重试次数")
+    WEBHOOK_RETRY_BACKOFF_SECONDS: float = Field(default=1.0, description="回调重试退避基数(秒)")
+    WEBHOOK_RETRY_BACKOFF_MAX_SECONDS: float = Field(default=60.0, description="回调重试最大退避(秒)")
+    WEBHOOK_TIMEOUT: int = Field(default=10, description="回调请求超时(秒)")
+    WEBHOOK_MAX_CONNECTIONS: int = Field(default=200, description="回调HTTP客户端最大连接数")
+    WEBHOOK_MAX_KEEPALIVE_CONNECTIONS: int = Field(default=50, description="回调HTTP客户端最大保活连接数")
+    WEBHOOK_ENDPOINT_CACHE_TTL: int = Field(default=60, description="回调配置缓存时间(秒)")
+    WEBHOOK_RECLAIM_INTERVAL: int = Field(default=30, description="认领空闲待处理事件的检查间隔(秒)")
+    WEBHOOK_RECLAIM_IDLE_MS: int = Field(default=300000, description="待处理事件空闲超过该时间(毫秒)后被重新认领，需大于一次投递含重试的最长耗时")
+    WEBHOOK_MAX_DELIVERIES: int = Field(default=5, description="事件被读取的最大次数，超过后不再重试，直接写入死信")
+    WEBHOOK_METRICS_PORT: int = Field(default=9101, description="Webhook分发进程监控指标端口")
     
     # ==================== 附件配置 ====================
     ATTACHMENT_STORAGE_PATH: str = Field(default="/data/attachments", description="附件存储路径")
@@ -77,7 +172,28 @@ class Settings(BaseSettings):
     
     # ==================== 监控配置 ====================
     PROMETHEUS_ENABLED: bool = Field(default=True, description="是否启用Prometheus")
-    METRICS_PORT: int = Field(default=9090, description="监控指标端口")
+    METRICS_PORT: int = Field(default=9090, description="Celery Worker监控指标端口")
+    
+    # ==================== 链路追踪配置 ====================
+    TRACING_ENABLED: bool = Field(default=False, description="是否启用链路追踪")
+    TRACING_SAMPLE_RATE: float = Field(default=0.1, description="按trace_id采样的比例(0-1)")
+    TRACING_EXPORTER: str = Field(default="file", description="Span导出方式: file/otlp")
+    TRACING_FILE_PATH: str = Field(default="logs/traces.jsonl", description="file导出的文件路径(OTLP JSON，每行一批)")
+    TRACING_OTLP_ENDPOINT: str = Field(default="http://localhost:4318/v1/traces", description="OTLP/HTTP收集端地址")
+    TRACING_EXPORT_BATCH_SIZE: int = Field(default=512, description="每批导出的Span数量")
+    TRACING_EXPORT_INTERVAL: float = Field(default=2.0, description="导出间隔(秒)")
+    TRACING_MAX_QUEUE_SIZE: int = Field(default=10000, description="待导出Span队列上限，超出丢弃")
+    
+    # ==================== 访问日志配置 ====================
+    ACCESS_LOG_SAMPLE_RATE: float = Field(default=0.05, description="成功请求访问日志采样率(0-1)")
+    ACCESS_LOG_CLIENT_ERROR_SAMPLE_RATE: float = Field(default=1.0, description="4xx请求访问日志采样率(0-1)")
+    ACCESS_LOG_ROUTE_SAMPLE_RATES: Dict[str, float] = Field(
+        default={"/health": 0.0, "/metrics": 0.0},
+        description="按路由模板覆盖成功请求的采样率"
+    )
+    ACCESS_LOG_SLOW_MS: int = Field(default=1000, description="慢请求阈值(毫秒)，超过时必定记录")
+    LOG_STDOUT_BUFFER_SIZE: int = Field(default=65536, description="控制台日志缓冲大小(字节)")
+    LOG_STDOUT_FLUSH_INTERVAL: float = Field(default=1.0, description="控制台日志最长刷新间隔(秒)")
     
     # ==================== 限流配置 ====================
     RATE_LIMIT_ENABLED: bool = Field(default=True, description="是否启用限流")
@@ -103,6 +219,23 @@ class Settings(BaseSettings):
                 return [origin.strip() for origin in v.split(",") if origin.strip()]
         return v
     
+    @validator("ACCESS_LOG_ROUTE_SAMPLE_RATES", pre=True)
+    def parse_route_sample_rates(cls, v):
+        """解析按路由采样率配置"""
+        if isinstance(v, str):
+            # 支持JSON对象或 路由=采样率 逗号分隔
+            import json
+            try:
+                return json.loads(v)
+            except json.JSONDecodeError:
+                rates = {}
+                for item in v.split(","):
+                    route, _, rate = item.strip().rpartition("=")
+                    if route:
+                        rates[route] = float(rate)
+                return rates
+        return v
+    
     @validator("DEBUG", pre=True)
     def parse_debug(cls, v):
         """解析DEBUG配置"""
@@ -110,7 +243,7 @@ class Settings(BaseSettings):
             return v.lower() in ("true", "1", "yes", "on")
         return v
     
-    @validator("DB_ECHO", "EMAIL_USE_TLS", "PROMETHEUS_ENABLED", "RATE_LIMIT_ENABLED", pre=True)
+    @validator("DB_ECHO", "DB_PROFILER_ENABLED", "DB_PROFILER_HEADERS", "TRACING_ENABLED", "CIRCUIT_BREAKER_ENABLED", "QUOTA_ROLLING_ENABLED", "QUOTA_PACING_ENABLED", "DEFERRED_QUEUE_ENABLED", "EMAIL_USE_TLS", "PROMETHEUS_ENABLED", "RATE_LIMIT_ENABLED", "AUTH_CACHE_ENABLED", pre=True)
     def parse_bool(cls, v):
         """解析布尔配置"""
         if isinstance(v, str):
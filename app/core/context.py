@@ -0,0 +1,35 @@
+"""
+请求上下文
+通过contextvars在协程、日志和Celery任务之间传递请求ID
+"""
+from contextvars import ContextVar, Token
+from typing import Optional
+
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+
+def get_request_id() -> Optional[str]:
+    """获取当前上下文的请求ID"""
+    return request_id_var.get()
+
+
+def set_request_id(request_id: Optional[str]) -> Token:
+    """
+    设置当前上下文的请求ID
+
+    Args:
+        request_id: 请求ID
+
+    Returns:
+        Token: 用于恢复上下文的Token
+    """
+    return request_id_var.set(request_id)
+
+
+def reset_request_id(token: Token) -> None:
+    """恢复设置前的请求ID"""
+    request_id_var.reset(token)
+
+
+__all__ = ["request_id_var", "get_request_id", "set_request_id", "reset_request_id"]
@@ -1,6 +1,7 @@
 """
 数据库连接和会话管理
 """
+import time
 from typing import Generator
 from sqlalchemy import create_engine, event, text
 from sqlalchemy.ext.declarative import declarative_base
@@ -9,6 +10,7 @@ from sqlalchemy.pool import NullPool, QueuePool
 
 from app.core.config import settings
 from app.core.logger import logger
+from app.core.query_profiler import record_query
 
 
 # 创建数据库引擎
@@ -33,23 +35,22 @@ else:
     )
 
 
-# 事件监听：记录慢查询
+# 事件监听：慢查询日志和SQL指纹统计
 @event.listens_for(engine, "before_cursor_execute")
 def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
     """记录SQL执行开始时间"""
-    conn.info.setdefault("query_start_time", []).append(None)
-    import time
-    conn.info["query_start_time"][-1] = time.time()
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
 
 
 @event.listens_for(engine, "after_cursor_execute")
 def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
-    """记录慢查询"""
-    import time
-    total_time = time.time() - conn.info["query_start_time"].pop()
+    """记录慢查询，并按指纹归属到当前请求/任务"""
+    total_time = time.perf_counter() - conn.info["query_start_time"].pop()
     
-    # 记录超过1秒的慢查询
-    if total_time > 1.0:
+    if settings.DB_PROFILER_ENABLED:
+        record_query(statement, total_time)
+    
+    if total_time > settings.DB_SLOW_QUERY_SECONDS:
         logger.warning(
             f"Slow query detected",
             extra={
@@ -96,7 +97,7 @@ def init_db() -> None:
     初始化数据库
     创建所有表（仅用于开发环境，生产环境使用Alembic）
     """
-    from app.models import message, email, template, api_key  # noqa
+    from app.models import message, email, template, api_key, campaign  # noqa
     
     if settings.is_development:
         logger.info("Initializing database tables...")
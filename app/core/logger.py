@@ -2,15 +2,20 @@
 日志配置
 使用loguru进行日志管理，支持JSON格式输出
 """
+import atexit
+import os
 import sys
-import json
+import random
 import logging
+import threading
+import time
 from pathlib import Path
-from typing import Any, Dict
-from datetime import datetime
+from typing import Any, Dict, IO, Optional
+import orjson
 from loguru import logger as loguru_logger
 
 from app.core.config import settings
+from app.core.context import get_request_id
 
 
 class InterceptHandler(logging.Handler):
@@ -46,9 +51,9 @@ def serialize(record: Dict[str, Any]) -> str:
         "line": record["line"],
     }
     
-    # 添加额外字段
+    # 添加额外字段（跳过格式化时写入的序列化结果）
     if record.get("extra"):
-        subset.update(record["extra"])
+        subset.update((k, v) for k, v in record["extra"].items() if k != "serialized")
     
     # 添加异常信息
     if record.get("exception"):
@@ -58,7 +63,7 @@ def serialize(record: Dict[str, Any]) -> str:
             "traceback": record["exception"].traceback
         }
     
-    return json.dumps(subset, ensure_ascii=False, default=str)
+    return orjson.dumps(subset, default=str).decode("utf-8")
 
 
 def patching(record: Dict[str, Any]) -> Dict[str, Any]:
@@ -67,6 +72,10 @@ def patching(record: Dict[str, Any]) -> Dict[str, Any]:
     """
     record["extra"]["app_name"] = settings.APP_NAME
     record["extra"]["env"] = settings.ENV
+    # 当前请求/任务的请求ID（来自contextvars）
+    request_id = get_request_id()
+    if request_id and "request_id" not in record["extra"]:
+        record["extra"]["request_id"] = request_id
     return record
 
 
@@ -76,7 +85,9 @@ def format_record(record: Dict[str, Any]) -> str:
     生产环境使用JSON格式，开发环境使用可读格式
     """
     if settings.is_production:
-        return serialize(record) + "\n"
+        # 序列化结果放入extra再引用，避免JSON中的花括号被当作格式化占位符
+        record["extra"]["serialized"] = serialize(record)
+        return "{extra[serialized]}\n"
     else:
         # 开发环境使用彩色格式
         format_string = (
@@ -90,20 +101,142 @@ def format_record(record: Dict[str, Any]) -> str:
         return format_string
 
 
+class BufferedStream:
+    """
+    批量写出的输出流
+
+    loguru的StreamSink每条日志都会调用flush，这里把flush变为按缓冲大小或时间间隔
+    才真正写出，另有后台线程定期刷新，保证低流量时日志也不会长时间滞留。
+    ERROR及以上级别的日志立即写出；进程退出时（atexit）写出剩余内容；
+    fork出的子进程（如Celery prefork）丢弃继承的缓冲并在首次写入时启动自己的刷新线程
+    """
+
+    def __init__(self, stream: IO[str], buffer_size: int, flush_interval: float):
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._size = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._pid: Optional[int] = None
+        self._ensure_flusher()
+        atexit.register(self.stop)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _ensure_flusher(self) -> None:
+        """当前进程还没有刷新线程时启动（按PID判断，fork后的子进程需要重新启动）"""
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    threading.Thread(target=self._flush_periodically, name="log-flush", daemon=True).start()
+                    self._pid = pid
+
+    def _after_fork(self) -> None:
+        """子进程：父进程的缓冲由父进程写出，锁可能在fork时被持有，均重新创建"""
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._size = 0
+
+    def write(self, message: str) -> None:
+        self._ensure_flusher()
+        with self._lock:
+            self._buffer.append(message)
+            self._size += len(message)
+        # loguru传入的消息带有record，错误日志（可能是崩溃前的最后一条）立即写出
+        record = getattr(message, "record", None)
+        if record is not None and record["level"].no >= logging.ERROR:
+            self.force_flush()
+
+    def flush(self) -> None:
+        """缓冲未满且未到刷新间隔时不写出"""
+        if self._size >= self.buffer_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.force_flush()
+
+    def force_flush(self) -> None:
+        with self._lock:
+            if getattr(self.stream, "closed", False):
+                self._buffer.clear()
+                self._size = 0
+                return
+            if self._buffer:
+                self.stream.write("".join(self._buffer))
+                self._buffer.clear()
+                self._size = 0
+            self._last_flush = time.monotonic()
+        self.stream.flush()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.force_flush()
+
+    def _flush_periodically(self) -> None:
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.force_flush()
+            except Exception:
+                pass
+
+
+class AccessLogSampler:
+    """
+    访问日志采样
+
+    5xx和慢请求始终记录，4xx和成功请求按配置比例采样，成功请求的采样率可按路由模板覆盖。
+    请求总量由按路由统计的 http_requests_total 指标提供，不依赖访问日志。
+    """
+
+    def __init__(
+        self,
+        success_rate: float,
+        client_error_rate: float,
+        route_rates: Dict[str, float],
+        slow_threshold_ms: int
+    ):
+        self.success_rate = success_rate
+        self.client_error_rate = client_error_rate
+        self.route_rates = route_rates
+        self.slow_threshold = slow_threshold_ms / 1000
+
+    def should_log(self, route: str, status_code: int, duration: float) -> bool:
+        """
+        是否记录本次请求的访问日志
+
+        Args:
+            route: 路由模板
+            status_code: 响应状态码
+            duration: 请求耗时（秒）
+
+        Returns:
+            bool: 是否记录
+        """
+        if status_code >= 500 or duration >= self.slow_threshold:
+            return True
+        if status_code >= 400:
+            rate = self.client_error_rate
+        else:
+            rate = self.route_rates.get(route, self.success_rate)
+        return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
 def init_logging():
     """
     初始化日志配置
     """
     # 移除默认的handler
     loguru_logger.remove()
+    loguru_logger.configure(patcher=patching)
     
     # 创建日志目录
     log_dir = Path("logs")
     log_dir.mkdir(exist_ok=True)
     
-    # 控制台输出
+    # 控制台输出（批量写出）
     loguru_logger.add(
-        sys.stdout,
+        BufferedStream(sys.stdout, settings.LOG_STDOUT_BUFFER_SIZE, settings.LOG_STDOUT_FLUSH_INTERVAL),
         level=settings.LOG_LEVEL,
         format=format_record,
         colorize=not settings.is_production,
@@ -187,5 +320,13 @@ init_logging()
 # 导出logger
 logger = loguru_logger
 
-__all__ = ["logger", "mask_sensitive_data"]
+# 访问日志采样器
+access_log_sampler = AccessLogSampler(
+    success_rate=settings.ACCESS_LOG_SAMPLE_RATE,
+    client_error_rate=settings.ACCESS_LOG_CLIENT_ERROR_SAMPLE_RATE,
+    route_rates=settings.ACCESS_LOG_ROUTE_SAMPLE_RATES,
+    slow_threshold_ms=settings.ACCESS_LOG_SLOW_MS,
+)
+
+__all__ = ["logger", "mask_sensitive_data", "access_log_sampler", "AccessLogSampler", "BufferedStream"]
 
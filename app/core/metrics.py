@@ -0,0 +1,213 @@
+"""
+Prometheus监控指标
+集中定义HTTP与投递指标；设置PROMETHEUS_MULTIPROC_DIR环境变量时启用多进程模式，
+由多个uvicorn worker或Celery子进程写入同一目录，导出时合并
+"""
+import os
+from typing import TYPE_CHECKING
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from app.core.logger import logger
+
+if TYPE_CHECKING:
+    from starlette.types import Scope
+
+
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or os.environ.get("prometheus_multiproc_dir")
+
+# 未匹配任何路由的请求统一归为一个标签值，防止扫描类请求撑爆时间序列
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+# ==================== HTTP指标 ====================
+
+# 请求计数器
+REQUEST_COUNT = Counter(
+    "http_requests_total",
+    "Total HTTP requests",
+    ["method", "endpoint", "status"]
+)
+
+# 请求延迟直方图
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency",
+    ["method", "endpoint"]
+)
+
+
+# ==================== 投递指标 ====================
+
+# 消息发送计数器（按最终状态）
+MESSAGE_SENT = Counter(
+    "messages_sent_total",
+    "Total messages sent",
+    ["channel", "status"]
+)
+
+# 消息创建计数器
+MESSAGE_CREATED = Counter(
+    "messages_created_total",
+    "Total message records created",
+    ["channel"]
+)
+
+# 消息状态变更计数器
+MESSAGE_STATUS_CHANGES = Counter(
+    "message_status_changes_total",
+    "Message status transitions",
+    ["status"]
+)
+
+# 延迟发送计数器（parked: 因无可用账户暂存, released: 放回发送队列）
+MESSAGE_DEFERRED = Counter(
+    "messages_deferred_total",
+    "Messages parked because no sending account had capacity, and released",
+    ["action"]
+)
+
+# 邮件发送计数器（按单次发送结果）
+EMAIL_SENT = Counter(
+    "emails_sent_total",
+    "Total emails sent",
+    ["status"]
+)
+
+# 按发件账户统计的发送次数
+EMAIL_ACCOUNT_SENT = Counter(
+    "email_account_sends_total",
+    "Email send attempts per sending account",
+    ["account", "status"]
+)
+
+# SMTP各阶段耗时
+SMTP_PHASE_LATENCY = Histogram(
+    "smtp_phase_duration_seconds",
+    "SMTP phase latency",
+    ["phase"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+
+# 消息从创建到发送完成的端到端耗时
+MESSAGE_DELIVERY_LATENCY = Histogram(
+    "message_delivery_duration_seconds",
+    "Time from message creation to final delivery status",
+    ["channel", "status"],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600)
+)
+
+# 发送任务执行耗时
+TASK_DURATION = Histogram(
+    "celery_task_duration_seconds",
+    "Celery task execution time",
+    ["task"]
+)
+
+
+# ==================== 数据库指标 ====================
+
+# 按SQL指纹统计的执行耗时（指纹数量有上限，超出的归入other）
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "SQL statement execution time by fingerprint",
+    ["fingerprint"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+
+# 单个请求/任务执行的SQL数量
+DB_QUERIES_PER_SCOPE = Histogram(
+    "db_queries_per_scope",
+    "SQL statements executed per request or task",
+    ["source"],
+    buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144, 233)
+)
+
+# 检测到的N+1查询
+DB_N_PLUS_ONE = Counter(
+    "db_n_plus_one_total",
+    "Requests or tasks that repeated the same SQL fingerprint beyond the threshold",
+    ["source"]
+)
+
+
+def route_label(scope: "Scope") -> str:
+    """
+    获取请求对应的路由模板（如 /api/v1/messages/{message_id}）
+
+    Args:
+        scope: ASGI scope（路由匹配后）
+
+    Returns:
+        str: 路由模板，未匹配时返回UNMATCHED_ROUTE
+    """
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    return path if path else UNMATCHED_ROUTE
+
+
+def _collect_registry() -> CollectorRegistry:
+    """获取用于导出的Registry，多进程模式下合并所有进程的数据"""
+    if not MULTIPROC_DIR:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def generate_metrics() -> bytes:
+    """
+    生成Prometheus文本格式的指标
+
+    Returns:
+        bytes: 指标内容
+    """
+    return generate_latest(_collect_registry())
+
+
+def start_metrics_server(port: int) -> None:
+    """
+    启动独立的指标HTTP服务（用于Celery worker等非Web进程）
+
+    Args:
+        port: 监听端口
+    """
+    start_http_server(port, registry=_collect_registry())
+    logger.info(f"Metrics server listening on :{port} (multiprocess={'on' if MULTIPROC_DIR else 'off'})")
+
+
+def mark_process_dead(pid: int) -> None:
+    """多进程模式下清理已退出进程的live gauge数据"""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
+
+
+__all__ = [
+    "CONTENT_TYPE_LATEST",
+    "REQUEST_COUNT",
+    "REQUEST_LATENCY",
+    "MESSAGE_SENT",
+    "MESSAGE_CREATED",
+    "MESSAGE_STATUS_CHANGES",
+    "MESSAGE_DEFERRED",
+    "EMAIL_SENT",
+    "EMAIL_ACCOUNT_SENT",
+    "SMTP_PHASE_LATENCY",
+    "MESSAGE_DELIVERY_LATENCY",
+    "TASK_DURATION",
+    "DB_QUERY_DURATION",
+    "DB_QUERIES_PER_SCOPE",
+    "DB_N_PLUS_ONE",
+    "route_label",
+    "generate_metrics",
+    "start_metrics_server",
+    "mark_process_dead",
+]
@@ -0,0 +1,144 @@
+"""
+自定义中间件
+"""
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.context import set_request_id, reset_request_id
+from app.core.logger import logger, access_log_sampler
+from app.core.metrics import REQUEST_COUNT, REQUEST_LATENCY, route_label
+from app.core.query_profiler import begin_scope, end_scope, current_scope
+from app.core.security import generate_request_id
+from app.core.tracing import tracer, activate_span, deactivate_span, trace_id_from_request_id, SPAN_KIND_SERVER
+
+
+class StreamAwareGZipMiddleware(GZipMiddleware):
+    """
+    Gzip压缩中间件（跳过SSE事件流）
+
+    压缩器会缓冲输出，导致事件无法及时推送给客户端
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 500, stream_paths: tuple = ("/events",)) -> None:
+        super().__init__(app, minimum_size=minimum_size)
+        self.stream_paths = stream_paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["path"].endswith(self.stream_paths):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+class RequestContextMiddleware:
+    """
+    请求上下文中间件（纯ASGI实现）
+
+    一次处理完成请求ID、耗时响应头、Prometheus指标和访问日志，
+    不像BaseHTTPMiddleware那样为每个请求额外创建任务和内存流。
+    请求ID写入contextvars，供日志和Celery任务头读取；
+    同时开启本请求的SQL统计，管理员请求可返回X-DB-Queries/X-DB-Time；
+    启用链路追踪时为请求创建根Span。
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")
+                break
+        # 只有服务端生成的请求ID用于推导trace_id
+        trace_id = None
+        if not request_id:
+            request_id = generate_request_id()
+            trace_id = trace_id_from_request_id(request_id)
+
+        token = set_request_id(request_id)
+        query_token = begin_scope()
+        span = tracer.start_span(
+            "HTTP",
+            SPAN_KIND_SERVER,
+            attributes={"http.method": scope["method"], "http.target": scope["path"]},
+            trace_id=trace_id,
+        )
+        span_token = activate_span(span)
+        start_time = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers["X-Request-ID"] = request_id
+                headers["X-Process-Time"] = f"{time.perf_counter() - start_time:.4f}"
+                queries = current_scope()
+                if queries is not None and queries.expose_headers:
+                    headers["X-DB-Queries"] = str(queries.count)
+                    headers["X-DB-Time"] = f"{queries.total_time:.4f}"
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            logger.error(
+                f"Request error: {str(e)}",
+                extra={
+                    "request_id": request_id,
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "error": str(e),
+                }
+            )
+            raise
+        finally:
+            process_time = time.perf_counter() - start_time
+            self._record(scope, status_code, process_time, request_id)
+            end_scope(query_token, route_label(scope))
+            if span is not None:
+                span.name = f"{scope['method']} {route_label(scope)}"
+                span.set_attribute("http.status_code", status_code)
+                if status_code >= 500:
+                    span.status_code = "ERROR"
+                span.end()
+                deactivate_span(span_token)
+            reset_request_id(token)
+
+    @staticmethod
+    def _record(scope: Scope, status_code: int, process_time: float, request_id: str) -> None:
+        """记录Prometheus指标和访问日志（访问日志按路由和状态采样）"""
+        method = scope["method"]
+        # 使用路由模板作为标签，避免路径参数产生新的时间序列
+        endpoint = route_label(scope)
+
+        if settings.PROMETHEUS_ENABLED:
+            REQUEST_COUNT.labels(method=method, endpoint=endpoint, status=status_code).inc()
+            REQUEST_LATENCY.labels(method=method, endpoint=endpoint).observe(process_time)
+
+        if not access_log_sampler.should_log(endpoint, status_code, process_time):
+            return
+
+        logger.info(
+            f"{method} {scope['path']}",
+            extra={
+                "request_id": request_id,
+                "method": method,
+                "path": scope["path"],
+                "status_code": status_code,
+                "process_time": f"{process_time:.4f}s",
+            }
+        )
+
+
+__all__ = ["StreamAwareGZipMiddleware", "RequestContextMiddleware"]
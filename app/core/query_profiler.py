@@ -0,0 +1,266 @@
+"""
+SQL性能分析
+把SQL归一化为指纹，按指纹聚合执行次数和耗时；把查询归属到当前请求或Celery任务，
+检测同一请求/任务内重复执行的相同指纹（N+1）
+"""
+import hashlib
+import re
+import threading
+from collections import Counter, deque
+from contextvars import ContextVar, Token
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import DB_QUERY_DURATION, DB_QUERIES_PER_SCOPE, DB_N_PLUS_ONE
+
+
+# 超出指纹上限的语句统一归入该标签
+OTHER_FINGERPRINT = "other"
+
+_COMMENTS = re.compile(r"/\*.*?\*/|--[^\n]*", re.S)
+_STRINGS = re.compile(r"'(?:''|[^'])*'")
+_PARAMS = re.compile(r"%\([^)]+\)s|%s|\?|(?<![:\w]):\w+\b|__\[POSTCOMPILE_\w+\]")
+_NUMBERS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.I)
+_VALUES_ROWS = re.compile(r"(\(\s*\?(?:\s*,\s*\?)*\s*\))(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(statement: str) -> str:
+    """
+    把SQL归一化为指纹：去掉注释，字面量和绑定参数替换为?，IN列表和多行VALUES折叠
+
+    Args:
+        statement: SQL语句
+
+    Returns:
+        str: 指纹
+    """
+    sql = _COMMENTS.sub(" ", statement)
+    sql = _STRINGS.sub("?", sql)
+    sql = _PARAMS.sub("?", sql)
+    sql = _NUMBERS.sub("?", sql)
+    sql = _IN_LISTS.sub("IN (...)", sql)
+    sql = _VALUES_ROWS.sub(r"\1", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+def fingerprint_id(sql_fingerprint: str) -> str:
+    """指纹的短ID（用作Prometheus标签）"""
+    return hashlib.sha1(sql_fingerprint.encode("utf-8")).hexdigest()[:12]
+
+
+class _FingerprintStats:
+    """单个指纹的聚合数据，保留最近的耗时样本用于计算分位数"""
+
+    __slots__ = ("id", "sql", "count", "total_time", "max_time", "samples")
+
+    def __init__(self, fid: str, sql: str, sample_size: int):
+        self.id = fid
+        self.sql = sql
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.samples: deque = deque(maxlen=sample_size)
+
+    def add(self, duration: float) -> None:
+        self.count += 1
+        self.total_time += duration
+        if duration > self.max_time:
+            self.max_time = duration
+        self.samples.append(duration)
+
+    def to_dict(self) -> Dict[str, Any]:
+        ordered = sorted(self.samples)
+
+        def pct(p: float) -> float:
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000, 3) if ordered else 0.0
+
+        return {
+            "fingerprint": self.id,
+            "sql": self.sql,
+            "count": self.count,
+            "total_ms": round(self.total_time * 1000, 3),
+            "mean_ms": round(self.total_time / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "p99_ms": pct(0.99),
+            "max_ms": round(self.max_time * 1000, 3),
+        }
+
+
+class FingerprintRegistry:
+    """
+    进程内按指纹聚合的SQL统计
+
+    指纹数量有上限，超出后新指纹统一记入other，防止动态SQL撑爆内存和指标时间序列
+    """
+
+    def __init__(self, max_fingerprints: int, sample_size: int = 512):
+        self.max_fingerprints = max_fingerprints
+        self.sample_size = sample_size
+        self._stats: Dict[str, _FingerprintStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, sql_fingerprint: str, duration: float) -> str:
+        """
+        记录一次执行
+
+        Args:
+            sql_fingerprint: SQL指纹
+            duration: 耗时（秒）
+
+        Returns:
+            str: 指纹ID（超出上限时为other）
+        """
+        with self._lock:
+            stats = self._stats.get(sql_fingerprint)
+            if stats is None:
+                if len(self._stats) < self.max_fingerprints:
+                    stats = _FingerprintStats(fingerprint_id(sql_fingerprint), sql_fingerprint, self.sample_size)
+                else:
+                    stats = self._stats.get(OTHER_FINGERPRINT)
+                    if stats is None:
+                        stats = _FingerprintStats(OTHER_FINGERPRINT, OTHER_FINGERPRINT, self.sample_size)
+                        self._stats[OTHER_FINGERPRINT] = stats
+                    stats.add(duration)
+                    return OTHER_FINGERPRINT
+                self._stats[sql_fingerprint] = stats
+            stats.add(duration)
+            return stats.id
+
+    def snapshot(self, limit: int = 50, order_by: str = "total_ms") -> List[Dict[str, Any]]:
+        """
+        按指定字段降序返回统计
+
+        Args:
+            limit: 返回条数
+            order_by: 排序字段（total_ms/count/p95_ms/max_ms等）
+
+        Returns:
+            List[Dict]: 指纹统计
+        """
+        with self._lock:
+            rows = [stats.to_dict() for stats in self._stats.values()]
+        rows.sort(key=lambda row: row.get(order_by, 0), reverse=True)
+        return rows[:limit]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+class QueryScope:
+    """一个请求或Celery任务内执行的SQL汇总"""
+
+    __slots__ = ("count", "total_time", "fingerprints", "expose_headers")
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.fingerprints: Counter = Counter()
+        self.expose_headers = False
+
+    def record(self, sql_fingerprint: str, duration: float) -> None:
+        self.count += 1
+        self.total_time += duration
+        self.fingerprints[sql_fingerprint] += 1
+
+    def repeated(self, threshold: int) -> List[tuple]:
+        """执行次数达到阈值的指纹 [(指纹, 次数)]"""
+        return [(fp, count) for fp, count in self.fingerprints.most_common() if count >= threshold]
+
+
+query_registry = FingerprintRegistry(settings.DB_PROFILER_MAX_FINGERPRINTS)
+query_scope_var: ContextVar[Optional[QueryScope]] = ContextVar("query_scope", default=None)
+
+
+def begin_scope() -> Token:
+    """开始统计当前请求/任务的SQL"""
+    return query_scope_var.set(QueryScope())
+
+
+def end_scope(token: Token, source: str) -> Optional[QueryScope]:
+    """
+    结束统计：记录每个请求/任务的SQL数量，检测N+1
+
+    Args:
+        token: begin_scope返回的Token
+        source: 归属（路由模板或任务名）
+
+    Returns:
+        Optional[QueryScope]: 本次统计
+    """
+    scope = query_scope_var.get()
+    query_scope_var.reset(token)
+    if scope is None or not scope.count:
+        return scope
+
+    if settings.PROMETHEUS_ENABLED:
+        DB_QUERIES_PER_SCOPE.labels(source=source).observe(scope.count)
+
+    repeated = scope.repeated(settings.DB_PROFILER_N_PLUS_ONE_THRESHOLD)
+    if repeated:
+        if settings.PROMETHEUS_ENABLED:
+            DB_N_PLUS_ONE.labels(source=source).inc()
+        sql_fingerprint, count = repeated[0]
+        logger.warning(
+            f"Possible N+1 query in {source}: same statement executed {count} times",
+            extra={
+                "source": source,
+                "fingerprint": fingerprint_id(sql_fingerprint),
+                "sql": sql_fingerprint[:500],
+                "repeat_count": count,
+                "total_queries": scope.count,
+            }
+        )
+    return scope
+
+
+def current_scope() -> Optional[QueryScope]:
+    """当前请求/任务的SQL汇总"""
+    return query_scope_var.get()
+
+
+def expose_query_headers() -> None:
+    """允许在当前响应中返回X-DB-Queries/X-DB-Time（仅对管理员调用）"""
+    scope = query_scope_var.get()
+    if scope is not None and settings.DB_PROFILER_HEADERS:
+        scope.expose_headers = True
+
+
+def record_query(statement: str, duration: float) -> None:
+    """
+    记录一条SQL的执行（由数据库游标事件调用）
+
+    Args:
+        statement: SQL语句
+        duration: 耗时（秒）
+    """
+    sql_fingerprint = fingerprint(statement)
+    fid = query_registry.record(sql_fingerprint, duration)
+    if settings.PROMETHEUS_ENABLED:
+        DB_QUERY_DURATION.labels(fingerprint=fid).observe(duration)
+
+    scope = query_scope_var.get()
+    if scope is not None:
+        scope.record(sql_fingerprint, duration)
+
+
+__all__ = [
+    "OTHER_FINGERPRINT",
+    "fingerprint",
+    "fingerprint_id",
+    "FingerprintRegistry",
+    "QueryScope",
+    "query_registry",
+    "query_scope_var",
+    "begin_scope",
+    "end_scope",
+    "current_scope",
+    "expose_query_headers",
+    "record_query",
+]
@@ -2,22 +2,43 @@
 安全相关功能
 包括密码哈希、JWT Token、数据加密等
 """
+import asyncio
+import hashlib
+import hmac
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from jose import JWTError, jwt
 import bcrypt
-from cryptography.fernet import Fernet
+from prometheus_client import Gauge, Histogram
 
 from app.core.config import settings
 from app.core.logger import logger
+from app.utils.cache import LRUCache
 
-# Fernet加密实例
-try:
-    fernet = Fernet(settings.ENCRYPTION_KEY.encode())
-except Exception as e:
-    logger.error(f"Failed to initialize Fernet encryption: {str(e)}")
-    logger.warning("Please generate a valid Fernet key using: from cryptography.fernet import Fernet; print(Fernet.generate_key())")
-    raise
+# Fernet加密实例（首次使用时创建，避免启动时导入cryptography并校验密钥）
+_fernet = None
+
+
+def get_fernet():
+    """
+    获取Fernet加密实例
+    
+    Returns:
+        Fernet: 加密实例
+    """
+    global _fernet
+    if _fernet is None:
+        from cryptography.fernet import Fernet
+        try:
+            _fernet = Fernet(settings.ENCRYPTION_KEY.encode())
+        except Exception as e:
+            logger.error(f"Failed to initialize Fernet encryption: {str(e)}")
+            logger.warning("Please generate a valid Fernet key using: from cryptography.fernet import Fernet; print(Fernet.generate_key())")
+            raise
+    return _fernet
 
 
 def hash_password(password: str) -> str:
@@ -62,6 +83,92 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(password_bytes, hashed_bytes)
 
 
+# ==================== 异步密码验证 ====================
+
+# bcrypt在独立的有界线程池中执行，避免阻塞事件循环
+_password_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="bcrypt"
+)
+# 已提交但尚未开始执行的验证数（队列深度）
+_password_pending = 0
+_password_pending_lock = threading.Lock()
+
+# 验证成功结果缓存，键为HMAC(SECRET_KEY, 哈希+明文)，不保存明文
+_verify_cache = LRUCache(
+    maxsize=settings.PASSWORD_VERIFY_CACHE_SIZE,
+    ttl=settings.PASSWORD_VERIFY_CACHE_TTL
+)
+
+PASSWORD_HASH_QUEUE_DEPTH = Gauge(
+    "password_hash_queue_depth",
+    "bcrypt verifications waiting for a worker thread",
+    multiprocess_mode="livesum"
+)
+
+PASSWORD_HASH_WAIT = Histogram(
+    "password_hash_wait_seconds",
+    "Time bcrypt verifications spend queued before running"
+)
+
+PASSWORD_HASH_DURATION = Histogram(
+    "password_hash_duration_seconds",
+    "bcrypt verification run time"
+)
+
+
+def _verify_cache_key(plain_password: str, hashed_password: str) -> str:
+    return hmac.new(
+        settings.SECRET_KEY.encode(),
+        hashed_password.encode() + b"\0" + plain_password.encode(),
+        hashlib.sha256
+    ).hexdigest()
+
+
+def _change_pending(delta: int) -> None:
+    global _password_pending
+    with _password_pending_lock:
+        _password_pending += delta
+        PASSWORD_HASH_QUEUE_DEPTH.set(_password_pending)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    异步验证密码
+    
+    命中验证缓存时直接返回；否则在bcrypt线程池中执行，不阻塞事件循环
+    
+    Args:
+        plain_password: 明文密码
+        hashed_password: 哈希密码
+        
+    Returns:
+        bool: 是否匹配
+    """
+    cache_key = _verify_cache_key(plain_password, hashed_password)
+    if _verify_cache.get(cache_key):
+        return True
+    
+    submitted_at = time.perf_counter()
+    
+    def run() -> bool:
+        started_at = time.perf_counter()
+        PASSWORD_HASH_WAIT.observe(started_at - submitted_at)
+        _change_pending(-1)
+        try:
+            return verify_password(plain_password, hashed_password)
+        finally:
+            PASSWORD_HASH_DURATION.observe(time.perf_counter() - started_at)
+    
+    _change_pending(1)
+    loop = asyncio.get_running_loop()
+    matched = await loop.run_in_executor(_password_executor, run)
+    
+    if matched:
+        _verify_cache.set(cache_key, True)
+    return matched
+
+
 def create_access_token(
     data: Dict[str, Any],
     expires_delta: Optional[timedelta] = None
@@ -171,7 +278,7 @@ def encrypt_data(data: str) -> str:
         str: 加密后的数据（Base64编码）
     """
     try:
-        encrypted = fernet.encrypt(data.encode())
+        encrypted = get_fernet().encrypt(data.encode())
         return encrypted.decode()
     except Exception as e:
         logger.error(f"Encryption error: {str(e)}")
@@ -189,7 +296,7 @@ def decrypt_data(encrypted_data: str) -> str:
         str: 明文数据
     """
     try:
-        decrypted = fernet.decrypt(encrypted_data.encode())
+        decrypted = get_fernet().decrypt(encrypted_data.encode())
         return decrypted.decode()
     except Exception as e:
         logger.error(f"Decryption error: {str(e)}")
@@ -267,6 +374,7 @@ def decrypt_password(encrypted_password: str) -> str:
 __all__ = [
     "hash_password",
     "verify_password",
+    "verify_password_async",
     "create_access_token",
     "create_refresh_token",
     "decode_token",
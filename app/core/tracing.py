@@ -0,0 +1,450 @@
+"""
+链路追踪
+轻量的OpenTelemetry风格实现：Span按contextvars嵌套，跨进程通过W3C traceparent头传播。
+服务端生成的请求ID直接推导出trace_id，按请求ID即可找到对应链路；客户端传入的请求ID不可信，
+其链路使用随机trace_id，请求ID只作为Span属性记录。
+Span批量导出为OTLP JSON，写入本地文件（每行一个resourceSpans）或POST到OTLP/HTTP收集端。
+"""
+import atexit
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.core.config import settings
+from app.core.context import get_request_id
+from app.core.logger import logger
+
+
+SPAN_KIND_INTERNAL = "internal"
+SPAN_KIND_SERVER = "server"
+SPAN_KIND_CLIENT = "client"
+SPAN_KIND_PRODUCER = "producer"
+SPAN_KIND_CONSUMER = "consumer"
+
+# OTLP JSON中的SpanKind枚举值
+_OTLP_KIND = {
+    SPAN_KIND_INTERNAL: 1,
+    SPAN_KIND_SERVER: 2,
+    SPAN_KIND_CLIENT: 3,
+    SPAN_KIND_PRODUCER: 4,
+    SPAN_KIND_CONSUMER: 5,
+}
+
+TRACEPARENT_HEADER = "traceparent"
+
+
+def trace_id_from_request_id(request_id: Optional[str]) -> str:
+    """
+    由请求ID推导trace_id（32位十六进制）
+
+    只用于服务端生成的请求ID：客户端可控的ID会让外部决定trace_id和采样结果，
+    也可能与其他请求的链路冲突。UUID格式的请求ID直接去掉连字符，其他格式取SHA-256前32位
+    """
+    if not request_id:
+        return os.urandom(16).hex()
+    compact = request_id.replace("-", "").lower()
+    if len(compact) == 32 and all(c in "0123456789abcdef" for c in compact):
+        return compact
+    return hashlib.sha256(request_id.encode("utf-8")).hexdigest()[:32]
+
+
+def should_sample(trace_id: str, rate: float) -> bool:
+    """按trace_id确定性采样，API和Worker对同一请求得出相同结论"""
+    if rate >= 1:
+        return True
+    if rate <= 0:
+        return False
+    return int(trace_id[-16:], 16) < rate * (1 << 64)
+
+
+class SpanContext:
+    """跨进程传递的Span标识"""
+
+    __slots__ = ("trace_id", "span_id", "sampled")
+
+    def __init__(self, trace_id: str, span_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+    def to_traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    @classmethod
+    def from_traceparent(cls, value: Optional[str]) -> Optional["SpanContext"]:
+        """解析traceparent头，格式不合法时返回None"""
+        if not value:
+            return None
+        parts = value.strip().split("-")
+        if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+            return None
+        try:
+            flags = int(parts[3], 16)
+        except ValueError:
+            return None
+        return cls(parts[1], parts[2], bool(flags & 1))
+
+
+class Span:
+    """一个计时片段，未采样时只携带标识用于传播，不记录也不导出"""
+
+    __slots__ = (
+        "name", "kind", "context", "parent_id", "start_ns", "end_ns",
+        "attributes", "status_code", "status_message",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        context: SpanContext,
+        parent_id: Optional[str] = None,
+        kind: str = SPAN_KIND_INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None,
+        start_ns: Optional[int] = None,
+    ):
+        self.name = name
+        self.kind = kind
+        self.context = context
+        self.parent_id = parent_id
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = dict(attributes) if attributes and context.sampled else {}
+        self.status_code = "UNSET"
+        self.status_message: Optional[str] = None
+
+    @property
+    def is_recording(self) -> bool:
+        return self.context.sampled and self.end_ns is None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if self.is_recording:
+            self.attributes[key] = value
+
+    def record_exception(self, exc: BaseException) -> None:
+        if self.is_recording:
+            self.status_code = "ERROR"
+            self.status_message = f"{type(exc).__name__}: {exc}"[:500]
+
+    def end(self, end_ns: Optional[int] = None) -> None:
+        """结束Span并提交导出（重复调用无效）"""
+        if self.end_ns is not None:
+            return
+        self.end_ns = end_ns or time.time_ns()
+        if self.context.sampled:
+            tracer.processor.submit(self)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """转换为OTLP JSON的Span"""
+        span = {
+            "traceId": self.context.trace_id,
+            "spanId": self.context.span_id,
+            "name": self.name,
+            "kind": _OTLP_KIND.get(self.kind, 1),
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": {"UNSET": 0, "OK": 1, "ERROR": 2}[self.status_code]},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.status_message:
+            span["status"]["message"] = self.status_message
+        return span
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+class BatchSpanProcessor:
+    """
+    后台线程批量导出Span
+
+    队列满时丢弃新Span，不阻塞业务线程；线程按进程懒启动，兼容Celery prefork
+    """
+
+    def __init__(self, max_queue_size: int, batch_size: int, interval: float):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_queue_size = max_queue_size
+        self._queue: Optional[queue.Queue] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def _ensure_worker(self) -> queue.Queue:
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._queue = queue.Queue(maxsize=self.max_queue_size)
+                    threading.Thread(target=self._run, name="span-exporter", daemon=True).start()
+                    self._pid = pid
+        return self._queue
+
+    def submit(self, span: Span) -> None:
+        try:
+            self._ensure_worker().put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _drain(self) -> List[Span]:
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            while not self._queue.empty():
+                self._export(self._drain())
+
+    def flush(self) -> None:
+        """导出队列中剩余的Span（进程退出时调用）"""
+        if self._queue is None or self._pid != os.getpid():
+            return
+        while not self._queue.empty():
+            self._export(self._drain())
+
+    def _export(self, batch: List[Span]) -> None:
+        if not batch:
+            return
+        try:
+            tracer.exporter.export(batch)
+        except Exception as e:
+            logger.warning(f"Failed to export {len(batch)} spans: {e}")
+
+
+def _resource_spans(spans: List[Span]) -> Dict[str, Any]:
+    return {
+        "resourceSpans": [{
+            "resource": {
+                "attributes": [
+                    _otlp_attribute("service.name", settings.APP_NAME),
+                    _otlp_attribute("service.version", settings.APP_VERSION),
+                    _otlp_attribute("process.pid", os.getpid()),
+                ]
+            },
+            "scopeSpans": [{
+                "scope": {"name": "app.core.tracing"},
+                "spans": [span.to_otlp() for span in spans],
+            }],
+        }]
+    }
+
+
+class FileSpanExporter:
+    """追加写入本地文件，每行一个OTLP JSON导出请求"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._ready = False
+
+    def export(self, spans: List[Span]) -> None:
+        if not self._ready:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._ready = True
+        line = json.dumps(_resource_spans(spans), ensure_ascii=False, separators=(",", ":"))
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class OTLPHttpSpanExporter:
+    """POST到OTLP/HTTP收集端（JSON编码）"""
+
+    def __init__(self, endpoint: str, timeout: float = 5.0):
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self._client = None
+
+    def export(self, spans: List[Span]) -> None:
+        if self._client is None:
+            import httpx
+            self._client = httpx.Client(timeout=self.timeout)
+        response = self._client.post(
+            self.endpoint,
+            content=json.dumps(_resource_spans(spans), separators=(",", ":")),
+            headers={"Content-Type": "application/json"},
+        )
+        response.raise_for_status()
+
+
+current_span_var: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """Span创建入口"""
+
+    def __init__(self):
+        self.enabled = settings.TRACING_ENABLED
+        self.sample_rate = settings.TRACING_SAMPLE_RATE
+        self.processor = BatchSpanProcessor(
+            max_queue_size=settings.TRACING_MAX_QUEUE_SIZE,
+            batch_size=settings.TRACING_EXPORT_BATCH_SIZE,
+            interval=settings.TRACING_EXPORT_INTERVAL,
+        )
+        if settings.TRACING_EXPORTER == "otlp":
+            self.exporter = OTLPHttpSpanExporter(settings.TRACING_OTLP_ENDPOINT)
+        else:
+            self.exporter = FileSpanExporter(settings.TRACING_FILE_PATH)
+
+    def start_span(
+        self,
+        name: str,
+        kind: str = SPAN_KIND_INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None,
+        parent: Optional[SpanContext] = None,
+        start_ns: Optional[int] = None,
+        trace_id: Optional[str] = None,
+    ) -> Optional[Span]:
+        """
+        创建Span（不激活）
+
+        Args:
+            name: 名称
+            kind: 类型
+            attributes: 属性
+            parent: 远端父Span（未提供时使用当前上下文中的Span）
+            start_ns: 开始时间（纳秒时间戳），用于补记已经结束的阶段
+            trace_id: 根Span的trace_id（见trace_id_from_request_id），未提供时随机生成
+
+        Returns:
+            Optional[Span]: 追踪关闭时返回None
+        """
+        if not self.enabled:
+            return None
+
+        if parent is None:
+            current = current_span_var.get()
+            parent = current.context if current is not None else None
+
+        if parent is not None:
+            context = SpanContext(parent.trace_id, os.urandom(8).hex(), parent.sampled)
+            parent_id = parent.span_id
+        else:
+            request_id = get_request_id()
+            trace_id = trace_id or os.urandom(16).hex()
+            context = SpanContext(trace_id, os.urandom(8).hex(), should_sample(trace_id, self.sample_rate))
+            parent_id = None
+            if request_id:
+                attributes = {**(attributes or {}), "request_id": request_id}
+
+        return Span(name, context, parent_id, kind, attributes, start_ns)
+
+    @contextmanager
+    def span(
+        self,
+        name: str,
+        kind: str = SPAN_KIND_INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None,
+        parent: Optional[SpanContext] = None,
+    ) -> Iterator[Optional[Span]]:
+        """
+        创建并激活Span，退出时结束；异常会记录到Span后继续抛出
+
+        用法：
+            with tracer.span("smtp.send", attributes={"account": email}) as span:
+                ...
+        """
+        span = self.start_span(name, kind, attributes, parent)
+        if span is None:
+            yield None
+            return
+        token = current_span_var.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            current_span_var.reset(token)
+            span.end()
+
+    def record_span(self, name: str, duration: float, attributes: Optional[Dict[str, Any]] = None) -> None:
+        """
+        补记一个刚结束的子阶段（结束时间为当前时刻）
+
+        Args:
+            name: 名称
+            duration: 耗时（秒）
+            attributes: 属性
+        """
+        if not self.enabled:
+            return
+        end_ns = time.time_ns()
+        span = self.start_span(name, attributes=attributes, start_ns=end_ns - int(duration * 1e9))
+        if span is not None:
+            span.end(end_ns)
+
+
+tracer = Tracer()
+atexit.register(tracer.processor.flush)
+
+
+def activate_span(span: Optional[Span]) -> Optional[Token]:
+    """把Span设为当前上下文（用于无法使用with的场景，如Celery信号）"""
+    return current_span_var.set(span) if span is not None else None
+
+
+def deactivate_span(token: Optional[Token]) -> None:
+    if token is not None:
+        current_span_var.reset(token)
+
+
+def current_span() -> Optional[Span]:
+    return current_span_var.get()
+
+
+def inject_trace_headers(headers: Dict[str, Any]) -> None:
+    """把当前Span写入消息头（traceparent）"""
+    span = current_span_var.get()
+    if span is not None:
+        headers[TRACEPARENT_HEADER] = span.context.to_traceparent()
+
+
+def extract_trace_context(traceparent: Optional[str]) -> Optional[SpanContext]:
+    """从traceparent头恢复远端父Span"""
+    return SpanContext.from_traceparent(traceparent)
+
+
+__all__ = [
+    "SPAN_KIND_INTERNAL",
+    "SPAN_KIND_SERVER",
+    "SPAN_KIND_CLIENT",
+    "SPAN_KIND_PRODUCER",
+    "SPAN_KIND_CONSUMER",
+    "TRACEPARENT_HEADER",
+    "SpanContext",
+    "Span",
+    "Tracer",
+    "FileSpanExporter",
+    "OTLPHttpSpanExporter",
+    "tracer",
+    "trace_id_from_request_id",
+    "should_sample",
+    "activate_span",
+    "deactivate_span",
+    "current_span",
+    "inject_trace_headers",
+    "extract_trace_context",
+]
@@ -2,16 +2,15 @@
 FastAPI应用入口
 """
 from fastapi import FastAPI, Request, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
 from starlette.responses import Response
-import time
 
 from app.core.config import settings
 from app.core.logger import logger
 from app.core.database import check_db_connection
+from app.core.middleware import StreamAwareGZipMiddleware, RequestContextMiddleware
+from app.core.metrics import CONTENT_TYPE_LATEST, generate_metrics
 from app.api.v1 import api_router
 
 
@@ -23,6 +22,7 @@ app = FastAPI(
     docs_url="/docs" if settings.is_development else None,
     redoc_url="/redoc" if settings.is_development else None,
     openapi_url="/openapi.json" if settings.is_development else None,
+    default_response_class=ORJSONResponse,
 )
 
 
@@ -37,104 +37,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Gzip压缩中间件
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+# Gzip压缩中间件（SSE事件流不压缩）
+app.add_middleware(StreamAwareGZipMiddleware, minimum_size=1000)
 
-
-# ==================== Prometheus监控指标 ====================
-
-if settings.PROMETHEUS_ENABLED:
-    # 请求计数器
-    REQUEST_COUNT = Counter(
-        "http_requests_total",
-        "Total HTTP requests",
-        ["method", "endpoint", "status"]
-    )
-    
-    # 请求延迟直方图
-    REQUEST_LATENCY = Histogram(
-        "http_request_duration_seconds",
-        "HTTP request latency",
-        ["method", "endpoint"]
-    )
-    
-    # 消息发送计数器
-    MESSAGE_SENT = Counter(
-        "messages_sent_total",
-        "Total messages sent",
-        ["channel", "status"]
-    )
-    
-    # 邮件发送计数器
-    EMAIL_SENT = Counter(
-        "emails_sent_total",
-        "Total emails sent",
-        ["status"]
-    )
-
-
-# ==================== 请求/响应中间件 ====================
-
-@app.middleware("http")
-async def add_process_time_header(request: Request, call_next):
-    """添加请求处理时间和请求ID"""
-    from app.core.security import generate_request_id
-    
-    # 生成或获取请求ID
-    request_id = request.headers.get("X-Request-ID", generate_request_id())
-    
-    # 记录请求开始
-    start_time = time.time()
-    
-    # 处理请求
-    try:
-        response = await call_next(request)
-        
-        # 计算处理时间
-        process_time = time.time() - start_time
-        
-        # 添加响应头
-        response.headers["X-Request-ID"] = request_id
-        response.headers["X-Process-Time"] = f"{process_time:.4f}"
-        
-        # 记录Prometheus指标
-        if settings.PROMETHEUS_ENABLED:
-            REQUEST_COUNT.labels(
-                method=request.method,
-                endpoint=request.url.path,
-                status=response.status_code
-            ).inc()
-            
-            REQUEST_LATENCY.labels(
-                method=request.method,
-                endpoint=request.url.path
-            ).observe(process_time)
-        
-        # 记录访问日志
-        logger.info(
-            f"{request.method} {request.url.path}",
-            extra={
-                "request_id": request_id,
-                "method": request.method,
-                "path": request.url.path,
-                "status_code": response.status_code,
-                "process_time": f"{process_time:.4f}s",
-            }
-        )
-        
-        return response
-        
-    except Exception as e:
-        logger.error(
-            f"Request error: {str(e)}",
-            extra={
-                "request_id": request_id,
-                "method": request.method,
-                "path": request.url.path,
-                "error": str(e),
-            }
-        )
-        raise
+# 请求上下文中间件（最外层：请求ID、耗时、指标、访问日志）
+app.add_middleware(RequestContextMiddleware)
 
 
 # ==================== 异常处理器 ====================
@@ -173,7 +80,10 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """应用关闭事件"""
+    from app.services.status_events import status_event_hub
+    
     logger.info(f"Shutting down {settings.APP_NAME}")
+    await status_event_hub.close()
 
 
 # ==================== 路由注册 ====================
@@ -189,7 +99,7 @@ if settings.PROMETHEUS_ENABLED:
     async def metrics():
         """Prometheus指标端点"""
         return Response(
-            content=generate_latest(),
+            content=generate_metrics(),
             media_type=CONTENT_TYPE_LATEST
         )
 
@@ -2,11 +2,12 @@
 数据库模型模块
 """
 from app.models.base import Base, BaseModel, TimeStampMixin, SoftDeleteMixin
-from app.models.message import MessageRecord, MessageStatus, MessageChannel
+from app.models.message import MessageRecord, MessageContent, MessageStatus, MessageChannel
 from app.models.template import MessageTemplate, MessageTemplateHistory, TemplateType
 from app.models.email import EmailAccount, EmailAttachment
 from app.models.api_key import APIKey
 from app.models.admin_user import AdminUser
+from app.models.campaign import Campaign, CampaignRecipient, CampaignStatus
 
 
 __all__ = [
@@ -18,6 +19,7 @@ __all__ = [
     
     # 消息相关
     "MessageRecord",
+    "MessageContent",
     "MessageStatus",
     "MessageChannel",
     
@@ -35,4 +37,9 @@ __all__ = [
     
     # 管理员
     "AdminUser",
+    
+    # 批量任务
+    "Campaign",
+    "CampaignRecipient",
+    "CampaignStatus",
 ]
@@ -42,6 +42,10 @@ class APIKey(BaseModel, SoftDeleteMixin):
     # 过期时间
     expires_at = Column(DateTime, nullable=True, comment="过期时间（NULL表示永不过期）")
     
+    # 状态回调（Webhook）
+    callback_url = Column(String(500), nullable=True, comment="状态回调地址")
+    callback_secret = Column(String(500), nullable=True, comment="回调签名密钥（加密存储）")
+    
     # 权限范围（预留字段，后期扩展）
     # scopes = Column(JSON, nullable=True, comment="权限范围")
     
@@ -0,0 +1,103 @@
+"""
+批量发送任务模型
+"""
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, Enum as SQLEnum, ForeignKey, JSON, BigInteger, Index
+import enum
+
+from app.models.base import Base, BaseModel
+
+
+class CampaignStatus(str, enum.Enum):
+    """批量任务状态"""
+    DRAFT = "draft"          # 草稿（可追加收件人）
+    RUNNING = "running"      # 拆分发送中
+    PAUSED = "paused"        # 已暂停
+    COMPLETED = "completed"  # 已完成（全部消息已有最终状态）
+    CANCELLED = "cancelled"  # 已取消
+
+
+class Campaign(BaseModel):
+    """批量发送任务表"""
+
+    __tablename__ = "campaigns"
+    __table_args__ = {'comment': '批量发送任务表'}
+
+    name = Column(String(200), nullable=False, comment="任务名称")
+    status = Column(
+        SQLEnum(CampaignStatus),
+        default=CampaignStatus.DRAFT,
+        nullable=False,
+        index=True,
+        comment="状态"
+    )
+
+    # 模板信息（创建时解析并固定版本号）
+    template_id = Column(
+        Integer,
+        ForeignKey("message_templates.id", ondelete="SET NULL"),
+        nullable=True,
+        comment="模板ID"
+    )
+    template_code = Column(String(100), nullable=False, comment="模板编码")
+    template_version = Column(Integer, nullable=True, comment="模板版本号")
+    variables = Column(JSON, nullable=True, comment="所有收件人共用的模板变量（收件人变量优先）")
+
+    # 拆分与限速
+    rate_limit = Column(Float, nullable=False, comment="拆分速率上限(封/秒)")
+    run_token = Column(Integer, default=0, nullable=False, comment="拆分任务令牌，每次启动/恢复递增，旧的任务链据此退出")
+    recipient_seq = Column(BigInteger, default=0, nullable=False, comment="已写入的收件人序号")
+
+    # 进度（total/created/invalid在拆分事务中更新；success/failed/cancelled由Redis计数定期同步）
+    total_count = Column(Integer, default=0, nullable=False, comment="收件人总数")
+    created_count = Column(Integer, default=0, nullable=False, comment="已生成的消息数")
+    invalid_count = Column(Integer, default=0, nullable=False, comment="渲染失败未生成消息的收件人数")
+    success_count = Column(Integer, default=0, nullable=False, comment="发送成功数")
+    failed_count = Column(Integer, default=0, nullable=False, comment="发送失败数")
+    cancelled_count = Column(Integer, default=0, nullable=False, comment="取消时尚未发送的消息数")
+
+    # 时间
+    started_at = Column(DateTime, nullable=True, comment="开始拆分时间")
+    last_chunk_at = Column(DateTime, nullable=True, comment="最近一批拆分时间（用于发现中断的拆分任务链）")
+    fanout_finished_at = Column(DateTime, nullable=True, comment="全部收件人拆分完成时间")
+    finished_at = Column(DateTime, nullable=True, comment="完成或取消时间")
+
+    # 调用方
+    api_key_id = Column(
+        Integer,
+        ForeignKey("api_keys.id", ondelete="SET NULL"),
+        nullable=True,
+        index=True,
+        comment="创建任务的API Key ID"
+    )
+    error_message = Column(Text, nullable=True, comment="错误信息")
+
+    def __repr__(self):
+        return f"<Campaign(id={self.id}, name={self.name}, status={self.status})>"
+
+
+class CampaignRecipient(Base):
+    """批量任务收件人暂存表（拆分后删除）"""
+
+    __tablename__ = "campaign_recipients"
+    __table_args__ = (
+        Index("ix_campaign_recipients_campaign_seq", "campaign_id", "seq", unique=True),
+        {'comment': '批量任务收件人暂存表'},
+    )
+
+    # SQLite只对INTEGER主键自增（测试库）
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True, comment="主键ID")
+    campaign_id = Column(
+        Integer,
+        ForeignKey("campaigns.id", ondelete="CASCADE"),
+        nullable=False,
+        comment="批量任务ID"
+    )
+    seq = Column(BigInteger, nullable=False, comment="收件人序号（拆分顺序）")
+    email = Column(String(255), nullable=False, comment="收件人邮箱")
+    variables = Column(JSON, nullable=True, comment="收件人模板变量")
+
+    def __repr__(self):
+        return f"<CampaignRecipient(campaign_id={self.campaign_id}, seq={self.seq}, email={self.email})>"
+
+
+__all__ = ["Campaign", "CampaignRecipient", "CampaignStatus"]
@@ -5,6 +5,7 @@ from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
+from app.core.config import settings
 from app.models.base import BaseModel
 
 
@@ -46,11 +47,11 @@ class EmailAccount(BaseModel):
     
     @property
     def is_available(self) -> bool:
-        """是否可用"""
+        """是否可用（启用滚动配额/熔断器时由Redis中的配额和熔断状态决定，不再看当日计数/连续失败次数）"""
         return (
             self.is_active and 
-            self.daily_sent_count < self.daily_limit and
-            self.failure_count < 5  # 连续失败5次后暂停使用
+            (settings.QUOTA_ROLLING_ENABLED or self.daily_sent_count < self.daily_limit) and
+            (settings.CIRCUIT_BREAKER_ENABLED or self.failure_count < 5)  # 连续失败5次后暂停使用
         )
     
     def reset_daily_count(self):
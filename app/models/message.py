@@ -1,8 +1,9 @@
 """
 消息记录模型
 """
-from sqlalchemy import Column, Integer, String, Text, Enum as SQLEnum, ForeignKey, JSON
-from sqlalchemy.orm import relationship
+from typing import Optional
+from sqlalchemy import Column, Integer, String, Text, DateTime, Enum as SQLEnum, ForeignKey, JSON, LargeBinary
+from sqlalchemy.orm import relationship, object_session
 import enum
 
 from app.models.base import BaseModel
@@ -52,9 +53,15 @@ class MessageRecord(BaseModel):
     cc = Column(String(1000), nullable=True, comment="抄送（仅邮件）")
     bcc = Column(String(1000), nullable=True, comment="密送（仅邮件）")
     
-    # 消息内容
+    # 消息内容（正文按SHA-256去重存储在message_contents表）
     subject = Column(String(500), nullable=True, comment="主题/标题")
-    content = Column(Text, nullable=False, comment="消息内容")
+    content_hash = Column(
+        String(64),
+        ForeignKey("message_contents.content_hash", ondelete="RESTRICT"),
+        nullable=False,
+        index=True,
+        comment="消息内容哈希（SHA-256）"
+    )
     content_type = Column(
         String(50),
         default="html",
@@ -75,7 +82,17 @@ class MessageRecord(BaseModel):
     
     # 发送信息
     sender = Column(String(200), nullable=True, comment="发送者（邮箱/短信签名）")
-    sent_at = Column(String(50), nullable=True, comment="实际发送时间")
+    send_at = Column(DateTime, nullable=True, index=True, comment="计划发送时间（为空表示立即发送）")
+    sent_at = Column(DateTime, nullable=True, index=True, comment="实际发送时间")
+    
+    # 投递耗时（毫秒），用于按账户/模板/时间段统计延迟分位数
+    queued_at = Column(DateTime, nullable=True, comment="进入发送队列时间")
+    started_at = Column(DateTime, nullable=True, comment="Worker开始处理时间")
+    render_ms = Column(Integer, nullable=True, comment="模板渲染耗时(毫秒)")
+    queue_wait_ms = Column(Integer, nullable=True, comment="排队耗时(毫秒)：queued_at到started_at")
+    smtp_connect_ms = Column(Integer, nullable=True, comment="SMTP连接及登录耗时(毫秒)")
+    smtp_transmit_ms = Column(Integer, nullable=True, comment="SMTP投递耗时(毫秒)")
+    delivery_ms = Column(Integer, nullable=True, comment="端到端投递耗时(毫秒)：queued_at到sent_at")
     
     # 重试信息
     retry_count = Column(Integer, default=0, nullable=False, comment="重试次数")
@@ -101,6 +118,22 @@ class MessageRecord(BaseModel):
         comment="请求ID（追踪）"
     )
     
+    # 调用方
+    api_key_id = Column(
+        Integer,
+        ForeignKey("api_keys.id", ondelete="SET NULL"),
+        nullable=True,
+        index=True,
+        comment="创建消息的API Key ID"
+    )
+    campaign_id = Column(
+        Integer,
+        ForeignKey("campaigns.id", ondelete="SET NULL"),
+        nullable=True,
+        index=True,
+        comment="所属批量任务ID"
+    )
+    
     # 附加信息
     extra_data = Column(JSON, nullable=True, comment="附加元数据")
     
@@ -109,7 +142,43 @@ class MessageRecord(BaseModel):
     
     def __repr__(self):
         return f"<MessageRecord(id={self.id}, channel={self.channel}, status={self.status}, to={self.to})>"
+    
+    @property
+    def content(self) -> Optional[str]:
+        """消息内容（通过内容存储解析并缓存）"""
+        if not self.content_hash:
+            return None
+        
+        from app.services.content_store import ContentStore
+        return ContentStore(object_session(self)).get(self.content_hash)
+
+
+class MessageContent(BaseModel):
+    """消息内容表（内容寻址存储）"""
+    
+    __tablename__ = "message_contents"
+    __table_args__ = {'comment': '消息内容表'}
+    
+    content_hash = Column(
+        String(64),
+        unique=True,
+        nullable=False,
+        index=True,
+        comment="内容哈希（SHA-256，基于原文计算）"
+    )
+    body = Column(LargeBinary, nullable=False, comment="内容（可能已压缩）")
+    compression = Column(
+        String(20),
+        default="none",
+        nullable=False,
+        comment="压缩算法: none/zstd"
+    )
+    size = Column(Integer, nullable=False, comment="原文大小（字节）")
+    ref_count = Column(Integer, default=1, nullable=False, comment="引用计数")
+    
+    def __repr__(self):
+        return f"<MessageContent(hash={self.content_hash[:12]}, size={self.size}, refs={self.ref_count})>"
 
 
-__all__ = ["MessageRecord", "MessageStatus", "MessageChannel"]
+__all__ = ["MessageRecord", "MessageContent", "MessageStatus", "MessageChannel"]
 
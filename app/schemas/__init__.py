@@ -7,6 +7,8 @@ from app.schemas.message import (
     MessageQuery,
     MessageResponse,
     BatchQueryRequest,
+    MessageStatusQueryRequest,
+    MessageStatusResponse,
 )
 from app.schemas.template import (
     TemplateCreate,
@@ -24,6 +26,12 @@ from app.schemas.email_account import (
     EmailAccountTestRequest,
     EmailAccountTestResponse,
 )
+from app.schemas.campaign import (
+    CampaignRecipientItem,
+    CampaignCreate,
+    CampaignRecipientUploadResponse,
+    CampaignResponse,
+)
 
 
 __all__ = [
@@ -43,6 +51,8 @@ __all__ = [
     "MessageQuery",
     "MessageResponse",
     "BatchQueryRequest",
+    "MessageStatusQueryRequest",
+    "MessageStatusResponse",
     
     # Template
     "TemplateCreate",
@@ -59,4 +69,10 @@ __all__ = [
     "EmailAccountResponse",
     "EmailAccountTestRequest",
     "EmailAccountTestResponse",
+    
+    # Campaign
+    "CampaignRecipientItem",
+    "CampaignCreate",
+    "CampaignRecipientUploadResponse",
+    "CampaignResponse",
 ]
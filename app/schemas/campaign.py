@@ -0,0 +1,82 @@
+"""
+批量发送任务相关Schema
+"""
+from typing import Optional, List, Dict, Any
+from datetime import datetime
+from pydantic import BaseModel, Field, EmailStr
+
+
+class CampaignRecipientItem(BaseModel):
+    """收件人"""
+
+    email: EmailStr = Field(..., description="收件人邮箱")
+    variables: Optional[Dict[str, Any]] = Field(None, description="收件人模板变量（覆盖任务共用变量）")
+
+
+class CampaignCreate(BaseModel):
+    """创建批量任务请求"""
+
+    name: str = Field(..., max_length=200, description="任务名称")
+    template_code: str = Field(..., description="模板编码")
+    variables: Optional[Dict[str, Any]] = Field(None, description="所有收件人共用的模板变量")
+    rate_limit: Optional[float] = Field(None, gt=0, description="拆分速率上限(封/秒)，为空时使用默认值")
+    recipients: Optional[List[CampaignRecipientItem]] = Field(
+        None,
+        max_items=1000,
+        description="少量收件人可直接随请求提交，大批量请通过 /campaigns/{id}/recipients 上传"
+    )
+    start: bool = Field(False, description="创建后立即开始（需同时提交recipients）")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "name": "十月会员通知",
+                "template_code": "welcome_email",
+                "variables": {"company": "示例公司"},
+                "rate_limit": 20,
+                "recipients": [{"email": "user@example.com", "variables": {"name": "张三"}}],
+                "start": True
+            }
+        }
+
+
+class CampaignRecipientUploadResponse(BaseModel):
+    """收件人上传响应"""
+
+    accepted: int = Field(..., description="本次写入的收件人数")
+    rejected: int = Field(..., description="格式或邮箱不合法被跳过的行数")
+    total: int = Field(..., description="任务收件人总数")
+    errors: List[str] = Field(default_factory=list, description="前若干条被跳过行的原因")
+
+
+class CampaignResponse(BaseModel):
+    """批量任务状态响应（结果计数来自Redis实时计数，不扫描子消息）"""
+
+    id: int
+    name: str
+    status: str
+    template_code: str
+    template_version: Optional[int]
+    rate_limit: float
+    total: int = Field(..., description="收件人总数")
+    created: int = Field(..., description="已生成的消息数")
+    invalid: int = Field(..., description="模板渲染失败未生成消息的收件人数")
+    remaining: int = Field(..., description="尚未拆分的收件人数")
+    in_flight: int = Field(..., description="已生成但尚无最终状态的消息数")
+    success: int
+    failed: int
+    cancelled: int
+    progress: float = Field(..., description="拆分进度(0-1)")
+    success_rate: Optional[float] = Field(None, description="已有最终状态的消息中的成功率")
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    fanout_finished_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+__all__ = [
+    "CampaignRecipientItem",
+    "CampaignCreate",
+    "CampaignRecipientUploadResponse",
+    "CampaignResponse",
+]
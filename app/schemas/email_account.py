@@ -1,7 +1,7 @@
 """
 邮箱账户Schema
 """
-from typing import Optional
+from typing import Any, Dict, Optional
 from datetime import datetime
 from pydantic import BaseModel, Field, EmailStr
 
@@ -57,6 +57,7 @@ class EmailAccountResponse(BaseModel):
     last_failure_at: Optional[datetime]
     remark: Optional[str]
     is_available: bool
+    circuit: Optional[Dict[str, Any]] = Field(None, description="熔断状态")
     created_at: datetime
     updated_at: datetime
     
@@ -2,7 +2,7 @@
 消息相关Schema
 """
 from typing import Optional, List, Dict, Any
-from datetime import datetime
+from datetime import datetime, timedelta
 from pydantic import BaseModel, Field, EmailStr, validator
 
 from app.models.message import MessageStatus, MessageChannel
@@ -26,6 +26,7 @@ class EmailSendRequest(BaseModel):
     attachment_ids: Optional[List[int]] = Field(None, description="附件ID列表")
     idempotency_key: Optional[str] = Field(None, max_length=100, description="幂等性键(防重复)")
     extra_data: Optional[Dict[str, Any]] = Field(None, description="附加元数据")
+    send_at: Optional[datetime] = Field(None, description="计划发送时间(为空或已过去时立即发送；不带时区按服务器本地时间)")
     
     @validator("to", "cc", "bcc", pre=True)
     def convert_to_list(cls, v):
@@ -34,6 +35,18 @@ class EmailSendRequest(BaseModel):
             return [v]
         return v
     
+    @validator("send_at")
+    def normalize_send_at(cls, v):
+        """带时区的时间转换为服务器本地时间，并限制最远计划时间"""
+        if v is None:
+            return v
+        from app.core.config import settings
+        if v.tzinfo is not None:
+            v = v.astimezone().replace(tzinfo=None)
+        if v > datetime.now() + timedelta(days=settings.SCHEDULE_MAX_DAYS):
+            raise ValueError(f"send_at must be within {settings.SCHEDULE_MAX_DAYS} days")
+        return v
+    
     class Config:
         json_schema_extra = {
             "example": {
@@ -87,7 +100,12 @@ class MessageResponse(BaseModel):
     max_retry: int
     created_at: datetime
     updated_at: datetime
-    sent_at: Optional[str]
+    sent_at: Optional[datetime]
+    send_at: Optional[datetime] = None
+    queued_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    queue_wait_ms: Optional[int] = None
+    delivery_ms: Optional[int] = None
     error_message: Optional[str]
     request_id: Optional[str]
     
@@ -101,11 +119,38 @@ class BatchQueryRequest(BaseModel):
     message_ids: List[int] = Field(..., min_items=1, max_items=100, description="消息ID列表")
 
 
+class MessageStatusQueryRequest(BaseModel):
+    """批量状态查询请求"""
+    
+    message_ids: List[int] = Field(..., min_items=1, description="消息ID列表")
+    
+    @validator("message_ids")
+    def limit_message_ids(cls, v):
+        """限制单次查询数量"""
+        from app.core.config import settings
+        if len(v) > settings.MESSAGE_STATUS_BATCH_MAX:
+            raise ValueError(f"At most {settings.MESSAGE_STATUS_BATCH_MAX} message ids per request")
+        return v
+
+
+class MessageStatusResponse(BaseModel):
+    """消息精简状态响应"""
+    
+    id: int
+    status: str
+    sender: Optional[str] = None
+    sent_at: Optional[str] = None
+    error_code: Optional[str] = None
+    retry_count: int = 0
+
+
 __all__ = [
     "EmailSendRequest",
     "EmailSendResponse",
     "MessageQuery",
     "MessageResponse",
     "BatchQueryRequest",
+    "MessageStatusQueryRequest",
+    "MessageStatusResponse",
 ]
 
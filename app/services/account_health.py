@@ -0,0 +1,176 @@
+"""
+邮箱账户健康度
+按账户维护发送延迟和错误率的EWMA（Redis中共享，各Worker共同更新），
+并据此在同一优先级的账户之间选择发送账户
+"""
+import random
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.models.email import EmailAccount
+from app.utils.redis_client import RedisClient
+
+
+HEALTH_KEY_PREFIX = "smtp:health:"
+
+# 原子更新EWMA：首个样本直接作为初值；latency<0表示本次不更新延迟（如失败）
+_RECORD_SCRIPT = """
+local alpha = tonumber(ARGV[1])
+local latency = tonumber(ARGV[2])
+local err = tonumber(ARGV[3])
+local current = redis.call('HMGET', KEYS[1], 'latency_ms', 'error_rate', 'samples', 'errors')
+local samples = tonumber(current[3] or '0') + 1
+local errors = tonumber(current[4] or '0') + err
+local error_rate = err
+if current[2] then
+    error_rate = alpha * err + (1 - alpha) * tonumber(current[2])
+end
+local fields = {'error_rate', tostring(error_rate), 'samples', samples, 'errors', errors, 'updated_at', ARGV[4]}
+if latency >= 0 then
+    local value = latency
+    if current[1] then
+        value = alpha * latency + (1 - alpha) * tonumber(current[1])
+    end
+    table.insert(fields, 'latency_ms')
+    table.insert(fields, tostring(value))
+end
+redis.call('HSET', KEYS[1], unpack(fields))
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[5]))
+return samples
+"""
+
+
+def _health_key(account_id: int) -> str:
+    return f"{HEALTH_KEY_PREFIX}{account_id}"
+
+
+class AccountHealthTracker:
+    """
+    账户健康度（EWMA延迟和错误率）
+
+    评分 = 延迟 × (1 + 错误率惩罚系数 × 错误率)，越低越好；
+    没有样本的账户使用默认延迟，新账户能分到流量并尽快积累样本
+    """
+
+    def __init__(self, redis_client: RedisClient):
+        self.redis = redis_client
+        self.alpha = settings.ACCOUNT_HEALTH_EWMA_ALPHA
+        self.default_latency_ms = settings.ACCOUNT_HEALTH_DEFAULT_LATENCY_MS
+        self.error_penalty = settings.ACCOUNT_HEALTH_ERROR_PENALTY
+        self._script = None
+
+    def record(self, account_id: int, success: bool, latency: Optional[float] = None) -> None:
+        """
+        记录一次发送结果
+
+        Args:
+            account_id: 账户ID
+            success: 是否成功
+            latency: 发送耗时（秒，仅成功时计入延迟）
+        """
+        latency_ms = latency * 1000 if success and latency is not None else -1
+        try:
+            if self._script is None:
+                self._script = self.redis.client.register_script(_RECORD_SCRIPT)
+            self._script(
+                keys=[_health_key(account_id)],
+                args=[self.alpha, latency_ms, 0 if success else 1, int(time.time()), settings.ACCOUNT_HEALTH_TTL],
+            )
+        except Exception as e:
+            logger.error(f"Failed to record account health: account_id={account_id}, error={e}")
+
+    def load(self, account_ids: Sequence[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        批量读取账户健康度（一次pipeline）
+
+        Args:
+            account_ids: 账户ID列表
+
+        Returns:
+            Dict[int, Dict]: 账户ID -> {latency_ms, error_rate, samples, errors, updated_at, score}
+        """
+        rows = self.redis.hgetall_many([_health_key(account_id) for account_id in account_ids])
+        health = {}
+        for account_id, row in zip(account_ids, rows):
+            latency_ms = float(row["latency_ms"]) if row.get("latency_ms") else None
+            error_rate = float(row.get("error_rate") or 0)
+            health[account_id] = {
+                "latency_ms": latency_ms,
+                "error_rate": error_rate,
+                "samples": int(row.get("samples") or 0),
+                "errors": int(row.get("errors") or 0),
+                "updated_at": int(row["updated_at"]) if row.get("updated_at") else None,
+                "score": self.score(latency_ms, error_rate),
+            }
+        return health
+
+    def score(self, latency_ms: Optional[float], error_rate: float) -> float:
+        """账户评分（越低越优先）"""
+        latency = latency_ms if latency_ms is not None else self.default_latency_ms
+        return max(latency, 1.0) * (1 + self.error_penalty * error_rate)
+
+    def choose(self, accounts: List[EmailAccount], policy: Optional[str] = None) -> Optional[EmailAccount]:
+        """
+        在候选账户中选择最高优先级档内的一个账户
+
+        Args:
+            accounts: 候选账户（按优先级降序、今日发送量升序排列）
+            policy: 选择策略（p2c/weighted/priority，默认取配置）
+
+        Returns:
+            Optional[EmailAccount]: 选中的账户
+        """
+        if not accounts:
+            return None
+
+        tier = [account for account in accounts if account.priority == accounts[0].priority]
+        policy = policy or settings.ACCOUNT_ROUTING_POLICY
+        if len(tier) == 1 or policy == "priority":
+            return tier[0]
+
+        health = self.load([account.id for account in tier])
+        if policy == "weighted":
+            weights = [1.0 / health[account.id]["score"] for account in tier]
+            return random.choices(tier, weights=weights)[0]
+
+        # p2c：随机取两个，选评分低的；评分相同时选今日发送量少的
+        first, second = random.sample(tier, 2)
+        return min(
+            (first, second),
+            key=lambda account: (health[account.id]["score"], account.daily_sent_count),
+        )
+
+    def weights(self, accounts: List[EmailAccount]) -> List[Dict[str, Any]]:
+        """
+        账户当前的健康度和在所属优先级档内的流量占比（按weighted策略计算）
+
+        Args:
+            accounts: 账户列表
+
+        Returns:
+            List[Dict]: 每个账户的健康度、评分和占比
+        """
+        health = self.load([account.id for account in accounts])
+        tier_totals: Dict[int, float] = {}
+        for account in accounts:
+            tier_totals[account.priority] = tier_totals.get(account.priority, 0.0) + 1.0 / health[account.id]["score"]
+
+        return [
+            {
+                "account_id": account.id,
+                "email": account.email,
+                "priority": account.priority,
+                "is_available": account.is_available,
+                "daily_sent_count": account.daily_sent_count,
+                "daily_limit": account.daily_limit,
+                **health[account.id],
+                "score": round(health[account.id]["score"], 3),
+                "weight": round(1.0 / health[account.id]["score"] / tier_totals[account.priority], 4),
+            }
+            for account in accounts
+        ]
+
+
+__all__ = ["AccountHealthTracker", "HEALTH_KEY_PREFIX"]
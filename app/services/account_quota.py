@@ -0,0 +1,156 @@
+"""
+邮箱账户滚动配额
+按时间桶在Redis中统计每个账户最近24小时（可配置）的发送量，替代每天0点清零的daily_sent_count；
+可选的匀速发送（pacing）限制账户在较短窗口内的发送量，使配额平均分布到全天
+"""
+import math
+import time
+from typing import Any, Dict, List, Sequence
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.models.email import EmailAccount
+from app.utils.redis_client import RedisClient
+
+
+QUOTA_KEY_PREFIX = "smtp:quota:"
+
+# KEYS: 账户计数哈希（字段为时间桶编号）
+# ARGV: 当前桶, 窗口桶数, 配额, 匀速窗口桶数, 匀速窗口上限(0为不限), 过期时间
+# 返回 {是否占用成功, 窗口内发送量, 匀速窗口内发送量}
+_CONSUME_SCRIPT = """
+local now_bucket = tonumber(ARGV[1])
+local oldest = now_bucket - tonumber(ARGV[2]) + 1
+local pace_oldest = now_bucket - tonumber(ARGV[4]) + 1
+local pace_limit = tonumber(ARGV[5])
+local fields = redis.call('HGETALL', KEYS[1])
+local used, paced = 0, 0
+for i = 1, #fields, 2 do
+    local bucket = tonumber(fields[i])
+    if bucket < oldest then
+        redis.call('HDEL', KEYS[1], fields[i])
+    else
+        local count = tonumber(fields[i + 1])
+        used = used + count
+        if bucket >= pace_oldest then paced = paced + count end
+    end
+end
+if used >= tonumber(ARGV[3]) or (pace_limit > 0 and paced >= pace_limit) then
+    return {0, used, paced}
+end
+redis.call('HINCRBY', KEYS[1], now_bucket, 1)
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[6]))
+return {1, used + 1, paced + 1}
+"""
+
+
+def _quota_key(account_id: int) -> str:
+    return f"{QUOTA_KEY_PREFIX}{account_id}"
+
+
+class AccountQuota:
+    """账户滚动配额（Redis时间桶计数，各Worker共享）"""
+
+    def __init__(self, redis_client: RedisClient):
+        self.redis = redis_client
+        self.enabled = settings.QUOTA_ROLLING_ENABLED
+        self.bucket_seconds = settings.QUOTA_BUCKET_SECONDS
+        self.window_buckets = max(settings.QUOTA_WINDOW_SECONDS // self.bucket_seconds, 1)
+        self.pacing = settings.QUOTA_PACING_ENABLED
+        self.pace_buckets = max(settings.QUOTA_PACING_WINDOW_SECONDS // self.bucket_seconds, 1)
+        self._consume = None
+
+    def _now_bucket(self) -> int:
+        return int(time.time() // self.bucket_seconds)
+
+    def pace_limit(self, account: EmailAccount) -> int:
+        """匀速窗口内允许的发送量（未启用匀速时为0）"""
+        if not self.pacing:
+            return 0
+        even_share = account.daily_limit * self.pace_buckets / self.window_buckets
+        return max(math.ceil(even_share * settings.QUOTA_PACING_BURST), 1)
+
+    def usage(self, accounts: Sequence[EmailAccount]) -> Dict[int, Dict[str, Any]]:
+        """
+        批量读取账户配额使用情况（一次pipeline，不修改计数）
+
+        Args:
+            accounts: 账户列表
+
+        Returns:
+            Dict[int, Dict]: 账户ID -> {used, remaining, paced, pace_limit, available}
+        """
+        rows = self.redis.hgetall_many([_quota_key(account.id) for account in accounts])
+        now_bucket = self._now_bucket()
+        oldest = now_bucket - self.window_buckets + 1
+        pace_oldest = now_bucket - self.pace_buckets + 1
+
+        result = {}
+        for account, row in zip(accounts, rows):
+            used = paced = 0
+            for bucket, count in row.items():
+                bucket = int(bucket)
+                if bucket >= oldest:
+                    used += int(count)
+                    if bucket >= pace_oldest:
+                        paced += int(count)
+            pace_limit = self.pace_limit(account)
+            result[account.id] = {
+                "used": used,
+                "remaining": max(account.daily_limit - used, 0),
+                "paced": paced,
+                "pace_limit": pace_limit or None,
+                "available": used < account.daily_limit and (not pace_limit or paced < pace_limit),
+            }
+        return result
+
+    def available(self, accounts: List[EmailAccount]) -> List[EmailAccount]:
+        """过滤出仍有滚动配额（及匀速余量）的账户"""
+        if not self.enabled or not accounts:
+            return accounts
+        usage = self.usage(accounts)
+        return [account for account in accounts if usage[account.id]["available"]]
+
+    def try_consume(self, account: EmailAccount) -> bool:
+        """
+        原子占用一次发送配额
+
+        Args:
+            account: 邮箱账户
+
+        Returns:
+            bool: 是否占用成功（配额或匀速余量用尽时为False）
+        """
+        if not self.enabled:
+            return True
+        try:
+            if self._consume is None:
+                self._consume = self.redis.client.register_script(_CONSUME_SCRIPT)
+            allowed, _, _ = self._consume(
+                keys=[_quota_key(account.id)],
+                args=[
+                    self._now_bucket(),
+                    self.window_buckets,
+                    account.daily_limit,
+                    self.pace_buckets,
+                    self.pace_limit(account),
+                    (self.window_buckets + 1) * self.bucket_seconds,
+                ],
+            )
+            return bool(allowed)
+        except Exception as e:
+            # Redis不可用时不因配额统计阻断发送
+            logger.error(f"Quota consume failed: account_id={account.id}, error={e}")
+            return True
+
+    def release(self, account: EmailAccount) -> None:
+        """退还一次已占用但未使用的配额"""
+        if not self.enabled:
+            return
+        try:
+            self.redis.client.hincrby(_quota_key(account.id), self._now_bucket(), -1)
+        except Exception as e:
+            logger.error(f"Quota release failed: account_id={account.id}, error={e}")
+
+
+__all__ = ["AccountQuota", "QUOTA_KEY_PREFIX"]
@@ -0,0 +1,148 @@
+"""
+批量任务进度计数
+每个任务在Redis哈希中维护 success/failed/cancelled 计数，消息进入最终状态时原子递增，
+查询汇总结果时无需扫描子消息；计数由定时任务同步到数据库，Redis数据丢失时从消息表重新统计
+"""
+from typing import Dict, Optional, Sequence
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.models.message import MessageStatus
+from app.utils.redis_client import RedisClient
+
+
+PROGRESS_KEY_PREFIX = "campaign:progress:"
+CANCELLED_KEY_PREFIX = "campaign:cancelled:"
+
+# 任务取消后仍在发送队列中的消息以该错误码标记为失败
+CAMPAIGN_CANCELLED_ERROR_CODE = "CAMPAIGN_CANCELLED"
+
+PROGRESS_FIELDS = ("success", "failed", "cancelled")
+
+# KEYS: 计数哈希；ARGV: 字段1, 值1, ..., 过期时间
+# 只在计数不存在时写入，不覆盖Worker已经递增的计数；返回是否写入
+_SEED_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+for i = 1, #ARGV - 1, 2 do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[#ARGV]))
+return 1
+"""
+
+
+def _progress_key(campaign_id: int) -> str:
+    return f"{PROGRESS_KEY_PREFIX}{campaign_id}"
+
+
+def _cancelled_key(campaign_id: int) -> str:
+    return f"{CANCELLED_KEY_PREFIX}{campaign_id}"
+
+
+def outcome_field(status: MessageStatus, error_code: Optional[str] = None) -> Optional[str]:
+    """
+    消息最终状态对应的计数字段
+
+    Args:
+        status: 消息状态
+        error_code: 错误码
+
+    Returns:
+        Optional[str]: 计数字段，非最终状态返回None
+    """
+    if status == MessageStatus.SUCCESS:
+        return "success"
+    if status == MessageStatus.FAILED:
+        return "cancelled" if error_code == CAMPAIGN_CANCELLED_ERROR_CODE else "failed"
+    return None
+
+
+class CampaignProgress:
+    """批量任务进度计数（Redis哈希）"""
+
+    def __init__(self, redis_client: RedisClient):
+        self.redis = redis_client
+        self.ttl = settings.CAMPAIGN_PROGRESS_TTL
+        self._seed = None
+
+    def incr(self, campaign_id: int, field: str, amount: int = 1) -> None:
+        """
+        递增计数
+
+        Args:
+            campaign_id: 任务ID
+            field: 计数字段
+            amount: 增量（可为负，用于失败消息重新发送时撤销计数）
+        """
+        try:
+            pipe = self.redis.client.pipeline(transaction=False)
+            pipe.hincrby(_progress_key(campaign_id), field, amount)
+            pipe.expire(_progress_key(campaign_id), self.ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to update campaign {campaign_id} progress: {e}")
+
+    def record(self, campaign_id: int, status: MessageStatus, error_code: Optional[str] = None, amount: int = 1) -> None:
+        """记录一条消息的最终状态（非最终状态忽略）"""
+        field = outcome_field(status, error_code)
+        if field:
+            self.incr(campaign_id, field, amount)
+
+    def get_many(self, campaign_ids: Sequence[int]) -> Dict[int, Optional[Dict[str, int]]]:
+        """
+        批量读取计数（一次pipeline）
+
+        Args:
+            campaign_ids: 任务ID列表
+
+        Returns:
+            Dict[int, Optional[Dict]]: 任务ID -> 计数，Redis中不存在时为None
+        """
+        rows = self.redis.hgetall_many([_progress_key(campaign_id) for campaign_id in campaign_ids])
+        return {
+            campaign_id: {field: int(row.get(field) or 0) for field in PROGRESS_FIELDS} if row else None
+            for campaign_id, row in zip(campaign_ids, rows)
+        }
+
+    def seed(self, campaign_id: int, counts: Optional[Dict[str, int]] = None) -> bool:
+        """
+        初始化计数（任务开始时写入0，计数丢失时用数据库统计结果重建）
+
+        计数已存在时不写入：重建期间Worker的递增会先创建计数，覆盖会丢失或重复计入这些递增
+
+        Args:
+            campaign_id: 任务ID
+            counts: 各字段初始值，默认为0
+
+        Returns:
+            bool: 是否写入
+        """
+        counts = counts or {}
+        args = []
+        for field in PROGRESS_FIELDS:
+            args.extend([field, counts.get(field, 0)])
+        try:
+            if self._seed is None:
+                self._seed = self.redis.client.register_script(_SEED_SCRIPT)
+            return bool(self._seed(keys=[_progress_key(campaign_id)], args=[*args, self.ttl]))
+        except Exception as e:
+            logger.error(f"Failed to seed campaign {campaign_id} progress: {e}")
+            return False
+
+    def mark_cancelled(self, campaign_id: int) -> None:
+        """标记任务已取消，Worker据此跳过队列中尚未发送的消息"""
+        self.redis.set(_cancelled_key(campaign_id), 1, ex=self.ttl)
+
+    def is_cancelled(self, campaign_id: int) -> bool:
+        """任务是否已取消"""
+        return bool(self.redis.exists(_cancelled_key(campaign_id)))
+
+
+__all__ = [
+    "CampaignProgress",
+    "CAMPAIGN_CANCELLED_ERROR_CODE",
+    "PROGRESS_FIELDS",
+    "outcome_field",
+]
@@ -0,0 +1,488 @@
+"""
+批量发送任务服务
+收件人先分批写入暂存表，启动后由拆分任务按批渲染模板、批量写入消息记录并投递，
+每批之间按任务的速率上限停顿；暂停、恢复、取消只修改任务状态，拆分任务在下一批开始前检查
+"""
+import csv
+import json
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from jinja2 import Template
+from pydantic import EmailStr, TypeAdapter, ValidationError
+from sqlalchemy import delete, func, insert, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import MESSAGE_CREATED
+from app.core.security import generate_request_id
+from app.models.campaign import Campaign, CampaignRecipient, CampaignStatus
+from app.models.message import MessageRecord, MessageStatus, MessageChannel
+from app.models.template import MessageTemplate, MessageTemplateHistory
+from app.services.campaign_progress import CampaignProgress, PROGRESS_FIELDS, outcome_field
+from app.services.content_store import ContentStore
+from app.services.template_service import TemplateService
+from app.utils.redis_client import RedisClient
+
+
+RECIPIENT_FORMATS = ("csv", "ndjson")
+
+_email_adapter = TypeAdapter(EmailStr)
+
+
+class CampaignError(ValueError):
+    """批量任务操作错误（状态不允许、收件人超限等）"""
+
+
+class RecipientParser:
+    """
+    逐行解析收件人
+
+    csv: 首行为表头且必须包含email列，其余列作为收件人模板变量
+    ndjson: 每行一个JSON对象 {"email": ..., "variables": {...}}
+    """
+
+    def __init__(self, fmt: str):
+        if fmt not in RECIPIENT_FORMATS:
+            raise CampaignError(f"Unsupported recipient format: {fmt}")
+        self.fmt = fmt
+        self.header: Optional[List[str]] = None
+
+    def parse(self, line: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        解析一行
+
+        Args:
+            line: 一行文本
+
+        Returns:
+            Optional[Tuple[str, Dict]]: (邮箱, 变量)，空行和表头返回None
+
+        Raises:
+            ValueError: 行格式或邮箱不合法
+        """
+        line = line.lstrip("\ufeff").strip()
+        if not line:
+            return None
+
+        if self.fmt == "ndjson":
+            item = json.loads(line)
+            if not isinstance(item, dict):
+                raise ValueError("expected a JSON object")
+            email, variables = item.get("email"), item.get("variables") or {}
+            if not isinstance(variables, dict):
+                raise ValueError("variables must be an object")
+        else:
+            row = next(csv.reader([line]))
+            if self.header is None:
+                self.header = [column.strip() for column in row]
+                if "email" not in self.header:
+                    raise CampaignError("CSV header must contain an 'email' column")
+                return None
+            values = dict(zip(self.header, row))
+            email = values.pop("email", None)
+            variables = {key: value for key, value in values.items() if key}
+
+        try:
+            email = _email_adapter.validate_python((email or "").strip())
+        except ValidationError:
+            raise ValueError(f"invalid email: {email}")
+        return email, variables
+
+
+class CampaignService:
+    """批量发送任务服务"""
+
+    def __init__(self, db: Session, redis_client: Optional[RedisClient] = None):
+        self.db = db
+        self.progress = CampaignProgress(redis_client) if redis_client else None
+
+    def create_campaign(
+        self,
+        name: str,
+        template_code: str,
+        variables: Optional[Dict[str, Any]] = None,
+        rate_limit: Optional[float] = None,
+        api_key_id: Optional[int] = None
+    ) -> Campaign:
+        """
+        创建批量任务（草稿状态）
+
+        Args:
+            name: 任务名称
+            template_code: 模板编码
+            variables: 共用模板变量
+            rate_limit: 拆分速率上限(封/秒)
+            api_key_id: 调用方API Key ID
+
+        Returns:
+            Campaign: 批量任务
+        """
+        template = TemplateService(self.db).get_template(template_code)
+        if not template:
+            raise CampaignError(f"Template not found: {template_code}")
+
+        campaign = Campaign(
+            name=name,
+            status=CampaignStatus.DRAFT,
+            template_id=template.id,
+            template_code=template.code,
+            template_version=template.version,
+            variables=variables,
+            rate_limit=min(rate_limit or settings.CAMPAIGN_DEFAULT_RATE, settings.CAMPAIGN_MAX_RATE),
+            api_key_id=api_key_id
+        )
+        self.db.add(campaign)
+        self.db.commit()
+        self.db.refresh(campaign)
+
+        logger.info(f"Created campaign {campaign.id} with template {template.code} v{template.version}")
+        return campaign
+
+    def get_campaign(self, campaign_id: int) -> Optional[Campaign]:
+        """根据ID获取批量任务"""
+        return self.db.query(Campaign).filter(Campaign.id == campaign_id).first()
+
+    def _lock(self, campaign_id: int) -> Campaign:
+        """锁定任务行（状态变更、写入收件人、拆分时串行化）"""
+        campaign = self.db.query(Campaign).filter(Campaign.id == campaign_id).with_for_update().first()
+        if not campaign:
+            raise CampaignError(f"Campaign not found: {campaign_id}")
+        return campaign
+
+    def add_recipients(self, campaign_id: int, recipients: List[Tuple[str, Dict[str, Any]]]) -> Campaign:
+        """
+        批量写入收件人（一条多行INSERT）
+
+        Args:
+            campaign_id: 任务ID
+            recipients: (邮箱, 变量) 列表
+
+        Returns:
+            Campaign: 更新后的任务
+        """
+        campaign = self._lock(campaign_id)
+        if campaign.status != CampaignStatus.DRAFT:
+            self.db.rollback()
+            raise CampaignError("Recipients can only be added to a draft campaign")
+        if campaign.total_count + len(recipients) > settings.CAMPAIGN_MAX_RECIPIENTS:
+            self.db.rollback()
+            raise CampaignError(f"A campaign can have at most {settings.CAMPAIGN_MAX_RECIPIENTS} recipients")
+
+        if recipients:
+            seq = campaign.recipient_seq
+            self.db.execute(
+                insert(CampaignRecipient),
+                [
+                    {"campaign_id": campaign.id, "seq": seq + offset, "email": email, "variables": variables or None}
+                    for offset, (email, variables) in enumerate(recipients, start=1)
+                ]
+            )
+            campaign.recipient_seq = seq + len(recipients)
+            campaign.total_count += len(recipients)
+        self.db.commit()
+        return campaign
+
+    def start(self, campaign_id: int) -> Campaign:
+        """开始拆分（草稿 -> 运行中），返回的任务带有新的run_token"""
+        campaign = self._lock(campaign_id)
+        if campaign.status != CampaignStatus.DRAFT:
+            self.db.rollback()
+            raise CampaignError(f"Cannot start a {campaign.status.value} campaign")
+        if campaign.total_count == 0:
+            self.db.rollback()
+            raise CampaignError("Campaign has no recipients")
+        campaign.status = CampaignStatus.RUNNING
+        campaign.started_at = datetime.now()
+        campaign.run_token += 1
+        self.db.commit()
+        # 计数从0开始，同步任务只在计数真正丢失时才从消息表重建
+        if self.progress:
+            self.progress.seed(campaign.id)
+        return campaign
+
+    def pause(self, campaign_id: int) -> Campaign:
+        """暂停拆分（已投递的消息继续发送）"""
+        campaign = self._lock(campaign_id)
+        if campaign.status != CampaignStatus.RUNNING:
+            self.db.rollback()
+            raise CampaignError(f"Cannot pause a {campaign.status.value} campaign")
+        campaign.status = CampaignStatus.PAUSED
+        self.db.commit()
+        return campaign
+
+    def resume(self, campaign_id: int) -> Campaign:
+        """恢复拆分，递增run_token使暂停前的任务链失效"""
+        campaign = self._lock(campaign_id)
+        if campaign.status != CampaignStatus.PAUSED:
+            self.db.rollback()
+            raise CampaignError(f"Cannot resume a {campaign.status.value} campaign")
+        campaign.status = CampaignStatus.RUNNING
+        campaign.run_token += 1
+        campaign.error_message = None
+        self.db.commit()
+        return campaign
+
+    def cancel(self, campaign_id: int) -> Campaign:
+        """
+        取消任务：停止拆分，发送队列中尚未发送的消息由Worker标记为取消，
+        暂存的收件人由同步任务分批清理
+        """
+        campaign = self._lock(campaign_id)
+        if campaign.status in (CampaignStatus.COMPLETED, CampaignStatus.CANCELLED):
+            self.db.rollback()
+            raise CampaignError(f"Cannot cancel a {campaign.status.value} campaign")
+        campaign.status = CampaignStatus.CANCELLED
+        campaign.finished_at = datetime.now()
+        self.db.commit()
+        if self.progress:
+            self.progress.mark_cancelled(campaign.id)
+        return campaign
+
+    def restart_stalled(self, campaign: Campaign) -> Optional[int]:
+        """
+        重新启动中断的拆分任务链（Worker重启、任务丢失）
+
+        Returns:
+            Optional[int]: 新的run_token，任务状态已变化时返回None
+        """
+        campaign = self._lock(campaign.id)
+        if campaign.status != CampaignStatus.RUNNING or campaign.fanout_finished_at:
+            self.db.rollback()
+            return None
+        campaign.run_token += 1
+        campaign.last_chunk_at = datetime.now()
+        self.db.commit()
+        logger.warning(f"Restarting stalled fan-out for campaign {campaign.id}")
+        return campaign.run_token
+
+    def _load_templates(self, campaign: Campaign) -> Tuple[Optional[Template], Template, Optional[int]]:
+        """加载任务创建时的模板版本（模板已更新时从历史快照读取）"""
+        template = self.db.query(MessageTemplate).filter(MessageTemplate.id == campaign.template_id).first()
+        if not template:
+            raise CampaignError(f"Template {campaign.template_code} no longer exists")
+
+        source = template
+        if template.version != campaign.template_version:
+            snapshot = (
+                self.db.query(MessageTemplateHistory)
+                .filter(
+                    MessageTemplateHistory.template_id == template.id,
+                    MessageTemplateHistory.version == campaign.template_version
+                )
+                .first()
+            )
+            source = snapshot or template
+        version = source.version
+        subject = Template(source.subject_template) if source.subject_template else None
+        return subject, Template(source.content_template), version
+
+    def fan_out_chunk(self, campaign_id: int, run_token: int) -> Tuple[List[int], Optional[float]]:
+        """
+        拆分一批收件人：渲染模板、批量写入正文和消息记录、删除已处理的暂存收件人，在同一事务中完成
+
+        消息写入时queued_at为空，调用方投递后再用mark_queued标记；
+        投递失败或进程退出时未标记的消息由unqueued_message_ids找回补投
+
+        Args:
+            campaign_id: 任务ID
+            run_token: 拆分任务令牌（与任务当前令牌不一致时说明已被暂停/恢复替代，直接退出）
+
+        Returns:
+            Tuple[List[int], Optional[float]]: (需投递的消息ID, 距下一批的最短间隔秒数)，
+                任务已停止或拆分完成时间隔为None
+        """
+        campaign = self._lock(campaign_id)
+        if campaign.status != CampaignStatus.RUNNING or campaign.run_token != run_token:
+            self.db.rollback()
+            return [], None
+
+        recipients = (
+            self.db.query(CampaignRecipient)
+            .filter(CampaignRecipient.campaign_id == campaign.id)
+            .order_by(CampaignRecipient.seq)
+            .limit(settings.CAMPAIGN_CHUNK_SIZE)
+            .all()
+        )
+        now = datetime.now()
+        campaign.last_chunk_at = now
+        if not recipients:
+            campaign.fanout_finished_at = now
+            self.db.commit()
+            logger.info(f"Campaign {campaign.id} fan-out finished: {campaign.created_count} messages")
+            return [], None
+
+        try:
+            subject_template, content_template, template_version = self._load_templates(campaign)
+        except CampaignError as e:
+            # 模板被删除：暂停任务等待处理，不丢弃剩余收件人
+            campaign.status = CampaignStatus.PAUSED
+            campaign.error_message = str(e)
+            self.db.commit()
+            logger.error(f"Campaign {campaign.id} paused: {e}")
+            return [], None
+        common = campaign.variables or {}
+
+        rendered = []
+        invalid = 0
+        for recipient in recipients:
+            variables = {**common, **(recipient.variables or {}), "email": recipient.email}
+            render_start = time.perf_counter()
+            try:
+                subject = subject_template.render(**variables) if subject_template else None
+                content = content_template.render(**variables)
+            except Exception as e:
+                invalid += 1
+                logger.warning(f"Campaign {campaign.id} skipped {recipient.email}: {e}")
+                continue
+            render_ms = round((time.perf_counter() - render_start) * 1000)
+            rendered.append((recipient, subject, content, render_ms))
+
+        message_ids = []
+        if rendered:
+            content_hashes = ContentStore(self.db).put_many([content for _, _, content, _ in rendered])
+            message_ids = self.db.execute(
+                insert(MessageRecord).returning(MessageRecord.id),
+                [
+                    {
+                        "channel": MessageChannel.EMAIL,
+                        "status": MessageStatus.PENDING,
+                        "to": recipient.email,
+                        "subject": subject,
+                        "content_hash": content_hash,
+                        "content_type": "html",
+                        "template_id": campaign.template_id,
+                        "template_version": template_version,
+                        "template_variables": recipient.variables,
+                        "request_id": generate_request_id(),
+                        "api_key_id": campaign.api_key_id,
+                        "campaign_id": campaign.id,
+                        "render_ms": render_ms,
+                    }
+                    for (recipient, subject, _, render_ms), content_hash in zip(rendered, content_hashes)
+                ]
+            ).scalars().all()
+
+        self.db.execute(
+            delete(CampaignRecipient).where(
+                CampaignRecipient.campaign_id == campaign.id,
+                CampaignRecipient.seq <= recipients[-1].seq
+            )
+        )
+        campaign.created_count += len(message_ids)
+        campaign.invalid_count += invalid
+        self.db.commit()
+
+        MESSAGE_CREATED.labels(channel=MessageChannel.EMAIL.value).inc(len(message_ids))
+        return message_ids, len(recipients) / campaign.rate_limit
+
+    def mark_queued(self, message_ids: List[int], queued_at: datetime) -> None:
+        """标记已投递到发送队列的消息（已标记的不覆盖）"""
+        self.db.execute(
+            update(MessageRecord)
+            .where(MessageRecord.id.in_(message_ids), MessageRecord.queued_at.is_(None))
+            .values(queued_at=queued_at)
+        )
+        self.db.commit()
+
+    def unqueued_message_ids(self, campaign: Campaign, created_before: datetime) -> List[int]:
+        """
+        已生成但未投递的消息（拆分后投递失败或进程退出），按campaign_id索引查询
+
+        Args:
+            campaign: 任务
+            created_before: 只返回该时间之前生成的消息，避免与正在投递的批次重复
+
+        Returns:
+            List[int]: 消息ID，最多CAMPAIGN_CHUNK_SIZE条
+        """
+        rows = (
+            self.db.query(MessageRecord.id)
+            .filter(
+                MessageRecord.campaign_id == campaign.id,
+                MessageRecord.status == MessageStatus.PENDING,
+                MessageRecord.queued_at.is_(None),
+                # 暂存的消息由延迟队列负责
+                MessageRecord.error_code.is_(None),
+                MessageRecord.created_at < created_before
+            )
+            .order_by(MessageRecord.id)
+            .limit(settings.CAMPAIGN_CHUNK_SIZE)
+            .all()
+        )
+        return [row.id for row in rows]
+
+    def counts(self, campaigns: List[Campaign]) -> Dict[int, Dict[str, int]]:
+        """
+        各任务的发送结果计数：优先读取Redis实时计数，不存在时使用数据库中最近一次同步的值
+
+        Args:
+            campaigns: 任务列表
+
+        Returns:
+            Dict[int, Dict]: 任务ID -> {success, failed, cancelled}
+        """
+        live = self.progress.get_many([campaign.id for campaign in campaigns]) if self.progress else {}
+        return {
+            campaign.id: live.get(campaign.id) or {
+                "success": campaign.success_count,
+                "failed": campaign.failed_count,
+                "cancelled": campaign.cancelled_count,
+            }
+            for campaign in campaigns
+        }
+
+    def recount(self, campaign: Campaign) -> Dict[str, int]:
+        """从消息表重新统计结果（仅在Redis计数丢失时使用，按campaign_id索引扫描）"""
+        rows = (
+            self.db.query(MessageRecord.status, MessageRecord.error_code, func.count(MessageRecord.id))
+            .filter(MessageRecord.campaign_id == campaign.id)
+            .group_by(MessageRecord.status, MessageRecord.error_code)
+            .all()
+        )
+        counts = dict.fromkeys(PROGRESS_FIELDS, 0)
+        for status, error_code, count in rows:
+            field = outcome_field(status, error_code)
+            if field:
+                counts[field] += count
+        return counts
+
+    def summary(self, campaign: Campaign, counts: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+        """
+        任务汇总（不扫描子消息）
+
+        Args:
+            campaign: 批量任务
+            counts: 已读取的结果计数（批量查询时传入）
+
+        Returns:
+            Dict: 任务信息和进度
+        """
+        counts = counts or self.counts([campaign])[campaign.id]
+        finished = counts["success"] + counts["failed"] + counts["cancelled"]
+        processed = campaign.created_count + campaign.invalid_count
+        return {
+            "id": campaign.id,
+            "name": campaign.name,
+            "status": campaign.status.value,
+            "template_code": campaign.template_code,
+            "template_version": campaign.template_version,
+            "rate_limit": campaign.rate_limit,
+            "total": campaign.total_count,
+            "created": campaign.created_count,
+            "invalid": campaign.invalid_count,
+            "remaining": max(campaign.total_count - processed, 0),
+            "in_flight": max(campaign.created_count - finished, 0),
+            **counts,
+            "progress": round(processed / campaign.total_count, 4) if campaign.total_count else 0,
+            "success_rate": round(counts["success"] / finished, 4) if finished else None,
+            "created_at": campaign.created_at,
+            "started_at": campaign.started_at,
+            "fanout_finished_at": campaign.fanout_finished_at,
+            "finished_at": campaign.finished_at,
+        }
+
+
+__all__ = ["CampaignService", "CampaignError", "RecipientParser", "RECIPIENT_FORMATS"]
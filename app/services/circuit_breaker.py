@@ -0,0 +1,226 @@
+"""
+邮箱账户熔断器
+按账户维护 closed/open/half_open 状态（Redis中共享）：
+  - closed: 统计最近窗口内的失败率，样本数和失败率同时达到阈值时熔断
+  - open: 冷却期内不参与选择，冷却结束后进入half_open
+  - half_open: 只放行有限次数的探测发送，全部成功则恢复，任一失败重新熔断
+"""
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.utils.redis_client import RedisClient
+
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+BREAKER_KEY_PREFIX = "smtp:breaker:"
+
+# 窗口按固定数量的时间桶统计，桶计数独立过期
+WINDOW_BUCKETS = 6
+
+# KEYS: 状态哈希, 当前桶, 窗口内全部桶
+# ARGV: 是否成功, 当前时间, 最小样本数, 失败率阈值, 探测次数, 桶过期时间
+# 返回 {记录后的状态, 是否发生状态转换}
+_RECORD_SCRIPT = """
+local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+local success = ARGV[1] == '1'
+if state == 'half_open' then
+    if success then
+        local passed = redis.call('HINCRBY', KEYS[1], 'probe_successes', 1)
+        if passed >= tonumber(ARGV[5]) then
+            redis.call('DEL', KEYS[1])
+            for i = 3, #KEYS do redis.call('DEL', KEYS[i]) end
+            return {'closed', 1}
+        end
+        return {'half_open', 0}
+    end
+    redis.call('HSET', KEYS[1], 'state', 'open', 'opened_at', ARGV[2], 'probes_issued', 0, 'probe_successes', 0,
+        'reason', 'probe failed')
+    return {'open', 1}
+end
+if state == 'open' then
+    return {'open', 0}
+end
+redis.call('HINCRBY', KEYS[2], success and 'ok' or 'fail', 1)
+redis.call('EXPIRE', KEYS[2], tonumber(ARGV[6]))
+local ok, fail = 0, 0
+for i = 3, #KEYS do
+    local counts = redis.call('HMGET', KEYS[i], 'ok', 'fail')
+    ok = ok + tonumber(counts[1] or '0')
+    fail = fail + tonumber(counts[2] or '0')
+end
+local total = ok + fail
+if total >= tonumber(ARGV[3]) and fail / total >= tonumber(ARGV[4]) then
+    redis.call('HSET', KEYS[1], 'state', 'open', 'opened_at', ARGV[2], 'probes_issued', 0, 'probe_successes', 0,
+        'reason', string.format('%d/%d failed', fail, total))
+    return {'open', 1}
+end
+return {'closed', 0}
+"""
+
+# KEYS: 状态哈希；ARGV: 当前时间, 冷却时间, 探测次数
+# 半开状态下超过冷却时间仍未得出结论（探测结果丢失），重新发放探测名额
+_ACQUIRE_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'state', 'opened_at', 'half_open_at', 'probes_issued')
+local now = tonumber(ARGV[1])
+local cooldown = tonumber(ARGV[2])
+if not state[1] or state[1] == 'closed' then
+    return 1
+end
+if state[1] == 'open' then
+    if now - tonumber(state[2] or '0') < cooldown then
+        return 0
+    end
+    redis.call('HSET', KEYS[1], 'state', 'half_open', 'half_open_at', now, 'probes_issued', 0, 'probe_successes', 0)
+elseif now - tonumber(state[3] or '0') >= cooldown then
+    redis.call('HSET', KEYS[1], 'half_open_at', now, 'probes_issued', 0, 'probe_successes', 0)
+end
+local issued = redis.call('HINCRBY', KEYS[1], 'probes_issued', 1)
+if issued > tonumber(ARGV[3]) then
+    redis.call('HINCRBY', KEYS[1], 'probes_issued', -1)
+    return 0
+end
+return 1
+"""
+
+
+def _state_key(account_id: int) -> str:
+    return f"{BREAKER_KEY_PREFIX}{account_id}"
+
+
+class AccountCircuitBreaker:
+    """邮箱账户熔断器（状态保存在Redis，各Worker共享）"""
+
+    def __init__(self, redis_client: RedisClient):
+        self.redis = redis_client
+        self.enabled = settings.CIRCUIT_BREAKER_ENABLED
+        self.bucket_seconds = max(settings.CIRCUIT_BREAKER_WINDOW_SECONDS // WINDOW_BUCKETS, 1)
+        self.cooldown = settings.CIRCUIT_BREAKER_OPEN_SECONDS
+        self.probes = settings.CIRCUIT_BREAKER_HALF_OPEN_PROBES
+        self._scripts: Dict[str, Any] = {}
+
+    def _script(self, name: str, source: str):
+        if name not in self._scripts:
+            self._scripts[name] = self.redis.client.register_script(source)
+        return self._scripts[name]
+
+    def _window_keys(self, account_id: int, now: float) -> List[str]:
+        """窗口内各时间桶的键（第一个为当前桶）"""
+        current = int(now // self.bucket_seconds)
+        return [f"{BREAKER_KEY_PREFIX}{account_id}:{bucket}" for bucket in range(current, current - WINDOW_BUCKETS, -1)]
+
+    def states(self, account_ids: Sequence[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        批量读取熔断状态（一次pipeline）
+
+        Args:
+            account_ids: 账户ID列表
+
+        Returns:
+            Dict[int, Dict]: 账户ID -> {state, opened_at, reason, probes_issued, probe_successes, selectable}
+        """
+        rows = self.redis.hgetall_many([_state_key(account_id) for account_id in account_ids])
+        now = time.time()
+        result = {}
+        for account_id, row in zip(account_ids, rows):
+            state = row.get("state") or STATE_CLOSED
+            opened_at = int(float(row["opened_at"])) if row.get("opened_at") else None
+            result[account_id] = {
+                "state": state,
+                "opened_at": opened_at,
+                "reason": row.get("reason"),
+                "probes_issued": int(row.get("probes_issued") or 0),
+                "probe_successes": int(row.get("probe_successes") or 0),
+                # open状态冷却结束后即可参与选择（由acquire转为half_open）
+                "selectable": state != STATE_OPEN or now - (opened_at or 0) >= self.cooldown,
+            }
+        return result
+
+    def selectable(self, account_ids: Sequence[int]) -> set:
+        """
+        可参与选择的账户（closed、半开或冷却已结束）
+
+        Args:
+            account_ids: 账户ID列表
+
+        Returns:
+            set: 可选账户ID
+        """
+        if not self.enabled or not account_ids:
+            return set(account_ids)
+        return {account_id for account_id, state in self.states(account_ids).items() if state["selectable"]}
+
+    def acquire(self, account_id: int) -> bool:
+        """
+        申请使用账户发送：closed直接放行，冷却结束的open转为half_open，half_open占用一个探测名额
+
+        Args:
+            account_id: 账户ID
+
+        Returns:
+            bool: 是否放行
+        """
+        if not self.enabled:
+            return True
+        try:
+            allowed = self._script("acquire", _ACQUIRE_SCRIPT)(
+                keys=[_state_key(account_id)],
+                args=[int(time.time()), self.cooldown, self.probes],
+            )
+            return bool(allowed)
+        except Exception as e:
+            # Redis不可用时不因熔断器阻断发送
+            logger.error(f"Circuit breaker acquire failed: account_id={account_id}, error={e}")
+            return True
+
+    def record(self, account_id: int, success: bool) -> Optional[str]:
+        """
+        记录一次发送结果并完成状态转换
+
+        Args:
+            account_id: 账户ID
+            success: 是否成功
+
+        Returns:
+            Optional[str]: 记录后的状态
+        """
+        if not self.enabled:
+            return None
+        now = time.time()
+        window = self._window_keys(account_id, now)
+        try:
+            state, changed = self._script("record", _RECORD_SCRIPT)(
+                keys=[_state_key(account_id), window[0], *window],
+                args=[
+                    1 if success else 0,
+                    int(now),
+                    settings.CIRCUIT_BREAKER_MIN_REQUESTS,
+                    settings.CIRCUIT_BREAKER_FAILURE_RATE,
+                    self.probes,
+                    self.bucket_seconds * (WINDOW_BUCKETS + 1),
+                ],
+            )
+        except Exception as e:
+            logger.error(f"Circuit breaker record failed: account_id={account_id}, error={e}")
+            return None
+        if changed:
+            log = logger.warning if state == STATE_OPEN else logger.info
+            log(f"Circuit {state} for email account {account_id}")
+        return state
+
+    def reset(self, account_id: int) -> None:
+        """手动恢复为closed并清空窗口计数"""
+        self.redis.delete(_state_key(account_id), *self._window_keys(account_id, time.time()))
+
+
+__all__ = [
+    "AccountCircuitBreaker",
+    "STATE_CLOSED",
+    "STATE_OPEN",
+    "STATE_HALF_OPEN",
+    "BREAKER_KEY_PREFIX",
+]
@@ -0,0 +1,219 @@
+"""
+消息内容存储服务
+按SHA-256对消息正文做内容寻址存储，支持zstd压缩与引用计数
+
+写入依赖 INSERT ... ON CONFLICT 合并引用计数，仅支持PostgreSQL（生产）和SQLite（测试）
+"""
+import hashlib
+from typing import Optional, Dict, Iterable, List
+from sqlalchemy.orm import Session
+from sqlalchemy import update, delete
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.models.message import MessageContent
+from app.core.config import settings
+from app.core.logger import logger
+from app.utils.cache import LRUCache
+
+try:
+    import zstandard
+except ImportError:  # zstd为可选依赖
+    zstandard = None
+
+
+# 进程内正文缓存（内容按哈希寻址、不可变，无需失效）
+_body_cache = LRUCache(maxsize=settings.MESSAGE_CONTENT_CACHE_SIZE)
+
+
+class ContentStore:
+    """消息内容存储"""
+
+    def __init__(self, db: Optional[Session]):
+        self.db = db
+
+    @staticmethod
+    def compute_hash(content: str) -> str:
+        """
+        计算内容哈希
+
+        Args:
+            content: 原文
+
+        Returns:
+            str: SHA-256十六进制字符串
+        """
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def put(self, content: str) -> str:
+        """
+        写入内容并增加引用计数（不提交事务，由调用方提交）
+
+        Args:
+            content: 原文
+
+        Returns:
+            str: 内容哈希
+        """
+        content_hash = self.compute_hash(content)
+        raw = content.encode("utf-8")
+        body, compression = self._encode(raw)
+
+        stmt = self._insert(MessageContent.__table__).values(
+            content_hash=content_hash,
+            body=body,
+            compression=compression,
+            size=len(raw),
+            ref_count=1,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["content_hash"],
+            set_={"ref_count": MessageContent.__table__.c.ref_count + 1},
+        )
+        self.db.execute(stmt)
+
+        _body_cache.set(content_hash, content)
+        return content_hash
+
+    def put_many(self, contents: List[str]) -> List[str]:
+        """
+        批量写入内容（一条多行upsert，相同内容合并计数；不提交事务）
+
+        行按哈希排序后写入：并发的批次含有相同内容时按相同顺序加锁，避免相互死锁
+
+        Args:
+            contents: 原文列表
+
+        Returns:
+            List[str]: 与输入一一对应的内容哈希
+        """
+        hashes = [self.compute_hash(content) for content in contents]
+        unique: Dict[str, str] = {}
+        refs: Dict[str, int] = {}
+        for content_hash, content in zip(hashes, contents):
+            unique.setdefault(content_hash, content)
+            refs[content_hash] = refs.get(content_hash, 0) + 1
+        if not unique:
+            return hashes
+
+        rows = []
+        for content_hash, content in sorted(unique.items()):
+            raw = content.encode("utf-8")
+            body, compression = self._encode(raw)
+            rows.append({
+                "content_hash": content_hash,
+                "body": body,
+                "compression": compression,
+                "size": len(raw),
+                "ref_count": refs[content_hash],
+            })
+
+        table = MessageContent.__table__
+        stmt = self._insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["content_hash"],
+            set_={"ref_count": table.c.ref_count + stmt.excluded.ref_count},
+        )
+        self.db.execute(stmt)
+
+        for content_hash, content in unique.items():
+            _body_cache.set(content_hash, content)
+        return hashes
+
+    def get(self, content_hash: str) -> Optional[str]:
+        """
+        根据哈希获取原文（优先读取缓存）
+
+        Args:
+            content_hash: 内容哈希
+
+        Returns:
+            Optional[str]: 原文，不存在返回None
+        """
+        return self.get_many([content_hash]).get(content_hash)
+
+    def get_many(self, content_hashes: Iterable[str]) -> Dict[str, str]:
+        """
+        批量获取原文，未命中缓存的部分用一次IN查询补齐
+
+        Args:
+            content_hashes: 内容哈希列表
+
+        Returns:
+            Dict[str, str]: 哈希 -> 原文
+        """
+        wanted = {h for h in content_hashes if h}
+        result = _body_cache.get_many(wanted)
+        missing = wanted - result.keys()
+
+        if missing and self.db is not None:
+            rows = (
+                self.db.query(
+                    MessageContent.content_hash,
+                    MessageContent.body,
+                    MessageContent.compression,
+                )
+                .filter(MessageContent.content_hash.in_(missing))
+                .all()
+            )
+            for row in rows:
+                content = self._decode(row.body, row.compression)
+                _body_cache.set(row.content_hash, content)
+                result[row.content_hash] = content
+
+        return result
+
+    def release(self, content_hash: str) -> None:
+        """
+        减少引用计数，引用归零时删除内容（不提交事务）
+
+        Args:
+            content_hash: 内容哈希
+        """
+        table = MessageContent.__table__
+        self.db.execute(
+            update(table)
+            .where(table.c.content_hash == content_hash)
+            .values(ref_count=table.c.ref_count - 1)
+        )
+        result = self.db.execute(
+            delete(table)
+            .where(table.c.content_hash == content_hash, table.c.ref_count <= 0)
+        )
+        if result.rowcount:
+            _body_cache.delete(content_hash)
+            logger.debug(f"Released message content {content_hash[:12]}")
+
+    def _insert(self, table):
+        """按数据库方言构造支持 ON CONFLICT 的INSERT"""
+        dialect = self.db.get_bind().dialect.name
+        if dialect == "postgresql":
+            return postgresql.insert(table)
+        if dialect == "sqlite":
+            return sqlite.insert(table)
+        raise NotImplementedError(f"ContentStore does not support the {dialect} dialect")
+
+    @staticmethod
+    def _encode(raw: bytes) -> tuple[bytes, str]:
+        """按配置压缩内容"""
+        if (
+            settings.MESSAGE_CONTENT_COMPRESSION == "zstd"
+            and len(raw) >= settings.MESSAGE_CONTENT_COMPRESS_MIN_SIZE
+        ):
+            if zstandard is None:
+                logger.warning("zstandard not installed, storing message content uncompressed")
+            else:
+                compressor = zstandard.ZstdCompressor(level=settings.MESSAGE_CONTENT_ZSTD_LEVEL)
+                return compressor.compress(raw), "zstd"
+        return raw, "none"
+
+    @staticmethod
+    def _decode(body: bytes, compression: str) -> str:
+        """解压内容"""
+        if compression == "zstd":
+            if zstandard is None:
+                raise RuntimeError("zstandard is required to read zstd-compressed message content")
+            body = zstandard.ZstdDecompressor().decompress(body)
+        return bytes(body).decode("utf-8")
+
+
+__all__ = ["ContentStore"]
@@ -0,0 +1,137 @@
+"""
+SMTP凭证缓存
+Worker进程内缓存解密后的SMTP密码，避免每次发送都执行Fernet解密
+"""
+import time
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.security import decrypt_data
+from app.models.email import EmailAccount
+from app.utils.cache import LRUCache
+from app.utils.redis_client import ChannelListener
+
+
+INVALIDATION_CHANNEL = "smtp:credentials:invalidate"
+
+
+class CredentialError(ValueError):
+    """SMTP密码解密失败（账户配置问题，发送时按账户侧错误换账户重发）"""
+
+
+class SMTPCredentialCache:
+    """
+    解密后的SMTP密码缓存（仅保存在进程内存中）
+
+    以(账户ID, updated_at)为键，同时校验密文：发送计数等字段的更新会刷新updated_at，
+    因此键未命中时再比较密文，密文未变则沿用已解密的密码并换成新键，不必重新解密。
+    """
+
+    def __init__(self, maxsize: int, ttl: int):
+        self.ttl = ttl
+        self._cache = LRUCache(maxsize=maxsize)
+        # 账户ID -> 当前缓存键
+        self._keys: dict = {}
+        self._listener = ChannelListener(INVALIDATION_CHANNEL, self._on_invalidation, on_reset=self.clear)
+
+    @staticmethod
+    def _key(account: EmailAccount) -> Tuple[int, Optional[datetime]]:
+        return account.id, account.updated_at
+
+    def get_password(self, account: EmailAccount) -> str:
+        """
+        获取账户的明文SMTP密码
+
+        Args:
+            account: 邮箱账户
+
+        Returns:
+            str: 明文密码
+
+        Raises:
+            CredentialError: 密码解密失败
+        """
+        key = self._key(account)
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] == account.smtp_password:
+            return entry[1]
+
+        previous_key = self._keys.get(account.id)
+        if entry is None and previous_key is not None and previous_key != key:
+            entry = self._cache.get(previous_key)
+            self._cache.delete(previous_key)
+
+        if entry is not None and entry[0] == account.smtp_password:
+            # 密文未变，沿用原有过期时间，保证明文驻留时长不超过TTL
+            _, password, expires_at = entry
+        else:
+            try:
+                password = decrypt_data(account.smtp_password)
+            except Exception as e:
+                logger.error(f"Failed to decrypt SMTP password for {account.email}: {str(e)}")
+                raise CredentialError("Invalid SMTP password encryption")
+            expires_at = time.monotonic() + self.ttl
+
+        self._listener.start()
+        self._cache.set(key, (account.smtp_password, password, expires_at), ttl=expires_at - time.monotonic())
+        self._keys[account.id] = key
+        return password
+
+    def warm(self, db: Session) -> int:
+        """
+        预热：解密所有启用账户的密码
+
+        Args:
+            db: 数据库会话
+
+        Returns:
+            int: 预热的账户数量
+        """
+        count = 0
+        accounts = db.query(EmailAccount).filter(EmailAccount.is_active == True).all()
+        for account in accounts:
+            try:
+                self.get_password(account)
+                count += 1
+            except ValueError:
+                continue
+
+        logger.info(f"SMTP credential cache warmed with {count} accounts")
+        return count
+
+    def invalidate_local(self, account_id: int) -> None:
+        """失效本进程中某个账户的缓存"""
+        key = self._keys.pop(account_id, None)
+        if key is not None:
+            self._cache.delete(key)
+
+    def invalidate(self, account_id: int) -> None:
+        """
+        失效某个账户的缓存，并通知所有Worker进程
+
+        Args:
+            account_id: 邮箱账户ID
+        """
+        self.invalidate_local(account_id)
+        self._listener.publish({"id": account_id})
+
+    def clear(self) -> None:
+        """清空缓存"""
+        self._cache.clear()
+        self._keys.clear()
+
+    def _on_invalidation(self, data: dict) -> None:
+        self.invalidate_local(int(data["id"]))
+
+
+smtp_credential_cache = SMTPCredentialCache(
+    maxsize=settings.SMTP_CREDENTIAL_CACHE_SIZE,
+    ttl=settings.SMTP_CREDENTIAL_CACHE_TTL,
+)
+
+
+__all__ = ["SMTPCredentialCache", "CredentialError", "smtp_credential_cache"]
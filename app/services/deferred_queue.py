@@ -0,0 +1,119 @@
+"""
+延迟发送队列
+所有发件账户都没有可用额度时，消息不再消耗重试次数，而是暂存在Redis有序集合中
+（score为消息创建时间，先创建的先发送），待配额恢复（滚动窗口释放、每日重置、新增账户）后按容量放回发送队列
+"""
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from app.core.logger import logger
+from app.utils.redis_client import RedisClient
+
+
+DEFERRED_KEY = "msg:deferred"
+# 暂存消息的错误码（状态保持PENDING），释放时清除；也用于从数据库补回Redis中丢失的暂存消息
+DEFERRED_ERROR_CODE = "NO_ACCOUNT_DEFERRED"
+
+# KEYS: 延迟集合；ARGV: 数量
+# 原子取出score最小的一批消息（多个释放任务并发时不会重复投递）
+_POP_SCRIPT = """
+local members = redis.call('ZRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+if #members > 0 then
+    redis.call('ZREM', KEYS[1], unpack(members))
+end
+return members
+"""
+
+
+class DeferredMessageQueue:
+    """延迟发送队列（Redis有序集合）"""
+
+    def __init__(self, redis_client: RedisClient):
+        self.redis = redis_client
+        self._pop = None
+
+    def park(self, message_id: int, created_at: Optional[datetime] = None) -> bool:
+        """
+        暂存消息（已在队列中时保持原有顺序）
+
+        Args:
+            message_id: 消息ID
+            created_at: 消息创建时间，决定释放顺序
+
+        Returns:
+            bool: 是否写入成功
+        """
+        score = created_at.timestamp() if created_at else time.time()
+        try:
+            self.redis.client.zadd(DEFERRED_KEY, {str(message_id): score}, nx=True)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to defer message {message_id}: {e}")
+            return False
+
+    def park_many(self, messages: dict) -> int:
+        """
+        批量暂存消息
+
+        Args:
+            messages: 消息ID -> 创建时间
+
+        Returns:
+            int: 新加入的数量
+        """
+        if not messages:
+            return 0
+        try:
+            return self.redis.client.zadd(
+                DEFERRED_KEY,
+                {str(message_id): created_at.timestamp() for message_id, created_at in messages.items()},
+                nx=True,
+            )
+        except Exception as e:
+            logger.error(f"Failed to defer {len(messages)} messages: {e}")
+            return 0
+
+    def pop(self, count: int) -> List[int]:
+        """
+        取出最早暂存的一批消息
+
+        Args:
+            count: 数量
+
+        Returns:
+            List[int]: 消息ID（按创建时间先后）
+        """
+        if count <= 0:
+            return []
+        if self._pop is None:
+            self._pop = self.redis.client.register_script(_POP_SCRIPT)
+        return [int(member) for member in self._pop(keys=[DEFERRED_KEY], args=[count])]
+
+    def remove(self, message_id: int) -> None:
+        """从延迟队列移除（消息被删除时调用）"""
+        try:
+            self.redis.client.zrem(DEFERRED_KEY, str(message_id))
+        except Exception as e:
+            logger.error(f"Failed to remove deferred message {message_id}: {e}")
+
+    def size(self) -> dict:
+        """
+        队列大小
+
+        Returns:
+            dict: {deferred: 暂存数量, oldest_seconds: 最早一条已等待的秒数}
+        """
+        try:
+            pipe = self.redis.client.pipeline(transaction=False)
+            pipe.zcard(DEFERRED_KEY)
+            pipe.zrange(DEFERRED_KEY, 0, 0, withscores=True)
+            deferred, oldest = pipe.execute()
+            oldest_seconds = int(time.time() - oldest[0][1]) if oldest else None
+            return {"deferred": deferred, "oldest_seconds": oldest_seconds}
+        except Exception as e:
+            logger.error(f"Failed to read deferred queue size: {e}")
+            return {"deferred": None, "oldest_seconds": None}
+
+
+__all__ = ["DeferredMessageQueue", "DEFERRED_KEY", "DEFERRED_ERROR_CODE"]
@@ -2,52 +2,123 @@
 邮件发送服务
 管理邮箱池，实现邮件发送逻辑
 """
+import time
 import aiosmtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
-from typing import Optional, List
+from typing import Optional, List, Dict, Tuple
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 
 from app.models.email import EmailAccount
 from app.core.logger import logger
-from app.core.security import decrypt_data
+from app.core.metrics import EMAIL_SENT, EMAIL_ACCOUNT_SENT, SMTP_PHASE_LATENCY
+from app.core.tracing import tracer, SPAN_KIND_CLIENT
+from app.services.account_health import AccountHealthTracker
+from app.services.account_quota import AccountQuota
+from app.services.circuit_breaker import AccountCircuitBreaker
+from app.services.credential_cache import smtp_credential_cache
+from app.services.smtp_errors import NO_ACCOUNT, TRANSIENT_ACCOUNT, classify_smtp_error
 from app.core.config import settings
+from app.utils.redis_client import redis_client
 
 
 class EmailPoolManager:
     """邮箱池管理器"""
     
-    def __init__(self, db: Session):
+    def __init__(
+        self,
+        db: Session,
+        health: Optional[AccountHealthTracker] = None,
+        breaker: Optional[AccountCircuitBreaker] = None,
+        quota: Optional[AccountQuota] = None
+    ):
         self.db = db
+        self.health = health
+        self.breaker = breaker if breaker is not None and breaker.enabled else None
+        self.quota = quota if quota is not None and quota.enabled else None
     
-    def get_available_account(self) -> Optional[EmailAccount]:
+    def get_available_account(self, exclude: Optional[List[int]] = None) -> Optional[EmailAccount]:
         """
         获取可用的邮箱账户
-        按照优先级和可用性选择
+        先取最高优先级档，档内按账户健康度（EWMA延迟和错误率）选择；
+        未提供健康度时选择今日发送量最少的账户。
+        启用熔断器时跳过熔断中的账户，否则跳过连续失败5次的账户；
+        启用滚动配额时按最近24小时的发送量（及匀速余量）判断额度并在返回前占用一次配额，
+        否则按daily_sent_count判断
+        
+        Args:
+            exclude: 排除的账户ID（本次任务内已失败的账户）
         
         Returns:
             Optional[EmailAccount]: 可用的邮箱账户，如果没有返回None
         """
-        # 查询可用的邮箱账户
+        accounts = self._candidate_accounts(exclude)
+        if self.quota is not None:
+            accounts = self.quota.available(accounts)
+        
+        while accounts:
+            account = self.health.choose(accounts) if self.health is not None else accounts[0]
+            accounts.remove(account)
+            # 配额被其他Worker用尽，或半开账户的探测名额已被占满时换下一个
+            if self.quota is not None and not self.quota.try_consume(account):
+                continue
+            if self.breaker is not None and not self.breaker.acquire(account.id):
+                if self.quota is not None:
+                    self.quota.release(account)
+                continue
+            return account
+        
+        logger.warning("No available email accounts")
+        return None
+    
+    def release_quota(self, account: EmailAccount) -> None:
+        """退还get_available_account占用的配额（邮件未进入投递时调用）"""
+        if self.quota is not None:
+            self.quota.release(account)
+    
+    def _candidate_accounts(self, exclude: Optional[List[int]] = None) -> List[EmailAccount]:
+        """查询启用且未熔断的账户（未启用滚动配额时同时按daily_sent_count过滤）"""
+        filters = [EmailAccount.is_active == True]
+        if self.quota is None:
+            filters.append(EmailAccount.daily_sent_count < EmailAccount.daily_limit)
+        if self.breaker is None:
+            filters.append(EmailAccount.failure_count < 5)
+        if exclude:
+            filters.append(EmailAccount.id.notin_(exclude))
+        
         accounts = (
             self.db.query(EmailAccount)
-            .filter(
-                EmailAccount.is_active == True,
-                EmailAccount.daily_sent_count < EmailAccount.daily_limit,
-                EmailAccount.failure_count < 5
-            )
+            .filter(*filters)
             .order_by(EmailAccount.priority.desc(), EmailAccount.daily_sent_count.asc())
             .all()
         )
         
-        if not accounts:
-            logger.warning("No available email accounts")
-            return None
+        if self.breaker is not None and accounts:
+            selectable = self.breaker.selectable([account.id for account in accounts])
+            accounts = [account for account in accounts if account.id in selectable]
+        return accounts
+    
+    def available_capacity(self) -> int:
+        """
+        当前可立即发送的邮件数（各可用账户剩余额度之和，启用匀速时取匀速窗口余量）
+        
+        Returns:
+            int: 可发送数量
+        """
+        accounts = self._candidate_accounts()
+        if self.quota is None:
+            return sum(max(account.daily_limit - account.daily_sent_count, 0) for account in accounts)
         
-        return accounts[0]
+        capacity = 0
+        for usage in self.quota.usage(accounts).values():
+            remaining = usage["remaining"]
+            if usage["pace_limit"]:
+                remaining = min(remaining, max(usage["pace_limit"] - usage["paced"], 0))
+            capacity += remaining
+        return capacity
     
     def reset_daily_counts(self) -> int:
         """
@@ -99,18 +170,82 @@ class EmailSender:
     
     def __init__(self, account: EmailAccount):
         self.account = account
-        self._password = None
+        # 最近一次发送的SMTP各阶段耗时（秒）
+        self.phase_timings: Dict[str, float] = {}
     
     @property
     def smtp_password(self) -> str:
-        """解密SMTP密码"""
-        if self._password is None:
-            try:
-                self._password = decrypt_data(self.account.smtp_password)
-            except Exception as e:
-                logger.error(f"Failed to decrypt SMTP password for {self.account.email}: {str(e)}")
-                raise ValueError("Invalid SMTP password encryption")
-        return self._password
+        """解密SMTP密码（经进程内凭证缓存）"""
+        return smtp_credential_cache.get_password(self.account)
+    
+    def _observe_phase(self, phase: str, started: float) -> float:
+        """记录SMTP阶段耗时（指标、子Span和phase_timings），返回下一阶段的开始时间"""
+        now = time.perf_counter()
+        self.phase_timings[phase] = now - started
+        SMTP_PHASE_LATENCY.labels(phase=phase).observe(now - started)
+        tracer.record_span(f"smtp.{phase}", now - started)
+        return now
+    
+    def _build_message(
+        self,
+        to: List[str],
+        subject: str,
+        content: str,
+        cc: Optional[List[str]] = None,
+        bcc: Optional[List[str]] = None,
+        content_type: str = "html",
+        attachments: Optional[List[dict]] = None
+    ) -> Tuple[str, List[str]]:
+        """
+        构建MIME邮件
+        
+        Args:
+            同 send
+            
+        Returns:
+            tuple: (邮件原文, 收件人列表（包含to, cc, bcc）)
+        """
+        # 创建邮件对象
+        if attachments:
+            message = MIMEMultipart()
+        else:
+            message = MIMEText(content, content_type, "utf-8")
+        
+        # 设置邮件头
+        # QQ邮箱对From字段格式要求严格，简化为只使用邮箱地址
+        message["From"] = self.account.email
+        message["To"] = ", ".join(to)
+        message["Subject"] = subject
+        
+        if cc:
+            message["Cc"] = ", ".join(cc)
+        if bcc:
+            message["Bcc"] = ", ".join(bcc)
+        
+        # 如果有附件，需要添加正文部分
+        if attachments:
+            text_part = MIMEText(content, content_type, "utf-8")
+            message.attach(text_part)
+            
+            # 添加附件
+            for attachment in attachments:
+                part = MIMEBase("application", "octet-stream")
+                part.set_payload(attachment["content"])
+                encoders.encode_base64(part)
+                part.add_header(
+                    "Content-Disposition",
+                    f'attachment; filename="{attachment["filename"]}"'
+                )
+                message.attach(part)
+        
+        # 准备收件人列表（包含to, cc, bcc）
+        recipients = to.copy()
+        if cc:
+            recipients.extend(cc)
+        if bcc:
+            recipients.extend(bcc)
+        
+        return message.as_string(), recipients
     
     async def send(
         self,
@@ -135,66 +270,41 @@ class EmailSender:
             attachments: 附件列表 [{"filename": "xx", "content": bytes}]
             
         Returns:
-            bool: 是否发送成功
+            bool: 发送成功返回True，失败时抛出异常（由smtp_errors分类）
         """
         try:
-            # 创建邮件对象
-            if attachments:
-                message = MIMEMultipart()
-            else:
-                message = MIMEText(content, content_type, "utf-8")
-            
-            # 设置邮件头
-            # QQ邮箱对From字段格式要求严格，简化为只使用邮箱地址
-            message["From"] = self.account.email
-            message["To"] = ", ".join(to)
-            message["Subject"] = subject
-            
-            if cc:
-                message["Cc"] = ", ".join(cc)
-            if bcc:
-                message["Bcc"] = ", ".join(bcc)
+            with tracer.span("smtp.build"):
+                raw_message, recipients = self._build_message(
+                    to, subject, content, cc, bcc, content_type, attachments
+                )
             
-            # 如果有附件，需要添加正文部分
-            if attachments:
-                text_part = MIMEText(content, content_type, "utf-8")
-                message.attach(text_part)
-                
-                # 添加附件
-                for attachment in attachments:
-                    part = MIMEBase("application", "octet-stream")
-                    part.set_payload(attachment["content"])
-                    encoders.encode_base64(part)
-                    part.add_header(
-                        "Content-Disposition",
-                        f'attachment; filename="{attachment["filename"]}"'
+            # 发送邮件（分阶段记录耗时：连接、登录、投递）
+            self.phase_timings = {}
+            with tracer.span(
+                "smtp.send",
+                SPAN_KIND_CLIENT,
+                {"account": self.account.email, "smtp_host": self.account.smtp_host, "recipients": len(recipients)},
+            ):
+                phase_start = time.perf_counter()
+                async with aiosmtplib.SMTP(
+                    hostname=self.account.smtp_host,
+                    port=self.account.smtp_port,
+                    use_tls=self.account.use_tls,
+                    start_tls=False,  # 465端口使用implicit SSL，不需要STARTTLS
+                    timeout=settings.EMAIL_TIMEOUT
+                ) as smtp:
+                    phase_start = self._observe_phase("connect", phase_start)
+                    await smtp.login(self.account.smtp_username, self.smtp_password)
+                    phase_start = self._observe_phase("login", phase_start)
+                    # 使用sendmail方法，显式指定发件人和收件人列表
+                    await smtp.sendmail(
+                        self.account.email,
+                        recipients,
+                        raw_message
                     )
-                    message.attach(part)
-            
-            # 准备收件人列表（包含to, cc, bcc）
-            recipients = to.copy()
-            if cc:
-                recipients.extend(cc)
-            if bcc:
-                recipients.extend(bcc)
-            
-            # 发送邮件
-            async with aiosmtplib.SMTP(
-                hostname=self.account.smtp_host,
-                port=self.account.smtp_port,
-                use_tls=self.account.use_tls,
-                start_tls=False,  # 465端口使用implicit SSL，不需要STARTTLS
-                timeout=settings.EMAIL_TIMEOUT
-            ) as smtp:
-                await smtp.login(self.account.smtp_username, self.smtp_password)
-                # 使用sendmail方法，显式指定发件人和收件人列表
-                await smtp.sendmail(
-                    self.account.email,
-                    recipients,
-                    message.as_string()
-                )
+                    self._observe_phase("data", phase_start)
             
-            logger.info(f"Email sent successfully to {to} from {self.account.email}")
+            logger.debug(f"Email sent successfully to {to} from {self.account.email}")
             return True
             
         except aiosmtplib.SMTPException as e:
@@ -205,6 +315,12 @@ class EmailSender:
             raise
 
 
+def _record_send_metrics(account: EmailAccount, status: str) -> None:
+    """记录单次发送结果指标（账户标签取自邮箱池，数量有界）"""
+    EMAIL_SENT.labels(status=status).inc()
+    EMAIL_ACCOUNT_SENT.labels(account=account.email, status=status).inc()
+
+
 async def send_email(
     db: Session,
     to: List[str],
@@ -213,11 +329,13 @@ async def send_email(
     cc: Optional[List[str]] = None,
     bcc: Optional[List[str]] = None,
     content_type: str = "html",
-    attachments: Optional[List[dict]] = None
-) -> tuple[bool, Optional[str], Optional[str]]:
+    attachments: Optional[List[dict]] = None,
+    timings: Optional[Dict[str, float]] = None
+) -> tuple[bool, Optional[str], Optional[str], Optional[str]]:
     """
     发送邮件（高级接口）
-    自动选择可用邮箱账户
+    自动选择可用邮箱账户；账户侧的暂时性错误（连接、认证、421等）换下一个账户重发，
+    最多尝试EMAIL_FAILOVER_MAX_ACCOUNTS个账户
     
     Args:
         db: 数据库会话
@@ -228,44 +346,92 @@ async def send_email(
         bcc: 密送列表
         content_type: 内容类型
         attachments: 附件列表
+        timings: 传入字典时写入SMTP各阶段耗时（秒）
         
     Returns:
-        tuple: (是否成功, 发送者邮箱, 错误信息)
+        tuple: (是否成功, 发送者邮箱, 错误信息, 错误类别)，错误类别见smtp_errors；
+            一个账户都没有取到时错误类别为NO_ACCOUNT
     """
-    pool_manager = EmailPoolManager(db)
-    account = pool_manager.get_available_account()
-    
-    if not account:
-        error_msg = "No available email account"
-        logger.error(error_msg)
-        return False, None, error_msg
+    pool_manager = EmailPoolManager(db, account_health, account_breaker, account_quota)
+    tried: List[int] = []
+    sender_email = error_msg = None
+    error_class = TRANSIENT_ACCOUNT
     
-    sender = EmailSender(account)
-    
-    try:
-        success = await sender.send(
-            to=to,
-            subject=subject,
-            content=content,
-            cc=cc,
-            bcc=bcc,
-            content_type=content_type,
-            attachments=attachments
-        )
+    # 账户侧的暂时性错误在本次任务内换账户重发，其他结果直接返回
+    for _ in range(max(settings.EMAIL_FAILOVER_MAX_ACCOUNTS, 1)):
+        with tracer.span("account.pick") as span:
+            account = pool_manager.get_available_account(exclude=tried)
+            if span is not None and account:
+                span.set_attribute("account", account.email)
         
-        if success:
-            pool_manager.record_success(account)
-            return True, account.email, None
-        else:
-            error_msg = "Send failed with unknown reason"
-            pool_manager.record_failure(account, error_msg)
-            return False, account.email, error_msg
+        if not account:
+            if not tried:
+                error_msg = "No available email account"
+                logger.warning(error_msg)
+                EMAIL_SENT.labels(status="no_account").inc()
+                return False, None, error_msg, NO_ACCOUNT
+            return False, sender_email, error_msg, error_class
+        
+        tried.append(account.id)
+        sender_email = account.email
+        sender = EmailSender(account)
+        send_start = time.perf_counter()
+        
+        try:
+            await sender.send(
+                to=to,
+                subject=subject,
+                content=content,
+                cc=cc,
+                bcc=bcc,
+                content_type=content_type,
+                attachments=attachments
+            )
+        except Exception as e:
+            error_msg = str(e)
+            error_class, reply_code = classify_smtp_error(e)
+            if timings is not None:
+                timings.update(sender.phase_timings)
+            _record_send_metrics(account, "failed")
+            
+            if error_class != TRANSIENT_ACCOUNT:
+                # 收件方拒收不是账户的问题，不计入账户健康度和熔断
+                account_health.record(account.id, True, time.perf_counter() - send_start)
+                account_breaker.record(account.id, True)
+                return False, account.email, error_msg, error_class
             
-    except Exception as e:
-        error_msg = str(e)
-        pool_manager.record_failure(account, error_msg)
-        return False, account.email, error_msg
+            account_health.record(account.id, False)
+            account_breaker.record(account.id, False)
+            pool_manager.record_failure(account, error_msg)
+            if "login" not in sender.phase_timings:
+                # 连接或登录阶段失败，邮件未进入投递，退还选账户时占用的配额
+                pool_manager.release_quota(account)
+            logger.warning(f"Failing over from {account.email} after SMTP error {reply_code}: {error_msg}")
+            continue
+        
+        if timings is not None:
+            timings.update(sender.phase_timings)
+        account_health.record(account.id, True, time.perf_counter() - send_start)
+        account_breaker.record(account.id, True)
+        pool_manager.record_success(account)
+        _record_send_metrics(account, "success")
+        return True, account.email, None, None
+    
+    return False, sender_email, error_msg, error_class
+
+
+# Worker内共享的账户健康度、熔断器和滚动配额（数据在Redis中，跨进程共享）
+account_health = AccountHealthTracker(redis_client)
+account_breaker = AccountCircuitBreaker(redis_client)
+account_quota = AccountQuota(redis_client)
 
 
-__all__ = ["EmailPoolManager", "EmailSender", "send_email"]
+__all__ = [
+    "EmailPoolManager",
+    "EmailSender",
+    "send_email",
+    "account_health",
+    "account_breaker",
+    "account_quota",
+]
 
@@ -7,12 +7,17 @@ import json
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import desc, func
 
 from app.models.message import MessageRecord, MessageStatus, MessageChannel
 from app.core.logger import logger
+from app.core.metrics import MESSAGE_CREATED, MESSAGE_STATUS_CHANGES
 from app.core.security import generate_request_id
 from app.utils.redis_client import RedisClient
+from app.services.campaign_progress import CampaignProgress
+from app.services.content_store import ContentStore
+from app.services.status_cache import MessageStatusCache
+from app.services.status_events import publish_status_event
 
 
 class MessageService:
@@ -21,6 +26,8 @@ class MessageService:
     def __init__(self, db: Session, redis_client: Optional[RedisClient] = None):
         self.db = db
         self.redis = redis_client
+        self.status_cache = MessageStatusCache(redis_client) if redis_client else None
+        self.campaign_progress = CampaignProgress(redis_client) if redis_client else None
     
     def create_message(
         self,
@@ -36,7 +43,10 @@ class MessageService:
         template_variables: Optional[Dict[str, Any]] = None,
         idempotency_key: Optional[str] = None,
         request_id: Optional[str] = None,
-        extra_data: Optional[Dict[str, Any]] = None
+        extra_data: Optional[Dict[str, Any]] = None,
+        api_key_id: Optional[int] = None,
+        render_ms: Optional[int] = None,
+        send_at: Optional[datetime] = None
     ) -> MessageRecord:
         """
         创建消息记录
@@ -55,10 +65,16 @@ class MessageService:
             idempotency_key: 幂等性键
             request_id: 请求ID
             extra_data: 元数据
+            api_key_id: 调用方API Key ID
+            render_ms: 模板渲染耗时（毫秒）
+            send_at: 计划发送时间（定时消息在到期投递时才记录queued_at）
             
         Returns:
             MessageRecord: 消息记录
         """
+        # 正文按哈希去重存储，消息记录只保存哈希
+        content_hash = ContentStore(self.db).put(content)
+        
         message = MessageRecord(
             channel=channel,
             status=MessageStatus.PENDING,
@@ -66,21 +82,28 @@ class MessageService:
             cc=cc,
             bcc=bcc,
             subject=subject,
-            content=content,
+            content_hash=content_hash,
             content_type=content_type,
             template_id=template_id,
             template_version=template_version,
             template_variables=template_variables,
             idempotency_key=idempotency_key,
             request_id=request_id or generate_request_id(),
-            extra_data=extra_data
+            extra_data=extra_data,
+            api_key_id=api_key_id,
+            render_ms=render_ms,
+            send_at=send_at,
+            queued_at=None if send_at else datetime.now()
         )
         
         self.db.add(message)
         self.db.commit()
         self.db.refresh(message)
+        self._on_status_change(message)
         
-        logger.info(f"Created message record: id={message.id}, channel={channel}, to={to}")
+        # 成功路径以计数器代替info日志
+        MESSAGE_CREATED.labels(channel=message.channel.value).inc()
+        logger.debug(f"Created message record: id={message.id}, channel={channel}, to={to}")
         return message
     
     def update_message_status(
@@ -89,28 +112,45 @@ class MessageService:
         status: MessageStatus,
         sender: Optional[str] = None,
         error_code: Optional[str] = None,
-        error_message: Optional[str] = None
+        error_message: Optional[str] = None,
+        smtp_timings: Optional[Dict[str, float]] = None
     ) -> MessageRecord:
         """
         更新消息状态
         
+        进入SENDING时记录开始处理时间和排队耗时（仅首次），进入SUCCESS时记录发送时间和端到端耗时
+        
         Args:
             message: 消息记录
             status: 新状态
             sender: 发送者
             error_code: 错误码
             error_message: 错误信息
+            smtp_timings: SMTP各阶段耗时（秒）{"connect": .., "login": .., "data": ..}
             
         Returns:
             MessageRecord: 更新后的消息记录
         """
         message.status = status
+        now = datetime.now()
         
         if sender:
             message.sender = sender
         
+        if status == MessageStatus.SENDING and message.started_at is None:
+            message.started_at = now
+            message.queue_wait_ms = _elapsed_ms(message.queued_at, now)
+        
         if status == MessageStatus.SUCCESS:
-            message.sent_at = datetime.utcnow().isoformat()
+            message.sent_at = now
+            message.delivery_ms = _elapsed_ms(message.queued_at, now)
+        
+        if smtp_timings:
+            message.smtp_connect_ms = round(
+                (smtp_timings.get("connect", 0) + smtp_timings.get("login", 0)) * 1000
+            )
+            if "data" in smtp_timings:
+                message.smtp_transmit_ms = round(smtp_timings["data"] * 1000)
         
         if error_code:
             message.error_code = error_code
@@ -119,10 +159,72 @@ class MessageService:
             message.error_message = error_message
         
         self.db.commit()
+        self._on_status_change(message)
+        if message.campaign_id and self.campaign_progress:
+            self.campaign_progress.record(message.campaign_id, status, message.error_code)
         
-        logger.info(f"Updated message {message.id} status to {status}")
+        MESSAGE_STATUS_CHANGES.labels(status=message.status.value).inc()
+        logger.debug(f"Updated message {message.id} status to {status}")
         return message
     
+    def reset_for_retry(self, message: MessageRecord) -> MessageRecord:
+        """
+        重置失败消息以便重新发送
+        
+        Args:
+            message: 消息记录
+            
+        Returns:
+            MessageRecord: 更新后的消息记录
+        """
+        # 检查重试次数（如果已达上限，重置计数器）
+        if message.retry_count >= message.max_retry:
+            logger.warning(f"消息 {message.id} 已达最大重试次数，重置计数器")
+            message.retry_count = 0
+        
+        # 批量任务的失败消息重新发送时撤销失败计数
+        if message.campaign_id and self.campaign_progress:
+            self.campaign_progress.record(message.campaign_id, message.status, message.error_code, amount=-1)
+        
+        message.status = MessageStatus.PENDING
+        message.error_code = None
+        message.error_message = None
+        
+        # 重新入队，投递耗时从本次入队开始计算
+        message.queued_at = datetime.now()
+        message.started_at = None
+        message.sent_at = None
+        message.queue_wait_ms = None
+        message.smtp_connect_ms = None
+        message.smtp_transmit_ms = None
+        message.delivery_ms = None
+        self.db.commit()
+        self._on_status_change(message)
+        
+        return message
+    
+    def _on_status_change(self, message: MessageRecord) -> None:
+        """状态变化：写入Redis状态缓存并发布状态事件"""
+        if self.status_cache:
+            record = self.status_cache.set(message)
+            publish_status_event(self.redis, message.api_key_id, record)
+    
+    def get_status_many(self, message_ids: List[int], api_key_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        批量获取消息精简状态
+        
+        Args:
+            message_ids: 消息ID列表
+            api_key_id: 调用方API Key ID，指定时只返回该API Key的消息（管理员为None）
+            
+        Returns:
+            List[Dict]: 状态记录列表
+        """
+        if self.status_cache:
+            return self.status_cache.get_many(self.db, message_ids, api_key_id)
+        records = MessageStatusCache.load_from_db(self.db, message_ids, api_key_id)
+        return [records[message_id] for message_id in dict.fromkeys(message_ids) if message_id in records]
+    
     def add_retry_log(
         self,
         message: MessageRecord,
@@ -156,6 +258,7 @@ class MessageService:
         message.retry_logs.append(retry_log)
         
         self.db.commit()
+        self._on_status_change(message)
         
         logger.info(f"Added retry log for message {message.id}, attempt {message.retry_count}")
         return message
@@ -244,6 +347,48 @@ class MessageService:
         """
         return self.db.query(MessageRecord).get(message_id)
     
+    def get_messages(self, message_ids: List[int], api_key_id: Optional[int] = None) -> List[MessageRecord]:
+        """
+        根据ID列表批量获取消息（单次IN查询）
+        
+        Args:
+            message_ids: 消息ID列表
+            api_key_id: 调用方API Key ID，指定时只返回该API Key的消息（管理员为None）
+            
+        Returns:
+            List[MessageRecord]: 消息列表（按请求顺序，不存在或无权访问的ID被忽略）
+        """
+        query = self.db.query(MessageRecord).filter(MessageRecord.id.in_(message_ids))
+        if api_key_id is not None:
+            query = query.filter(MessageRecord.api_key_id == api_key_id)
+        messages = query.all()
+        by_id = {msg.id: msg for msg in messages}
+        return [by_id[message_id] for message_id in dict.fromkeys(message_ids) if message_id in by_id]
+    
+    def delete_message(self, message: MessageRecord) -> None:
+        """
+        删除消息并释放内容引用
+        
+        Args:
+            message: 消息记录
+        """
+        content_hash = message.content_hash
+        self.db.delete(message)
+        self.db.flush()
+        ContentStore(self.db).release(content_hash)
+        self.db.commit()
+        
+        logger.info(f"Deleted message record: id={message.id}")
+    
+    def prefetch_contents(self, messages: List[MessageRecord]) -> None:
+        """
+        批量预取消息内容到缓存，避免逐条解析正文
+        
+        Args:
+            messages: 消息列表
+        """
+        ContentStore(self.db).get_many(msg.content_hash for msg in messages)
+    
     def list_messages(
         self,
         channel: Optional[MessageChannel] = None,
@@ -255,10 +400,13 @@ class MessageService:
         end_time: Optional[str] = None,
         page: int = 1,
         page_size: int = 20
-    ) -> tuple[List[MessageRecord], int]:
+    ) -> tuple[List[Dict[str, Any]], int]:
         """
         查询消息列表
         
+        只查询列表需要的列，直接由Core元组构建字典，不经过ORM实体和身份映射；
+        消息正文通过一次批量查询从内容存储补齐
+        
         Args:
             channel: 渠道
             status: 状态
@@ -271,35 +419,94 @@ class MessageService:
             page_size: 每页数量
             
         Returns:
-            tuple: (消息列表, 总数)
+            tuple: (消息字典列表（字段与MessageResponse一致）, 总数)
         """
-        query = self.db.query(MessageRecord)
-        
+        filters = []
         if channel:
-            query = query.filter(MessageRecord.channel == channel)
+            filters.append(MessageRecord.channel == channel)
         if status:
-            query = query.filter(MessageRecord.status == status)
+            filters.append(MessageRecord.status == status)
         if to:
-            query = query.filter(MessageRecord.to.like(f"%{to}%"))
+            filters.append(MessageRecord.to.like(f"%{to}%"))
         if request_id:
-            query = query.filter(MessageRecord.request_id == request_id)
+            filters.append(MessageRecord.request_id == request_id)
         if api_key_id is not None:
-            query = query.filter(MessageRecord.api_key_id == api_key_id)
+            filters.append(MessageRecord.api_key_id == api_key_id)
         if start_time:
-            query = query.filter(MessageRecord.created_at >= start_time)
+            filters.append(MessageRecord.created_at >= start_time)
         if end_time:
-            query = query.filter(MessageRecord.created_at <= end_time)
+            filters.append(MessageRecord.created_at <= end_time)
         
-        total = query.count()
+        total = self.db.query(func.count(MessageRecord.id)).filter(*filters).scalar()
         
-        messages = (
-            query.order_by(desc(MessageRecord.created_at))
+        rows = (
+            self.db.query(*MESSAGE_LIST_COLUMNS)
+            .filter(*filters)
+            .order_by(desc(MessageRecord.created_at))
             .offset((page - 1) * page_size)
             .limit(page_size)
             .all()
         )
         
-        return messages, total
+        contents = ContentStore(self.db).get_many(row.content_hash for row in rows)
+        
+        return [_message_row_to_dict(row, contents) for row in rows], total
+
+
+# 列表接口查询的列（与MessageResponse字段对应，正文按content_hash补齐）
+MESSAGE_LIST_COLUMNS = (
+    MessageRecord.id,
+    MessageRecord.channel,
+    MessageRecord.status,
+    MessageRecord.to,
+    MessageRecord.subject,
+    MessageRecord.content_hash,
+    MessageRecord.sender,
+    MessageRecord.retry_count,
+    MessageRecord.max_retry,
+    MessageRecord.created_at,
+    MessageRecord.updated_at,
+    MessageRecord.sent_at,
+    MessageRecord.send_at,
+    MessageRecord.queued_at,
+    MessageRecord.started_at,
+    MessageRecord.queue_wait_ms,
+    MessageRecord.delivery_ms,
+    MessageRecord.error_message,
+    MessageRecord.request_id,
+)
+
+
+def _elapsed_ms(start: Optional[datetime], end: datetime) -> Optional[int]:
+    """两个时间点之间的毫秒数（起点缺失时为None，时钟回拨时取0）"""
+    if start is None:
+        return None
+    return max(round((end - start).total_seconds() * 1000), 0)
+
+
+def _message_row_to_dict(row: Any, contents: Dict[str, str]) -> Dict[str, Any]:
+    """把列表查询的行转换为响应字典"""
+    return {
+        "id": row.id,
+        "channel": row.channel.value,
+        "status": row.status.value,
+        "to": row.to,
+        "subject": row.subject,
+        "content": contents.get(row.content_hash),
+        "sender": row.sender,
+        "retry_count": row.retry_count,
+        "max_retry": row.max_retry,
+        "created_at": row.created_at,
+        "updated_at": row.updated_at,
+        "sent_at": row.sent_at,
+        "send_at": row.send_at,
+        "queued_at": row.queued_at,
+        "started_at": row.started_at,
+        "queue_wait_ms": row.queue_wait_ms,
+        "delivery_ms": row.delivery_ms,
+        "error_message": row.error_message,
+        "request_id": row.request_id,
+    }
 
 
 __all__ = ["MessageService"]
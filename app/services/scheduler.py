@@ -0,0 +1,131 @@
+"""
+定时发送队列
+计划发送的消息ID保存在Redis有序集合中（score为计划发送时间戳），
+由定时任务按批认领到期消息并投递到发送队列；数据库send_at索引作为兜底来源
+"""
+import time
+from datetime import datetime
+from typing import List
+
+from app.core.logger import logger
+from app.utils.redis_client import RedisClient
+
+
+SCHEDULED_KEY = "msg:scheduled"
+# 已认领但尚未确认投递的消息（score为租约到期时间），租约过期后放回SCHEDULED_KEY
+INFLIGHT_KEY = "msg:scheduled:inflight"
+
+# KEYS: 计划集合, 认领集合；ARGV: 当前时间, 批量大小, 租约到期时间
+_CLAIM_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+for _, member in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], member)
+    redis.call('ZADD', KEYS[1], ARGV[1], member)
+end
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, member in ipairs(due) do
+    redis.call('ZREM', KEYS[1], member)
+    redis.call('ZADD', KEYS[2], ARGV[3], member)
+end
+return due
+"""
+
+
+class ScheduledMessageQueue:
+    """定时发送队列（Redis有序集合）"""
+
+    def __init__(self, redis_client: RedisClient):
+        self.redis = redis_client
+        self._claim = None
+
+    def add(self, message_id: int, send_at: datetime) -> bool:
+        """
+        加入定时发送队列
+
+        Args:
+            message_id: 消息ID
+            send_at: 计划发送时间
+
+        Returns:
+            bool: 是否写入成功
+        """
+        try:
+            self.redis.client.zadd(SCHEDULED_KEY, {str(message_id): send_at.timestamp()})
+            return True
+        except Exception as e:
+            logger.error(f"Failed to schedule message {message_id}: {e}")
+            return False
+
+    def add_many(self, schedule: dict) -> int:
+        """
+        批量加入定时发送队列
+
+        Args:
+            schedule: 消息ID -> 计划发送时间
+
+        Returns:
+            int: 新加入的数量
+        """
+        if not schedule:
+            return 0
+        try:
+            return self.redis.client.zadd(
+                SCHEDULED_KEY,
+                {str(message_id): send_at.timestamp() for message_id, send_at in schedule.items()},
+            )
+        except Exception as e:
+            logger.error(f"Failed to schedule {len(schedule)} messages: {e}")
+            return 0
+
+    def remove(self, message_id: int) -> None:
+        """从定时发送队列移除（消息被删除或取消时调用）"""
+        try:
+            pipe = self.redis.client.pipeline(transaction=False)
+            pipe.zrem(SCHEDULED_KEY, str(message_id))
+            pipe.zrem(INFLIGHT_KEY, str(message_id))
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to unschedule message {message_id}: {e}")
+
+    def claim_due(self, batch_size: int, lease_seconds: int) -> List[int]:
+        """
+        原子认领一批到期消息（移入认领集合），同时把租约过期的认领放回计划集合
+
+        Args:
+            batch_size: 批量大小
+            lease_seconds: 认领租约（秒），到期未确认的消息会被重新认领
+
+        Returns:
+            List[int]: 到期的消息ID
+        """
+        if self._claim is None:
+            self._claim = self.redis.client.register_script(_CLAIM_SCRIPT)
+        now = time.time()
+        due = self._claim(keys=[SCHEDULED_KEY, INFLIGHT_KEY], args=[now, batch_size, now + lease_seconds])
+        return [int(member) for member in due]
+
+    def ack(self, message_ids: List[int]) -> None:
+        """确认已投递（从认领集合移除）"""
+        if message_ids:
+            self.redis.client.zrem(INFLIGHT_KEY, *[str(message_id) for message_id in message_ids])
+
+    def size(self) -> dict:
+        """
+        队列大小
+
+        Returns:
+            dict: {scheduled: 等待中, due: 已到期未认领, inflight: 已认领未确认}
+        """
+        try:
+            pipe = self.redis.client.pipeline(transaction=False)
+            pipe.zcard(SCHEDULED_KEY)
+            pipe.zcount(SCHEDULED_KEY, "-inf", time.time())
+            pipe.zcard(INFLIGHT_KEY)
+            scheduled, due, inflight = pipe.execute()
+            return {"scheduled": scheduled, "due": due, "inflight": inflight}
+        except Exception as e:
+            logger.error(f"Failed to read scheduled queue size: {e}")
+            return {"scheduled": None, "due": None, "inflight": None}
+
+
+__all__ = ["ScheduledMessageQueue", "SCHEDULED_KEY", "INFLIGHT_KEY"]
@@ -0,0 +1,101 @@
+"""
+SMTP错误分类
+把发送异常归为三类，决定投递链路的处理方式：
+  - permanent: 永久失败（如收件人不存在、内容被拒），直接标记失败，不重试
+  - transient_account: 账户/服务器侧问题（连接、认证、发件人被拒、421），换账户重发
+  - transient_recipient: 收件方暂时拒收（4xx邮箱忙、灰名单），延迟重试
+另有 no_account 表示没有可用的发件账户（配额用尽或全部熔断），消息暂存到延迟队列，不消耗重试次数
+"""
+import asyncio
+import re
+from typing import Optional, Tuple
+
+import aiosmtplib
+
+from app.services.credential_cache import CredentialError
+
+
+PERMANENT = "permanent"
+TRANSIENT_ACCOUNT = "transient_account"
+TRANSIENT_RECIPIENT = "transient_recipient"
+NO_ACCOUNT = "no_account"
+
+# 认证相关的5xx：账户问题，换账户可以发出
+AUTH_REPLY_CODES = {530, 534, 535, 538}
+# 服务不可用、TLS不可用等4xx：发送服务器侧问题
+ACCOUNT_TEMPORARY_CODES = {421, 454}
+# 增强状态码 X.Y.Z，Y为类别：1地址 2邮箱 3邮件系统 4网络路由 5协议 6内容 7安全策略
+_ENHANCED_STATUS = re.compile(r"\b([245])\.(\d{1,3})\.(\d{1,3})\b")
+# 与账户/服务器相关的非SMTP回复异常：网络错误、超时、连接断开、SMTP协议错误、凭证解密失败
+ACCOUNT_SIDE_ERRORS = (OSError, asyncio.TimeoutError, aiosmtplib.SMTPException, CredentialError)
+
+
+def _enhanced_subject(message: str) -> Optional[int]:
+    """提取增强状态码的类别（X.Y.Z中的Y）"""
+    match = _ENHANCED_STATUS.search(message or "")
+    return int(match.group(2)) if match else None
+
+
+def classify_reply(code: int, message: str = "", sender_refused: bool = False) -> str:
+    """
+    按SMTP回复码分类
+
+    Args:
+        code: 回复码
+        message: 回复文本（用于读取增强状态码）
+        sender_refused: 是否为MAIL FROM阶段的拒绝
+
+    Returns:
+        str: 错误类别
+    """
+    subject = _enhanced_subject(message)
+    if code in AUTH_REPLY_CODES or sender_refused:
+        return TRANSIENT_ACCOUNT
+    if 500 <= code < 600:
+        return PERMANENT
+    if code in ACCOUNT_TEMPORARY_CODES or subject in (3, 4):
+        return TRANSIENT_ACCOUNT
+    return TRANSIENT_RECIPIENT
+
+
+def classify_smtp_error(exc: BaseException) -> Tuple[str, Optional[int]]:
+    """
+    对发送异常分类
+
+    Args:
+        exc: 发送时抛出的异常
+
+    Returns:
+        Tuple[str, Optional[int]]: (错误类别, SMTP回复码)
+    """
+    if isinstance(exc, aiosmtplib.SMTPRecipientsRefused):
+        # 全部收件人被拒：任一为暂时拒收则整体延迟重试
+        categories = [classify_reply(error.code, error.message) for error in exc.recipients]
+        codes = [error.code for error in exc.recipients]
+        if TRANSIENT_RECIPIENT in categories or TRANSIENT_ACCOUNT in categories:
+            return TRANSIENT_RECIPIENT, min(codes) if codes else None
+        return PERMANENT, max(codes) if codes else None
+
+    if isinstance(exc, aiosmtplib.SMTPResponseException):
+        sender_refused = isinstance(exc, aiosmtplib.SMTPSenderRefused)
+        if isinstance(exc, (aiosmtplib.SMTPAuthenticationError, aiosmtplib.SMTPConnectError, aiosmtplib.SMTPHeloError)):
+            return TRANSIENT_ACCOUNT, exc.code
+        return classify_reply(exc.code, exc.message, sender_refused), exc.code
+
+    if isinstance(exc, ACCOUNT_SIDE_ERRORS):
+        # 连接断开、超时、网络错误、凭证解密失败等都与账户/服务器相关，换账户重发
+        return TRANSIENT_ACCOUNT, None
+
+    # 其他异常（附件格式错误、编码错误等）是消息本身的问题，换账户或重试都无法发出
+    return PERMANENT, None
+
+
+__all__ = [
+    "PERMANENT",
+    "TRANSIENT_ACCOUNT",
+    "TRANSIENT_RECIPIENT",
+    "NO_ACCOUNT",
+    "ACCOUNT_SIDE_ERRORS",
+    "classify_reply",
+    "classify_smtp_error",
+]
@@ -0,0 +1,152 @@
+"""
+消息状态缓存
+在Redis中维护每条消息的精简状态记录，供客户端高频轮询使用
+"""
+import json
+from typing import Optional, List, Dict, Any
+from sqlalchemy.orm import Session
+
+from app.models.message import MessageRecord
+from app.core.config import settings
+from app.utils.redis_client import RedisClient
+
+
+STATUS_KEY_PREFIX = "msg:status:"
+# 缓存值中记录所属API Key的字段，返回前移除
+OWNER_FIELD = "api_key_id"
+
+
+def _status_key(message_id: int) -> str:
+    return f"{STATUS_KEY_PREFIX}{message_id}"
+
+
+def build_status_record(message: Any) -> Dict[str, Any]:
+    """
+    构建精简状态记录
+
+    Args:
+        message: 消息记录（ORM对象或包含同名属性的行）
+
+    Returns:
+        Dict: 状态记录
+    """
+    status = message.status
+    sent_at = message.sent_at
+    return {
+        "id": message.id,
+        "status": status.value if hasattr(status, "value") else status,
+        "sender": message.sender,
+        "sent_at": sent_at.isoformat() if hasattr(sent_at, "isoformat") else sent_at,
+        "error_code": message.error_code,
+        "retry_count": message.retry_count,
+    }
+
+
+class MessageStatusCache:
+    """消息状态缓存"""
+
+    def __init__(self, redis_client: RedisClient):
+        self.redis = redis_client
+        self.ttl = settings.MESSAGE_STATUS_CACHE_TTL
+
+    def set(self, message: MessageRecord) -> Dict[str, Any]:
+        """
+        写入消息的当前状态（缓存值附带所属API Key，用于查询时校验权限）
+
+        Args:
+            message: 消息记录
+
+        Returns:
+            Dict: 写入的状态记录
+        """
+        record = build_status_record(message)
+        self.redis.set(_status_key(message.id), _dump(record, message.api_key_id), ex=self.ttl)
+        return record
+
+    def get_many(
+        self,
+        db: Session,
+        message_ids: List[int],
+        api_key_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        批量获取状态：一次MGET读取缓存，未命中部分用一次IN查询补齐并回填
+
+        Args:
+            db: 数据库会话
+            message_ids: 消息ID列表
+            api_key_id: 调用方API Key ID，指定时只返回该API Key的消息（管理员为None）
+
+        Returns:
+            List[Dict]: 状态记录列表（按请求顺序，不存在或无权访问的ID被忽略）
+        """
+        ids = list(dict.fromkeys(message_ids))
+        values = self.redis.mget([_status_key(message_id) for message_id in ids])
+
+        found: Dict[int, Dict[str, Any]] = {}
+        missing = []
+        for message_id, value in zip(ids, values):
+            cached = json.loads(value) if value else None
+            # 不含所属API Key的旧缓存值按未命中处理
+            if cached is None or OWNER_FIELD not in cached:
+                missing.append(message_id)
+                continue
+            owner = cached.pop(OWNER_FIELD)
+            if api_key_id is None or owner == api_key_id:
+                found[message_id] = cached
+
+        if missing:
+            rows = _query(db, missing)
+            self.redis.mset_ex(
+                {_status_key(row.id): _dump(build_status_record(row), row.api_key_id) for row in rows},
+                ex=self.ttl,
+            )
+            found.update({
+                row.id: build_status_record(row)
+                for row in rows
+                if api_key_id is None or row.api_key_id == api_key_id
+            })
+
+        return [found[message_id] for message_id in ids if message_id in found]
+
+    @staticmethod
+    def load_from_db(
+        db: Session,
+        message_ids: List[int],
+        api_key_id: Optional[int] = None
+    ) -> Dict[int, Dict[str, Any]]:
+        """
+        从数据库读取状态记录（单次IN查询，只取状态相关列）
+
+        Args:
+            db: 数据库会话
+            message_ids: 消息ID列表
+            api_key_id: 调用方API Key ID，指定时只返回该API Key的消息
+
+        Returns:
+            Dict[int, Dict]: 消息ID -> 状态记录
+        """
+        return {row.id: build_status_record(row) for row in _query(db, message_ids, api_key_id)}
+
+
+def _query(db: Session, message_ids: List[int], api_key_id: Optional[int] = None) -> list:
+    """查询状态相关列及所属API Key"""
+    query = db.query(
+        MessageRecord.id,
+        MessageRecord.status,
+        MessageRecord.sender,
+        MessageRecord.sent_at,
+        MessageRecord.error_code,
+        MessageRecord.retry_count,
+        MessageRecord.api_key_id,
+    ).filter(MessageRecord.id.in_(message_ids))
+    if api_key_id is not None:
+        query = query.filter(MessageRecord.api_key_id == api_key_id)
+    return query.all()
+
+
+def _dump(record: Dict[str, Any], api_key_id: Optional[int]) -> str:
+    return json.dumps({**record, OWNER_FIELD: api_key_id}, ensure_ascii=False)
+
+
+__all__ = ["MessageStatusCache", "build_status_record"]
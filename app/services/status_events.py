@@ -0,0 +1,198 @@
+"""
+消息状态事件
+投递链路通过Redis Stream发布状态变化，API进程内由单个监听任务扇出给SSE订阅者
+"""
+import asyncio
+import json
+from typing import Optional, Dict, Set, List, Any, Tuple, TYPE_CHECKING
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.utils.redis_client import RedisClient
+
+if TYPE_CHECKING:
+    import redis.asyncio as aioredis
+
+
+STATUS_STREAM_KEY = "msg:events"
+
+# (事件ID, 事件数据)
+StatusEvent = Tuple[str, Dict[str, Any]]
+
+
+def publish_status_event(
+    redis_client: RedisClient,
+    api_key_id: Optional[int],
+    record: Dict[str, Any]
+) -> Optional[str]:
+    """
+    发布消息状态事件
+
+    Args:
+        redis_client: Redis客户端
+        api_key_id: 消息所属API Key ID（为空时不发布）
+        record: 精简状态记录
+
+    Returns:
+        Optional[str]: Stream条目ID
+    """
+    if api_key_id is None:
+        return None
+
+    return redis_client.xadd(
+        STATUS_STREAM_KEY,
+        {"api_key_id": api_key_id, "data": json.dumps(record, ensure_ascii=False)},
+        maxlen=settings.MESSAGE_EVENTS_STREAM_MAXLEN,
+    )
+
+
+class StatusEventHub:
+    """
+    状态事件分发中心
+
+    每个进程只持有一个Redis连接阻塞读取事件流，再按API Key分发到各订阅者的队列，
+    因此空闲的SSE连接只占用一个asyncio.Queue。
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+        self._redis: Optional["aioredis.Redis"] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def redis(self) -> "aioredis.Redis":
+        if self._redis is None:
+            # 只有API进程需要异步客户端，Worker发布事件时不加载
+            import redis.asyncio as aioredis
+            self._redis = aioredis.from_url(
+                settings.REDIS_URL,
+                socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+                decode_responses=True,
+            )
+        return self._redis
+
+    def subscribe(self, api_key_id: int) -> asyncio.Queue:
+        """
+        订阅某个API Key的状态事件
+
+        Args:
+            api_key_id: API Key ID
+
+        Returns:
+            asyncio.Queue: 事件队列，队列溢出时会收到None表示需要重连补发
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=settings.MESSAGE_EVENTS_QUEUE_SIZE)
+        self._subscribers.setdefault(api_key_id, set()).add(queue)
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+        return queue
+
+    def unsubscribe(self, api_key_id: int, queue: asyncio.Queue) -> None:
+        """取消订阅"""
+        queues = self._subscribers.get(api_key_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[api_key_id]
+
+    @property
+    def subscriber_count(self) -> int:
+        """当前订阅者数量"""
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    async def replay(self, api_key_id: int, last_event_id: str) -> List[StatusEvent]:
+        """
+        补发指定事件ID之后的事件（用于Last-Event-ID断点续传）
+
+        Args:
+            api_key_id: API Key ID
+            last_event_id: 客户端最后收到的事件ID
+
+        Returns:
+            List[StatusEvent]: 需要补发的事件
+        """
+        events: List[StatusEvent] = []
+        start = f"({last_event_id}"
+
+        while True:
+            try:
+                entries = await self.redis.xrange(STATUS_STREAM_KEY, min=start, max="+", count=1000)
+            except Exception as e:
+                logger.warning(f"Failed to replay status events after {last_event_id}: {e}")
+                break
+
+            for event_id, fields in entries:
+                if int(fields.get("api_key_id", 0)) == api_key_id:
+                    events.append((event_id, json.loads(fields["data"])))
+
+            if len(entries) < 1000:
+                break
+            start = f"({entries[-1][0]}"
+
+        return events
+
+    async def _run(self) -> None:
+        """监听事件流并分发"""
+        last_id = await self._latest_id()
+
+        while self._subscribers:
+            try:
+                response = await self.redis.xread(
+                    {STATUS_STREAM_KEY: last_id},
+                    count=500,
+                    block=settings.MESSAGE_EVENTS_BLOCK_MS,
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Status event stream read error: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            for _, entries in response or []:
+                for event_id, fields in entries:
+                    last_id = event_id
+                    self._dispatch(int(fields.get("api_key_id", 0)), (event_id, json.loads(fields["data"])))
+
+        self._task = None
+
+    async def _latest_id(self) -> str:
+        """获取当前事件流的最后一个ID"""
+        try:
+            entries = await self.redis.xrevrange(STATUS_STREAM_KEY, max="+", min="-", count=1)
+            return entries[0][0] if entries else "0-0"
+        except Exception:
+            return "$"
+
+    def _dispatch(self, api_key_id: int, event: StatusEvent) -> None:
+        """把事件放入订阅者队列，慢订阅者收到None后断开并由客户端续传"""
+        for queue in list(self._subscribers.get(api_key_id, ())):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+    async def close(self) -> None:
+        """关闭监听任务和Redis连接"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+
+# 进程级分发中心
+status_event_hub = StatusEventHub()
+
+
+__all__ = ["STATUS_STREAM_KEY", "publish_status_event", "StatusEventHub", "status_event_hub"]
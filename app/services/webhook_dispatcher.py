@@ -0,0 +1,469 @@
+"""
+Webhook回调分发
+消费消息状态事件流，按API Key攒批后签名POST到调用方配置的回调地址；
+定期认领消费组中空闲过久的待处理事件（发送异常未确认、或其他消费者已退出），重新发送或写入死信
+
+运行方式：
+    python -m app.services.webhook_dispatcher
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import socket
+import time
+from dataclasses import dataclass
+from typing import Optional, Dict, List, Callable, Awaitable
+
+import httpx
+import redis.asyncio as aioredis
+from prometheus_client import Counter, Histogram, Gauge
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.services.status_events import STATUS_STREAM_KEY, StatusEvent
+from app.utils.cache import LRUCache
+
+
+WEBHOOK_CONSUMER_GROUP = "webhooks"
+WEBHOOK_DEAD_LETTER_KEY = "msg:webhooks:dead"
+
+SIGNATURE_HEADER = "X-Webhook-Signature"
+TIMESTAMP_HEADER = "X-Webhook-Timestamp"
+
+
+# ==================== 监控指标 ====================
+
+WEBHOOK_DELIVERY_LATENCY = Histogram(
+    "webhook_delivery_duration_seconds",
+    "Webhook batch delivery latency including retries",
+    ["result"]
+)
+
+WEBHOOK_DELIVERIES = Counter(
+    "webhook_deliveries_total",
+    "Webhook batch deliveries",
+    ["result"]
+)
+
+WEBHOOK_EVENTS = Counter(
+    "webhook_events_total",
+    "Webhook events processed",
+    ["result"]
+)
+
+WEBHOOK_QUEUE_DEPTH = Gauge(
+    "webhook_queue_depth",
+    "Webhook events buffered or in flight"
+)
+
+
+@dataclass(frozen=True)
+class WebhookEndpoint:
+    """回调地址配置"""
+    api_key_id: int
+    url: str
+    secret: str
+
+
+EndpointResolver = Callable[[int], Awaitable[Optional[WebhookEndpoint]]]
+
+
+def sign_payload(secret: str, timestamp: str, body: bytes) -> str:
+    """
+    计算回调签名
+
+    签名内容为 "{timestamp}.{body}"，接收方用相同密钥计算HMAC-SHA256后比对，
+    并校验时间戳以防重放
+
+    Args:
+        secret: 签名密钥
+        timestamp: Unix时间戳字符串
+        body: 请求体
+
+    Returns:
+        str: 签名（sha256=十六进制）
+    """
+    digest = hmac.new(secret.encode(), timestamp.encode() + b"." + body, hashlib.sha256).hexdigest()
+    return f"sha256={digest}"
+
+
+def _load_endpoint(api_key_id: int) -> Optional[WebhookEndpoint]:
+    """从数据库读取回调配置（同步，在线程中执行）"""
+    from app.core.database import SessionLocal
+    from app.core.security import decrypt_data
+    from app.models.api_key import APIKey
+
+    db = SessionLocal()
+    try:
+        api_key = db.query(APIKey).get(api_key_id)
+        if not api_key or not api_key.is_valid or not api_key.callback_url or not api_key.callback_secret:
+            return None
+        return WebhookEndpoint(
+            api_key_id=api_key_id,
+            url=api_key.callback_url,
+            secret=decrypt_data(api_key.callback_secret),
+        )
+    finally:
+        db.close()
+
+
+class WebhookDispatcher:
+    """Webhook分发器"""
+
+    def __init__(
+        self,
+        redis: Optional[aioredis.Redis] = None,
+        endpoint_resolver: Optional[EndpointResolver] = None,
+        http_client: Optional[httpx.AsyncClient] = None,
+        consumer_name: Optional[str] = None,
+    ):
+        self.redis = redis or aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+        self.http = http_client or httpx.AsyncClient(
+            timeout=settings.WEBHOOK_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.WEBHOOK_MAX_KEEPALIVE_CONNECTIONS,
+            ),
+        )
+        self.consumer_name = consumer_name or socket.gethostname()
+        self._resolve_endpoint = endpoint_resolver or self._resolve_from_db
+        self._endpoint_cache = LRUCache(maxsize=10000, ttl=settings.WEBHOOK_ENDPOINT_CACHE_TTL)
+
+        self._buffers: Dict[int, List[StatusEvent]] = {}
+        self._buffer_started: Dict[int, float] = {}
+        self._endpoint_limits: Dict[str, asyncio.Semaphore] = {}
+        self._tasks: set = set()
+        # 本进程已读取但尚未处理完的事件ID，认领时跳过
+        self._inflight_ids: set = set()
+        self._pending_events = 0
+        self._running = False
+
+    # ==================== 事件消费 ====================
+
+    async def run(self) -> None:
+        """消费事件流直到stop()被调用"""
+        await self._ensure_group()
+        self._running = True
+        flusher = asyncio.create_task(self._flush_loop())
+        reclaimer = asyncio.create_task(self._reclaim_loop())
+
+        # 先处理本消费者未确认的历史事件（ID从0开始），读完后切换为读取新事件（>）
+        read_id = "0"
+        try:
+            while self._running:
+                # 在途批次过多时暂停读取，形成背压
+                while len(self._tasks) >= settings.WEBHOOK_MAX_INFLIGHT_BATCHES:
+                    await asyncio.sleep(0.05)
+
+                try:
+                    response = await self.redis.xreadgroup(
+                        WEBHOOK_CONSUMER_GROUP,
+                        self.consumer_name,
+                        {STATUS_STREAM_KEY: read_id},
+                        count=500,
+                        block=settings.WEBHOOK_BATCH_WAIT_MS,
+                    )
+                except Exception as e:
+                    logger.warning(f"Webhook stream read error: {e}")
+                    await asyncio.sleep(1)
+                    continue
+
+                entries = response[0][1] if response else []
+                if read_id != ">":
+                    if not entries:
+                        read_id = ">"
+                        continue
+                    read_id = entries[-1][0]
+
+                for event_id, fields in entries:
+                    self.enqueue(int(fields.get("api_key_id", 0)), (event_id, json.loads(fields["data"])))
+        finally:
+            flusher.cancel()
+            reclaimer.cancel()
+            await self.drain()
+
+    async def _ensure_group(self) -> None:
+        """创建消费组（已存在时忽略）"""
+        try:
+            await self.redis.xgroup_create(STATUS_STREAM_KEY, WEBHOOK_CONSUMER_GROUP, id="$", mkstream=True)
+        except aioredis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def stop(self) -> None:
+        """停止消费"""
+        self._running = False
+
+    # ==================== 攒批 ====================
+
+    def enqueue(self, api_key_id: int, event: StatusEvent) -> None:
+        """
+        事件加入对应API Key的批次，达到批量大小时立即发送
+
+        Args:
+            api_key_id: API Key ID
+            event: (事件ID, 事件数据)
+        """
+        buffer = self._buffers.setdefault(api_key_id, [])
+        if not buffer:
+            self._buffer_started[api_key_id] = time.monotonic()
+        buffer.append(event)
+        self._inflight_ids.add(event[0])
+        self._set_pending(1)
+
+        if len(buffer) >= settings.WEBHOOK_BATCH_SIZE:
+            self._flush(api_key_id)
+
+    async def _flush_loop(self) -> None:
+        """定期发送等待超时的批次"""
+        wait = settings.WEBHOOK_BATCH_WAIT_MS / 1000
+        while True:
+            await asyncio.sleep(wait / 2)
+            now = time.monotonic()
+            for api_key_id, started in list(self._buffer_started.items()):
+                if now - started >= wait:
+                    self._flush(api_key_id)
+
+    def _flush(self, api_key_id: int) -> None:
+        """取出批次并启动发送任务"""
+        events = self._buffers.pop(api_key_id, [])
+        self._buffer_started.pop(api_key_id, None)
+        if not events:
+            return
+
+        task = asyncio.create_task(self._process_batch(api_key_id, events))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def drain(self) -> None:
+        """发送所有缓冲批次并等待在途任务完成"""
+        for api_key_id in list(self._buffers):
+            self._flush(api_key_id)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    # ==================== 认领 ====================
+
+    async def _reclaim_loop(self) -> None:
+        """定期认领空闲过久的待处理事件"""
+        while True:
+            await asyncio.sleep(settings.WEBHOOK_RECLAIM_INTERVAL)
+            try:
+                await self.reclaim()
+            except Exception as e:
+                logger.warning(f"Webhook reclaim error: {e}")
+
+    async def reclaim(self) -> int:
+        """
+        认领消费组中空闲超过WEBHOOK_RECLAIM_IDLE_MS的待处理事件
+
+        未确认的事件（发送过程异常、或所属消费者已退出）重新攒批发送；
+        已被读取WEBHOOK_MAX_DELIVERIES次仍未确认的事件不再重试，写入死信后确认
+
+        Returns:
+            int: 认领的事件数
+        """
+        idle_ms = settings.WEBHOOK_RECLAIM_IDLE_MS
+        pending = await self.redis.xpending_range(
+            STATUS_STREAM_KEY,
+            WEBHOOK_CONSUMER_GROUP,
+            min="-",
+            max="+",
+            count=500,
+            idle=idle_ms,
+        )
+        deliveries = {
+            entry["message_id"]: entry["times_delivered"]
+            for entry in pending
+            if entry["message_id"] not in self._inflight_ids
+        }
+        if not deliveries:
+            return 0
+
+        # min_idle_time保证并发认领时同一事件只被一个消费者取得
+        claimed = await self.redis.xclaim(
+            STATUS_STREAM_KEY,
+            WEBHOOK_CONSUMER_GROUP,
+            self.consumer_name,
+            min_idle_time=idle_ms,
+            message_ids=list(deliveries),
+        )
+
+        exhausted: Dict[int, List[StatusEvent]] = {}
+        count = 0
+        for event_id, fields in claimed:
+            # 已被裁剪出Stream的事件没有内容
+            if not fields:
+                continue
+            count += 1
+            api_key_id = int(fields.get("api_key_id", 0))
+            event = (event_id, json.loads(fields["data"]))
+            if deliveries[event_id] >= settings.WEBHOOK_MAX_DELIVERIES:
+                exhausted.setdefault(api_key_id, []).append(event)
+            else:
+                self.enqueue(api_key_id, event)
+
+        for api_key_id, events in exhausted.items():
+            logger.warning(f"Webhook events for api_key {api_key_id} exceeded max deliveries: {len(events)}")
+            await self._dead_letter(api_key_id, events)
+            WEBHOOK_EVENTS.labels(result="dead").inc(len(events))
+            await self._ack(events)
+
+        if count:
+            logger.info(f"Webhook reclaimed {count} idle events")
+        return count
+
+    # ==================== 发送 ====================
+
+    async def _process_batch(self, api_key_id: int, events: List[StatusEvent]) -> None:
+        """发送一个批次并确认事件"""
+        try:
+            endpoint = await self._get_endpoint(api_key_id)
+            if endpoint is None:
+                WEBHOOK_EVENTS.labels(result="skipped").inc(len(events))
+            else:
+                delivered = await self.deliver(endpoint, events)
+                if not delivered:
+                    await self._dead_letter(api_key_id, events)
+                WEBHOOK_EVENTS.labels(result="delivered" if delivered else "dead").inc(len(events))
+        except Exception as e:
+            # 未确认的事件留在消费组待处理列表中，空闲超时后由reclaim重新认领
+            logger.error(f"Webhook batch for api_key {api_key_id} failed: {e}")
+            return
+        finally:
+            self._set_pending(-len(events))
+            self._inflight_ids.difference_update(event_id for event_id, _ in events)
+
+        await self._ack(events)
+
+    async def deliver(self, endpoint: WebhookEndpoint, events: List[StatusEvent]) -> bool:
+        """
+        签名并POST一个批次，失败时指数退避重试
+
+        Args:
+            endpoint: 回调配置
+            events: 事件列表
+
+        Returns:
+            bool: 是否投递成功
+        """
+        body = json.dumps(
+            {"events": [{"event_id": event_id, **data} for event_id, data in events]},
+            ensure_ascii=False,
+        ).encode()
+        limit = self._endpoint_limits.setdefault(
+            endpoint.url, asyncio.Semaphore(settings.WEBHOOK_MAX_CONCURRENCY_PER_ENDPOINT)
+        )
+        start_time = time.perf_counter()
+
+        for attempt in range(settings.WEBHOOK_MAX_RETRIES + 1):
+            retryable = True
+            try:
+                async with limit:
+                    timestamp = str(int(time.time()))
+                    response = await self.http.post(
+                        endpoint.url,
+                        content=body,
+                        headers={
+                            "Content-Type": "application/json",
+                            TIMESTAMP_HEADER: timestamp,
+                            SIGNATURE_HEADER: sign_payload(endpoint.secret, timestamp, body),
+                        },
+                    )
+                if response.status_code < 300:
+                    self._observe(start_time, "success")
+                    return True
+                # 4xx（429除外）视为调用方拒绝，不再重试
+                retryable = response.status_code >= 500 or response.status_code == 429
+                error = f"HTTP {response.status_code}"
+            except httpx.HTTPError as e:
+                error = f"{type(e).__name__}: {e}"
+
+            if not retryable or attempt == settings.WEBHOOK_MAX_RETRIES:
+                logger.warning(f"Webhook delivery to {endpoint.url} failed: {error}")
+                break
+
+            delay = min(
+                settings.WEBHOOK_RETRY_BACKOFF_SECONDS * (2 ** attempt),
+                settings.WEBHOOK_RETRY_BACKOFF_MAX_SECONDS,
+            )
+            await asyncio.sleep(delay)
+
+        self._observe(start_time, "failed")
+        return False
+
+    @staticmethod
+    def _observe(start_time: float, result: str) -> None:
+        WEBHOOK_DELIVERY_LATENCY.labels(result=result).observe(time.perf_counter() - start_time)
+        WEBHOOK_DELIVERIES.labels(result=result).inc()
+
+    def _set_pending(self, delta: int) -> None:
+        self._pending_events += delta
+        WEBHOOK_QUEUE_DEPTH.set(self._pending_events)
+
+    async def _get_endpoint(self, api_key_id: int) -> Optional[WebhookEndpoint]:
+        """获取回调配置（带缓存，未配置的结果同样缓存）"""
+        cached = self._endpoint_cache.get(api_key_id, default=False)
+        if cached is not False:
+            return cached
+        endpoint = await self._resolve_endpoint(api_key_id)
+        self._endpoint_cache.set(api_key_id, endpoint)
+        return endpoint
+
+    @staticmethod
+    async def _resolve_from_db(api_key_id: int) -> Optional[WebhookEndpoint]:
+        return await asyncio.to_thread(_load_endpoint, api_key_id)
+
+    async def _ack(self, events: List[StatusEvent]) -> None:
+        try:
+            await self.redis.xack(STATUS_STREAM_KEY, WEBHOOK_CONSUMER_GROUP, *[event_id for event_id, _ in events])
+        except Exception as e:
+            logger.warning(f"Webhook XACK error: {e}")
+
+    async def _dead_letter(self, api_key_id: int, events: List[StatusEvent]) -> None:
+        """投递失败的批次写入死信Stream，便于排查和手动重放"""
+        try:
+            await self.redis.xadd(
+                WEBHOOK_DEAD_LETTER_KEY,
+                {
+                    "api_key_id": api_key_id,
+                    "events": json.dumps([data for _, data in events], ensure_ascii=False),
+                },
+                maxlen=settings.MESSAGE_EVENTS_STREAM_MAXLEN,
+                approximate=True,
+            )
+        except Exception as e:
+            logger.error(f"Webhook dead-letter error: {e}")
+
+    async def close(self) -> None:
+        """关闭HTTP客户端和Redis连接"""
+        await self.http.aclose()
+        await self.redis.close()
+
+
+__all__ = [
+    "WebhookDispatcher",
+    "WebhookEndpoint",
+    "sign_payload",
+    "SIGNATURE_HEADER",
+    "TIMESTAMP_HEADER",
+]
+
+
+async def _main() -> None:
+    from prometheus_client import start_http_server
+
+    if settings.PROMETHEUS_ENABLED:
+        start_http_server(settings.WEBHOOK_METRICS_PORT)
+
+    dispatcher = WebhookDispatcher()
+    logger.info(f"Webhook dispatcher started as consumer {dispatcher.consumer_name}")
+    try:
+        await dispatcher.run()
+    finally:
+        await dispatcher.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -1,7 +1,23 @@
-"""Celery异步任务"""
-from app.tasks.celery_app import celery_app
-from app.tasks.email_tasks import send_email_task
-from app.tasks.scheduled_tasks import reset_email_daily_counts, cleanup_expired_attachments
+"""Celery异步任务
+
+子模块按需导入：API进程只通过 app.tasks.dispatch 投递任务，不加载任务实现
+"""
+import importlib
+
+
+_EXPORTS = {
+    "celery_app": "app.tasks.celery_app",
+    "send_email_task": "app.tasks.email_tasks",
+    "reset_email_daily_counts": "app.tasks.scheduled_tasks",
+    "cleanup_expired_attachments": "app.tasks.scheduled_tasks",
+}
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(module), name)
 
 
 __all__ = [
@@ -0,0 +1,187 @@
+"""
+批量发送任务
+"""
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from sqlalchemy import delete, or_, select
+
+from app.tasks.celery_app import celery_app
+from app.tasks.dispatch import enqueue_email
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.logger import logger
+from app.models.campaign import Campaign, CampaignRecipient, CampaignStatus
+from app.services.campaign_service import CampaignService, CampaignError
+from app.utils.redis_client import redis_client
+
+
+# 拆分出错后的重试间隔（秒）
+FANOUT_ERROR_RETRY_SECONDS = 60
+
+
+def _publish(service: CampaignService, message_ids: List[int]) -> int:
+    """
+    投递消息后标记入队时间（先投递后标记，与release_scheduled_messages一致）
+
+    投递中途出错时只标记已投递的消息，其余queued_at仍为空，由sync_campaign_progress补投
+
+    Returns:
+        int: 已投递的消息数
+    """
+    queued_at = datetime.now()
+    published = []
+    try:
+        for message_id in message_ids:
+            enqueue_email(message_id)
+            published.append(message_id)
+    finally:
+        if published:
+            service.mark_queued(published, queued_at)
+    return len(published)
+
+
+@celery_app.task(name="app.tasks.campaign_tasks.fan_out_campaign", ignore_result=True)
+def fan_out_campaign(campaign_id: int, run_token: int):
+    """
+    拆分一批收件人并投递，然后按速率上限延迟调度下一批
+
+    每次启动/恢复生成新的run_token，令牌不一致的旧任务链在下一批开始前退出，保证同一任务只有一条拆分链
+
+    Args:
+        campaign_id: 任务ID
+        run_token: 拆分任务令牌
+    """
+    started = time.perf_counter()
+    db = SessionLocal()
+    service = CampaignService(db, redis_client)
+
+    try:
+        try:
+            message_ids, interval = service.fan_out_chunk(campaign_id, run_token)
+        except CampaignError as e:
+            logger.error(f"Campaign {campaign_id} fan-out stopped: {e}")
+            return
+        except Exception as e:
+            # 数据库等临时错误：稍后重试本批（事务已回滚，收件人未被删除）
+            logger.error(f"Error in campaign {campaign_id} fan-out: {str(e)}")
+            db.rollback()
+            fan_out_campaign.apply_async(args=[campaign_id, run_token], countdown=FANOUT_ERROR_RETRY_SECONDS)
+            return
+
+        try:
+            _publish(service, message_ids)
+        except Exception as e:
+            # 消息已写入：未投递的由同步任务补投，下一批稍后继续
+            logger.error(f"Error publishing campaign {campaign_id} messages: {str(e)}")
+            db.rollback()
+            if interval is not None:
+                fan_out_campaign.apply_async(args=[campaign_id, run_token], countdown=FANOUT_ERROR_RETRY_SECONDS)
+            return
+    finally:
+        db.close()
+
+    if interval is not None:
+        countdown = max(interval - (time.perf_counter() - started), 0)
+        fan_out_campaign.apply_async(args=[campaign_id, run_token], countdown=countdown)
+
+
+@celery_app.task(name="app.tasks.campaign_tasks.sync_campaign_progress", ignore_result=True)
+def sync_campaign_progress():
+    """
+    同步批量任务进度
+    把Redis中的结果计数写回任务表（Redis计数丢失时从消息表重新统计），检测任务完成，
+    补投拆分后未投递的消息，重新启动中断的拆分任务链，并清理已取消任务的暂存收件人
+    """
+    db = SessionLocal()
+    service = CampaignService(db, redis_client)
+    now = datetime.now()
+    # 超过一批的间隔再加上该宽限时间仍未拆分下一批，视为任务链中断
+    stall_grace = max(settings.CAMPAIGN_SYNC_INTERVAL * 10, 300)
+
+    try:
+        campaigns = (
+            db.query(Campaign)
+            .filter(
+                or_(
+                    Campaign.status.in_([CampaignStatus.RUNNING, CampaignStatus.PAUSED]),
+                    # 取消后队列中的消息仍在陆续标记，继续同步一段时间
+                    Campaign.finished_at >= now - timedelta(days=1)
+                )
+            )
+            .all()
+        )
+        if not campaigns:
+            return {"status": "success", "count": 0}
+
+        live = service.progress.get_many([campaign.id for campaign in campaigns])
+        completed = 0
+        for campaign in campaigns:
+            counts = live[campaign.id]
+            if counts is None and campaign.created_count:
+                counts = service.recount(campaign)
+                if service.progress.seed(campaign.id, counts):
+                    logger.warning(f"Rebuilt progress counters for campaign {campaign.id} from message records")
+                else:
+                    # 统计期间Worker已重新创建计数，以Redis为准
+                    counts = service.progress.get_many([campaign.id])[campaign.id] or counts
+            counts = counts or {"success": 0, "failed": 0, "cancelled": 0}
+
+            campaign.success_count = counts["success"]
+            campaign.failed_count = counts["failed"]
+            campaign.cancelled_count = counts["cancelled"]
+
+            finished = counts["success"] + counts["failed"] + counts["cancelled"]
+            if (
+                campaign.status == CampaignStatus.RUNNING
+                and campaign.fanout_finished_at
+                and finished >= campaign.created_count
+            ):
+                campaign.status = CampaignStatus.COMPLETED
+                campaign.finished_at = now
+                completed += 1
+                logger.info(f"Campaign {campaign.id} completed: {counts}")
+
+            if campaign.status == CampaignStatus.CANCELLED:
+                # 暂存收件人按批删除，避免一次删除百万行
+                db.execute(
+                    delete(CampaignRecipient).where(
+                        CampaignRecipient.id.in_(
+                            select(CampaignRecipient.id)
+                            .where(CampaignRecipient.campaign_id == campaign.id)
+                            .limit(settings.CAMPAIGN_CHUNK_SIZE * 10)
+                        )
+                    )
+                )
+            db.commit()
+
+            stranded = service.unqueued_message_ids(campaign, now - timedelta(seconds=stall_grace))
+            if stranded:
+                try:
+                    requeued = _publish(service, stranded)
+                    logger.warning(f"Requeued {requeued} unqueued messages for campaign {campaign.id}")
+                except Exception as e:
+                    db.rollback()
+                    logger.error(f"Error requeuing campaign {campaign.id} messages: {str(e)}")
+
+            stall_before = now - timedelta(seconds=settings.CAMPAIGN_CHUNK_SIZE / campaign.rate_limit + stall_grace)
+            if (
+                campaign.status == CampaignStatus.RUNNING
+                and not campaign.fanout_finished_at
+                and (campaign.last_chunk_at or campaign.started_at) < stall_before
+            ):
+                run_token = service.restart_stalled(campaign)
+                if run_token is not None:
+                    fan_out_campaign.delay(campaign.id, run_token)
+
+        return {"status": "success", "count": len(campaigns), "completed": completed}
+    except Exception as e:
+        logger.error(f"Error syncing campaign progress: {str(e)}")
+        db.rollback()
+        return {"status": "error", "message": str(e)}
+    finally:
+        db.close()
+
+
+__all__ = ["fan_out_campaign", "sync_campaign_progress"]
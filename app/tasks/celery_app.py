@@ -1,11 +1,25 @@
 """
 Celery应用配置
 """
+import os
+import time
+
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import before_task_publish, task_prerun, task_postrun, worker_ready, worker_process_shutdown
 
 from app.core.config import settings
+from app.core.context import get_request_id, set_request_id, reset_request_id
 from app.core.logger import logger
+from app.core.query_profiler import begin_scope, end_scope
+from app.core.tracing import (
+    tracer,
+    activate_span,
+    deactivate_span,
+    inject_trace_headers,
+    extract_trace_context,
+    SPAN_KIND_CONSUMER,
+)
 
 
 # 创建Celery应用
@@ -16,6 +30,7 @@ celery_app = Celery(
     include=[
         "app.tasks.email_tasks",
         "app.tasks.scheduled_tasks",
+        "app.tasks.campaign_tasks",
     ]
 )
 
@@ -48,8 +63,154 @@ celery_app.conf.beat_schedule = {
         "task": "app.tasks.scheduled_tasks.cleanup_expired_attachments",
         "schedule": crontab(minute=0),
     },
+    # 投递到期的定时消息（过期未执行的调度直接丢弃，下一轮会处理）
+    "release-scheduled-messages": {
+        "task": "app.tasks.scheduled_tasks.release_scheduled_messages",
+        "schedule": settings.SCHEDULE_DISPATCH_INTERVAL,
+        "options": {"expires": settings.SCHEDULE_DISPATCH_INTERVAL},
+    },
+    # 每10分钟把数据库中未进入Redis的定时消息补回
+    "reconcile-scheduled-messages": {
+        "task": "app.tasks.scheduled_tasks.reconcile_scheduled_messages",
+        "schedule": crontab(minute="*/10"),
+    },
+    # 按账户剩余额度释放因无可用账户而暂存的消息（滚动窗口释放的额度）
+    "release-deferred-messages": {
+        "task": "app.tasks.scheduled_tasks.release_deferred_messages",
+        "schedule": settings.DEFERRED_RELEASE_INTERVAL,
+        "options": {"expires": settings.DEFERRED_RELEASE_INTERVAL},
+    },
+    # 批量任务进度同步、完成检测和中断恢复
+    "sync-campaign-progress": {
+        "task": "app.tasks.campaign_tasks.sync_campaign_progress",
+        "schedule": settings.CAMPAIGN_SYNC_INTERVAL,
+        "options": {"expires": settings.CAMPAIGN_SYNC_INTERVAL},
+    },
+    # 每10分钟把数据库中未进入Redis的暂存消息补回
+    "reconcile-deferred-messages": {
+        "task": "app.tasks.scheduled_tasks.reconcile_deferred_messages",
+        "schedule": crontab(minute="5-59/10"),
+    },
 }
 
+
+# ==================== 请求ID传递 ====================
+
+@before_task_publish.connect
+def inject_request_id(headers=None, **kwargs):
+    """发布任务时把当前请求ID写入任务头"""
+    request_id = get_request_id()
+    if request_id and headers is not None:
+        headers.setdefault("request_id", request_id)
+
+
+@task_prerun.connect
+def bind_request_id(task=None, **kwargs):
+    """任务执行前从任务头恢复请求ID，使Worker日志与API请求关联"""
+    task._request_id_token = set_request_id(getattr(task.request, "request_id", None))
+
+
+@task_postrun.connect
+def unbind_request_id(task=None, **kwargs):
+    """任务结束后恢复上下文"""
+    token = getattr(task, "_request_id_token", None)
+    if token is not None:
+        reset_request_id(token)
+        task._request_id_token = None
+
+
+# ==================== SQL统计 ====================
+
+@task_prerun.connect
+def begin_task_query_scope(task=None, **kwargs):
+    """任务执行期间的SQL归属到该任务"""
+    task._query_scope_token = begin_scope()
+
+
+@task_postrun.connect
+def end_task_query_scope(task=None, **kwargs):
+    """任务结束时汇总SQL并检测N+1"""
+    token = getattr(task, "_query_scope_token", None)
+    if token is not None:
+        end_scope(token, task.name)
+        task._query_scope_token = None
+
+
+# ==================== 链路追踪 ====================
+
+@before_task_publish.connect
+def inject_trace_context(headers=None, **kwargs):
+    """发布任务时写入traceparent和发布时间，Worker据此计算排队耗时"""
+    if headers is None or not tracer.enabled:
+        return
+    inject_trace_headers(headers)
+    headers["published_at"] = time.time_ns()
+
+
+@task_prerun.connect
+def start_task_span(task=None, **kwargs):
+    """任务开始时补记排队Span，并创建以发布方为父节点的任务Span"""
+    if not tracer.enabled:
+        return
+    parent = extract_trace_context(getattr(task.request, "traceparent", None))
+    published_at = getattr(task.request, "published_at", None)
+    attributes = {
+        "task": task.name,
+        "task_id": task.request.id,
+        "retries": task.request.retries or 0,
+    }
+
+    if published_at:
+        wait_span = tracer.start_span("queue.wait", SPAN_KIND_CONSUMER, parent=parent, start_ns=int(published_at))
+        if wait_span is not None:
+            wait_span.end()
+            attributes["queue_wait_ms"] = round((wait_span.end_ns - wait_span.start_ns) / 1e6, 3)
+
+    span = tracer.start_span(f"celery.task {task.name}", SPAN_KIND_CONSUMER, attributes, parent=parent)
+    task._trace_span = span
+    task._trace_token = activate_span(span)
+
+
+@task_postrun.connect
+def end_task_span(task=None, state=None, **kwargs):
+    """任务结束时关闭任务Span"""
+    span = getattr(task, "_trace_span", None)
+    if span is None:
+        return
+    span.set_attribute("state", state)
+    if state not in (None, "SUCCESS"):
+        span.status_code = "ERROR"
+    span.end()
+    deactivate_span(getattr(task, "_trace_token", None))
+    task._trace_span = task._trace_token = None
+
+
+# ==================== 监控指标导出 ====================
+
+@worker_ready.connect
+def start_worker_metrics(**kwargs):
+    """Worker主进程就绪后启动指标服务，prefork子进程的指标通过多进程目录合并导出"""
+    if not settings.PROMETHEUS_ENABLED:
+        return
+
+    from app.core.metrics import MULTIPROC_DIR, start_metrics_server
+
+    if not MULTIPROC_DIR:
+        logger.warning("PROMETHEUS_MULTIPROC_DIR is not set, metrics from prefork child processes will not be exported")
+    try:
+        start_metrics_server(settings.METRICS_PORT)
+    except OSError as e:
+        logger.error(f"Failed to start worker metrics server: {e}")
+
+
+@worker_process_shutdown.connect
+def cleanup_worker_metrics(pid=None, **kwargs):
+    """子进程退出时清理多进程指标文件"""
+    from app.core.metrics import mark_process_dead
+
+    mark_process_dead(pid or os.getpid())
+
+
 logger.info("Celery application configured")
 
 
@@ -0,0 +1,54 @@
+"""
+任务投递
+API进程按任务名投递，不导入任务实现模块；Celery在首次投递时才加载
+"""
+from app.core.tracing import tracer, SPAN_KIND_PRODUCER
+
+
+SEND_EMAIL_TASK = "app.tasks.email_tasks.send_email_task"
+RELEASE_DEFERRED_TASK = "app.tasks.scheduled_tasks.release_deferred_messages"
+FAN_OUT_CAMPAIGN_TASK = "app.tasks.campaign_tasks.fan_out_campaign"
+
+
+def enqueue_email(message_id: int) -> None:
+    """
+    投递邮件发送任务
+
+    Args:
+        message_id: 消息ID
+    """
+    from app.tasks.celery_app import celery_app
+
+    # 发布时当前Span写入任务头，Worker端的任务Span以它为父节点
+    with tracer.span("queue.publish", SPAN_KIND_PRODUCER, {"task": SEND_EMAIL_TASK, "message_id": message_id}):
+        celery_app.send_task(SEND_EMAIL_TASK, args=[message_id])
+
+
+def trigger_deferred_release() -> None:
+    """账户额度增加（新增/启用账户、调整配额、恢复熔断）后立即释放暂存消息，不等待下一轮定时检查"""
+    from app.tasks.celery_app import celery_app
+
+    celery_app.send_task(RELEASE_DEFERRED_TASK)
+
+
+def start_campaign_fanout(campaign_id: int, run_token: int) -> None:
+    """
+    启动批量任务的拆分任务链
+
+    Args:
+        campaign_id: 任务ID
+        run_token: 本次启动/恢复生成的拆分任务令牌
+    """
+    from app.tasks.celery_app import celery_app
+
+    celery_app.send_task(FAN_OUT_CAMPAIGN_TASK, args=[campaign_id, run_token])
+
+
+__all__ = [
+    "SEND_EMAIL_TASK",
+    "RELEASE_DEFERRED_TASK",
+    "FAN_OUT_CAMPAIGN_TASK",
+    "enqueue_email",
+    "trigger_deferred_release",
+    "start_campaign_fanout",
+]
@@ -2,15 +2,26 @@
 邮件发送任务
 """
 import asyncio
+import time
 from typing import List
 from celery import Task
+from celery.exceptions import Retry
+from celery.signals import worker_process_init
 
 from app.tasks.celery_app import celery_app
 from app.core.database import SessionLocal
 from app.core.logger import logger
+from app.core.config import settings
+from app.core.metrics import MESSAGE_SENT, MESSAGE_DEFERRED, MESSAGE_DELIVERY_LATENCY, TASK_DURATION
+from app.core.tracing import tracer
 from app.models.message import MessageRecord, MessageStatus
+from app.services.campaign_progress import CampaignProgress, CAMPAIGN_CANCELLED_ERROR_CODE
+from app.services.credential_cache import smtp_credential_cache
+from app.services.deferred_queue import DeferredMessageQueue, DEFERRED_ERROR_CODE
 from app.services.email_service import send_email
 from app.services.message_service import MessageService
+from app.services.smtp_errors import NO_ACCOUNT, PERMANENT
+from app.utils.redis_client import redis_client
 from datetime import datetime, timedelta
 
 
@@ -22,11 +33,54 @@ class EmailTask(Task):
         logger.error(f"Task {task_id} failed: {exc}")
 
 
+@worker_process_init.connect
+def warm_smtp_credentials(**kwargs):
+    """Worker子进程启动时预热SMTP凭证缓存"""
+    db = SessionLocal()
+    try:
+        smtp_credential_cache.warm(db)
+    except Exception as e:
+        logger.error(f"Failed to warm SMTP credential cache: {e}")
+    finally:
+        db.close()
+
+
+def _record_delivery(message: MessageRecord, status: MessageStatus) -> None:
+    """记录消息投递结果指标"""
+    MESSAGE_SENT.labels(channel="email", status=status.value).inc()
+    if status != MessageStatus.RETRYING and message.created_at:
+        MESSAGE_DELIVERY_LATENCY.labels(channel="email", status=status.value).observe(
+            max((datetime.now() - message.created_at).total_seconds(), 0)
+        )
+
+
+deferred_queue = DeferredMessageQueue(redis_client)
+campaign_progress = CampaignProgress(redis_client)
+
+
+def _defer_message(message_service: MessageService, message: MessageRecord, error: str) -> None:
+    """
+    没有可用发件账户时暂存消息，等待账户额度恢复后由release_deferred_messages放回发送队列
+
+    先把状态改回PENDING再写入Redis，写入失败的消息由reconcile_deferred_messages按错误码补回
+    """
+    message_service.update_message_status(
+        message,
+        MessageStatus.PENDING,
+        error_code=DEFERRED_ERROR_CODE,
+        error_message=error
+    )
+    deferred_queue.park(message.id, message.created_at)
+    MESSAGE_DEFERRED.labels(action="parked").inc()
+    logger.info(f"No sending account has capacity, message deferred: message_id={message.id}")
+
+
 @celery_app.task(
     bind=True,
     base=EmailTask,
     max_retries=3,
     default_retry_delay=60,  # 1分钟后重试
+    # SMTP发送结果由任务自行分类处理，自动重试只兜底数据库等基础设施异常
     autoretry_for=(Exception,),
     retry_backoff=True,
     retry_backoff_max=600,  # 最大10分钟
@@ -36,21 +90,40 @@ def send_email_task(self, message_id: int):
     """
     发送邮件任务
     
+    SMTP错误分类处理：永久失败直接标记失败；账户侧错误在send_email内换账户重发；
+    收件方暂时拒收（及所有账户均失败）按指数退避延迟重试；
+    没有任何账户有可用额度时暂存到延迟队列，不消耗重试次数
+    
     Args:
         message_id: 消息ID
     """
     db = SessionLocal()
+    task_start = time.perf_counter()
     
     try:
         # 获取消息记录
-        message = db.query(MessageRecord).get(message_id)
-        if not message:
-            logger.error(f"Message {message_id} not found")
+        with tracer.span("db.load_message", attributes={"message_id": message_id}):
+            message = db.query(MessageRecord).get(message_id)
+            if not message:
+                logger.error(f"Message {message_id} not found")
+                return
+            content = message.content
+        
+        message_service = MessageService(db, redis_client)
+        
+        # 所属批量任务已取消：不再发送
+        if message.campaign_id and campaign_progress.is_cancelled(message.campaign_id):
+            message_service.update_message_status(
+                message,
+                MessageStatus.FAILED,
+                error_code=CAMPAIGN_CANCELLED_ERROR_CODE,
+                error_message="Campaign cancelled"
+            )
             return
         
         # 更新状态为发送中
-        message_service = MessageService(db)
-        message_service.update_message_status(message, MessageStatus.SENDING)
+        with tracer.span("message.status", attributes={"status": MessageStatus.SENDING.value}):
+            message_service.update_message_status(message, MessageStatus.SENDING)
         
         # 解析收件人
         to_list = [email.strip() for email in message.to.split(",")]
@@ -61,15 +134,17 @@ def send_email_task(self, message_id: int):
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
         
-        success, sender, error = loop.run_until_complete(
+        smtp_timings = {}
+        success, sender, error, error_class = loop.run_until_complete(
             send_email(
                 db=db,
                 to=to_list,
                 subject=message.subject or "No Subject",
-                content=message.content,
+                content=content,
                 cc=cc_list,
                 bcc=bcc_list,
-                content_type=message.content_type
+                content_type=message.content_type,
+                timings=smtp_timings
             )
         )
         
@@ -80,26 +155,42 @@ def send_email_task(self, message_id: int):
             message_service.update_message_status(
                 message,
                 MessageStatus.SUCCESS,
-                sender=sender
+                sender=sender,
+                smtp_timings=smtp_timings
+            )
+            _record_delivery(message, MessageStatus.SUCCESS)
+            logger.debug(f"Email sent successfully: message_id={message_id}")
+        elif error_class == PERMANENT:
+            # 永久失败（如收件人不存在），不重试
+            message_service.update_message_status(
+                message,
+                MessageStatus.FAILED,
+                sender=sender,
+                error_code="SMTP_PERMANENT",
+                error_message=error
             )
-            logger.info(f"Email sent successfully: message_id={message_id}")
+            _record_delivery(message, MessageStatus.FAILED)
+            logger.warning(f"Email permanently rejected: message_id={message_id}, error={error}")
+        elif error_class == NO_ACCOUNT and settings.DEFERRED_QUEUE_ENABLED:
+            # 账户额度全部用尽，重试也只会再次失败：暂存等待额度恢复
+            _defer_message(message_service, message, error)
         else:
-            # 发送失败，记录重试日志
+            # 收件方暂时拒收，或所有可用账户都失败：延迟重试
             retry_count = self.request.retries
             max_retries = self.max_retries
             
             if retry_count < max_retries:
-                # 记录重试
-                retry_at = datetime.utcnow() + timedelta(seconds=60 * (2 ** retry_count))
+                countdown = 60 * (2 ** retry_count)
+                retry_at = datetime.utcnow() + timedelta(seconds=countdown)
                 message_service.add_retry_log(message, error, retry_at)
                 message_service.update_message_status(
                     message,
                     MessageStatus.RETRYING,
+                    error_code=f"SMTP_{error_class.upper()}",
                     error_message=error
                 )
-                
-                # 抛出异常以触发重试
-                raise Exception(error)
+                _record_delivery(message, MessageStatus.RETRYING)
+                raise self.retry(countdown=countdown)
             else:
                 # 达到最大重试次数，标记为失败
                 message_service.update_message_status(
@@ -109,8 +200,11 @@ def send_email_task(self, message_id: int):
                     error_code="MAX_RETRIES_EXCEEDED",
                     error_message=error
                 )
+                _record_delivery(message, MessageStatus.FAILED)
                 logger.error(f"Email send failed after {max_retries} retries: message_id={message_id}")
         
+    except Retry:
+        raise
     except Exception as e:
         logger.error(f"Error in send_email_task: {str(e)}")
         
@@ -122,17 +216,19 @@ def send_email_task(self, message_id: int):
             try:
                 message = db.query(MessageRecord).get(message_id)
                 if message:
-                    message_service = MessageService(db)
+                    message_service = MessageService(db, redis_client)
                     message_service.update_message_status(
                         message,
                         MessageStatus.FAILED,
                         error_code="TASK_ERROR",
                         error_message=str(e)
                     )
+                    _record_delivery(message, MessageStatus.FAILED)
             except Exception as update_error:
                 logger.error(f"Failed to update message status: {update_error}")
     
     finally:
+        TASK_DURATION.labels(task="send_email_task").observe(time.perf_counter() - task_start)
         db.close()
 
 
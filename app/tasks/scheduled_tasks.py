@@ -3,18 +3,27 @@
 """
 from datetime import datetime, timedelta
 
+from sqlalchemy import update
+
 from app.tasks.celery_app import celery_app
+from app.tasks.dispatch import enqueue_email
+from app.core.config import settings
 from app.core.database import SessionLocal
 from app.core.logger import logger
-from app.services.email_service import EmailPoolManager
+from app.core.metrics import MESSAGE_DEFERRED
+from app.services.deferred_queue import DeferredMessageQueue, DEFERRED_ERROR_CODE
+from app.services.email_service import EmailPoolManager, account_breaker, account_quota
+from app.services.scheduler import ScheduledMessageQueue
 from app.models.email import EmailAttachment
+from app.models.message import MessageRecord, MessageStatus
+from app.utils.redis_client import redis_client
 
 
 @celery_app.task(name="app.tasks.scheduled_tasks.reset_email_daily_counts")
 def reset_email_daily_counts():
     """
     重置邮箱每日发送计数
-    每天凌晨0点执行
+    每天凌晨0点执行；启用滚动配额时账户选择不再依赖该计数，仅用于展示当日发送量
     """
     db = SessionLocal()
     
@@ -22,6 +31,8 @@ def reset_email_daily_counts():
         pool_manager = EmailPoolManager(db)
         count = pool_manager.reset_daily_counts()
         logger.info(f"Reset daily counts for {count} email accounts")
+        # 未启用滚动配额时额度在此刻恢复，立即释放暂存消息
+        release_deferred_messages.delay()
         return {"status": "success", "count": count}
     except Exception as e:
         logger.error(f"Error resetting email daily counts: {str(e)}")
@@ -75,5 +86,237 @@ def cleanup_expired_attachments():
         db.close()
 
 
-__all__ = ["reset_email_daily_counts", "cleanup_expired_attachments"]
+@celery_app.task(name="app.tasks.scheduled_tasks.release_scheduled_messages", ignore_result=True)
+def release_scheduled_messages():
+    """
+    投递到期的定时消息
+    按批认领Redis中到期的消息ID，投递到发送队列后再标记入队时间并确认认领，内存占用只与批量大小有关
+
+    先投递后标记：投递失败或进程退出时未确认的认领在租约到期后被重新认领，
+    此时queued_at仍为空，消息会再次投递而不会被跳过（至少投递一次）
+    """
+    queue = ScheduledMessageQueue(redis_client)
+    db = SessionLocal()
+    released = 0
+    
+    try:
+        while released < settings.SCHEDULE_DISPATCH_MAX_PER_RUN:
+            message_ids = queue.claim_due(
+                settings.SCHEDULE_DISPATCH_BATCH_SIZE,
+                settings.SCHEDULE_CLAIM_LEASE_SECONDS
+            )
+            if not message_ids:
+                break
+            
+            # 只投递仍在等待的消息（已删除或已投递的跳过）
+            ready = [
+                row.id for row in db.query(MessageRecord.id).filter(
+                    MessageRecord.id.in_(message_ids),
+                    MessageRecord.status == MessageStatus.PENDING,
+                    MessageRecord.queued_at.is_(None)
+                )
+            ]
+            
+            queued_at = datetime.now()
+            published = []
+            try:
+                for message_id in ready:
+                    enqueue_email(message_id)
+                    published.append(message_id)
+            finally:
+                # 只标记并确认已投递的消息；未投递的保留认领，租约到期后重新认领
+                if published:
+                    db.execute(
+                        update(MessageRecord)
+                        .where(MessageRecord.id.in_(published), MessageRecord.queued_at.is_(None))
+                        .values(queued_at=queued_at)
+                    )
+                    db.commit()
+                unpublished = set(ready) - set(published)
+                queue.ack([message_id for message_id in message_ids if message_id not in unpublished])
+            released += len(published)
+        
+        if released:
+            logger.info(f"Released {released} scheduled messages")
+        return {"status": "success", "count": released}
+    except Exception as e:
+        logger.error(f"Error releasing scheduled messages: {str(e)}")
+        db.rollback()
+        return {"status": "error", "message": str(e)}
+    finally:
+        db.close()
+
+
+@celery_app.task(name="app.tasks.scheduled_tasks.reconcile_scheduled_messages")
+def reconcile_scheduled_messages():
+    """
+    补回定时消息
+    数据库中一小时内到期、尚未投递的定时消息若不在Redis中（写入失败或Redis数据丢失），按ID分批重新加入
+    """
+    queue = ScheduledMessageQueue(redis_client)
+    db = SessionLocal()
+    horizon = datetime.now() + timedelta(hours=1)
+    last_id = 0
+    restored = 0
+    
+    try:
+        while True:
+            rows = (
+                db.query(MessageRecord.id, MessageRecord.send_at)
+                .filter(
+                    MessageRecord.id > last_id,
+                    MessageRecord.status == MessageStatus.PENDING,
+                    MessageRecord.send_at <= horizon,
+                    MessageRecord.queued_at == None
+                )
+                .order_by(MessageRecord.id)
+                .limit(settings.SCHEDULE_DISPATCH_BATCH_SIZE)
+                .all()
+            )
+            if not rows:
+                break
+            restored += queue.add_many({row.id: row.send_at for row in rows})
+            last_id = rows[-1].id
+        
+        if restored:
+            logger.warning(f"Restored {restored} scheduled messages missing from Redis")
+        return {"status": "success", "count": restored}
+    except Exception as e:
+        logger.error(f"Error reconciling scheduled messages: {str(e)}")
+        return {"status": "error", "message": str(e)}
+    finally:
+        db.close()
+
+
+def _restore_deferred(db, queue: DeferredMessageQueue, message_ids: list) -> None:
+    """
+    恢复投递失败的暂存消息：重新写入暂存错误码并放回延迟队列
+
+    Args:
+        db: 数据库会话
+        queue: 延迟队列
+        message_ids: 已清除错误码但未投递的消息ID
+    """
+    if not message_ids:
+        return
+    db.rollback()
+    rows = db.execute(
+        update(MessageRecord)
+        .where(
+            MessageRecord.id.in_(message_ids),
+            MessageRecord.status == MessageStatus.PENDING,
+            MessageRecord.error_code.is_(None)
+        )
+        .values(error_code=DEFERRED_ERROR_CODE, error_message="Re-deferred after enqueue failure")
+        .returning(MessageRecord.id, MessageRecord.created_at)
+    ).all()
+    db.commit()
+    queue.park_many({row.id: row.created_at for row in rows})
+    logger.warning(f"Enqueue failed, re-deferred {len(rows)} messages")
+
+
+@celery_app.task(name="app.tasks.scheduled_tasks.release_deferred_messages", ignore_result=True)
+def release_deferred_messages():
+    """
+    释放暂存消息
+    因没有可用账户而暂存的消息按创建时间先后放回发送队列，数量不超过当前各账户剩余额度之和，
+    额度未恢复时不释放，避免消息在队列和暂存之间空转
+
+    投递失败时未投递的消息恢复暂存错误码并重新暂存，不会停留在既不在队列也不在暂存中的状态
+    """
+    queue = DeferredMessageQueue(redis_client)
+    db = SessionLocal()
+    released = 0
+    
+    try:
+        capacity = EmailPoolManager(db, breaker=account_breaker, quota=account_quota).available_capacity()
+        limit = min(capacity, settings.DEFERRED_RELEASE_MAX_PER_RUN)
+        
+        while released < limit:
+            message_ids = queue.pop(min(settings.DEFERRED_RELEASE_BATCH_SIZE, limit - released))
+            if not message_ids:
+                break
+            
+            # 清除暂存错误码作为释放标记（已删除或已被处理的消息跳过）
+            ready = db.execute(
+                update(MessageRecord)
+                .where(
+                    MessageRecord.id.in_(message_ids),
+                    MessageRecord.status == MessageStatus.PENDING,
+                    MessageRecord.error_code == DEFERRED_ERROR_CODE
+                )
+                .values(error_code=None, error_message=None)
+                .returning(MessageRecord.id)
+            ).scalars().all()
+            db.commit()
+            
+            published = 0
+            try:
+                for message_id in ready:
+                    enqueue_email(message_id)
+                    published += 1
+            except Exception:
+                _restore_deferred(db, queue, ready[published:])
+                raise
+            released += len(ready)
+        
+        if released:
+            MESSAGE_DEFERRED.labels(action="released").inc(released)
+            logger.info(f"Released {released} deferred messages (capacity {capacity})")
+        return {"status": "success", "count": released, "capacity": capacity}
+    except Exception as e:
+        logger.error(f"Error releasing deferred messages: {str(e)}")
+        db.rollback()
+        return {"status": "error", "message": str(e)}
+    finally:
+        db.close()
+
+
+@celery_app.task(name="app.tasks.scheduled_tasks.reconcile_deferred_messages")
+def reconcile_deferred_messages():
+    """
+    补回暂存消息
+    数据库中仍带暂存错误码的消息若不在Redis中（写入失败、Redis数据丢失或取出后未完成释放），按ID分批重新加入
+    """
+    queue = DeferredMessageQueue(redis_client)
+    db = SessionLocal()
+    last_id = 0
+    restored = 0
+    
+    try:
+        while True:
+            rows = (
+                db.query(MessageRecord.id, MessageRecord.created_at)
+                .filter(
+                    MessageRecord.id > last_id,
+                    MessageRecord.status == MessageStatus.PENDING,
+                    MessageRecord.error_code == DEFERRED_ERROR_CODE
+                )
+                .order_by(MessageRecord.id)
+                .limit(settings.DEFERRED_RELEASE_BATCH_SIZE)
+                .all()
+            )
+            if not rows:
+                break
+            restored += queue.park_many({row.id: row.created_at for row in rows})
+            last_id = rows[-1].id
+        
+        if restored:
+            logger.warning(f"Restored {restored} deferred messages missing from Redis")
+        return {"status": "success", "count": restored}
+    except Exception as e:
+        logger.error(f"Error reconciling deferred messages: {str(e)}")
+        return {"status": "error", "message": str(e)}
+    finally:
+        db.close()
+
+
+__all__ = [
+    "reset_email_daily_counts",
+    "cleanup_expired_attachments",
+    "release_scheduled_messages",
+    "reconcile_scheduled_messages",
+    "release_deferred_messages",
+    "reconcile_deferred_messages",
+]
 
@@ -29,6 +29,17 @@ def db_session():
         Base.metadata.drop_all(bind=engine)
 
 
+@pytest.fixture
+def fake_redis():
+    """基于fakeredis的RedisClient（支持Lua脚本）"""
+    import fakeredis
+    from app.utils.redis_client import RedisClient
+    
+    redis_client = RedisClient.__new__(RedisClient)
+    redis_client.client = fakeredis.FakeRedis(decode_responses=True)
+    return redis_client
+
+
 @pytest.fixture(scope="function")
 def client(db_session):
     """创建测试客户端"""
@@ -0,0 +1,139 @@
+"""
+账户滚动配额测试：时间桶窗口、匀速发送、发送失败时退还配额
+"""
+import pytest
+
+from app.core.config import settings
+from app.models.email import EmailAccount
+from app.services import email_service
+from app.services.account_health import AccountHealthTracker
+from app.services.account_quota import AccountQuota
+from app.services.circuit_breaker import AccountCircuitBreaker
+
+
+@pytest.fixture
+def quota_settings(monkeypatch):
+    """1小时一个桶、24桶窗口、1桶匀速窗口"""
+    monkeypatch.setattr(settings, "QUOTA_ROLLING_ENABLED", True)
+    monkeypatch.setattr(settings, "QUOTA_BUCKET_SECONDS", 3600)
+    monkeypatch.setattr(settings, "QUOTA_WINDOW_SECONDS", 86400)
+    monkeypatch.setattr(settings, "QUOTA_PACING_ENABLED", False)
+    monkeypatch.setattr(settings, "QUOTA_PACING_WINDOW_SECONDS", 3600)
+    monkeypatch.setattr(settings, "QUOTA_PACING_BURST", 2.0)
+
+
+def _quota(fake_redis, now):
+    """now为列表，修改now[0]即可推进当前桶"""
+    quota = AccountQuota(fake_redis)
+    quota._now_bucket = lambda: now[0]
+    return quota
+
+
+def _account(account_id=1, daily_limit=3):
+    return EmailAccount(id=account_id, email=f"sender{account_id}@example.com", daily_limit=daily_limit)
+
+
+def test_window_counts_expire_bucket_by_bucket(fake_redis, quota_settings):
+    now = [1000]
+    quota = _quota(fake_redis, now)
+    account = _account(daily_limit=3)
+
+    assert quota.try_consume(account)
+    now[0] += 10
+    assert quota.try_consume(account)
+    assert quota.try_consume(account)
+    assert not quota.try_consume(account)
+    assert quota.usage([account])[1] == {
+        "used": 3, "remaining": 0, "paced": 2, "pace_limit": None, "available": False,
+    }
+
+    # 第一个桶滑出24桶窗口后释放一次额度
+    now[0] = 1000 + 24
+    assert quota.usage([account])[1]["used"] == 2
+    assert quota.try_consume(account)
+    assert not quota.try_consume(account)
+    assert "1000" not in fake_redis.client.hgetall("smtp:quota:1")
+
+
+def test_release_returns_consumed_slot(fake_redis, quota_settings):
+    quota = _quota(fake_redis, [1000])
+    account = _account(daily_limit=1)
+
+    assert quota.try_consume(account)
+    assert quota.available([account]) == []
+    quota.release(account)
+    assert quota.available([account]) == [account]
+    assert quota.try_consume(account)
+
+
+@pytest.mark.parametrize("daily_limit,expected", [
+    (240, 20),  # 240/24桶 = 每桶10，突发倍数2
+    (100, 9),   # 100/24 * 2 = 8.33 向上取整
+    (1, 1),     # 至少为1
+])
+def test_pace_limit(fake_redis, quota_settings, monkeypatch, daily_limit, expected):
+    monkeypatch.setattr(settings, "QUOTA_PACING_ENABLED", True)
+    assert _quota(fake_redis, [1000]).pace_limit(_account(daily_limit=daily_limit)) == expected
+
+
+def test_pace_limit_disabled(fake_redis, quota_settings):
+    assert _quota(fake_redis, [1000]).pace_limit(_account(daily_limit=240)) == 0
+
+
+def test_pacing_limits_short_window(fake_redis, quota_settings, monkeypatch):
+    monkeypatch.setattr(settings, "QUOTA_PACING_ENABLED", True)
+    monkeypatch.setattr(settings, "QUOTA_PACING_BURST", 1.0)
+    now = [1000]
+    quota = _quota(fake_redis, now)
+    account = _account(daily_limit=48)
+
+    assert [quota.try_consume(account) for _ in range(3)] == [True, True, False]
+    assert quota.usage([account])[1]["available"] is False
+
+    # 进入下一个匀速窗口，滚动窗口内仍有余量
+    now[0] += 1
+    assert quota.try_consume(account)
+    assert quota.usage([account])[1]["used"] == 3
+
+
+@pytest.fixture
+def send_pool(db_session, fake_redis, quota_settings, monkeypatch):
+    """send_email使用fakeredis上的健康度、熔断器和配额，返回配额对象"""
+    monkeypatch.setattr(settings, "EMAIL_FAILOVER_MAX_ACCOUNTS", 1)
+    quota = AccountQuota(fake_redis)
+    monkeypatch.setattr(email_service, "account_quota", quota)
+    monkeypatch.setattr(email_service, "account_health", AccountHealthTracker(fake_redis))
+    monkeypatch.setattr(email_service, "account_breaker", AccountCircuitBreaker(fake_redis))
+
+    db_session.add(EmailAccount(
+        email="sender@example.com",
+        smtp_host="smtp.example.com",
+        smtp_username="sender@example.com",
+        smtp_password="encrypted",
+        daily_limit=10,
+    ))
+    db_session.commit()
+    return quota
+
+
+def _failing_send(phases, error):
+    async def send(self, **kwargs):
+        self.phase_timings = {phase: 0.01 for phase in phases}
+        raise error
+    return send
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("phases,used", [
+    ((), 0),                    # 连接失败：退还配额
+    (("connect",), 0),          # 登录失败：退还配额
+    (("connect", "login"), 1),  # 投递阶段失败：邮件可能已被接收，不退还
+])
+async def test_send_email_releases_quota_before_data(db_session, send_pool, monkeypatch, phases, used):
+    monkeypatch.setattr(email_service.EmailSender, "send", _failing_send(phases, OSError("connection reset")))
+
+    success, _, _, _ = await email_service.send_email(db_session, ["user@example.com"], "Hi", "body")
+
+    account = db_session.query(EmailAccount).one()
+    assert not success
+    assert send_pool.usage([account])[account.id]["used"] == used
@@ -0,0 +1,113 @@
+"""
+认证缓存测试：TTL上限、按调用方失效、跨进程失效通知
+"""
+import time
+
+import fakeredis
+import pytest
+
+from app.core.auth_cache import AuthCache, Principal, PRINCIPAL_API_KEY, PRINCIPAL_ADMIN
+from app.utils import redis_client as redis_client_module
+from app.utils.redis_client import ChannelListener
+
+
+@pytest.fixture(autouse=True)
+def listener_redis(fake_redis, monkeypatch):
+    """失效通知走fakeredis"""
+    monkeypatch.setattr(redis_client_module, "redis_client", fake_redis)
+    return fake_redis
+
+
+def _wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+def _principal(principal_id=1, principal_type=PRINCIPAL_API_KEY):
+    return Principal(type=principal_type, id=principal_id, name=f"key{principal_id}")
+
+
+def test_get_returns_cached_claims():
+    cache = AuthCache(maxsize=10, ttl=300)
+    claims = {"sub": "1", "exp": time.time() + 3600}
+    cache.set("token-a", claims, _principal())
+
+    assert cache.get("token-a") == (claims, _principal())
+    assert cache.get("token-b") is None
+
+
+def test_ttl_is_capped_by_token_exp():
+    cache = AuthCache(maxsize=10, ttl=300)
+
+    cache.set("expired", {"exp": time.time() - 1}, _principal())
+    assert cache.get("expired") is None
+    assert len(cache) == 0
+
+    cache.set("short", {"exp": time.time() + 0.05}, _principal())
+    assert cache.get("short") is not None
+    time.sleep(0.1)
+    assert cache.get("short") is None
+
+
+def test_invalidate_local_only_affects_principal():
+    cache = AuthCache(maxsize=10, ttl=300)
+    cache.set("token-a1", {}, _principal(1))
+    cache.set("token-a2", {}, _principal(1))
+    cache.set("token-b", {}, _principal(2))
+    cache.set("token-admin", {}, _principal(1, PRINCIPAL_ADMIN))
+
+    cache.invalidate_local(PRINCIPAL_API_KEY, 1)
+
+    assert cache.get("token-a1") is None
+    assert cache.get("token-a2") is None
+    assert cache.get("token-b") is not None
+    assert cache.get("token-admin") is not None
+
+    # 失效后重新认证写入的条目正常命中
+    cache.set("token-a1", {}, _principal(1))
+    assert cache.get("token-a1") is not None
+
+
+def test_evicted_tokens_leave_no_per_token_state():
+    """LRU淘汰后不留下任何按Token的记录，内存只受maxsize限制"""
+    cache = AuthCache(maxsize=10, ttl=300)
+    for i in range(1000):
+        cache.set(f"token-{i}", {}, _principal(i % 3))
+
+    assert len(cache) == 10
+    assert cache._generations == {}
+
+
+def test_invalidate_notifies_other_processes():
+    local, remote = AuthCache(maxsize=10, ttl=300), AuthCache(maxsize=10, ttl=300)
+    local.set("token", {}, _principal())
+    remote.set("token", {}, _principal())
+
+    local.invalidate(PRINCIPAL_API_KEY, 1)
+
+    assert local.get("token") is None
+    assert _wait_until(lambda: remote.get("token") is None)
+
+
+def test_listener_recovers_after_connection_drop(listener_redis, monkeypatch):
+    """监听连接断开：清空本地缓存，恢复后重新订阅，失效通知照常到达"""
+    server = fakeredis.FakeServer()
+    listener_redis.client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    monkeypatch.setattr(ChannelListener, "RESUBSCRIBE_INTERVAL", 0)
+    local, remote = AuthCache(maxsize=10, ttl=300), AuthCache(maxsize=10, ttl=300)
+    remote.set("token", {}, _principal())
+
+    # 断线期间可能错过失效通知：清空缓存；重新订阅失败，留待下次start重试
+    server.connected = False
+    assert _wait_until(lambda: remote._listener._pid is None)
+    assert remote.get("token") is None
+
+    server.connected = True
+    remote.set("token", {}, _principal())
+    assert remote._listener._pid is not None
+    assert remote.get("token") is not None
+
+    local.invalidate(PRINCIPAL_API_KEY, 1)
+    assert _wait_until(lambda: remote.get("token") is None)
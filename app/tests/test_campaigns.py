@@ -0,0 +1,297 @@
+"""
+批量发送任务测试：收件人解析、进度计数、拆分任务链的启动/暂停/恢复/取消
+"""
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.models.campaign import Campaign, CampaignRecipient, CampaignStatus
+from app.models.message import MessageRecord, MessageStatus
+from app.models.template import MessageTemplate, TemplateType
+from app.services.campaign_progress import CampaignProgress, CAMPAIGN_CANCELLED_ERROR_CODE, outcome_field
+from app.services.campaign_service import CampaignService, CampaignError, RecipientParser
+from app.tasks import campaign_tasks
+
+
+# ==================== 收件人解析 ====================
+
+def test_csv_parser_uses_header_columns_as_variables():
+    parser = RecipientParser("csv")
+
+    assert parser.parse("\ufeffemail,name,city\n") is None
+    assert parser.parse("a@example.com,张三,上海") == ("a@example.com", {"name": "张三", "city": "上海"})
+    assert parser.parse('b@example.com,"Li, Si",') == ("b@example.com", {"name": "Li, Si", "city": ""})
+    assert parser.parse("   ") is None
+
+
+def test_csv_parser_requires_email_column():
+    with pytest.raises(CampaignError):
+        RecipientParser("csv").parse("name,city")
+
+
+@pytest.mark.parametrize("line", ["not-an-email,张三", ",张三"])
+def test_csv_parser_rejects_invalid_email(line):
+    parser = RecipientParser("csv")
+    parser.parse("email,name")
+    with pytest.raises(ValueError):
+        parser.parse(line)
+
+
+def test_ndjson_parser():
+    parser = RecipientParser("ndjson")
+
+    assert parser.parse('{"email": "a@example.com", "variables": {"name": "张三"}}') == (
+        "a@example.com", {"name": "张三"}
+    )
+    assert parser.parse('{"email": "b@example.com"}') == ("b@example.com", {})
+    assert parser.parse("") is None
+
+
+@pytest.mark.parametrize("line", [
+    "[1, 2]",
+    '{"email": "a@example.com", "variables": [1]}',
+    '{"email": "bad"}',
+    "{not json",
+])
+def test_ndjson_parser_rejects_invalid_lines(line):
+    with pytest.raises(ValueError):
+        RecipientParser("ndjson").parse(line)
+
+
+def test_parser_rejects_unknown_format():
+    with pytest.raises(CampaignError):
+        RecipientParser("xlsx")
+
+
+# ==================== 进度计数 ====================
+
+@pytest.mark.parametrize("status,error_code,expected", [
+    (MessageStatus.SUCCESS, None, "success"),
+    (MessageStatus.FAILED, "SMTP_PERMANENT", "failed"),
+    (MessageStatus.FAILED, CAMPAIGN_CANCELLED_ERROR_CODE, "cancelled"),
+    (MessageStatus.RETRYING, None, None),
+    (MessageStatus.PENDING, None, None),
+])
+def test_outcome_field(status, error_code, expected):
+    assert outcome_field(status, error_code) == expected
+
+
+def test_progress_counters(fake_redis):
+    progress = CampaignProgress(fake_redis)
+
+    progress.record(1, MessageStatus.SUCCESS)
+    progress.record(1, MessageStatus.SUCCESS)
+    progress.record(1, MessageStatus.FAILED, "SMTP_PERMANENT")
+    progress.record(1, MessageStatus.RETRYING)
+    # 失败消息重新发送时撤销计数
+    progress.record(1, MessageStatus.FAILED, "SMTP_PERMANENT", amount=-1)
+    progress.seed(2, {"success": 5, "failed": 1, "cancelled": 2})
+
+    assert progress.get_many([1, 2, 3]) == {
+        1: {"success": 2, "failed": 0, "cancelled": 0},
+        2: {"success": 5, "failed": 1, "cancelled": 2},
+        3: None,
+    }
+    assert fake_redis.client.ttl("campaign:progress:1") > 0
+
+
+def test_progress_seed_does_not_overwrite(fake_redis):
+    """重建计数时Worker已递增：保留已有计数，不覆盖"""
+    progress = CampaignProgress(fake_redis)
+
+    assert progress.seed(1)
+    progress.record(1, MessageStatus.SUCCESS)
+    assert not progress.seed(1, {"success": 10})
+    assert progress.get_many([1])[1] == {"success": 1, "failed": 0, "cancelled": 0}
+    assert fake_redis.client.ttl("campaign:progress:1") > 0
+
+
+def test_progress_cancelled_flag(fake_redis):
+    progress = CampaignProgress(fake_redis)
+
+    assert not progress.is_cancelled(1)
+    progress.mark_cancelled(1)
+    assert progress.is_cancelled(1)
+    assert not progress.is_cancelled(2)
+
+
+# ==================== 拆分任务链 ====================
+
+@pytest.fixture
+def fanout(db_session, fake_redis, monkeypatch):
+    """
+    把拆分任务接到测试数据库和fakeredis上，记录投递的消息和调度的下一批
+
+    Returns:
+        dict: enqueued 投递的消息ID，scheduled 调度的 (campaign_id, run_token)
+    """
+    recorded = {"enqueued": [], "scheduled": []}
+    monkeypatch.setattr(settings, "CAMPAIGN_CHUNK_SIZE", 2)
+    monkeypatch.setattr(campaign_tasks, "SessionLocal", sessionmaker(bind=db_session.get_bind()))
+    monkeypatch.setattr(campaign_tasks, "redis_client", fake_redis)
+    monkeypatch.setattr(campaign_tasks, "enqueue_email", recorded["enqueued"].append)
+    monkeypatch.setattr(
+        campaign_tasks.fan_out_campaign,
+        "apply_async",
+        lambda args, countdown: recorded["scheduled"].append(tuple(args))
+    )
+    return recorded
+
+
+def _campaign(db_session, fake_redis, recipients=5):
+    db_session.add(MessageTemplate(
+        code="notice",
+        name="通知",
+        type=TemplateType.EMAIL,
+        subject_template="Hi {{ name }}",
+        content_template="<p>{{ name }} @ {{ company }}</p>",
+    ))
+    db_session.commit()
+
+    service = CampaignService(db_session, fake_redis)
+    campaign = service.create_campaign("测试任务", "notice", variables={"company": "示例公司"}, rate_limit=100)
+    service.add_recipients(
+        campaign.id,
+        [(f"user{i}@example.com", {"name": f"user{i}"}) for i in range(recipients)]
+    )
+    return service, campaign.id
+
+
+def _reload(db_session, campaign_id):
+    db_session.expire_all()
+    return db_session.query(Campaign).get(campaign_id)
+
+
+def test_fan_out_chunks_until_finished(db_session, fake_redis, fanout):
+    """每批拆分CHUNK_SIZE个收件人并调度下一批，收件人用完后任务链结束"""
+    service, campaign_id = _campaign(db_session, fake_redis)
+    token = service.start(campaign_id).run_token
+    # 开始时计数初始化为0，同步任务不会从消息表重建
+    assert CampaignProgress(fake_redis).get_many([campaign_id])[campaign_id] == {
+        "success": 0, "failed": 0, "cancelled": 0
+    }
+
+    for _ in range(3):
+        campaign_tasks.fan_out_campaign(campaign_id, token)
+    assert len(fanout["enqueued"]) == 5
+    assert fanout["scheduled"] == [(campaign_id, token)] * 3
+
+    # 暂存表已空：标记拆分完成，不再调度
+    campaign_tasks.fan_out_campaign(campaign_id, token)
+    campaign = _reload(db_session, campaign_id)
+    assert len(fanout["scheduled"]) == 3
+    assert campaign.fanout_finished_at is not None
+    assert campaign.created_count == 5
+    assert db_session.query(CampaignRecipient).count() == 0
+
+    messages = db_session.query(MessageRecord).order_by(MessageRecord.id).all()
+    assert [message.id for message in messages] == fanout["enqueued"]
+    assert messages[0].subject == "Hi user0"
+    assert messages[0].content == "<p>user0 @ 示例公司</p>"
+    assert all(message.campaign_id == campaign_id for message in messages)
+
+
+def test_pause_resume_replaces_run_token(db_session, fake_redis, fanout):
+    """暂停后旧任务链退出；恢复生成新令牌，旧令牌的任务链不再拆分"""
+    service, campaign_id = _campaign(db_session, fake_redis)
+    old_token = service.start(campaign_id).run_token
+    campaign_tasks.fan_out_campaign(campaign_id, old_token)
+    assert len(fanout["enqueued"]) == 2
+
+    service.pause(campaign_id)
+    campaign_tasks.fan_out_campaign(campaign_id, old_token)
+    assert len(fanout["enqueued"]) == 2
+    assert len(fanout["scheduled"]) == 1
+
+    new_token = service.resume(campaign_id).run_token
+    assert new_token != old_token
+
+    # 暂停前已调度的旧任务链在恢复后到达：直接退出
+    campaign_tasks.fan_out_campaign(campaign_id, old_token)
+    assert len(fanout["enqueued"]) == 2
+
+    campaign_tasks.fan_out_campaign(campaign_id, new_token)
+    assert len(fanout["enqueued"]) == 4
+    assert fanout["scheduled"][-1] == (campaign_id, new_token)
+
+
+def test_cancel_stops_fan_out(db_session, fake_redis, fanout):
+    """取消后不再拆分，Worker据Redis标记跳过队列中的消息"""
+    service, campaign_id = _campaign(db_session, fake_redis)
+    token = service.start(campaign_id).run_token
+    campaign_tasks.fan_out_campaign(campaign_id, token)
+
+    service.cancel(campaign_id)
+    campaign_tasks.fan_out_campaign(campaign_id, token)
+
+    assert len(fanout["enqueued"]) == 2
+    assert _reload(db_session, campaign_id).status == CampaignStatus.CANCELLED
+    assert CampaignProgress(fake_redis).is_cancelled(campaign_id)
+    with pytest.raises(CampaignError):
+        service.resume(campaign_id)
+    with pytest.raises(CampaignError):
+        service.cancel(campaign_id)
+
+
+@pytest.mark.parametrize("action", ["pause", "resume"])
+def test_invalid_transitions(db_session, fake_redis, action):
+    """草稿状态不能暂停或恢复；没有收件人不能开始"""
+    service, campaign_id = _campaign(db_session, fake_redis, recipients=0)
+
+    with pytest.raises(CampaignError):
+        getattr(service, action)(campaign_id)
+    with pytest.raises(CampaignError):
+        service.start(campaign_id)
+
+
+def test_sync_completes_campaign(db_session, fake_redis, fanout):
+    """拆分完成且全部消息有最终状态时，同步任务把任务标记为完成"""
+    service, campaign_id = _campaign(db_session, fake_redis, recipients=2)
+    token = service.start(campaign_id).run_token
+    campaign_tasks.fan_out_campaign(campaign_id, token)
+    campaign_tasks.fan_out_campaign(campaign_id, token)
+
+    progress = CampaignProgress(fake_redis)
+    progress.record(campaign_id, MessageStatus.SUCCESS)
+    campaign_tasks.sync_campaign_progress()
+    assert _reload(db_session, campaign_id).status == CampaignStatus.RUNNING
+
+    progress.record(campaign_id, MessageStatus.FAILED, "SMTP_PERMANENT")
+    campaign_tasks.sync_campaign_progress()
+    campaign = _reload(db_session, campaign_id)
+    assert campaign.status == CampaignStatus.COMPLETED
+    assert (campaign.success_count, campaign.failed_count) == (1, 1)
+
+
+def test_publish_failure_is_requeued_by_sync(db_session, fake_redis, fanout, monkeypatch):
+    """投递中途出错：已投递的标记入队时间，其余由同步任务补投"""
+    service, campaign_id = _campaign(db_session, fake_redis, recipients=2)
+    token = service.start(campaign_id).run_token
+
+    def flaky_enqueue(message_id):
+        if fanout["enqueued"]:
+            raise ConnectionError("broker unavailable")
+        fanout["enqueued"].append(message_id)
+
+    monkeypatch.setattr(campaign_tasks, "enqueue_email", flaky_enqueue)
+    campaign_tasks.fan_out_campaign(campaign_id, token)
+
+    db_session.expire_all()
+    first, second = db_session.query(MessageRecord).order_by(MessageRecord.id).all()
+    assert fanout["enqueued"] == [first.id]
+    assert first.queued_at is not None
+    assert second.queued_at is None
+    # 下一批延后重试
+    assert fanout["scheduled"] == [(campaign_id, token)]
+
+    # 刚生成的消息可能仍在投递中，不补投
+    monkeypatch.setattr(campaign_tasks, "enqueue_email", fanout["enqueued"].append)
+    campaign_tasks.sync_campaign_progress()
+    assert fanout["enqueued"] == [first.id]
+
+    second.created_at = second.created_at.replace(year=second.created_at.year - 1)
+    db_session.commit()
+    campaign_tasks.sync_campaign_progress()
+    db_session.expire_all()
+    assert fanout["enqueued"] == [first.id, second.id]
+    assert db_session.query(MessageRecord).get(second.id).queued_at is not None
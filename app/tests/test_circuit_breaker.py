@@ -0,0 +1,142 @@
+"""
+账户熔断器测试（fakeredis执行Lua脚本）：熔断阈值、冷却、半开探测
+"""
+import pytest
+
+from app.core.config import settings
+from app.services import circuit_breaker
+from app.services.circuit_breaker import AccountCircuitBreaker, STATE_CLOSED, STATE_OPEN, STATE_HALF_OPEN
+
+
+class FakeClock:
+    """替换circuit_breaker模块中的time"""
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(circuit_breaker, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def breaker(fake_redis, clock, monkeypatch):
+    """窗口60秒、至少4次、失败率50%、冷却30秒、2次探测"""
+    monkeypatch.setattr(settings, "CIRCUIT_BREAKER_ENABLED", True)
+    monkeypatch.setattr(settings, "CIRCUIT_BREAKER_WINDOW_SECONDS", 60)
+    monkeypatch.setattr(settings, "CIRCUIT_BREAKER_MIN_REQUESTS", 4)
+    monkeypatch.setattr(settings, "CIRCUIT_BREAKER_FAILURE_RATE", 0.5)
+    monkeypatch.setattr(settings, "CIRCUIT_BREAKER_OPEN_SECONDS", 30)
+    monkeypatch.setattr(settings, "CIRCUIT_BREAKER_HALF_OPEN_PROBES", 2)
+    return AccountCircuitBreaker(fake_redis)
+
+
+def _trip(breaker, account_id=1):
+    for _ in range(4):
+        breaker.record(account_id, False)
+    assert breaker.states([account_id])[account_id]["state"] == STATE_OPEN
+
+
+def _state(breaker, account_id=1):
+    return breaker.states([account_id])[account_id]
+
+
+def test_trips_when_min_requests_and_failure_rate_reached(breaker):
+    assert breaker.record(1, True) == STATE_CLOSED
+    assert breaker.record(1, False) == STATE_CLOSED
+    # 样本数不足
+    assert breaker.record(1, False) == STATE_CLOSED
+    assert breaker.record(1, False) == STATE_OPEN
+
+    state = _state(breaker)
+    assert state["reason"] == "3/4 failed"
+    assert not state["selectable"]
+    # 熔断期间的结果不再计入
+    assert breaker.record(1, True) == STATE_OPEN
+
+
+def test_stays_closed_below_failure_rate(breaker):
+    for success in (True, True, True, False, True, False):
+        assert breaker.record(1, success) == STATE_CLOSED
+    assert breaker.acquire(1)
+
+
+def test_old_buckets_leave_the_window(breaker, clock):
+    for _ in range(3):
+        breaker.record(1, False)
+    # 窗口（6个10秒桶）滑过后，之前的失败不再计入
+    clock.now += 70
+    assert breaker.record(1, False) == STATE_CLOSED
+
+
+def test_cooldown_then_half_open(breaker, clock):
+    _trip(breaker)
+
+    clock.now += 29
+    assert not breaker.acquire(1)
+    assert not breaker.selectable([1])
+
+    clock.now += 1
+    assert breaker.selectable([1]) == {1}
+    assert breaker.acquire(1)
+    assert _state(breaker)["state"] == STATE_HALF_OPEN
+
+
+def test_probe_successes_close_circuit(breaker, clock, fake_redis):
+    _trip(breaker)
+    clock.now += 30
+
+    assert breaker.acquire(1)
+    assert breaker.acquire(1)
+    # 探测名额用尽
+    assert not breaker.acquire(1)
+    assert _state(breaker)["probes_issued"] == 2
+
+    assert breaker.record(1, True) == STATE_HALF_OPEN
+    assert breaker.record(1, True) == STATE_CLOSED
+    assert fake_redis.client.keys("smtp:breaker:1*") == []
+    assert breaker.acquire(1)
+
+
+def test_probe_failure_reopens(breaker, clock):
+    _trip(breaker)
+    clock.now += 30
+    assert breaker.acquire(1)
+
+    assert breaker.record(1, False) == STATE_OPEN
+    state = _state(breaker)
+    assert state["reason"] == "probe failed"
+    assert state["opened_at"] == int(clock.now)
+    # 重新开始冷却
+    assert not breaker.acquire(1)
+    clock.now += 30
+    assert breaker.acquire(1)
+
+
+def test_stale_half_open_rearms_probes(breaker, clock):
+    """探测结果丢失（Worker崩溃）时，半开超过冷却时间后重新发放探测名额"""
+    _trip(breaker)
+    clock.now += 30
+    assert breaker.acquire(1)
+    assert breaker.acquire(1)
+    assert not breaker.acquire(1)
+
+    clock.now += 29
+    assert not breaker.acquire(1)
+    clock.now += 1
+    assert breaker.acquire(1)
+    state = _state(breaker)
+    assert (state["state"], state["probes_issued"]) == (STATE_HALF_OPEN, 1)
+
+
+def test_reset_closes_circuit(breaker):
+    _trip(breaker)
+    breaker.reset(1)
+    assert _state(breaker)["state"] == STATE_CLOSED
+    assert breaker.record(1, False) == STATE_CLOSED
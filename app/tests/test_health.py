@@ -30,3 +30,23 @@ def test_liveness_check(client):
     data = response.json()
     assert data["status"] == "healthy"
 
+
+
+def test_metrics_use_route_template(client):
+    """测试指标使用路由模板作为标签"""
+    client.get("/api/v1/messages/12345")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    body = response.text
+    assert 'endpoint="/api/v1/messages/{message_id}"' in body
+    assert "/api/v1/messages/12345" not in body
+
+
+def test_request_id_header(client):
+    """测试请求ID透传与生成"""
+    response = client.get("/health", headers={"X-Request-ID": "req-123"})
+    assert response.headers["X-Request-ID"] == "req-123"
+    assert "X-Process-Time" in response.headers
+
+    response = client.get("/health")
+    assert response.headers["X-Request-ID"]
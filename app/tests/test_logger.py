@@ -0,0 +1,31 @@
+"""
+日志输出缓冲测试
+"""
+import io
+
+from loguru import logger as loguru_logger
+
+from app.core.logger import BufferedStream
+
+
+def test_buffered_stream_flushes_errors_immediately():
+    stream = io.StringIO()
+    buffered = BufferedStream(stream, buffer_size=1 << 20, flush_interval=3600)
+    handler_id = loguru_logger.add(buffered, format="{message}", level="INFO")
+    try:
+        loguru_logger.info("queued")
+        assert stream.getvalue() == ""
+
+        loguru_logger.error("boom")
+        assert stream.getvalue() == "queued\nboom\n"
+    finally:
+        loguru_logger.remove(handler_id)
+
+
+def test_buffered_stream_stop_tolerates_closed_stream():
+    stream = io.StringIO()
+    buffered = BufferedStream(stream, buffer_size=1 << 20, flush_interval=3600)
+    buffered.write("pending\n")
+    stream.close()
+
+    buffered.stop()
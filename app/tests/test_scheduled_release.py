@@ -0,0 +1,97 @@
+"""
+定时消息投递测试（投递失败时消息不能丢失）
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.models.message import MessageRecord, MessageStatus, MessageChannel
+from app.tasks import scheduled_tasks
+
+
+class FakeScheduledQueue:
+    """按预设批次返回认领结果并记录确认的队列替身"""
+
+    def __init__(self, batches):
+        self.batches = list(batches)
+        self.acked = []
+
+    def claim_due(self, batch_size, lease_seconds):
+        return self.batches.pop(0) if self.batches else []
+
+    def ack(self, message_ids):
+        self.acked.extend(message_ids)
+
+
+def _scheduled_message(db_session):
+    message = MessageRecord(
+        channel=MessageChannel.EMAIL,
+        status=MessageStatus.PENDING,
+        to="user@example.com",
+        content_hash="0" * 64,
+        send_at=datetime.now() - timedelta(minutes=1),
+    )
+    db_session.add(message)
+    db_session.commit()
+    return message.id
+
+
+@pytest.fixture
+def release(db_session, monkeypatch):
+    """把定时投递任务接到测试数据库和替身队列上"""
+    monkeypatch.setattr(scheduled_tasks, "SessionLocal", sessionmaker(bind=db_session.get_bind()))
+
+    def run(batches, enqueue):
+        queue = FakeScheduledQueue(batches)
+        monkeypatch.setattr(scheduled_tasks, "ScheduledMessageQueue", lambda redis: queue)
+        monkeypatch.setattr(scheduled_tasks, "enqueue_email", enqueue)
+        return scheduled_tasks.release_scheduled_messages(), queue
+
+    return run
+
+
+def _queued_at(db_session, message_id):
+    db_session.expire_all()
+    return db_session.query(MessageRecord).get(message_id).queued_at
+
+
+def test_publish_failure_keeps_claim_for_redelivery(db_session, release):
+    """投递失败的消息不标记queued_at、不确认认领，租约到期后重新认领时仍会投递"""
+    first = _scheduled_message(db_session)
+    second = _scheduled_message(db_session)
+    published = []
+
+    def flaky_enqueue(message_id):
+        if message_id == second:
+            raise ConnectionError("broker unavailable")
+        published.append(message_id)
+
+    result, queue = release([[first, second]], flaky_enqueue)
+
+    assert result["status"] == "error"
+    assert published == [first]
+    assert queue.acked == [first]
+    assert _queued_at(db_session, first) is not None
+    assert _queued_at(db_session, second) is None
+
+    # 租约到期后重新认领
+    result, queue = release([[second]], published.append)
+
+    assert result == {"status": "success", "count": 1}
+    assert published == [first, second]
+    assert queue.acked == [second]
+    assert _queued_at(db_session, second) is not None
+
+
+def test_released_message_is_not_published_twice(db_session, release):
+    """已投递的消息再次被认领时只确认，不重复投递"""
+    message_id = _scheduled_message(db_session)
+    published = []
+
+    release([[message_id]], published.append)
+    result, queue = release([[message_id]], published.append)
+
+    assert result == {"status": "success", "count": 0}
+    assert published == [message_id]
+    assert queue.acked == [message_id]
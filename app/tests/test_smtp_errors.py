@@ -0,0 +1,74 @@
+"""
+SMTP错误分类测试
+"""
+import asyncio
+
+import aiosmtplib
+import pytest
+
+from app.services.credential_cache import CredentialError
+from app.services.smtp_errors import (
+    PERMANENT,
+    TRANSIENT_ACCOUNT,
+    TRANSIENT_RECIPIENT,
+    classify_reply,
+    classify_smtp_error,
+)
+
+
+@pytest.mark.parametrize("code,message,sender_refused,expected", [
+    (421, "4.3.2 Service not available, closing channel", False, TRANSIENT_ACCOUNT),
+    (454, "4.7.0 TLS not available", False, TRANSIENT_ACCOUNT),
+    (450, "4.2.1 Mailbox busy", False, TRANSIENT_RECIPIENT),
+    (451, "4.7.1 Greylisted, try again later", False, TRANSIENT_RECIPIENT),
+    (452, "4.3.1 Insufficient system storage", False, TRANSIENT_ACCOUNT),
+    (451, "4.4.1 No answer from host", False, TRANSIENT_ACCOUNT),
+    (450, "", False, TRANSIENT_RECIPIENT),
+    (535, "5.7.8 Authentication credentials invalid", False, TRANSIENT_ACCOUNT),
+    (530, "5.7.0 Authentication required", False, TRANSIENT_ACCOUNT),
+    (550, "5.1.1 User unknown", False, PERMANENT),
+    (552, "5.2.2 Mailbox full", False, PERMANENT),
+    (554, "5.7.1 Message rejected as spam", False, PERMANENT),
+    (550, "5.7.1 Sender address rejected", True, TRANSIENT_ACCOUNT),
+    (553, "5.1.8 Domain of sender does not exist", True, TRANSIENT_ACCOUNT),
+])
+def test_classify_reply(code, message, sender_refused, expected):
+    """按回复码、增强状态码和拒绝阶段分类"""
+    assert classify_reply(code, message, sender_refused) == expected
+
+
+def _refused(*replies):
+    return aiosmtplib.SMTPRecipientsRefused([
+        aiosmtplib.SMTPRecipientRefused(code, message, f"user{i}@example.com")
+        for i, (code, message) in enumerate(replies)
+    ])
+
+
+@pytest.mark.parametrize("exc,expected", [
+    # 收件人被拒：全部永久拒收才算永久失败
+    (_refused((550, "5.1.1 User unknown")), (PERMANENT, 550)),
+    (_refused((550, "5.1.1 User unknown"), (553, "5.1.3 Bad address")), (PERMANENT, 553)),
+    (_refused((550, "5.1.1 User unknown"), (450, "4.2.1 Mailbox busy")), (TRANSIENT_RECIPIENT, 450)),
+    (_refused((421, "4.3.2 Try later")), (TRANSIENT_RECIPIENT, 421)),
+    # 发件人被拒、认证失败：换账户
+    (aiosmtplib.SMTPSenderRefused(550, "5.7.1 Sender rejected", "from@example.com"), (TRANSIENT_ACCOUNT, 550)),
+    (aiosmtplib.SMTPAuthenticationError(535, "5.7.8 Bad credentials"), (TRANSIENT_ACCOUNT, 535)),
+    (aiosmtplib.SMTPHeloError(501, "5.5.2 Bad HELO"), (TRANSIENT_ACCOUNT, 501)),
+    # DATA阶段的回复按回复码分类
+    (aiosmtplib.SMTPDataError(554, "5.7.1 Message rejected as spam"), (PERMANENT, 554)),
+    (aiosmtplib.SMTPDataError(451, "4.7.1 Greylisted"), (TRANSIENT_RECIPIENT, 451)),
+    (aiosmtplib.SMTPResponseException(421, "4.3.2 Closing connection"), (TRANSIENT_ACCOUNT, 421)),
+    # 连接、超时、网络、凭证问题：换账户
+    (aiosmtplib.SMTPServerDisconnected("Connection lost"), (TRANSIENT_ACCOUNT, None)),
+    (aiosmtplib.SMTPConnectTimeoutError("Timed out connecting"), (TRANSIENT_ACCOUNT, None)),
+    (ConnectionRefusedError(111, "Connection refused"), (TRANSIENT_ACCOUNT, None)),
+    (asyncio.TimeoutError(), (TRANSIENT_ACCOUNT, None)),
+    (CredentialError("Invalid SMTP password encryption"), (TRANSIENT_ACCOUNT, None)),
+    # 构建邮件时的错误是消息本身的问题，不能记到账户上
+    (KeyError("filename"), (PERMANENT, None)),
+    (TypeError("expected bytes"), (PERMANENT, None)),
+    (UnicodeEncodeError("ascii", "中", 0, 1, "ordinal not in range"), (PERMANENT, None)),
+])
+def test_classify_smtp_error(exc, expected):
+    """发送异常分类"""
+    assert classify_smtp_error(exc) == expected
@@ -0,0 +1,53 @@
+"""
+启动导入测试
+用 python -X importtime 检查各进程类型的导入图（耗时预算受机器负载影响，由 benchmarks/cold_start.py --check 检查）
+"""
+import subprocess
+import sys
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[2]
+
+API_IMPORTS = ["app.main"]
+WORKER_IMPORTS = ["app.tasks.celery_app", "app.tasks.email_tasks", "app.tasks.scheduled_tasks", "app.tasks.campaign_tasks"]
+
+
+def import_profile(modules: list) -> dict:
+    """
+    在新进程中导入模块并解析 -X importtime 输出
+
+    Returns:
+        dict: 模块名 -> 自身导入耗时（微秒）
+    """
+    code = "; ".join(f"import {module}" for module in modules)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+
+    profile = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        profile[name.strip()] = int(self_us)
+    return profile
+
+
+def test_api_does_not_import_worker_stack():
+    """API进程不应加载Celery、任务实现和SMTP客户端"""
+    profile = import_profile(API_IMPORTS)
+    for module in ("celery", "app.tasks.email_tasks", "aiosmtplib", "cryptography.fernet"):
+        assert module not in profile, f"{module} imported at API startup"
+
+
+def test_worker_does_not_import_web_stack():
+    """Worker进程不应加载FastAPI应用"""
+    profile = import_profile(WORKER_IMPORTS)
+    for module in ("fastapi", "app.main", "app.api"):
+        assert module not in profile, f"{module} imported at worker startup"
+
@@ -0,0 +1,47 @@
+"""
+消息状态缓存测试（批量查询只能看到自己的消息）
+"""
+from app.models.message import MessageRecord, MessageStatus, MessageChannel
+from app.services.status_cache import MessageStatusCache
+
+
+def _message(db_session, api_key_id):
+    message = MessageRecord(
+        channel=MessageChannel.EMAIL,
+        status=MessageStatus.SUCCESS,
+        to="user@example.com",
+        content_hash="0" * 64,
+        api_key_id=api_key_id,
+    )
+    db_session.add(message)
+    db_session.commit()
+    return message
+
+
+def test_get_many_filters_by_owner(db_session, fake_redis):
+    """缓存命中和数据库补齐两条路径都按API Key过滤"""
+    cache = MessageStatusCache(fake_redis)
+    mine = _message(db_session, api_key_id=1)
+    others = _message(db_session, api_key_id=2)
+    cache.set(mine)
+    ids = [mine.id, others.id]
+
+    # 第一次：mine命中缓存，others从数据库补齐
+    assert [record["id"] for record in cache.get_many(db_session, ids, api_key_id=1)] == [mine.id]
+    # 第二次：两条都命中缓存
+    assert [record["id"] for record in cache.get_many(db_session, ids, api_key_id=1)] == [mine.id]
+    assert [record["id"] for record in cache.get_many(db_session, ids, api_key_id=2)] == [others.id]
+    # 管理员不过滤，返回记录中不包含所属API Key
+    records = cache.get_many(db_session, ids)
+    assert [record["id"] for record in records] == ids
+    assert all("api_key_id" not in record for record in records)
+
+
+def test_legacy_cache_entry_is_reloaded(db_session, fake_redis):
+    """不含所属API Key的旧缓存值按未命中处理"""
+    cache = MessageStatusCache(fake_redis)
+    others = _message(db_session, api_key_id=2)
+    fake_redis.set(f"msg:status:{others.id}", '{"id": %d, "status": "success"}' % others.id)
+
+    assert cache.get_many(db_session, [others.id], api_key_id=1) == []
+    assert [record["id"] for record in cache.get_many(db_session, [others.id], api_key_id=2)] == [others.id]
@@ -0,0 +1,46 @@
+"""
+链路追踪测试：trace_id只由服务端生成的请求ID推导
+"""
+import uuid
+
+import pytest
+
+from app.core.tracing import tracer, trace_id_from_request_id
+
+
+@pytest.fixture
+def spans(monkeypatch):
+    """开启全量采样，收集结束的Span"""
+    finished = []
+    monkeypatch.setattr(tracer, "enabled", True)
+    monkeypatch.setattr(tracer, "sample_rate", 1.0)
+    monkeypatch.setattr(tracer.processor, "submit", finished.append)
+    return finished
+
+
+def _server_span(spans):
+    return next(span for span in spans if span.kind == "server")
+
+
+def test_generated_request_id_derives_trace_id(client, spans):
+    response = client.get("/health")
+
+    request_id = response.headers["X-Request-ID"]
+    span = _server_span(spans)
+    assert span.context.trace_id == trace_id_from_request_id(request_id) == request_id.replace("-", "")
+    assert span.attributes["request_id"] == request_id
+
+
+@pytest.mark.parametrize("request_id", [str(uuid.uuid4()), "client-chosen-id"])
+def test_client_request_id_gets_random_trace_id(client, spans, request_id):
+    client.get("/health", headers={"X-Request-ID": request_id})
+    client.get("/health", headers={"X-Request-ID": request_id})
+
+    first, second = [span for span in spans if span.kind == "server"]
+    assert first.context.trace_id != trace_id_from_request_id(request_id)
+    assert first.context.trace_id != second.context.trace_id
+    assert first.attributes["request_id"] == request_id
+
+
+def test_root_span_without_trace_id_is_random(spans):
+    assert tracer.start_span("task").context.trace_id != tracer.start_span("task").context.trace_id
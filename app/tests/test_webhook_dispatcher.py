@@ -0,0 +1,188 @@
+"""
+Webhook分发测试（使用本地HTTP服务模拟回调地址）
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.services.webhook_dispatcher import (
+    WebhookDispatcher,
+    WebhookEndpoint,
+    sign_payload,
+    SIGNATURE_HEADER,
+    TIMESTAMP_HEADER,
+)
+
+
+class FakeRedis:
+    """只记录确认和死信的Redis替身，pending为预置的待处理事件 {事件ID: (读取次数, 字段)}"""
+
+    def __init__(self):
+        self.acked = []
+        self.dead = []
+        self.pending = {}
+        self.claimed = []
+
+    async def xpending_range(self, name, groupname, min, max, count, idle=None):
+        return [
+            {"message_id": event_id, "consumer": "gone", "time_since_delivered": idle, "times_delivered": times}
+            for event_id, (times, _) in self.pending.items()
+        ]
+
+    async def xclaim(self, name, groupname, consumername, min_idle_time, message_ids):
+        self.claimed.extend(message_ids)
+        return [(event_id, self.pending[event_id][1]) for event_id in message_ids]
+
+    async def xack(self, stream, group, *ids):
+        self.acked.extend(ids)
+
+    async def xadd(self, name, fields, **kwargs):
+        self.dead.append(fields)
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def callback_server():
+    """本地回调服务，按预设状态码依次响应并记录请求"""
+    received = []
+    responses = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            received.append({"headers": dict(self.headers), "body": body})
+            self.send_response(responses.pop(0) if responses else 200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield f"http://127.0.0.1:{server.server_port}/hook", received, responses
+
+    server.shutdown()
+
+
+def _dispatcher(url, redis):
+    async def resolver(api_key_id):
+        return WebhookEndpoint(api_key_id=api_key_id, url=url, secret="test-secret")
+
+    return WebhookDispatcher(redis=redis, endpoint_resolver=resolver)
+
+
+@pytest.mark.asyncio
+async def test_batched_signed_delivery(callback_server):
+    """同一API Key的事件合并为一次签名请求并全部确认"""
+    url, received, _ = callback_server
+    redis = FakeRedis()
+    dispatcher = _dispatcher(url, redis)
+
+    for i in range(3):
+        dispatcher.enqueue(1, (f"1-{i}", {"id": i, "status": "success"}))
+    await dispatcher.drain()
+    await dispatcher.http.aclose()
+
+    assert len(received) == 1
+    request = received[0]
+    payload = json.loads(request["body"])
+    assert [event["event_id"] for event in payload["events"]] == ["1-0", "1-1", "1-2"]
+
+    timestamp = request["headers"][TIMESTAMP_HEADER]
+    assert request["headers"][SIGNATURE_HEADER] == sign_payload("test-secret", timestamp, request["body"])
+    assert redis.acked == ["1-0", "1-1", "1-2"]
+
+
+@pytest.mark.asyncio
+async def test_retry_then_dead_letter(callback_server, monkeypatch):
+    """5xx触发重试，4xx直接进入死信"""
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "WEBHOOK_RETRY_BACKOFF_SECONDS", 0)
+    url, received, responses = callback_server
+    redis = FakeRedis()
+    dispatcher = _dispatcher(url, redis)
+    endpoint = WebhookEndpoint(api_key_id=1, url=url, secret="test-secret")
+
+    responses.extend([503, 200])
+    assert await dispatcher.deliver(endpoint, [("1-0", {"id": 1})]) is True
+    assert len(received) == 2
+
+    responses.append(400)
+    dispatcher.enqueue(1, ("1-1", {"id": 2}))
+    await dispatcher.drain()
+    await dispatcher.http.aclose()
+
+    assert len(received) == 3
+    assert len(redis.dead) == 1
+    assert redis.acked == ["1-1"]
+
+
+def _fields(api_key_id, data):
+    return {"api_key_id": str(api_key_id), "data": json.dumps(data)}
+
+
+@pytest.mark.asyncio
+async def test_reclaim_redelivers_idle_events(callback_server):
+    """认领空闲的待处理事件并重新发送，本进程在途的事件不认领"""
+    url, received, _ = callback_server
+    redis = FakeRedis()
+    dispatcher = _dispatcher(url, redis)
+    redis.pending = {
+        "1-0": (1, _fields(1, {"id": 1})),
+        "1-1": (2, _fields(1, {"id": 2})),
+        "1-2": (1, _fields(2, {"id": 3})),
+    }
+    dispatcher.enqueue(2, ("1-2", {"id": 3}))
+
+    assert await dispatcher.reclaim() == 2
+    assert redis.claimed == ["1-0", "1-1"]
+    await dispatcher.drain()
+    await dispatcher.http.aclose()
+
+    assert len(received) == 2
+    assert sorted(redis.acked) == ["1-0", "1-1", "1-2"]
+    assert dispatcher._inflight_ids == set()
+
+
+@pytest.mark.asyncio
+async def test_reclaim_dead_letters_exhausted_events(callback_server, monkeypatch):
+    """读取次数达到上限的事件直接写入死信并确认，不再发送"""
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "WEBHOOK_MAX_DELIVERIES", 3)
+    url, received, _ = callback_server
+    redis = FakeRedis()
+    dispatcher = _dispatcher(url, redis)
+    redis.pending = {"1-0": (3, _fields(1, {"id": 1})), "1-1": (1, {})}
+
+    assert await dispatcher.reclaim() == 1
+    await dispatcher.drain()
+    await dispatcher.http.aclose()
+
+    assert received == []
+    assert json.loads(redis.dead[0]["events"]) == [{"id": 1}]
+    assert redis.acked == ["1-0"]
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_stays_pending_for_reclaim():
+    """发送过程异常时不确认，事件移出在途集合，之后可被认领"""
+    async def resolver(api_key_id):
+        raise RuntimeError("database unavailable")
+
+    redis = FakeRedis()
+    dispatcher = WebhookDispatcher(redis=redis, endpoint_resolver=resolver)
+    dispatcher.enqueue(1, ("1-0", {"id": 1}))
+    await dispatcher.drain()
+    await dispatcher.http.aclose()
+
+    assert redis.acked == []
+    assert dispatcher._inflight_ids == set()
@@ -1,8 +1,11 @@
 """
 Redis客户端封装
 """
+import os
 import redis
-from typing import Optional, Any
+import threading
+import time
+from typing import Optional, Any, Callable, Dict, List
 import json
 from app.core.config import settings
 from app.core.logger import logger
@@ -45,6 +48,30 @@ class RedisClient:
             logger.error(f"Redis SETEX error: {str(e)}")
             return False
     
+    def mget(self, keys: List[str]) -> List[Optional[str]]:
+        """批量获取值"""
+        if not keys:
+            return []
+        try:
+            return self.client.mget(keys)
+        except Exception as e:
+            logger.error(f"Redis MGET error: {str(e)}")
+            return [None] * len(keys)
+    
+    def mset_ex(self, mapping: Dict[str, Any], ex: int) -> bool:
+        """批量设置值（带过期时间，使用pipeline一次往返）"""
+        if not mapping:
+            return True
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for key, value in mapping.items():
+                pipe.set(key, value, ex=ex)
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Redis MSET_EX error: {str(e)}")
+            return False
+    
     def delete(self, *keys: str) -> int:
         """删除键"""
         try:
@@ -117,6 +144,27 @@ class RedisClient:
             logger.error(f"Redis HGETALL error: {str(e)}")
             return {}
     
+    def hgetall_many(self, names: List[str]) -> List[dict]:
+        """批量获取多个哈希（使用pipeline一次往返）"""
+        if not names:
+            return []
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for name in names:
+                pipe.hgetall(name)
+            return pipe.execute()
+        except Exception as e:
+            logger.error(f"Redis HGETALL_MANY error: {str(e)}")
+            return [{} for _ in names]
+    
+    def xadd(self, name: str, fields: Dict[str, Any], maxlen: Optional[int] = None) -> Optional[str]:
+        """追加Stream条目（maxlen为近似裁剪长度）"""
+        try:
+            return self.client.xadd(name, fields, maxlen=maxlen, approximate=True)
+        except Exception as e:
+            logger.error(f"Redis XADD error: {str(e)}")
+            return None
+    
     def set_json(self, key: str, value: Any, ex: Optional[int] = None) -> bool:
         """设置JSON值"""
         try:
@@ -146,9 +194,109 @@ class RedisClient:
             return False
 
 
+class ChannelListener:
+    """
+    频道订阅监听（用于进程内缓存的失效通知）
+
+    每个进程一个后台线程；按PID判断，fork出的子进程首次调用start时重新订阅。
+    订阅失败时间隔RESUBSCRIBE_INTERVAL秒后由下一次start重试；监听连接断开时重新订阅，
+    并通过on_reset清空调用方的本地缓存（断线期间可能错过失效通知）
+    """
+
+    # 订阅失败后的重试间隔（秒），避免Redis不可用时每次调用都尝试连接
+    RESUBSCRIBE_INTERVAL = 5.0
+
+    def __init__(
+        self,
+        channel: str,
+        handler: Callable[[Any], None],
+        on_reset: Optional[Callable[[], None]] = None
+    ):
+        """
+        Args:
+            channel: 频道名
+            handler: 处理函数，参数为解析后的JSON消息
+            on_reset: 订阅建立（或重建）后调用，用于清空可能已过时的本地缓存
+        """
+        self.channel = channel
+        self.handler = handler
+        self.on_reset = on_reset
+        self._pid: Optional[int] = None
+        self._retry_at = 0.0
+        self._last_error = float("-inf")
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """启动监听线程（当前进程已订阅或处于重试间隔内时直接返回）"""
+        pid = os.getpid()
+        if self._pid == pid or time.monotonic() < self._retry_at:
+            return
+        with self._lock:
+            if self._pid == pid or time.monotonic() < self._retry_at:
+                return
+            self._subscribe()
+
+    def _subscribe(self) -> bool:
+        """订阅并启动监听线程，成功后才记录PID（调用方持有锁）"""
+        try:
+            pubsub = redis_client.client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{self.channel: self._handle})
+            pubsub.run_in_thread(sleep_time=1, daemon=True, exception_handler=self._on_error)
+        except Exception as e:
+            self._pid = None
+            self._retry_at = time.monotonic() + self.RESUBSCRIBE_INTERVAL
+            logger.error(f"Failed to subscribe to {self.channel}: {str(e)}")
+            return False
+
+        self._pid = os.getpid()
+        self._reset()
+        return True
+
+    def _on_error(self, error: BaseException, pubsub: Any, thread: Any) -> None:
+        """
+        监听线程出错（连接断开等）：停止该线程，清空本地缓存并重新订阅
+
+        距上次出错不足RESUBSCRIBE_INTERVAL时不立即重新订阅，留给之后的start，避免连接反复断开时空转
+        """
+        logger.error(f"Subscription to {self.channel} lost: {str(error)}")
+        thread.stop()
+        with self._lock:
+            self._reset()
+            self._pid = None
+            now = time.monotonic()
+            if now - self._last_error >= self.RESUBSCRIBE_INTERVAL:
+                self._subscribe()
+            else:
+                self._retry_at = now + self.RESUBSCRIBE_INTERVAL
+            self._last_error = now
+
+    def _reset(self) -> None:
+        if self.on_reset is None:
+            return
+        try:
+            self.on_reset()
+        except Exception as e:
+            logger.error(f"Failed to reset cache for {self.channel}: {str(e)}")
+
+    def _handle(self, message: Dict[str, Any]) -> None:
+        try:
+            self.handler(json.loads(message["data"]))
+        except Exception as e:
+            logger.warning(f"Invalid message on {self.channel}: {str(e)}")
+
+    def publish(self, data: Any) -> bool:
+        """发布JSON消息"""
+        try:
+            redis_client.client.publish(self.channel, json.dumps(data))
+            return True
+        except Exception as e:
+            logger.error(f"Failed to publish to {self.channel}: {str(e)}")
+            return False
+
+
 # 创建全局Redis客户端实例
 redis_client = RedisClient()
 
 
-__all__ = ["RedisClient", "redis_client"]
+__all__ = ["RedisClient", "ChannelListener", "redis_client"]
 
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+访问日志开销基准测试
+
+在相同的轻量端点上比较每个请求的日志开销（相对不输出日志的基线）：
+  before  - 每个请求都记录，标准库json序列化，每条日志flush
+  after   - 按路由/状态采样，orjson序列化，批量写出
+
+日志写入临时文件，sink均使用enqueue=True（与线上一致）
+
+用法：
+    python benchmarks/access_log_overhead.py --requests 20000
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from app.core.logger import logger, serialize, access_log_sampler, BufferedStream
+from app.core.middleware import RequestContextMiddleware
+
+
+def legacy_format(record) -> str:
+    """旧的序列化方式：标准库json"""
+    subset = {
+        "timestamp": record["time"].strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+        "level": record["level"].name,
+        "message": record["message"],
+        "module": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+    }
+    subset.update((k, v) for k, v in record["extra"].items() if k != "serialized")
+    record["extra"]["serialized"] = json.dumps(subset, ensure_ascii=False, default=str)
+    return "{extra[serialized]}\n"
+
+
+def fast_format(record) -> str:
+    record["extra"]["serialized"] = serialize(record)
+    return "{extra[serialized]}\n"
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(RequestContextMiddleware)
+
+    @app.get("/bench/{item_id}")
+    async def item(item_id: int):
+        return {"id": item_id}
+
+    return app
+
+
+async def drive(app: FastAPI, total: int) -> float:
+    """顺序发送请求，返回总耗时"""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for i in range(200):
+            await client.get(f"/bench/{i}")
+        start = time.perf_counter()
+        for i in range(total):
+            await client.get(f"/bench/{i}")
+        return time.perf_counter() - start
+
+
+def configure(mode: str, path: str):
+    """按模式配置日志sink，返回需要关闭的文件"""
+    logger.remove()
+    if mode == "baseline":
+        return None
+
+    stream = open(path, "w", encoding="utf-8")
+    if mode == "before":
+        access_log_sampler.success_rate = 1.0
+        access_log_sampler.route_rates = {}
+        logger.add(stream, format=legacy_format, enqueue=True, level="INFO")
+    else:
+        access_log_sampler.success_rate = 0.05
+        logger.add(BufferedStream(stream, 65536, 1.0), format=fast_format, enqueue=True, level="INFO")
+    return stream
+
+
+async def main(total: int) -> None:
+    app = build_app()
+    path = os.path.join(tempfile.mkdtemp(), "access.log")
+
+    results = {}
+    for mode in ("baseline", "before", "after"):
+        stream = configure(mode, path)
+        results[mode] = await drive(app, total)
+        logger.remove()
+        if stream is not None:
+            stream.close()
+            results[mode + "_bytes"] = os.path.getsize(path)
+
+    baseline = results["baseline"]
+    print(f"{'mode':<10} {'req/s':>10} {'overhead(us/req)':>18} {'log bytes':>12}")
+    print("-" * 53)
+    for mode in ("baseline", "before", "after"):
+        elapsed = results[mode]
+        overhead = (elapsed - baseline) / total * 1e6
+        print(f"{mode:<10} {total / elapsed:>10.1f} {overhead:>18.1f} {results.get(mode + '_bytes', 0):>12}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="访问日志开销基准测试")
+    parser.add_argument("--requests", type=int, default=20000, help="请求数")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.requests))
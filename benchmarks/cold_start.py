@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+各进程类型冷启动耗时
+
+在新的解释器中导入各进程的入口模块，统计墙钟时间和 -X importtime 的导入耗时，
+并列出耗时最高的模块；--check 时导入耗时中位数超过预算则以非0状态退出
+
+用法：
+    python benchmarks/cold_start.py --runs 5 --top 10
+    python benchmarks/cold_start.py --check
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[1]
+
+PROCESS_TYPES = {
+    "api": ["app.main"],
+    "worker": ["app.tasks.celery_app", "app.tasks.email_tasks", "app.tasks.scheduled_tasks", "app.tasks.campaign_tasks"],
+    "webhook": ["app.services.webhook_dispatcher"],
+}
+
+# 导入耗时预算（毫秒），可通过环境变量按机器调整
+BUDGET_MS = {
+    "api": float(os.environ.get("STARTUP_BUDGET_API_MS", 2000)),
+    "worker": float(os.environ.get("STARTUP_BUDGET_WORKER_MS", 1500)),
+}
+
+
+def run_once(modules: list) -> tuple[float, dict]:
+    """
+    在新进程中导入模块
+
+    Returns:
+        tuple: (墙钟耗时秒, 模块名 -> 累计导入耗时微秒)
+    """
+    code = "; ".join(f"import {module}" for module in modules)
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        cumulative[name.strip()] = int(cumulative_us)
+    return elapsed, cumulative
+
+
+def main(runs: int, top: int, check: bool = False) -> int:
+    over_budget = []
+    for process, modules in PROCESS_TYPES.items():
+        walls = []
+        imports = []
+        profile = {}
+        for _ in range(runs):
+            wall, profile = run_once(modules)
+            walls.append(wall)
+            imports.append(sum(profile[m] for m in modules if m in profile))
+
+        print(f"[{process}] {' '.join(modules)}")
+        print(f"  cold start (wall): median {statistics.median(walls) * 1000:.0f}ms, "
+              f"min {min(walls) * 1000:.0f}ms")
+        import_ms = statistics.median(imports) / 1000
+        budget_ms = BUDGET_MS.get(process)
+        print(f"  import time:       median {import_ms:.0f}ms" + (f" (budget {budget_ms:.0f}ms)" if budget_ms else ""))
+        if budget_ms and import_ms > budget_ms:
+            over_budget.append(process)
+        print(f"  top {top} modules by cumulative import time:")
+        top_level = {name: us for name, us in profile.items() if "." not in name or name.startswith("app.")}
+        for name, us in sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:top]:
+            print(f"    {us / 1000:>8.1f}ms  {name}")
+        print()
+
+    if check and over_budget:
+        print(f"over import budget: {', '.join(over_budget)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="各进程类型冷启动耗时")
+    parser.add_argument("--runs", type=int, default=5, help="每种进程的运行次数")
+    parser.add_argument("--top", type=int, default=10, help="列出耗时最高的模块数量")
+    parser.add_argument("--check", action="store_true", help="导入耗时超过预算时以非0状态退出")
+    args = parser.parse_args()
+
+    sys.exit(main(args.runs, args.top, args.check))
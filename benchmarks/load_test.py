@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+端到端压测
+
+按目标速率（开环）调用 POST /api/v1/messages/email/send，同时在进程内启动本地SMTP接收端，
+统计：
+  - API延迟分位数（p50/p90/p99/max）和实际请求速率
+  - 入队到送达延迟（API返回 -> SMTP接收端收到）分位数
+  - 送达吞吐（msgs/s）和接收端按账户的结果计数
+
+结果以JSON Lines追加写入 --output，用 --label 和 --tag 标注配置（如连接池开关、Worker数量），
+便于做回归对比。
+
+前置条件：API和Worker已启动，且邮箱池中只有指向接收端的账户（可用 --setup-accounts 创建）。
+
+用法：
+    python benchmarks/load_test.py --api-key noti_xxx --api-secret secret_xxx \\
+        --setup-accounts 4 --rate 200 --duration 60 --label pooled --tag workers=8
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import json
+import platform
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.smtp_sink import AccountProfile, load_profiles, start_sink
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """计算分位数（毫秒）"""
+    if not values:
+        return {"p50": None, "p90": None, "p99": None, "max": None}
+    ordered = sorted(values)
+
+    def pick(pct: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct))] * 1000, 2)
+
+    return {"p50": pick(0.50), "p90": pick(0.90), "p99": pick(0.99), "max": round(ordered[-1] * 1000, 2)}
+
+
+def setup_accounts(count: int, host: str, port: int, daily_limit: int) -> None:
+    """创建指向本地接收端的邮箱账户（已存在则跳过）"""
+    from scripts.add_email_account import add_email_account
+
+    for i in range(count):
+        add_email_account(
+            email=f"loadsender{i}@example.com",
+            smtp_host=host,
+            smtp_port=port,
+            smtp_username=f"loadsender{i}@example.com",
+            smtp_password="load-test",
+            daily_limit=daily_limit,
+            use_tls=False,
+        )
+
+
+async def get_token(client: httpx.AsyncClient, api_key: str, api_secret: str) -> str:
+    response = await client.post("/api/v1/auth/token", json={"api_key": api_key, "api_secret": api_secret})
+    response.raise_for_status()
+    return response.json()["data"]["access_token"]
+
+
+async def generate_load(
+    client: httpx.AsyncClient,
+    token: str,
+    run_id: str,
+    rate: float,
+    duration: float,
+    max_inflight: int,
+) -> dict:
+    """
+    按目标速率开环发送请求
+
+    Returns:
+        dict: 延迟、状态码计数、主题 -> 入队完成时间
+    """
+    headers = {"Authorization": f"Bearer {token}"}
+    latencies: List[float] = []
+    status_counts: Dict[str, int] = {}
+    enqueued: Dict[str, float] = {}
+    semaphore = asyncio.Semaphore(max_inflight)
+    dropped = 0
+
+    async def send(seq: int) -> None:
+        subject = f"load-{run_id}-{seq}"
+        payload = {
+            "to": [f"rcpt{seq % 1000}@example.com"],
+            "subject": subject,
+            "content": f"<p>load test {run_id} message {seq}</p>",
+        }
+        start = time.perf_counter()
+        try:
+            response = await client.post("/api/v1/messages/email/send", json=payload, headers=headers)
+            key = str(response.status_code)
+            if response.status_code == 200:
+                enqueued[subject] = time.time()
+        except httpx.HTTPError as e:
+            key = type(e).__name__
+        finally:
+            semaphore.release()
+        latencies.append(time.perf_counter() - start)
+        status_counts[key] = status_counts.get(key, 0) + 1
+
+    tasks = []
+    interval = 1.0 / rate
+    start = time.perf_counter()
+    seq = 0
+    while time.perf_counter() - start < duration:
+        # 开环：按时间表发送，超过并发上限的请求计为丢弃而不是排队，避免掩盖延迟
+        due = start + seq * interval
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if semaphore.locked():
+            dropped += 1
+        else:
+            await semaphore.acquire()
+            tasks.append(asyncio.create_task(send(seq)))
+        seq += 1
+
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "latencies": latencies,
+        "status_counts": status_counts,
+        "enqueued": enqueued,
+        "sent": len(tasks),
+        "dropped": dropped,
+        "elapsed": elapsed,
+    }
+
+
+async def wait_for_delivery(handler, enqueued: Dict[str, float], timeout: float) -> float:
+    """等待接收端收到全部已入队的消息，返回等待时长"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if all(subject in handler.receipts for subject in enqueued):
+            break
+        await asyncio.sleep(0.5)
+    return time.perf_counter() - start
+
+
+async def run(args) -> dict:
+    default = AccountProfile(
+        latency_ms=args.smtp_latency_ms,
+        jitter_ms=args.smtp_jitter_ms,
+        throttle_rate=args.throttle_rate,
+        throttle_code=args.throttle_code,
+    )
+    controller, handler = start_sink(args.sink_host, args.sink_port, load_profiles(args.accounts, default))
+    run_id = uuid.uuid4().hex[:8]
+
+    try:
+        limits = httpx.Limits(max_connections=args.max_inflight, max_keepalive_connections=args.max_inflight)
+        async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=30) as client:
+            token = await get_token(client, args.api_key, args.api_secret)
+            load = await generate_load(client, token, run_id, args.rate, args.duration, args.max_inflight)
+
+        drain = await wait_for_delivery(handler, load["enqueued"], args.drain_timeout)
+    finally:
+        controller.stop()
+
+    delivered = {s: handler.receipts[s] - t for s, t in load["enqueued"].items() if s in handler.receipts}
+    last_receipt = max((handler.receipts[s] for s in delivered), default=None)
+    first_enqueue = min(load["enqueued"].values(), default=None)
+    delivery_window = (last_receipt - first_enqueue) if last_receipt and first_enqueue else None
+
+    return {
+        "label": args.label,
+        "tags": dict(tag.split("=", 1) for tag in args.tag),
+        "timestamp": datetime.utcnow().isoformat(),
+        "host": platform.node(),
+        "config": {
+            "rate": args.rate,
+            "duration": args.duration,
+            "max_inflight": args.max_inflight,
+            "smtp_latency_ms": args.smtp_latency_ms,
+            "throttle_rate": args.throttle_rate,
+            "throttle_code": args.throttle_code,
+        },
+        "api": {
+            "requests": load["sent"],
+            "dropped": load["dropped"],
+            "achieved_rps": round(load["sent"] / load["elapsed"], 2),
+            "status_counts": load["status_counts"],
+            "latency_ms": percentiles(load["latencies"]),
+        },
+        "delivery": {
+            "enqueued": len(load["enqueued"]),
+            "delivered": len(delivered),
+            "drain_seconds": round(drain, 2),
+            "msgs_per_second": round(len(delivered) / delivery_window, 2) if delivery_window else None,
+            "enqueue_to_sent_ms": percentiles(list(delivered.values())),
+        },
+        "smtp": handler.stats(),
+    }
+
+
+def print_summary(result: dict) -> None:
+    api = result["api"]
+    delivery = result["delivery"]
+    print(f"[{result['label']}] {result['tags']}")
+    print(f"  API       {api['requests']} req ({api['dropped']} dropped), {api['achieved_rps']} req/s, "
+          f"status {api['status_counts']}")
+    print(f"            latency ms {api['latency_ms']}")
+    print(f"  delivery  {delivery['delivered']}/{delivery['enqueued']} delivered, "
+          f"{delivery['msgs_per_second']} msgs/s, drain {delivery['drain_seconds']}s")
+    print(f"            enqueue->sent ms {delivery['enqueue_to_sent_ms']}")
+    print(f"  smtp      {result['smtp']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="端到端压测")
+    parser.add_argument("--base-url", default="http://localhost:8000", help="API地址")
+    parser.add_argument("--api-key", required=True, help="API Key")
+    parser.add_argument("--api-secret", required=True, help="API Secret")
+    parser.add_argument("--rate", type=float, default=50, help="目标请求速率(req/s)")
+    parser.add_argument("--duration", type=float, default=30, help="发送时长(秒)")
+    parser.add_argument("--max-inflight", type=int, default=200, help="最大并发请求数")
+    parser.add_argument("--drain-timeout", type=float, default=120, help="等待送达的最长时间(秒)")
+    parser.add_argument("--sink-host", default="127.0.0.1", help="SMTP接收端监听地址")
+    parser.add_argument("--sink-port", type=int, default=2525, help="SMTP接收端端口")
+    parser.add_argument("--smtp-latency-ms", type=float, default=0, help="SMTP默认处理延迟(毫秒)")
+    parser.add_argument("--smtp-jitter-ms", type=float, default=0, help="SMTP延迟抖动(毫秒)")
+    parser.add_argument("--throttle-rate", type=float, default=0, help="SMTP默认限流比例(0-1)")
+    parser.add_argument("--throttle-code", type=int, choices=[421, 451], default=451, help="限流回复码")
+    parser.add_argument("--accounts", help="SMTP接收端按账户的配置文件(JSON)")
+    parser.add_argument("--setup-accounts", type=int, default=0, help="创建N个指向接收端的邮箱账户")
+    parser.add_argument("--account-daily-limit", type=int, default=1000000, help="创建账户的每日限额")
+    parser.add_argument("--label", default="default", help="本次运行的配置名称")
+    parser.add_argument("--tag", action="append", default=[], help="附加标签 key=value，可重复")
+    parser.add_argument("--output", default="benchmarks/results/load_test.jsonl", help="结果文件(JSON Lines)")
+    args = parser.parse_args()
+
+    if args.setup_accounts:
+        setup_accounts(args.setup_accounts, args.sink_host, args.sink_port, args.account_daily_limit)
+
+    result = asyncio.run(run(args))
+    print_summary(result)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "a", encoding="utf-8") as f:
+        f.write(json.dumps(result, ensure_ascii=False) + "\n")
+    print(f"Results appended to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+热点函数微基准的公共夹具
+
+运行（结果按提交保存到 benchmarks/results/micro，便于跨提交对比）：
+    make bench
+    make bench-compare
+"""
+import time
+from typing import Any, Dict, List, Optional
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base
+from app.core.security import encrypt_password
+from app.models.email import EmailAccount
+
+
+class FakeRedis:
+    """进程内Redis替身，实现基准用到的RedisClient子集，排除网络往返"""
+
+    def __init__(self):
+        self.store: Dict[str, Any] = {}
+        self.expires: Dict[str, float] = {}
+
+    def _alive(self, key: str) -> bool:
+        expires_at = self.expires.get(key)
+        if expires_at is not None and expires_at <= time.time():
+            self.store.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.store
+
+    def get(self, key: str) -> Optional[str]:
+        return self.store.get(key) if self._alive(key) else None
+
+    def set(self, key: str, value: Any, ex: Optional[int] = None) -> bool:
+        self.store[key] = str(value)
+        if ex:
+            self.expires[key] = time.time() + ex
+        else:
+            self.expires.pop(key, None)
+        return True
+
+    def setex(self, key: str, time: int, value: Any) -> bool:
+        return self.set(key, value, ex=time)
+
+    def mget(self, keys: List[str]) -> List[Optional[str]]:
+        return [self.get(key) for key in keys]
+
+    def exists(self, *keys: str) -> int:
+        return sum(1 for key in keys if self._alive(key))
+
+    def hgetall_many(self, names: List[str]) -> List[dict]:
+        return [dict(self.store[name]) if self._alive(name) else {} for name in names]
+
+    def delete(self, *keys: str) -> int:
+        removed = 0
+        for key in keys:
+            removed += self.store.pop(key, None) is not None
+            self.expires.pop(key, None)
+        return removed
+
+
+@pytest.fixture
+def fake_redis():
+    """空的进程内Redis"""
+    return FakeRedis()
+
+
+@pytest.fixture(scope="module")
+def db_session():
+    """内存SQLite会话（模块内共享）"""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+@pytest.fixture(scope="module")
+def email_accounts(db_session):
+    """
+    邮箱池：50个账户，混合优先级、已用额度和失败计数，
+    其中部分账户已停用、额度用尽或处于失败暂停
+    """
+    password = encrypt_password("benchmark-password")
+    accounts = []
+    for i in range(50):
+        account = EmailAccount(
+            email=f"sender{i}@example.com",
+            smtp_host="smtp.example.com",
+            smtp_port=465,
+            smtp_username=f"sender{i}@example.com",
+            smtp_password=password,
+            daily_limit=500,
+            daily_sent_count=(i * 37) % 600,
+            priority=i % 3 * 10,
+            failure_count=5 if i % 11 == 0 else 0,
+            is_active=i % 7 != 0,
+        )
+        accounts.append(account)
+    db_session.add_all(accounts)
+    db_session.commit()
+    return accounts
@@ -0,0 +1,158 @@
+"""
+热点路径微基准
+
+覆盖发送链路上每条消息都会经过的纯CPU函数，Redis用进程内替身、数据库用内存SQLite，
+只测量函数自身的开销
+"""
+import itertools
+
+import pytest
+
+from app.core.security import create_access_token, decode_token, encrypt_data, decrypt_data
+from app.models.email import EmailAccount
+from app.models.message import MessageChannel
+from app.services.account_health import AccountHealthTracker, HEALTH_KEY_PREFIX
+from app.services.email_service import EmailPoolManager, EmailSender
+from app.services.message_service import MessageService
+from app.services.template_service import TemplateService
+
+
+ORDER_TEMPLATE = """
+<h1>您好，{{ user_name }}</h1>
+<p>您的订单 {{ order_no }} 已于 {{ paid_at }} 支付成功，共 {{ items|length }} 件商品：</p>
+<table>
+{% for item in items %}
+  <tr><td>{{ item.name }}</td><td>{{ item.quantity }}</td><td>{{ "%.2f"|format(item.price) }}</td></tr>
+{% endfor %}
+</table>
+<p>合计：{{ "%.2f"|format(total) }} 元</p>
+{% if coupon %}<p>已使用优惠券 {{ coupon }}</p>{% endif %}
+"""
+
+ORDER_VARIABLES = {
+    "user_name": "张三",
+    "order_no": "NO202401010001",
+    "paid_at": "2024-01-01 12:00:00",
+    "items": [{"name": f"商品{i}", "quantity": i % 3 + 1, "price": 19.9 * (i + 1)} for i in range(10)],
+    "total": 1094.5,
+    "coupon": "NEWYEAR",
+}
+
+HTML_CONTENT = "<p>" + "消息通知平台基准测试内容。" * 200 + "</p>"
+
+
+@pytest.fixture(scope="module")
+def sender():
+    account = EmailAccount(id=1, email="sender@example.com", smtp_host="smtp.example.com")
+    return EmailSender(account)
+
+
+# ==================== 模板渲染 ====================
+
+@pytest.mark.benchmark(group="template")
+def test_render_template_simple(benchmark):
+    service = TemplateService(None)
+    success, _, _ = benchmark(service.render_template, "您好，{{ name }}，验证码 {{ code }}", {"name": "张三", "code": "123456"})
+    assert success
+
+
+@pytest.mark.benchmark(group="template")
+def test_render_template_order(benchmark):
+    service = TemplateService(None)
+    success, result, _ = benchmark(service.render_template, ORDER_TEMPLATE, ORDER_VARIABLES)
+    assert success and "NO202401010001" in result
+
+
+# ==================== 去重 ====================
+
+@pytest.mark.benchmark(group="dedup")
+@pytest.mark.parametrize("size", [100, 10_000])
+def test_content_fingerprint(benchmark, size):
+    service = MessageService(None)
+    content = "x" * size
+    fingerprint = benchmark(service._generate_content_fingerprint, MessageChannel.EMAIL, "user@example.com", content)
+    assert len(fingerprint) == 64
+
+
+@pytest.mark.benchmark(group="dedup")
+def test_check_duplicate_miss(benchmark, db_session, fake_redis):
+    service = MessageService(db_session, fake_redis)
+    counter = itertools.count()
+
+    def run():
+        return service.check_duplicate(
+            channel=MessageChannel.EMAIL,
+            to="user@example.com",
+            content=f"{HTML_CONTENT}{next(counter)}"
+        )
+
+    assert benchmark(run) is None
+
+
+@pytest.mark.benchmark(group="dedup")
+def test_check_duplicate_hit(benchmark, db_session, fake_redis):
+    service = MessageService(db_session, fake_redis)
+    service.check_duplicate(channel=MessageChannel.EMAIL, to="user@example.com", content=HTML_CONTENT)
+
+    benchmark(service.check_duplicate, channel=MessageChannel.EMAIL, to="user@example.com", content=HTML_CONTENT)
+
+
+# ==================== MIME构建 ====================
+
+@pytest.mark.benchmark(group="mime")
+def test_build_message_html(benchmark, sender):
+    raw, recipients = benchmark(
+        sender._build_message,
+        ["a@example.com", "b@example.com"],
+        "订单支付成功",
+        HTML_CONTENT,
+        cc=["c@example.com"],
+    )
+    assert recipients == ["a@example.com", "b@example.com", "c@example.com"]
+
+
+@pytest.mark.benchmark(group="mime")
+def test_build_message_attachment(benchmark, sender):
+    attachments = [{"filename": "invoice.pdf", "content": b"%PDF-1.4" + b"\x00" * 100_000}]
+    raw, _ = benchmark(sender._build_message, ["a@example.com"], "电子发票", HTML_CONTENT, attachments=attachments)
+    assert "invoice.pdf" in raw
+
+
+# ==================== 安全 ====================
+
+@pytest.mark.benchmark(group="security")
+def test_decode_token(benchmark):
+    token = create_access_token({"sub": "1", "type": "api_key"})
+    payload = benchmark(decode_token, token)
+    assert payload["sub"] == "1"
+
+
+@pytest.mark.benchmark(group="security")
+def test_encrypt_data(benchmark):
+    benchmark(encrypt_data, "smtp-password-123456")
+
+
+@pytest.mark.benchmark(group="security")
+def test_decrypt_data(benchmark):
+    encrypted = encrypt_data("smtp-password-123456")
+    assert benchmark(decrypt_data, encrypted) == "smtp-password-123456"
+
+
+# ==================== 邮箱池 ====================
+
+@pytest.mark.benchmark(group="email_pool")
+def test_get_available_account(benchmark, db_session, email_accounts):
+    pool = EmailPoolManager(db_session)
+    account = benchmark(pool.get_available_account)
+    assert account is not None and account.is_available
+
+
+@pytest.mark.benchmark(group="email_pool")
+def test_get_available_account_p2c(benchmark, db_session, email_accounts, fake_redis):
+    for account in email_accounts:
+        fake_redis.store[f"{HEALTH_KEY_PREFIX}{account.id}"] = {
+            "latency_ms": str(200 + account.id * 10), "error_rate": "0.01", "samples": "100",
+        }
+    pool = EmailPoolManager(db_session, AccountHealthTracker(fake_redis))
+    account = benchmark(pool.get_available_account)
+    assert account is not None and account.is_available
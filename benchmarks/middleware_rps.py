@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+请求中间件吞吐基准测试
+
+对比旧的 @app.middleware("http")（BaseHTTPMiddleware）实现与纯ASGI的
+RequestContextMiddleware，在相同的轻量端点上测量每秒请求数。
+请求在进程内通过ASGI直接驱动，排除网络和服务器开销。
+
+用法：
+    python benchmarks/middleware_rps.py --requests 20000 --concurrency 64
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import REQUEST_COUNT, REQUEST_LATENCY, route_label
+from app.core.middleware import RequestContextMiddleware
+from app.core.security import generate_request_id
+
+
+def build_legacy_app() -> FastAPI:
+    """旧实现：BaseHTTPMiddleware"""
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def add_process_time_header(request: Request, call_next):
+        request_id = request.headers.get("X-Request-ID", generate_request_id())
+        start_time = time.time()
+        response = await call_next(request)
+        process_time = time.time() - start_time
+        response.headers["X-Request-ID"] = request_id
+        response.headers["X-Process-Time"] = f"{process_time:.4f}"
+        if settings.PROMETHEUS_ENABLED:
+            endpoint = route_label(request.scope)
+            REQUEST_COUNT.labels(method=request.method, endpoint=endpoint, status=response.status_code).inc()
+            REQUEST_LATENCY.labels(method=request.method, endpoint=endpoint).observe(process_time)
+        logger.info(
+            f"{request.method} {request.url.path}",
+            extra={"request_id": request_id, "status_code": response.status_code},
+        )
+        return response
+
+    _add_routes(app)
+    return app
+
+
+def build_asgi_app() -> FastAPI:
+    """新实现：纯ASGI中间件"""
+    app = FastAPI()
+    app.add_middleware(RequestContextMiddleware)
+    _add_routes(app)
+    return app
+
+
+def _add_routes(app: FastAPI) -> None:
+    @app.get("/bench/{item_id}")
+    async def item(item_id: int):
+        return {"id": item_id, "status": "ok"}
+
+
+async def run(app: FastAPI, total: int, concurrency: int) -> float:
+    """返回每秒请求数"""
+    transport = httpx.ASGITransport(app=app)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def issue(i: int):
+            async with semaphore:
+                response = await client.get(f"/bench/{i}")
+                assert response.status_code == 200
+
+        # 预热
+        await asyncio.gather(*(issue(i) for i in range(min(200, total))))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(issue(i) for i in range(total)))
+        return total / (time.perf_counter() - start)
+
+
+async def main(total: int, concurrency: int) -> None:
+    # 访问日志写入会主导耗时，基准测试中只保留错误日志
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+
+    legacy = await run(build_legacy_app(), total, concurrency)
+    asgi = await run(build_asgi_app(), total, concurrency)
+
+    print(f"{'middleware':<24} {'req/s':>10}")
+    print("-" * 35)
+    print(f"{'BaseHTTPMiddleware':<24} {legacy:>10.1f}")
+    print(f"{'RequestContextMiddleware':<24} {asgi:>10.1f}")
+    print(f"{'speedup':<24} {asgi / legacy:>9.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="请求中间件吞吐基准测试")
+    parser.add_argument("--requests", type=int, default=20000, help="请求总数")
+    parser.add_argument("--concurrency", type=int, default=64, help="并发数")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.requests, args.concurrency))
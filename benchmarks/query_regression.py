@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+查询性能回归测试（本地PostgreSQL）
+
+在 scripts/generate_load_data.py 生成的大数据量库上执行 MessageService.list_messages
+和监控接口的真实代码路径，记录每个场景的耗时分位数，并捕获场景内执行的每条SQL，
+用 EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) 保存执行计划。
+
+与基线对比时，以下情况视为回归，进程以非0退出：
+  - 中位耗时超过基线的 (1 + --tolerance) 倍且绝对增量超过 --min-delta-ms
+  - 出现基线中没有的 message_records 顺序扫描
+
+用法：
+    python benchmarks/query_regression.py --save-baseline
+    python benchmarks/query_regression.py --label add-status-index
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import json
+import statistics
+import subprocess
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from sqlalchemy import event, text
+
+from app.core.database import engine, SessionLocal
+from app.models.message import MessageStatus, MessageChannel
+from app.services.message_service import MessageService
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "queries")
+DEFAULT_BASELINE = os.path.join(RESULTS_DIR, "baseline.json")
+
+WATCHED_TABLES = {"message_records"}
+
+
+def _monitoring(func_name: str, **kwargs) -> Callable:
+    """监控接口是async路由函数，直接以会话调用"""
+    def run(db):
+        from app.api.v1 import monitoring
+        return asyncio.run(getattr(monitoring, func_name)(db=db, **kwargs))
+    return run
+
+
+def _list(**kwargs) -> Callable:
+    def run(db):
+        return MessageService(db).list_messages(**kwargs)
+    return run
+
+
+def build_scenarios(db) -> Dict[str, Callable]:
+    """
+    构建场景（参数取自库中实际存在的热点值）
+
+    Returns:
+        Dict: 场景名 -> 以会话为参数的可调用对象
+    """
+    api_key_id = db.execute(text(
+        "SELECT api_key_id FROM message_records WHERE api_key_id IS NOT NULL "
+        "GROUP BY api_key_id ORDER BY count(*) DESC LIMIT 1"
+    )).scalar()
+    request_id = db.execute(text("SELECT request_id FROM message_records ORDER BY id DESC LIMIT 1")).scalar()
+
+    now = datetime.now()
+    day_ago = (now - timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S")
+    week_ago = now - timedelta(days=7)
+
+    return {
+        "list_default": _list(page=1, page_size=20),
+        "list_deep_page": _list(page=500, page_size=20),
+        "list_status_failed": _list(status=MessageStatus.FAILED),
+        "list_channel_sms": _list(channel=MessageChannel.SMS),
+        "list_by_recipient": _list(to="user1@qq.com"),
+        "list_by_request_id": _list(request_id=request_id),
+        "list_by_api_key": _list(api_key_id=api_key_id),
+        "list_last_day": _list(start_time=day_ago),
+        "list_export_10000": _list(page_size=10000),
+        "monitoring_metrics_24h": _monitoring(
+            "get_system_metrics", hours=24, date=None, start_date=None, end_date=None
+        ),
+        "monitoring_metrics_7d": _monitoring(
+            "get_system_metrics",
+            hours=24,
+            date=None,
+            start_date=week_ago.strftime("%Y-%m-%d"),
+            end_date=now.strftime("%Y-%m-%d"),
+        ),
+        "monitoring_hourly_24h": _monitoring("get_hourly_stats", hours=24),
+        "monitoring_latency_account_24h": _monitoring(
+            "get_latency_percentiles", hours=24, group_by="account", bucket="hour", limit=100, current_user=None
+        ),
+        "monitoring_latency_hourly_24h": _monitoring(
+            "get_latency_percentiles", hours=24, group_by="bucket", bucket="hour", limit=100, current_user=None
+        ),
+    }
+
+
+class StatementCapture:
+    """捕获场景执行期间的SQL及参数"""
+
+    def __init__(self):
+        self.statements: List[tuple] = []
+        self.enabled = False
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if self.enabled and not executemany:
+            self.statements.append((statement, parameters))
+
+
+def summarize_plan(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """提取执行计划要点：耗时、节点类型、顺序扫描的表、使用的索引"""
+    nodes = []
+    seq_scans = set()
+    indexes = set()
+
+    def walk(node):
+        node_type = node["Node Type"]
+        relation = node.get("Relation Name")
+        nodes.append(f"{node_type} on {relation}" if relation else node_type)
+        if node_type == "Seq Scan" and relation:
+            seq_scans.add(relation)
+        if node.get("Index Name"):
+            indexes.add(node["Index Name"])
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan["Plan"])
+    return {
+        "execution_ms": round(plan.get("Execution Time", 0), 3),
+        "planning_ms": round(plan.get("Planning Time", 0), 3),
+        "total_cost": plan["Plan"].get("Total Cost"),
+        "rows": plan["Plan"].get("Actual Rows"),
+        "nodes": nodes,
+        "seq_scans": sorted(seq_scans),
+        "indexes": sorted(indexes),
+    }
+
+
+def explain(statements: List[tuple]) -> List[Dict[str, Any]]:
+    """对捕获的SQL执行 EXPLAIN ANALYZE"""
+    results = []
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            if not statement.lstrip().upper().startswith("SELECT"):
+                continue
+            row = conn.exec_driver_sql(
+                "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement,
+                parameters,
+            ).scalar()
+            plan = (row if isinstance(row, list) else json.loads(row))[0]
+            results.append({
+                "sql": statement,
+                "summary": summarize_plan(plan),
+                "plan": plan,
+            })
+        conn.rollback()
+    return results
+
+
+def run_scenario(name: str, scenario: Callable, runs: int, capture: StatementCapture) -> Dict[str, Any]:
+    """执行场景：预热一次（同时捕获SQL），再计时runs次"""
+    db = SessionLocal()
+    try:
+        capture.statements = []
+        capture.enabled = True
+        scenario(db)
+        capture.enabled = False
+        statements = list(capture.statements)
+        db.rollback()
+
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            scenario(db)
+            timings.append((time.perf_counter() - start) * 1000)
+            db.rollback()
+    finally:
+        db.close()
+
+    ordered = sorted(timings)
+    return {
+        "runs": runs,
+        "median_ms": round(statistics.median(ordered), 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        "min_ms": round(ordered[0], 3),
+        "max_ms": round(ordered[-1], 3),
+        "statements": explain(statements),
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, min_delta_ms: float) -> List[str]:
+    """
+    与基线对比
+
+    Returns:
+        List[str]: 回归描述
+    """
+    regressions = []
+    for name, result in current["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if not base:
+            continue
+
+        delta = result["median_ms"] - base["median_ms"]
+        if result["median_ms"] > base["median_ms"] * (1 + tolerance) and delta > min_delta_ms:
+            regressions.append(
+                f"{name}: median {base['median_ms']:.1f}ms -> {result['median_ms']:.1f}ms (+{delta:.1f}ms)"
+            )
+
+        base_scans = {t for s in base["statements"] for t in s["summary"]["seq_scans"]}
+        new_scans = {t for s in result["statements"] for t in s["summary"]["seq_scans"]} - base_scans
+        for table in sorted(new_scans & WATCHED_TABLES):
+            regressions.append(f"{name}: new Seq Scan on {table}")
+    return regressions
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="查询性能回归测试")
+    parser.add_argument("--runs", type=int, default=5, help="每个场景的计时次数")
+    parser.add_argument("--only", action="append", default=[], help="只运行指定场景，可重复")
+    parser.add_argument("--label", default="current", help="本次运行的名称")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="基线文件")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的相对退化比例")
+    parser.add_argument("--min-delta-ms", type=float, default=5, help="忽略小于该值的绝对退化(毫秒)")
+    args = parser.parse_args()
+
+    if engine.url.get_backend_name() != "postgresql":
+        print(f"❌ 仅支持PostgreSQL（当前: {engine.url.get_backend_name()}）")
+        return 2
+
+    capture = StatementCapture()
+    event.listen(engine, "before_cursor_execute", capture)
+
+    db = SessionLocal()
+    try:
+        row_count = db.execute(text(
+            "SELECT reltuples::bigint FROM pg_class WHERE relname = 'message_records'"
+        )).scalar()
+        scenarios = build_scenarios(db)
+    finally:
+        db.close()
+
+    selected = {name: fn for name, fn in scenarios.items() if not args.only or name in args.only}
+    result = {
+        "label": args.label,
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "message_records": row_count,
+        "scenarios": {},
+    }
+
+    print(f"message_records ≈ {row_count:,} 行，commit {result['commit']}")
+    for name, scenario in selected.items():
+        scenario_result = run_scenario(name, scenario, args.runs, capture)
+        result["scenarios"][name] = scenario_result
+        scans = sorted({t for s in scenario_result["statements"] for t in s["summary"]["seq_scans"]})
+        print(f"  {name:<26} median {scenario_result['median_ms']:>10.1f}ms  "
+              f"p95 {scenario_result['p95_ms']:>10.1f}ms  "
+              f"{len(scenario_result['statements'])} SQL  seq scans: {', '.join(scans) or '-'}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = os.path.join(RESULTS_DIR, f"{args.label}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2, default=str)
+    print(f"结果已保存: {output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2, default=str)
+        print(f"基线已保存: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("未找到基线，跳过对比（先用 --save-baseline 生成）")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("message_records") and row_count:
+        ratio = row_count / baseline["message_records"]
+        if not 0.9 <= ratio <= 1.1:
+            print(f"⚠️  数据量与基线差异较大（{baseline['message_records']:,} -> {row_count:,}），对比结果仅供参考")
+
+    regressions = compare(result, baseline, args.tolerance, args.min_delta_ms)
+    if regressions:
+        print(f"❌ 相对基线 {baseline.get('label')}@{baseline.get('commit')} 发现回归：")
+        for line in regressions:
+            print(f"   - {line}")
+        return 1
+
+    print(f"✅ 相对基线 {baseline.get('label')}@{baseline.get('commit')} 无回归")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+消息列表序列化基准测试
+
+在SQLite测试库中写入N条消息（默认1万条），对比列表接口的两种实现：
+  legacy  - ORM实体 + MessageResponse.model_validate + ResponseModel + 标准库json
+  fast    - Core元组直接构建字典 + orjson
+
+分别统计加载和序列化耗时
+
+用法：
+    python benchmarks/serialize_messages.py --messages 10000 --rounds 5
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import create_engine, desc, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base
+from app.models.message import MessageRecord, MessageContent, MessageStatus, MessageChannel
+from app.schemas import MessageResponse, ResponseModel, PagedResponse, PaginationModel
+from app.services.content_store import ContentStore
+from app.services.message_service import MessageService
+
+
+DB_PATH = "./benchmark_serialize.db"
+engine = create_engine(f"sqlite:///{DB_PATH}")
+BenchSession = sessionmaker(bind=engine)
+
+
+def setup(count: int) -> None:
+    """写入测试数据（正文按10种内容去重）"""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    now = datetime.now()
+    bodies = [f"<p>Hello {i}, your order has shipped.</p>" * 20 for i in range(10)]
+    hashes = [ContentStore.compute_hash(body) for body in bodies]
+
+    with engine.begin() as conn:
+        conn.execute(insert(MessageContent), [
+            {
+                "content_hash": h,
+                "body": body.encode("utf-8"),
+                "compression": "none",
+                "size": len(body),
+                "ref_count": count // 10,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for h, body in zip(hashes, bodies)
+        ])
+        conn.execute(insert(MessageRecord), [
+            {
+                "channel": MessageChannel.EMAIL,
+                "status": MessageStatus.SUCCESS,
+                "to": f"user{i}@example.com",
+                "subject": f"Order #{i}",
+                "content_hash": hashes[i % 10],
+                "content_type": "html",
+                "sender": "noreply@example.com",
+                "sent_at": now.isoformat(),
+                "retry_count": 0,
+                "max_retry": 3,
+                "request_id": f"req-{i}",
+                "created_at": now,
+                "updated_at": now,
+            }
+            for i in range(count)
+        ])
+
+
+def run_legacy(db, count: int) -> tuple[float, float]:
+    """旧实现：返回(加载耗时, 序列化耗时)"""
+    start = time.perf_counter()
+    messages = db.query(MessageRecord).order_by(desc(MessageRecord.created_at)).limit(count).all()
+    MessageService(db).prefetch_contents(messages)
+    loaded = time.perf_counter()
+
+    response = ResponseModel(
+        code=0,
+        message="Success",
+        data=PagedResponse(
+            items=[MessageResponse.model_validate(msg) for msg in messages],
+            pagination=PaginationModel(page=1, page_size=count, total=count, total_pages=1)
+        )
+    )
+    json.dumps(jsonable_encoder(response), ensure_ascii=False).encode("utf-8")
+    done = time.perf_counter()
+
+    db.expunge_all()
+    return loaded - start, done - loaded
+
+
+def run_fast(db, count: int) -> tuple[float, float]:
+    """新实现：返回(加载耗时, 序列化耗时)"""
+    start = time.perf_counter()
+    messages, total = MessageService(db).list_messages(page=1, page_size=count)
+    loaded = time.perf_counter()
+
+    orjson.dumps({
+        "code": 0,
+        "message": "Success",
+        "data": {
+            "items": messages,
+            "pagination": {"page": 1, "page_size": count, "total": total, "total_pages": 1}
+        },
+        "request_id": None
+    })
+    done = time.perf_counter()
+
+    return loaded - start, done - loaded
+
+
+def main(count: int, rounds: int) -> None:
+    setup(count)
+    db = BenchSession()
+
+    print(f"{'mode':<8} {'load(ms)':>10} {'serialize(ms)':>15} {'total(ms)':>11}")
+    print("-" * 47)
+    for name, runner in (("legacy", run_legacy), ("fast", run_fast)):
+        runner(db, count)  # 预热（同时填充正文缓存）
+        loads, dumps = [], []
+        for _ in range(rounds):
+            load, dump = runner(db, count)
+            loads.append(load)
+            dumps.append(dump)
+        load_ms = statistics.median(loads) * 1000
+        dump_ms = statistics.median(dumps) * 1000
+        print(f"{name:<8} {load_ms:>10.1f} {dump_ms:>15.1f} {load_ms + dump_ms:>11.1f}")
+
+    db.close()
+    os.remove(DB_PATH)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="消息列表序列化基准测试")
+    parser.add_argument("--messages", type=int, default=10000, help="消息数量")
+    parser.add_argument("--rounds", type=int, default=5, help="测试轮数（取中位数）")
+    args = parser.parse_args()
+
+    main(args.messages, args.rounds)
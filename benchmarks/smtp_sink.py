@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+本地SMTP接收端（压测用）
+
+基于aiosmtpd，接收邮件后丢弃，只记录到达时间。可按登录账户模拟：
+  - 处理延迟（latency_ms ± jitter_ms）
+  - 限流回复（按比例返回421/451）
+  - 认证失败（auth_fail）
+
+账户配置文件为JSON，键为SMTP用户名，"*" 为默认配置：
+    {"*": {"latency_ms": 50}, "loadsender1@example.com": {"latency_ms": 800, "throttle_rate": 0.1}}
+
+用法：
+    python benchmarks/smtp_sink.py --port 2525 --latency-ms 50 --throttle-rate 0.02
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, asdict
+from email.parser import BytesHeaderParser
+from typing import Dict, Optional
+
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult, LoginPassword
+
+
+@dataclass
+class AccountProfile:
+    """单个SMTP账户的模拟行为"""
+    latency_ms: float = 0
+    jitter_ms: float = 0
+    throttle_rate: float = 0
+    throttle_code: int = 451
+    auth_fail: bool = False
+
+
+class SinkHandler:
+    """aiosmtpd处理器：记录到达时间并按账户模拟延迟和限流"""
+
+    def __init__(self, profiles: Dict[str, AccountProfile]):
+        self.profiles = profiles
+        self.default = profiles.get("*", AccountProfile())
+        # 主题 -> 到达时间（time.time()）
+        self.receipts: Dict[str, float] = {}
+        self.counters: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def profile(self, username: Optional[str]) -> AccountProfile:
+        return self.profiles.get(username or "", self.default)
+
+    def authenticate(self, server, session, envelope, mechanism, auth_data) -> AuthResult:
+        """认证：密码不校验，按配置模拟失败"""
+        if not isinstance(auth_data, LoginPassword):
+            return AuthResult(success=False, handled=False)
+        username = auth_data.login.decode("utf-8", "replace")
+        if self.profile(username).auth_fail:
+            self._count(username, "auth_failed")
+            return AuthResult(success=False, handled=False)
+        return AuthResult(success=True, auth_data=username)
+
+    async def handle_DATA(self, server, session, envelope) -> str:
+        username = session.auth_data if isinstance(session.auth_data, str) else None
+        profile = self.profile(username)
+
+        delay = profile.latency_ms + random.uniform(-profile.jitter_ms, profile.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+        if profile.throttle_rate and random.random() < profile.throttle_rate:
+            self._count(username, f"throttled_{profile.throttle_code}")
+            if profile.throttle_code == 421:
+                return "421 4.7.0 Too many messages, try again later"
+            return "451 4.7.1 Rate limited, try again later"
+
+        headers = BytesHeaderParser().parsebytes(envelope.content)
+        with self._lock:
+            self.receipts[headers.get("Subject", "")] = time.time()
+        self._count(username, "accepted")
+        return "250 OK"
+
+    def _count(self, username: Optional[str], outcome: str) -> None:
+        with self._lock:
+            self.counters[(username or "-", outcome)] += 1
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """按账户汇总的结果计数"""
+        result: Dict[str, Dict[str, int]] = {}
+        with self._lock:
+            for (username, outcome), count in self.counters.items():
+                result.setdefault(username, {})[outcome] = count
+        return result
+
+
+def load_profiles(path: Optional[str], default: AccountProfile) -> Dict[str, AccountProfile]:
+    """读取账户配置文件"""
+    profiles = {"*": default}
+    if path:
+        with open(path, encoding="utf-8") as f:
+            for username, options in json.load(f).items():
+                profiles[username] = AccountProfile(**options)
+    return profiles
+
+
+def start_sink(host: str, port: int, profiles: Dict[str, AccountProfile]) -> tuple[Controller, SinkHandler]:
+    """
+    在后台线程启动SMTP接收端
+
+    Returns:
+        tuple: (Controller, SinkHandler)
+    """
+    handler = SinkHandler(profiles)
+    controller = Controller(
+        handler,
+        hostname=host,
+        port=port,
+        authenticator=handler.authenticate,
+        auth_require_tls=False,
+        data_size_limit=50 * 1024 * 1024,
+    )
+    controller.start()
+    return controller, handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="本地SMTP接收端（压测用）")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=2525, help="监听端口")
+    parser.add_argument("--latency-ms", type=float, default=0, help="默认处理延迟(毫秒)")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="延迟抖动(毫秒)")
+    parser.add_argument("--throttle-rate", type=float, default=0, help="默认限流比例(0-1)")
+    parser.add_argument("--throttle-code", type=int, choices=[421, 451], default=451, help="限流回复码")
+    parser.add_argument("--accounts", help="按账户的配置文件(JSON)")
+    parser.add_argument("--report-interval", type=float, default=10, help="统计输出间隔(秒)")
+    args = parser.parse_args()
+
+    default = AccountProfile(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        throttle_rate=args.throttle_rate,
+        throttle_code=args.throttle_code,
+    )
+    profiles = load_profiles(args.accounts, default)
+    controller, handler = start_sink(args.host, args.port, profiles)
+    print(f"SMTP sink listening on {args.host}:{args.port}")
+    print(json.dumps({name: asdict(p) for name, p in profiles.items()}, indent=2))
+
+    try:
+        while True:
+            time.sleep(args.report_interval)
+            print(json.dumps(handler.stats(), ensure_ascii=False))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    main()
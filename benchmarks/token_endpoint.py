@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+/auth/token 并发吞吐基准测试
+
+在进程内通过ASGI直接驱动应用（SQLite测试库），对比三种验证方式：
+  blocking    - 在事件循环中同步执行bcrypt（旧实现）
+  pool        - bcrypt放入线程池，不使用验证缓存
+  pool+cache  - bcrypt线程池 + HMAC验证缓存
+
+同时并发请求 /health 作为探针，观察事件循环是否被阻塞
+
+用法：
+    python benchmarks/token_endpoint.py --requests 200 --concurrency 50
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.main import app
+from app.api.v1 import auth as auth_api
+from app.core import security
+from app.core.database import Base, get_db
+from app.core.security import generate_api_key, generate_api_secret, hash_password
+from app.models.api_key import APIKey
+
+
+engine = create_engine("sqlite:///./benchmark_token.db", connect_args={"check_same_thread": False})
+BenchSession = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def override_get_db():
+    db = BenchSession()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def setup_api_key() -> tuple[str, str]:
+    """创建测试API Key"""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    api_key_str = generate_api_key()
+    api_secret_str = generate_api_secret()
+    db = BenchSession()
+    db.add(APIKey(
+        api_key=api_key_str,
+        api_secret_hash=hash_password(api_secret_str),
+        name="benchmark",
+        is_active=True
+    ))
+    db.commit()
+    db.close()
+    return api_key_str, api_secret_str
+
+
+async def blocking_verify(plain_password: str, hashed_password: str) -> bool:
+    """旧实现：直接在事件循环中执行bcrypt"""
+    return security.verify_password(plain_password, hashed_password)
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def run_mode(mode: str, credentials: dict, total: int, concurrency: int) -> dict:
+    """运行一种模式并返回统计结果"""
+    security._verify_cache.clear()
+    auth_api.verify_password_async = blocking_verify if mode == "blocking" else security.verify_password_async
+    if mode == "pool":
+        security._verify_cache.maxsize = 0
+    else:
+        security._verify_cache.maxsize = security.settings.PASSWORD_VERIFY_CACHE_SIZE
+
+    transport = httpx.ASGITransport(app=app)
+    token_latencies = []
+    probe_latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    done = asyncio.Event()
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def issue():
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/api/v1/auth/token", json=credentials)
+                token_latencies.append(time.perf_counter() - start)
+                assert response.status_code == 200, response.text
+
+        async def probe():
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/health")
+                probe_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.01)
+
+        probe_task = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(issue() for _ in range(total)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe_task
+
+    return {
+        "mode": mode,
+        "rps": total / elapsed,
+        "p50_ms": percentile(token_latencies, 0.50) * 1000,
+        "p99_ms": percentile(token_latencies, 0.99) * 1000,
+        "probe_p99_ms": percentile(probe_latencies, 0.99) * 1000 if probe_latencies else 0.0,
+        "probe_mean_ms": statistics.mean(probe_latencies) * 1000 if probe_latencies else 0.0,
+    }
+
+
+async def main(total: int, concurrency: int, modes: list) -> None:
+    api_key_str, api_secret_str = setup_api_key()
+    app.dependency_overrides[get_db] = override_get_db
+    credentials = {"api_key": api_key_str, "api_secret": api_secret_str}
+
+    print(f"{'mode':<12} {'req/s':>10} {'p50(ms)':>10} {'p99(ms)':>10} {'probe p99(ms)':>15}")
+    print("-" * 62)
+    for mode in modes:
+        result = await run_mode(mode, credentials, total, concurrency)
+        print(
+            f"{result['mode']:<12} {result['rps']:>10.1f} {result['p50_ms']:>10.1f} "
+            f"{result['p99_ms']:>10.1f} {result['probe_p99_ms']:>15.1f}"
+        )
+
+    app.dependency_overrides.clear()
+    os.remove("./benchmark_token.db")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="/auth/token 并发吞吐基准测试")
+    parser.add_argument("--requests", type=int, default=200, help="请求总数")
+    parser.add_argument("--concurrency", type=int, default=50, help="并发数")
+    parser.add_argument(
+        "--modes",
+        nargs="+",
+        default=["blocking", "pool", "pool+cache"],
+        choices=["blocking", "pool", "pool+cache"],
+        help="测试模式"
+    )
+    args = parser.parse_args()
+
+    asyncio.run(main(args.requests, args.concurrency, args.modes))
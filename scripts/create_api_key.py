@@ -12,7 +12,7 @@ import argparse
 from datetime import datetime, timedelta
 
 from app.core.database import SessionLocal
-from app.core.security import generate_api_key, generate_api_secret, hash_password
+from app.core.security import generate_api_key, generate_api_secret, hash_password, encrypt_data
 from app.models.api_key import APIKey
 from app.core.logger import logger
 
@@ -21,7 +21,8 @@ def create_api_key(
     name: str,
     description: str = None,
     expires_days: int = None,
-    created_by: str = "system"
+    created_by: str = "system",
+    callback_url: str = None
 ):
     """
     创建API密钥
@@ -31,6 +32,7 @@ def create_api_key(
         description: 密钥描述
         expires_days: 过期天数（None表示永不过期）
         created_by: 创建人
+        callback_url: 状态回调地址（可选）
     """
     db = SessionLocal()
     
@@ -39,6 +41,9 @@ def create_api_key(
         api_key_str = generate_api_key()
         api_secret_str = generate_api_secret()
         
+        # 生成回调签名密钥
+        callback_secret_str = generate_api_secret() if callback_url else None
+        
         # 计算过期时间
         expires_at = None
         if expires_days:
@@ -51,7 +56,9 @@ def create_api_key(
             name=name,
             description=description,
             expires_at=expires_at,
-            created_by=created_by
+            created_by=created_by,
+            callback_url=callback_url,
+            callback_secret=encrypt_data(callback_secret_str) if callback_secret_str else None
         )
         
         db.add(api_key)
@@ -72,6 +79,9 @@ def create_api_key(
         print("=" * 80)
         print(f"API Key:    {api_key_str}")
         print(f"API Secret: {api_secret_str}")
+        if callback_url:
+            print(f"回调地址:   {callback_url}")
+            print(f"回调签名密钥: {callback_secret_str}")
         print("=" * 80)
         print("\n使用示例：")
         print(f"""
@@ -102,6 +112,7 @@ def main():
     parser.add_argument("--description", help="密钥描述")
     parser.add_argument("--expires-days", type=int, help="过期天数（不指定则永不过期）")
     parser.add_argument("--created-by", default="system", help="创建人")
+    parser.add_argument("--callback-url", help="状态回调地址（Webhook）")
     
     args = parser.parse_args()
     
@@ -109,7 +120,8 @@ def main():
         name=args.name,
         description=args.description,
         expires_days=args.expires_days,
-        created_by=args.created_by
+        created_by=args.created_by,
+        callback_url=args.callback_url
     )
 
 
@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+"""
+生成大规模模拟数据（仅用于本地PostgreSQL性能测试）
+
+用COPY批量写入message_records，分布接近生产：
+  - 状态偏斜：绝大多数成功，少量失败/重试/待发送
+  - 错误信息按长尾分布集中在少数几类SMTP错误
+  - 收件人、模板、API Key、发件邮箱、正文均为幂律分布（少数热点占大头）
+  - 创建时间分布在最近N天，白天多、夜间少
+同时生成所需的email_accounts、message_templates、api_keys和message_contents
+
+用法：
+    python scripts/generate_load_data.py --messages 20000000 --days 90
+    python scripts/generate_load_data.py --messages 1000000 --reset --yes
+"""
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import hashlib
+import io
+import itertools
+import json
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List, Sequence
+
+from sqlalchemy import text
+
+from app.core.database import engine, Base, SessionLocal
+from app.core.security import encrypt_data, hash_password
+from app.models import *  # noqa
+from app.models.api_key import APIKey
+from app.models.email import EmailAccount
+from app.models.message import MessageContent, MessageStatus, MessageChannel
+from app.models.template import MessageTemplate, TemplateType
+
+
+NAME_PREFIX = "loadgen"
+
+# 状态分布（PostgreSQL原生枚举按成员名存储）
+STATUS_WEIGHTS = [
+    (MessageStatus.SUCCESS, 0.925),
+    (MessageStatus.FAILED, 0.04),
+    (MessageStatus.PENDING, 0.015),
+    (MessageStatus.RETRYING, 0.01),
+    (MessageStatus.SENDING, 0.01),
+]
+
+CHANNEL_WEIGHTS = [
+    (MessageChannel.EMAIL, 0.94),
+    (MessageChannel.SMS, 0.04),
+    (MessageChannel.WECHAT, 0.015),
+    (MessageChannel.WECHAT_OFFICIAL, 0.005),
+]
+
+# (错误码, 错误信息)，按出现频率从高到低排列
+SMTP_ERRORS = [
+    ("SMTP_550", "(550, b'Mailbox not found or access denied')"),
+    ("SMTP_421", "(421, b'Too many connections from your IP, try again later')"),
+    ("SMTP_451", "(451, b'Temporary local problem - please try later')"),
+    ("SMTP_554", "(554, b'Message rejected as spam by content filter')"),
+    ("SMTP_535", "(535, b'Error: authentication failed')"),
+    ("TIMEOUT", "Timed out connecting to smtp.qq.com on port 465"),
+    ("SMTP_552", "(552, b'Message size exceeds fixed maximum message size')"),
+    ("SMTP_553", "(553, b'Mail from must equal authorized user')"),
+    ("CONNECTION", "Connection lost"),
+    ("NO_ACCOUNT", "No available email account"),
+]
+
+RECIPIENT_DOMAINS = [
+    ("qq.com", 0.45), ("163.com", 0.2), ("126.com", 0.08), ("gmail.com", 0.07),
+    ("outlook.com", 0.05), ("sina.com", 0.04), ("foxmail.com", 0.04), ("example.com", 0.07),
+]
+
+# 每小时的相对发送量（白天高峰，夜间低谷）
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 3, 6, 10, 12, 12, 11, 9, 10, 12, 12, 11, 10, 8, 7, 6, 4, 3, 2]
+
+COPY_COLUMNS = (
+    "channel", "status", '"to"', "cc", "bcc", "subject", "content_hash", "content_type",
+    "template_id", "template_version", "template_variables", "sender", "sent_at",
+    "retry_count", "max_retry", "error_code", "error_message", "idempotency_key",
+    "request_id", "api_key_id", "created_at", "updated_at",
+    "queued_at", "started_at", "render_ms", "queue_wait_ms", "smtp_connect_ms", "smtp_transmit_ms",
+    "delivery_ms",
+)
+
+NULL = "\\N"
+
+
+def zipf_cum_weights(n: int, s: float = 1.1) -> List[float]:
+    """生成长度为n的Zipf分布累计权重"""
+    total = 0.0
+    cum = []
+    for rank in range(1, n + 1):
+        total += 1.0 / rank ** s
+        cum.append(total)
+    return cum
+
+
+def cumulative(weights: Sequence[float]) -> List[float]:
+    return list(itertools.accumulate(weights))
+
+
+def ensure_api_keys(db, count: int) -> List[int]:
+    """创建模拟API Key（按名称幂等）"""
+    existing = db.query(APIKey).filter(APIKey.name.like(f"{NAME_PREFIX}-%")).order_by(APIKey.id).all()
+    if len(existing) < count:
+        secret_hash = hash_password(f"{NAME_PREFIX}-secret")
+        for i in range(len(existing), count):
+            db.add(APIKey(api_key=f"noti_{NAME_PREFIX}_{i:04d}", api_secret_hash=secret_hash, name=f"{NAME_PREFIX}-{i}"))
+        db.commit()
+        existing = db.query(APIKey).filter(APIKey.name.like(f"{NAME_PREFIX}-%")).order_by(APIKey.id).all()
+    return [key.id for key in existing[:count]]
+
+
+def ensure_email_accounts(db, count: int) -> List[str]:
+    """创建模拟邮箱账户（按邮箱地址幂等）"""
+    existing = {
+        account.email
+        for account in db.query(EmailAccount).filter(EmailAccount.email.like(f"{NAME_PREFIX}%"))
+    }
+    password = encrypt_data(f"{NAME_PREFIX}-password")
+    emails = [f"{NAME_PREFIX}{i}@example.com" for i in range(count)]
+    for i, email in enumerate(emails):
+        if email in existing:
+            continue
+        db.add(EmailAccount(
+            email=email,
+            smtp_host="smtp.example.com",
+            smtp_port=465,
+            smtp_username=email,
+            smtp_password=password,
+            daily_limit=random.choice([500, 1000, 2000, 5000]),
+            daily_sent_count=random.randint(0, 500),
+            priority=random.choice([0, 10, 10, 20]),
+            failure_count=5 if i % 17 == 0 else 0,
+            is_active=i % 13 != 0,
+        ))
+    db.commit()
+    return emails
+
+
+def ensure_templates(db, count: int) -> List[tuple]:
+    """
+    创建模拟模板（按编码幂等）
+
+    Returns:
+        List[tuple]: [(模板ID, 版本号, 主题, 变量名列表)]
+    """
+    existing = {
+        template.code: template
+        for template in db.query(MessageTemplate).filter(MessageTemplate.code.like(f"{NAME_PREFIX}_%"))
+    }
+    for i in range(count):
+        code = f"{NAME_PREFIX}_{i:04d}"
+        if code in existing:
+            continue
+        template = MessageTemplate(
+            code=code,
+            name=f"模拟模板{i}",
+            type=TemplateType.EMAIL,
+            subject_template=f"【通知{i}】{{{{ user_name }}}}，您的订单 {{{{ order_no }}}}",
+            content_template="<p>您好，{{ user_name }}</p><p>订单 {{ order_no }} 状态已更新。</p>",
+            variables={"user_name": {"type": "string"}, "order_no": {"type": "string"}},
+            version=random.randint(1, 5),
+        )
+        db.add(template)
+        existing[code] = template
+    db.commit()
+    result = []
+    for i in range(count):
+        template = existing[f"{NAME_PREFIX}_{i:04d}"]
+        result.append((template.id, template.version, f"【通知{i}】", ["user_name", "order_no"]))
+    return result
+
+
+def create_contents(db, count: int) -> List[str]:
+    """
+    创建正文池（未压缩），返回内容哈希列表
+
+    正文按Zipf分布被消息引用，ref_count在数据写入完成后回填
+    """
+    hashes = []
+    rows = []
+    for i in range(count):
+        body = (
+            f"<html><body><h1>{NAME_PREFIX} {i}</h1>"
+            + "<p>您的订单状态已更新，请登录查看详情。</p>" * random.randint(5, 60)
+            + "</body></html>"
+        ).encode("utf-8")
+        content_hash = hashlib.sha256(body).hexdigest()
+        hashes.append(content_hash)
+        rows.append({
+            "content_hash": content_hash,
+            "body": body,
+            "compression": "none",
+            "size": len(body),
+            "ref_count": 0,
+            "created_at": datetime.now(),
+            "updated_at": datetime.now(),
+        })
+
+    existing = {
+        row[0] for row in db.execute(
+            text("SELECT content_hash FROM message_contents WHERE content_hash = ANY(:hashes)"),
+            {"hashes": hashes},
+        )
+    }
+    new_rows = [row for row in rows if row["content_hash"] not in existing]
+    for start in range(0, len(new_rows), 1000):
+        db.execute(MessageContent.__table__.insert(), new_rows[start:start + 1000])
+    db.commit()
+    return hashes
+
+
+class RowGenerator:
+    """按批生成message_records的COPY文本行"""
+
+    def __init__(
+        self,
+        days: int,
+        api_key_ids: List[int],
+        senders: List[str],
+        templates: List[tuple],
+        content_hashes: List[str],
+        recipients: int
+    ):
+        self.now = datetime.now().replace(microsecond=0)
+        self.days = days
+        self.api_key_ids = api_key_ids
+        self.senders = senders
+        self.templates = templates
+        self.content_hashes = content_hashes
+        self.recipients = recipients
+
+        self.status_values = [status for status, _ in STATUS_WEIGHTS]
+        self.status_cum = cumulative([weight for _, weight in STATUS_WEIGHTS])
+        self.channel_values = [channel for channel, _ in CHANNEL_WEIGHTS]
+        self.channel_cum = cumulative([weight for _, weight in CHANNEL_WEIGHTS])
+        self.domain_values = [domain for domain, _ in RECIPIENT_DOMAINS]
+        self.domain_cum = cumulative([weight for _, weight in RECIPIENT_DOMAINS])
+        self.hour_cum = cumulative(HOUR_WEIGHTS)
+        self.error_cum = zipf_cum_weights(len(SMTP_ERRORS), 1.3)
+        self.api_key_cum = zipf_cum_weights(len(api_key_ids), 1.2)
+        self.sender_cum = zipf_cum_weights(len(senders), 0.8)
+        self.template_cum = zipf_cum_weights(len(templates), 1.1)
+        self.content_cum = zipf_cum_weights(len(content_hashes), 1.05)
+        self.recipient_cum = zipf_cum_weights(recipients, 0.9)
+        self.content_refs: Counter = Counter()
+
+    def batch(self, start_seq: int, size: int) -> io.StringIO:
+        choices = random.choices
+        statuses = choices(self.status_values, cum_weights=self.status_cum, k=size)
+        channels = choices(self.channel_values, cum_weights=self.channel_cum, k=size)
+        domains = choices(self.domain_values, cum_weights=self.domain_cum, k=size)
+        hours = choices(range(24), cum_weights=self.hour_cum, k=size)
+        api_keys = choices(self.api_key_ids, cum_weights=self.api_key_cum, k=size)
+        senders = choices(self.senders, cum_weights=self.sender_cum, k=size)
+        templates = choices(self.templates, cum_weights=self.template_cum, k=size)
+        contents = choices(range(len(self.content_hashes)), cum_weights=self.content_cum, k=size)
+        users = choices(range(self.recipients), cum_weights=self.recipient_cum, k=size)
+        errors = choices(SMTP_ERRORS, cum_weights=self.error_cum, k=size)
+
+        self.content_refs.update(contents)
+        buffer = io.StringIO()
+        write = buffer.write
+        for i in range(size):
+            seq = start_seq + i
+            status = statuses[i]
+            channel = channels[i]
+
+            created_at = (
+                self.now
+                - timedelta(days=random.randrange(self.days))
+            ).replace(hour=hours[i], minute=random.randrange(60), second=random.randrange(60))
+            if created_at > self.now:
+                created_at -= timedelta(days=1)
+            # 待发送/发送中的消息集中在最近几分钟
+            if status in (MessageStatus.PENDING, MessageStatus.SENDING):
+                created_at = self.now - timedelta(seconds=random.randrange(600))
+
+            user = users[i]
+            if channel == MessageChannel.EMAIL:
+                to = f"user{user}@{domains[i]}"
+            elif channel == MessageChannel.SMS:
+                to = f"1{38000000000 + user}"
+            else:
+                to = f"o{user:08d}wx"
+
+            if random.random() < 0.7:
+                template_id, template_version, subject_prefix, _ = templates[i]
+                subject = f"{subject_prefix}user{user}，您的订单 NO{seq:010d}"
+                variables = json.dumps({"user_name": f"user{user}", "order_no": f"NO{seq:010d}"})
+                template_id, template_version = str(template_id), str(template_version)
+                render_ms = str(int(random.expovariate(1 / 3)))
+            else:
+                template_id = template_version = variables = render_ms = NULL
+                subject = f"系统通知 {seq % 1000}"
+
+            sender = NULL
+            sent_at = started_at = NULL
+            queue_wait_ms = smtp_connect_ms = smtp_transmit_ms = delivery_ms = NULL
+            error_code = error_message = NULL
+            retry_count = "0"
+            updated_at = created_at
+            if status != MessageStatus.PENDING:
+                # 排队耗时长尾分布
+                queue_wait = int(random.lognormvariate(4, 1.2))
+                started_at = (created_at + timedelta(milliseconds=queue_wait)).isoformat()
+                queue_wait_ms = str(queue_wait)
+            if status == MessageStatus.SUCCESS:
+                sender = senders[i]
+                connect = int(random.lognormvariate(5.5, 0.5))
+                transmit = int(random.lognormvariate(5, 0.7))
+                delivery = queue_wait + connect + transmit + random.randint(5, 50)
+                updated_at = created_at + timedelta(milliseconds=delivery)
+                sent_at = updated_at.isoformat()
+                smtp_connect_ms, smtp_transmit_ms, delivery_ms = str(connect), str(transmit), str(delivery)
+                retry_count = "0" if random.random() < 0.97 else "1"
+            elif status == MessageStatus.FAILED:
+                sender = senders[i] if errors[i][0] != "NO_ACCOUNT" else NULL
+                error_code, error_message = errors[i]
+                retry_count = "3"
+                updated_at = created_at + timedelta(minutes=random.randint(1, 30))
+            elif status == MessageStatus.RETRYING:
+                sender = senders[i]
+                error_code, error_message = errors[i]
+                retry_count = str(random.randint(1, 2))
+                updated_at = created_at + timedelta(minutes=random.randint(1, 10))
+
+            idempotency_key = f"{NAME_PREFIX}-{seq:012d}" if random.random() < 0.2 else NULL
+
+            write("\t".join((
+                channel.name,
+                status.name,
+                to,
+                NULL,
+                NULL,
+                subject,
+                self.content_hashes[contents[i]],
+                "html",
+                template_id,
+                template_version,
+                variables,
+                sender,
+                sent_at,
+                retry_count,
+                "3",
+                error_code,
+                error_message,
+                idempotency_key,
+                f"req_{NAME_PREFIX}_{seq:012x}",
+                str(api_keys[i]),
+                created_at.isoformat(),
+                updated_at.isoformat(),
+                created_at.isoformat(),
+                started_at,
+                render_ms,
+                queue_wait_ms,
+                smtp_connect_ms,
+                smtp_transmit_ms,
+                delivery_ms,
+            )))
+            write("\n")
+
+        buffer.seek(0)
+        return buffer
+
+
+def check_target(allow_remote: bool) -> None:
+    """只允许写入本地数据库，避免误写生产库"""
+    host = engine.url.host or "localhost"
+    if engine.url.get_backend_name() != "postgresql":
+        raise SystemExit(f"❌ 仅支持PostgreSQL（当前: {engine.url.get_backend_name()}）")
+    if host not in ("localhost", "127.0.0.1", "::1", "postgres") and not allow_remote:
+        raise SystemExit(f"❌ 目标数据库 {host} 不是本地库，如确认请加 --allow-remote")
+
+
+def generate(args) -> None:
+    check_target(args.allow_remote)
+    random.seed(args.seed)
+
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        if args.reset:
+            if not args.yes:
+                raise SystemExit("❌ --reset 会清空 message_records 和 message_contents，请加 --yes 确认")
+            db.execute(text("TRUNCATE message_records, message_contents RESTART IDENTITY CASCADE"))
+            db.commit()
+            print("🗑  已清空 message_records / message_contents")
+
+        api_key_ids = ensure_api_keys(db, args.api_keys)
+        senders = ensure_email_accounts(db, args.accounts)
+        templates = ensure_templates(db, args.templates)
+        content_hashes = create_contents(db, args.contents)
+        print(f"✅ API Key {len(api_key_ids)} / 邮箱 {len(senders)} / 模板 {len(templates)} / 正文 {len(content_hashes)}")
+
+        start_seq = db.execute(text("SELECT COALESCE(MAX(id), 0) FROM message_records")).scalar() + 1
+    finally:
+        db.close()
+
+    generator = RowGenerator(args.days, api_key_ids, senders, templates, content_hashes, args.recipients)
+    copy_sql = f"COPY message_records ({', '.join(COPY_COLUMNS)}) FROM STDIN"
+
+    raw = engine.raw_connection()
+    started = time.perf_counter()
+    loaded = 0
+    try:
+        cursor = raw.cursor()
+        while loaded < args.messages:
+            size = min(args.batch_size, args.messages - loaded)
+            buffer = generator.batch(start_seq + loaded, size)
+            cursor.copy_expert(copy_sql, buffer)
+            raw.commit()
+            loaded += size
+            elapsed = time.perf_counter() - started
+            print(f"  {loaded:>12,} / {args.messages:,} 行  {loaded / elapsed:,.0f} 行/秒")
+
+        # 回填正文引用计数
+        cursor.executemany(
+            "UPDATE message_contents SET ref_count = ref_count + %s WHERE content_hash = %s",
+            [(count, content_hashes[index]) for index, count in generator.content_refs.items()],
+        )
+        raw.commit()
+
+        print("📊 ANALYZE ...")
+        raw.set_isolation_level(0)
+        cursor.execute("ANALYZE message_records")
+        cursor.execute("ANALYZE message_contents")
+        cursor.close()
+    finally:
+        raw.close()
+
+    print(f"✅ 写入 {loaded:,} 条消息，耗时 {time.perf_counter() - started:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成大规模模拟数据（本地PostgreSQL）")
+    parser.add_argument("--messages", type=int, default=10_000_000, help="消息记录数量")
+    parser.add_argument("--days", type=int, default=90, help="创建时间分布的天数")
+    parser.add_argument("--accounts", type=int, default=50, help="邮箱账户数量")
+    parser.add_argument("--templates", type=int, default=200, help="模板数量")
+    parser.add_argument("--api-keys", type=int, default=20, help="API Key数量")
+    parser.add_argument("--contents", type=int, default=20_000, help="不同正文数量")
+    parser.add_argument("--recipients", type=int, default=500_000, help="不同收件人数量")
+    parser.add_argument("--batch-size", type=int, default=200_000, help="每次COPY的行数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--reset", action="store_true", help="写入前清空消息和正文表")
+    parser.add_argument("--yes", action="store_true", help="确认清空操作")
+    parser.add_argument("--allow-remote", action="store_true", help="允许写入非本地数据库")
+
+    args = parser.parse_args()
+    generate(args)
+
+
+if __name__ == "__main__":
+    main()